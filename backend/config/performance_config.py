@@ -28,6 +28,52 @@ class BotPerformanceConfig:
         'retries': 2,              # Quick retries
     }
     
+    # Shared keep-alive pools per external provider (utils/http_clients.py)
+    # Unset keys fall back to HTTP_CLIENT_CONFIG
+    # 'http2' needs the h2 package (httpx[http2]), which requirements.txt
+    # does not install - keep it False until it is added and tested per provider
+    HTTP_PROVIDERS_CONFIG = {
+        'shipstation': {
+            'base_url': 'https://api.shipstation.com',
+            'timeout': 30.0,
+            'connect_timeout': 10.0,
+            'max_connections': 50,
+            'max_keepalive_connections': 20,
+            'http2': False,
+            'warmup_url': 'https://api.shipstation.com/',
+        },
+        'oxapay': {
+            'base_url': 'https://api.oxapay.com',
+            'timeout': 30.0,
+            'connect_timeout': 10.0,
+            'max_connections': 20,
+            'max_keepalive_connections': 10,
+            'http2': False,
+            'warmup_url': 'https://api.oxapay.com/',
+        },
+        'cryptobot': {
+            'base_url': 'https://pay.crypt.bot',
+            'timeout': 30.0,
+            'connect_timeout': 10.0,
+            'max_connections': 20,
+            'max_keepalive_connections': 10,
+            'http2': False,
+        },
+        'labels': {                    # Label PDF downloads (ShipStation CDN)
+            'timeout': 30.0,
+            'connect_timeout': 10.0,
+            'max_connections': 30,
+            'max_keepalive_connections': 10,
+            'http2': False,
+        },
+        'internal': {                  # Calls from bot handlers to our own API
+            'timeout': 30.0,
+            'max_connections': 20,
+            'max_keepalive_connections': 5,
+            'http2': False,
+        },
+    }
+    
     # Database Connection Settings
     MONGODB_CONFIG = {
         'serverSelectionTimeoutMS': 5000,  # 5 sec server selection
@@ -52,6 +98,169 @@ class BotPerformanceConfig:
         'bulk_messages_per_second': 1, # For broadcast operations
     }
     
+    # Telegram webhook inbox - fast ack, background processing
+    UPDATE_INBOX_CONFIG = {
+        'num_workers': 16,             # Worker shards (updates of one user stay in order)
+        'max_queue_size': 2000,        # In-memory capacity before spilling to MongoDB
+        'drain_batch_size': 100,       # Overflow updates restored per batch
+    }
+    
+    # Telegram update_id deduplication at ingress
+    UPDATE_DEDUP_CONFIG = {
+        'window_size': 10000,          # Recent update_ids kept in memory
+        'shared_store': False,         # Enable for several workers (MongoDB TTL collection)
+        'ttl_seconds': 3600,           # How long update_ids stay in the shared store
+    }
+    
+    # Conversation/user_data persistence (write-behind to MongoDB)
+    PERSISTENCE_CONFIG = {
+        'flush_interval': 1.0,         # Seconds between batched bulk_write flushes
+        'flush_threshold': 200,        # Dirty keys that trigger an early flush
+        'active_window_hours': 24,     # Conversations restored on startup
+        'update_interval': 1.0,        # How often PTB hands changes to persistence
+    }
+    
+    # Outbound Telegram scheduler (all Bot API calls)
+    OUTBOUND_SCHEDULER_CONFIG = {
+        'global_rate': 28,             # Requests/sec across all chats (Telegram: ~30)
+        'private_chat_rate': 1.0,      # Requests/sec to one private chat
+        'private_chat_burst': 5,       # Short bursts for interactive replies
+        'group_chat_rate': 20 / 60,    # Telegram: 20 messages/min per group
+        'group_chat_burst': 3,
+        'lane_rates': {                # Caps for low-priority lanes (interactive/label uncapped)
+            'admin': 5,
+            'broadcast': 20,           # Leaves headroom for interactive replies
+        },
+        'max_retries': 3,              # Retries after RetryAfter
+    }
+    
+    # Broadcast engine
+    BROADCAST_CONFIG = {
+        'concurrency': 25,             # Sends in flight (rate enforced by outbound scheduler)
+        'batch_size': 500,             # Recipients per batch / bulk_write
+        'lease_seconds': 60,           # Job ownership without progress before takeover
+    }
+    
+    # ShipStation rate cache (L1 LRU in memory + shared L2 MongoDB)
+    RATE_CACHE_CONFIG = {
+        'cache_duration_minutes': 60,  # Rates are fresh for this long
+        'stale_minutes': 120,          # Then served stale while refreshed in background
+        'max_entries': 5000,           # L1 LRU size per process
+    }
+    
+    # Hedged requests to external APIs (idempotent calls only)
+    HEDGING_CONFIG = {
+        'defaults': {
+            'percentile': 95,          # Hedge when the primary is slower than p95
+            'window': 200,             # Latency samples per endpoint
+            'min_samples': 20,         # No hedging before enough samples
+            'min_delay': 0.05,         # Seconds
+            'max_extra_load': 0.1,     # Hedges as a fraction of calls (extra-load budget)
+        },
+        'endpoints': {
+            'shipstation_rates': {},
+            'shipstation_carriers': {},
+            'shipstation_address_validation': {'max_extra_load': 0.05},
+            'shipstation_labels': {},  # Measured only - purchases are never hedged
+        },
+    }
+    
+    # Per-carrier rate fan-out
+    RATE_FANOUT_CONFIG = {
+        'carrier_deadline': 10.0,      # Slower carriers are dropped from the rate screen
+        'carriers_per_request': 1,     # Carrier ids per /v2/rates request
+    }
+    
+    # Speculative rate prefetch during the order flow
+    RATE_PREFETCH_CONFIG = {
+        'max_concurrent': 20,          # Speculative /v2/rates calls in flight
+        'max_tracked_users': 5000,     # Users whose last prefetch is remembered
+    }
+    
+    # ShipStation carrier catalog cache
+    CARRIER_CATALOG_CONFIG = {
+        'refresh_interval': 3600,      # Scheduled refresh of /v2/carriers
+        'error_retry_interval': 30,    # First retry after a failed refresh
+        'max_error_retry_interval': 600,  # Backoff cap for repeated failures
+    }
+    
+    # Durable label pipeline (purchase → persist → download → deliver → notify)
+    LABEL_JOBS_CONFIG = {
+        'workers': 4,                  # Jobs processed concurrently per process
+        'poll_interval': 5,            # Seconds between queue polls when idle
+        'claim_timeout': 120,          # Lease; expired jobs are resumed by any worker
+        'max_attempts': 5,             # Claims before an erroring job is failed
+        'retention_days': 7,           # Finished jobs kept for inspection
+    }
+    
+    # Local content-addressed copies of label PDFs
+    LABEL_ARCHIVE_CONFIG = {
+        'compress': True,              # zstd when the zstandard package is installed
+        'retention_days': 400,         # Covers carrier claim / refund windows
+        'max_gb': 10,                  # Oldest files evicted above this
+        'max_concurrent': 4,           # Label downloads in flight
+        'maintenance_interval': 3600,  # Seconds between eviction + backfill passes
+        'backfill_batch': 200,         # Older labels archived per pass (newest first)
+        'backfill_attempts': 5,        # Failed downloads before a label is skipped
+        'backfill_retry_hours': 6,     # Retry delay after a failure, doubled per attempt
+    }
+    
+    # Oxapay webhook follow-ups (balance credit, label, notifications)
+    PAYMENT_WEBHOOKS_CONFIG = {
+        'workers': 4,                  # Follow-ups processed concurrently
+        'claim_timeout': 120,          # Lease; interrupted follow-ups are retried after it
+        'max_attempts': 5,             # Attempts before a follow-up is marked failed
+        'sweep_interval': 60,          # Seconds between sweeps for pending follow-ups
+    }
+    
+    # Provider polling for pending payments (lost / late webhooks)
+    PAYMENT_RECONCILER_CONFIG = {
+        'poll_interval': 15,           # Seconds between scans for due payments
+        'min_interval': 30,            # First check / shortest per-payment interval
+        'max_interval': 1800,          # Longest per-payment interval (old invoices)
+        'backoff_factor': 0.1,         # Per-payment interval as a fraction of its age
+        'batch_size': 50,              # Payments per scan batch
+        'max_concurrent': 5,           # Provider calls in flight
+        'expire_after_hours': 24,      # Pending payments older than this are expired
+    }
+    
+    # Cached ShipStation account balance
+    BALANCE_MONITOR_CONFIG = {
+        'refresh_interval': 900,       # Scheduled /v2/account refresh
+        'debounce_seconds': 30,        # Label purchases in this window share one refresh
+        'low_balance_threshold': 50,   # Admin alert below this (USD)
+    }
+    
+    # Pre-generated AI thank-you messages
+    THANK_YOU_POOL_CONFIG = {
+        'size': 20,                    # Messages kept ready
+        'low_watermark': 5,            # Refill when fewer are left
+        'max_concurrent': 2,           # LLM requests in flight during a refill
+        'error_backoff': 60,           # Seconds before retrying after failures
+    }
+    
+    # Append-only user balance ledger
+    BALANCE_LEDGER_CONFIG = {
+        'maintenance_interval': 300,   # Seconds between snapshot / recovery passes
+        'batch_size': 500,             # Changed users handled per pass
+        'pending_grace': 30,           # Unwritten entries younger than this are left to their writer
+    }
+    
+    # Background address verification
+    ADDRESS_VERIFICATION_CONFIG = {
+        'ttl_days': 30,                # Verified addresses reused for a month
+        'max_concurrent': 5,           # Validation API calls in flight
+        'max_entries': 10000,          # Per-process L1 addresses
+    }
+    
+    # In-memory user_data / conversation eviction
+    USER_DATA_EVICTION_CONFIG = {
+        'max_resident_users': 5000,    # Users kept in memory before LRU eviction
+        'max_resident_mb': 256,        # Approximate user_data memory cap
+        'idle_seconds': 1800,          # Idle users are always evicted
+        'check_interval': 60,          # Seconds between eviction passes
+    }
+    
     # Async Settings
     ASYNCIO_CONFIG = {
         'max_workers': 10,             # Thread pool size
@@ -86,6 +295,106 @@ class BotPerformanceConfig:
         """Get HTTP client configuration"""
         return cls.HTTP_CLIENT_CONFIG
     
+    @classmethod
+    def get_http_providers_config(cls) -> dict:
+        """Get per-provider HTTP pool configuration"""
+        return cls.HTTP_PROVIDERS_CONFIG
+    
+    @classmethod
+    def get_update_inbox_config(cls) -> dict:
+        """Get Telegram update inbox configuration"""
+        return cls.UPDATE_INBOX_CONFIG
+    
+    @classmethod
+    def get_update_dedup_config(cls) -> dict:
+        """Get update deduplication configuration"""
+        return cls.UPDATE_DEDUP_CONFIG
+    
+    @classmethod
+    def get_persistence_config(cls) -> dict:
+        """Get conversation persistence configuration"""
+        return cls.PERSISTENCE_CONFIG
+    
+    @classmethod
+    def get_outbound_scheduler_config(cls) -> dict:
+        """Get outbound Telegram scheduler configuration"""
+        return cls.OUTBOUND_SCHEDULER_CONFIG
+    
+    @classmethod
+    def get_broadcast_config(cls) -> dict:
+        """Get broadcast engine configuration"""
+        return cls.BROADCAST_CONFIG
+    
+    @classmethod
+    def get_rate_cache_config(cls) -> dict:
+        """Get shipping rate cache configuration"""
+        return cls.RATE_CACHE_CONFIG
+    
+    @classmethod
+    def get_hedging_config(cls) -> dict:
+        """Get request hedging configuration"""
+        return cls.HEDGING_CONFIG
+    
+    @classmethod
+    def get_rate_fanout_config(cls) -> dict:
+        """Get per-carrier rate fan-out configuration"""
+        return cls.RATE_FANOUT_CONFIG
+    
+    @classmethod
+    def get_rate_prefetch_config(cls) -> dict:
+        """Get rate prefetch configuration"""
+        return cls.RATE_PREFETCH_CONFIG
+    
+    @classmethod
+    def get_carrier_catalog_config(cls) -> dict:
+        """Get carrier catalog cache configuration"""
+        return cls.CARRIER_CATALOG_CONFIG
+    
+    @classmethod
+    def get_label_jobs_config(cls) -> dict:
+        """Get label job queue configuration"""
+        return cls.LABEL_JOBS_CONFIG
+    
+    @classmethod
+    def get_label_archive_config(cls) -> dict:
+        """Get label archive configuration"""
+        return cls.LABEL_ARCHIVE_CONFIG
+    
+    @classmethod
+    def get_payment_webhooks_config(cls) -> dict:
+        """Get payment webhook follow-up configuration"""
+        return cls.PAYMENT_WEBHOOKS_CONFIG
+    
+    @classmethod
+    def get_payment_reconciler_config(cls) -> dict:
+        """Get pending-payment reconciler configuration"""
+        return cls.PAYMENT_RECONCILER_CONFIG
+    
+    @classmethod
+    def get_balance_monitor_config(cls) -> dict:
+        """Get ShipStation balance monitor configuration"""
+        return cls.BALANCE_MONITOR_CONFIG
+    
+    @classmethod
+    def get_thank_you_pool_config(cls) -> dict:
+        """Get thank-you message pool configuration"""
+        return cls.THANK_YOU_POOL_CONFIG
+    
+    @classmethod
+    def get_balance_ledger_config(cls) -> dict:
+        """Get balance ledger configuration"""
+        return cls.BALANCE_LEDGER_CONFIG
+    
+    @classmethod
+    def get_address_verification_config(cls) -> dict:
+        """Get background address verification configuration"""
+        return cls.ADDRESS_VERIFICATION_CONFIG
+    
+    @classmethod
+    def get_user_data_eviction_config(cls) -> dict:
+        """Get user_data eviction configuration"""
+        return cls.USER_DATA_EVICTION_CONFIG
+    
     @classmethod
     def get_mongodb_config(cls) -> dict:
         """Get MongoDB configuration"""
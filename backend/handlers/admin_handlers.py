@@ -45,6 +45,7 @@ async def notify_admin_error(user_info: dict, error_type: str, error_details: st
     """Send error notification to admin"""
     from server import ADMIN_TELEGRAM_ID, bot_instance
     from handlers.common_handlers import safe_telegram_call
+    from middleware.rate_limiter import LANE_ADMIN
     
     if not ADMIN_TELEGRAM_ID or not bot_instance:
         return
@@ -74,7 +75,7 @@ async def notify_admin_error(user_info: dict, error_type: str, error_details: st
             chat_id=ADMIN_TELEGRAM_ID,
             text=message,
             parse_mode='HTML'
-        ))
+        ), lane=LANE_ADMIN)
     except Exception as e:
         logger.error(f"Failed to send admin notification: {e}")
 
@@ -15,24 +15,31 @@ logger = logging.getLogger(__name__)
 
 # ==================== HELPER FUNCTIONS ====================
 
-async def safe_telegram_call(coro, timeout=10, error_message="❌ Превышено время ожидания. Попробуйте еще раз.", chat_id=None):
+async def safe_telegram_call(coro, timeout=10, error_message="❌ Превышено время ожидания. Попробуйте еще раз.", chat_id=None, lane=None):
     """
     Universal wrapper with timeout protection
     Fast responses + error handling
     
+    Args:
+        lane: Outbound priority lane (middleware.rate_limiter.LANES), default - interactive
+    
     Usage:
         await safe_telegram_call(update.message.reply_text("Hello"), chat_id=update.effective_chat.id)
     """
+    from middleware.rate_limiter import outbound_lane
+    
     try:
+        if lane:
+            with outbound_lane(lane):
+                return await asyncio.wait_for(coro, timeout=timeout)
         return await asyncio.wait_for(coro, timeout=timeout)
     except asyncio.TimeoutError:
         logger.error(f"Telegram API timeout after {timeout}s")
         return None
     except telegram.error.RetryAfter as e:
-        # Telegram rate limit hit - wait and retry
-        logger.warning(f"Telegram rate limit: waiting {e.retry_after}s")
-        await asyncio.sleep(e.retry_after)
-        return await asyncio.wait_for(coro, timeout=timeout)
+        # The outbound scheduler already paused and retried this request
+        logger.warning(f"Telegram rate limit: request dropped after retries (retry_after={e.retry_after}s)")
+        return None
     except Exception as e:
         logger.error(f"Telegram API error: {e}")
         return None
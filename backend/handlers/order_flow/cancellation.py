@@ -141,6 +141,8 @@ async def confirm_cancel_order(update: Update, context: ContextTypes.DEFAULT_TYP
     # Clear session via service
     await session_service.clear_session(user_id)
     context.user_data.clear()
+    from services.rate_prefetch import rate_prefetcher
+    rate_prefetcher.cancel(user_id)
     logger.info(f"🗑️ Session cleared after order cancellation for user {user_id}")
     
     keyboard = [[InlineKeyboardButton("🔙 Главное меню", callback_data='start')]]
@@ -40,7 +40,7 @@ async def select_carrier(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Clear cached rates from shipstation_cache to force fresh API call
         user_data = context.user_data
-        cache_deleted = shipstation_cache.delete(
+        cache_deleted = await shipstation_cache.delete(
             from_zip=user_data.get('from_zip'),
             to_zip=user_data.get('to_zip'),
             weight=user_data.get('parcel_weight'),
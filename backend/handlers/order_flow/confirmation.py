@@ -23,10 +23,19 @@ async def show_data_confirmation(update: Update, context: ContextTypes.DEFAULT_T
     
     data = context.user_data
     
+    # 🔮 Final dimensions/edits known - (re)start rate prefetch if they changed
+    from services.rate_prefetch import rate_prefetcher
+    rate_prefetcher.schedule(update.effective_user.id, data)
+    
+    # Address checks started at the ZIP steps - show whatever is ready, never wait
+    from services.address_verification import address_verifier
+    from_check = address_verifier.peek(update.effective_user.id, 'from', data)
+    to_check = address_verifier.peek(update.effective_user.id, 'to', data)
+    
     # Format the summary message using UI utils
     message = DataConfirmationUI.confirmation_header()
-    message += "📤 " + DataConfirmationUI.format_address_section("ОТПРАВИТЕЛЬ", data, "from")
-    message += "📥 " + DataConfirmationUI.format_address_section("ПОЛУЧАТЕЛЬ", data, "to")
+    message += "📤 " + DataConfirmationUI.format_address_section("ОТПРАВИТЕЛЬ", data, "from", from_check)
+    message += "📥 " + DataConfirmationUI.format_address_section("ПОЛУЧАТЕЛЬ", data, "to", to_check)
     message += DataConfirmationUI.format_parcel_section(data)
     message += "\n✅ *Подтвердите данные или отредактируйте*"
     
@@ -12,6 +12,7 @@ logger = logging.getLogger(__name__)
 # Import shared utilities
 from handlers.common_handlers import safe_telegram_call, mark_message_as_selected
 from utils.handler_decorators import with_user_session, safe_handler, with_typing_action, with_services
+from services.address_verification import address_verifier
 
 # These will be imported from server when handlers are called
 # from server import (
@@ -198,12 +199,12 @@ async def order_from_address2(update: Update, context: ContextTypes.DEFAULT_TYPE
     asyncio.create_task(mark_message_as_selected(update, context, prompt_text=old_prompt_text))
     
     # ✅ МАГИЧЕСКИЙ ГИБРИД 2025
-    from utils.ui_utils import ask_with_cancel_and_focus, OrderStepMessages, TemplateEditMessages
+    from utils.ui_utils import ask_with_cancel_and_focus, city_prompt, OrderStepMessages, TemplateEditMessages
     
     if context.user_data.get('editing_template_from') or context.user_data.get('editing_from_address'):
-        message_text = TemplateEditMessages.FROM_CITY
+        message_text = city_prompt(TemplateEditMessages, 'FROM')
     else:
-        message_text = OrderStepMessages.FROM_CITY
+        message_text = city_prompt(OrderStepMessages, 'FROM')
     
     await ask_with_cancel_and_focus(
         update,
@@ -232,6 +233,18 @@ async def order_from_city(update: Update, context: ContextTypes.DEFAULT_TYPE, se
     
     
     city = update.effective_message.text.strip()
+    
+    # ZIP instead of the city: city and state from the offline index, two steps skipped
+    from utils.zip_index import zip_index, normalize_zip
+    if normalize_zip(city) and zip_index.available:
+        found = zip_index.lookup(city)
+        if not found:
+            await safe_telegram_call(update.effective_message.reply_text(
+                "❌ Не удалось определить город по этому ZIP коду. Введите название города:"
+            ))
+            return FROM_CITY
+        return await _autofill_from_zip(update, context, session_service, normalize_zip(city), *found)
+    
     city = sanitize_string(city, max_length=50)
     
     # Store
@@ -345,10 +358,22 @@ async def order_from_zip(update: Update, context: ContextTypes.DEFAULT_TYPE, ses
     
     zip_code = update.effective_message.text.strip()
     
+    # ZIP that cannot belong to the entered state - checked locally, ask again
+    from utils.zip_index import zip_index
+    state = context.user_data.get('from_state', '')
+    if not zip_index.is_consistent(zip_code, state):
+        await safe_telegram_call(update.effective_message.reply_text(
+            f"❌ ZIP {zip_code} не относится к штату {state}. Проверьте ZIP код:"
+        ))
+        return FROM_ZIP
+    
     # Store
     user_id = update.effective_user.id
     context.user_data['from_zip'] = zip_code
     
+    # Address complete - verify while the user answers the next prompts
+    address_verifier.schedule(user_id, 'from', context.user_data)
+    
     # Update session via repository (skip if editing template)
     # Session service injected via decorator
     if not context.user_data.get('editing_template_from'):
@@ -359,8 +384,15 @@ async def order_from_zip(update: Update, context: ContextTypes.DEFAULT_TYPE, ses
     old_prompt_text = context.user_data.get('last_bot_message_text', '')
     asyncio.create_task(mark_message_as_selected(update, context, prompt_text=old_prompt_text))
     
+    return await _ask_from_phone(update, context)
+
+
+async def _ask_from_phone(update: Update, context: ContextTypes.DEFAULT_TYPE, prefix: str = ''):
+    """Ask for the sender phone (after the ZIP step or a ZIP autofill)"""
+    from server import FROM_PHONE
+    
     # Show with SKIP option
-    from utils.ui_utils import get_skip_and_cancel_keyboard, OrderStepMessages, CallbackData, TemplateEditMessages
+    from utils.ui_utils import OrderStepMessages, CallbackData, TemplateEditMessages
     
     # ✅ МАГИЧЕСКИЙ ГИБРИД 2025 (опциональное поле)
     from utils.ui_utils import ask_with_skip_cancel_and_focus
@@ -373,7 +405,7 @@ async def order_from_zip(update: Update, context: ContextTypes.DEFAULT_TYPE, ses
     await ask_with_skip_cancel_and_focus(
         update,
         context,
-        message_text,
+        prefix + message_text,
         skip_callback=CallbackData.SKIP_FROM_PHONE,
         next_state=FROM_PHONE,
         safe_telegram_call_func=safe_telegram_call
@@ -382,6 +414,26 @@ async def order_from_zip(update: Update, context: ContextTypes.DEFAULT_TYPE, ses
     return FROM_PHONE
 
 
+async def _autofill_from_zip(update: Update, context: ContextTypes.DEFAULT_TYPE, session_service,
+                             zip_code: str, city: str, state: str):
+    """City step answered with a ZIP: store city/state/ZIP and go straight to the phone"""
+    user_id = update.effective_user.id
+    fields = {'from_city': city, 'from_state': state, 'from_zip': zip_code}
+    context.user_data.update(fields)
+    address_verifier.schedule(user_id, 'from', context.user_data)
+    
+    if not context.user_data.get('editing_template_from'):
+        for field, value in fields.items():
+            await session_service.save_order_field(user_id, field, value)
+    
+    logger.info(f"📮 FROM ZIP autofill - User: {user_id}, {zip_code} → {city}, {state}")
+    
+    old_prompt_text = context.user_data.get('last_bot_message_text', '')
+    asyncio.create_task(mark_message_as_selected(update, context, prompt_text=old_prompt_text))
+    
+    return await _ask_from_phone(update, context, prefix=f"✅ {city}, {state} {zip_code}\n\n")
+
+
 @safe_handler(fallback_state=ConversationHandler.END)
 @with_typing_action()
 @with_user_session(create_user=False, require_session=True)
@@ -12,6 +12,7 @@ logger = logging.getLogger(__name__)
 # Import shared utilities
 from handlers.common_handlers import safe_telegram_call, mark_message_as_selected
 from utils.validators import validate_weight  # Keep only weight validation
+from services.rate_prefetch import rate_prefetcher
 from utils.handler_decorators import with_user_session, safe_handler, with_typing_action, with_services
 from telegram.ext import ConversationHandler
 
@@ -49,6 +50,9 @@ async def order_parcel_weight(update: Update, context: ContextTypes.DEFAULT_TYPE
     # Update session via repository
     # Session service injected via decorator
     await session_service.save_order_field(user_id, 'parcel_weight', weight)
+    
+    # 🔮 Addresses and weight are known - start fetching rates while the user enters dimensions
+    rate_prefetcher.schedule(user_id, context.user_data)
     # REMOVED: ConversationHandler manages state via Persistence
         # await session_service.update_session_step(user_id, step="PARCEL_LENGTH")
     
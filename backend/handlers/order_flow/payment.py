@@ -258,6 +258,102 @@ __all__ = [
     'handle_back_to_rates',
     'process_payment'
 ]
+
+
+async def _create_label_with_progress(update: Update, order_id: str, telegram_id: int, message) -> bool:
+    """Buy the label inline (create_and_send_label) while showing a progress counter"""
+    from server import create_and_send_label
+    
+    # Show progress indicator while creating label
+    progress_msg = await safe_telegram_call(update.effective_message.reply_text(
+        "⏳ Создаем shipping label... 0 сек",
+        parse_mode='Markdown'
+    ))
+    
+    # Start progress updater in background
+    progress_task = None
+    if progress_msg:
+        async def update_progress():
+            seconds = 0
+            try:
+                while True:
+                    await asyncio.sleep(0.3)
+                    seconds += 1
+                    await safe_telegram_call(progress_msg.edit_text(
+                        f"⏳ Создаем shipping label... {seconds} сек",
+                        parse_mode='Markdown'
+                    ))
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.debug(f"Progress update error: {e}")
+        
+        progress_task = asyncio.create_task(update_progress())
+    
+    try:
+        # Pass order_id string, not MongoDB _id
+        return await create_and_send_label(order_id, telegram_id, message)
+    finally:
+        # Stop progress indicator and delete message
+        if progress_task:
+            progress_task.cancel()
+            try:
+                await progress_task
+            except asyncio.CancelledError:
+                pass
+        
+        if progress_msg:
+            try:
+                await safe_telegram_call(progress_msg.delete())
+            except Exception as e:
+                logger.debug(f"Failed to delete progress message: {e}")
+
+
+async def _settle_unfinished_balance_payment(order_id: str, telegram_id: int, amount: float) -> str:
+    """
+    Balance was charged but the inline label run did not finish
+    
+    Refunds only when the label job failed before anything was bought. A job
+    that may have bought the label waits for admin review; a postponed job
+    keeps the order in "processing" and the workers deliver the label.
+    
+    Returns:
+        Message for the user
+    """
+    from repositories import get_repositories, get_user_repo
+    from services.label_jobs import get_label_jobs
+    
+    try:
+        settlement = await get_label_jobs().settlement(order_id)
+    except Exception as e:
+        logger.error(f"❌ Cannot settle charged order {order_id}, leaving it for review: {e}", exc_info=True)
+        settlement = 'review'
+    
+    if settlement == 'pending':
+        logger.warning(f"⏳ Label job for charged order {order_id} postponed, workers will finish it")
+        return """⏳ Shipping label ещё создаётся.
+Мы пришлём его в этот чат, как только он будет готов."""
+    
+    if settlement == 'refund':
+        refunded = await get_user_repo().update_balance(
+            telegram_id, amount, operation="add", reason="refund", ref=order_id, key=f"refund:{order_id}"
+        )
+        if not refunded:
+            logger.error(f"❌ Refund of ${amount:.2f} for failed order {order_id} not applied")
+    
+    await get_repositories().orders.update_one(
+        {"order_id": order_id},
+        {"$set": {"payment_status": "failed", "shipping_status": "failed"}}
+    )
+    
+    if settlement == 'review':
+        return """❌ Не удалось подтвердить создание shipping label.
+Администратор проверит заказ и вернёт оплату, если лейбл не был создан."""
+    return """❌ Не удалось создать shipping label.
+Оплата возвращена на баланс.
+Пожалуйста, попробуйте позже или свяжитесь с администратором."""
+
+
 async def process_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     
@@ -313,7 +409,7 @@ async def process_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         if query.data == 'pay_from_balance':
             # Import required functions
-            from server import create_and_send_label, db
+            from server import db
             from services.service_factory import ServiceFactory
             from utils.ui_utils import PaymentFlowUI
             
@@ -368,63 +464,43 @@ async def process_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             logger.info(f"✅ Found pending order {order_id}, proceeding with payment")
             
-            # Show progress indicator while creating label
-            progress_msg = await safe_telegram_call(update.effective_message.reply_text(
-                "⏳ Создаем shipping label... 0 сек",
-                parse_mode='Markdown'
-            ))
-            
-            # Start progress updater in background
-            progress_task = None
-            if progress_msg:
-                async def update_progress():
-                    seconds = 0
-                    try:
-                        while True:
-                            await asyncio.sleep(0.3)
-                            seconds += 1
-                            await safe_telegram_call(progress_msg.edit_text(
-                                f"⏳ Создаем shipping label... {seconds} сек",
-                                parse_mode='Markdown'
-                            ))
-                    except asyncio.CancelledError:
-                        pass
-                    except Exception as e:
-                        logger.debug(f"Progress update error: {e}")
-                
-                progress_task = asyncio.create_task(update_progress())
+            # One payment attempt per order at a time (double click, second device)
+            claimed = await db.orders.find_one_and_update(
+                {"order_id": order['order_id'], "payment_status": {"$nin": ["paid", "processing"]}},
+                {"$set": {"payment_status": "processing"}}
+            )
+            if not claimed:
+                logger.warning(f"⚠️ Order {order_id} payment already in progress")
+                await safe_telegram_call(update.effective_message.reply_text(
+                    "⏳ Этот заказ уже оплачивается, дождитесь результата."
+                ))
+                return ConversationHandler.END
             
-            # Try to create shipping label (pass order_id string, not MongoDB _id)
-            label_created = await create_and_send_label(order['order_id'], telegram_id, query.message)
+            # Charge first: the conditional debit is what stops two concurrent
+            # purchases from both spending the same balance
+            success, error = await payment_service.process_balance_payment(
+                telegram_id=telegram_id,
+                order_id=order['order_id'],
+                amount=amount
+            )
             
-            # Stop progress indicator and delete message
-            if progress_task:
-                progress_task.cancel()
-                try:
-                    await progress_task
-                except asyncio.CancelledError:
-                    pass
+            if not success:
+                logger.warning(f"Balance payment refused for order {order_id}: {error}")
+                await db.orders.update_one(
+                    {"order_id": order['order_id'], "payment_status": "processing"},
+                    {"$set": {"payment_status": order_status}}
+                )
+                await safe_telegram_call(update.effective_message.reply_text(PaymentFlowUI.insufficient_balance_error()))
+                return ConversationHandler.END
             
-            if progress_msg:
-                try:
-                    await safe_telegram_call(progress_msg.delete())
-                except Exception as e:
-                    logger.debug(f"Failed to delete progress message: {e}")
+            # From here on the balance is charged: any failure is settled below
+            label_created = False
+            try:
+                label_created = await _create_label_with_progress(update, order['order_id'], telegram_id, query.message)
+            except Exception as e:
+                logger.error(f"❌ Label creation for charged order {order_id} raised: {e}", exc_info=True)
             
             if label_created:
-                # Only deduct balance if label was created successfully using payment service
-                success, error = await payment_service.process_balance_payment(
-                    telegram_id=telegram_id,
-                    order_id=order['order_id'],
-                    amount=amount
-                )
-                
-                if not success:
-                    logger.error(f"Failed to process payment: {error}")
-                    # This shouldn't happen as we checked balance earlier
-                    await safe_telegram_call(update.effective_message.reply_text(f"❌ Ошибка обработки платежа: {error}"))
-                    return ConversationHandler.END
-                
                 # Update order status to "paid" (NEW LOGIC)
                 await db.orders.update_one(
                     {"order_id": order_id},
@@ -445,32 +521,18 @@ async def process_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     PaymentFlowUI.payment_success_balance(amount, new_balance, order.get('order_id')),
                     reply_markup=reply_markup
                 ))
-                
-                # Mark order as completed to prevent stale button interactions
-                context.user_data.clear()
-                context.user_data['order_completed'] = True
             else:
-                # Label creation failed - don't charge user
-                from repositories import get_repositories
-                repos = get_repositories()
-                await repos.orders.update_one(
-                    {"order_id": order['order_id']},
-                    {"$set": {"payment_status": "failed", "shipping_status": "failed"}}
-                )
-                
+                failure_text = await _settle_unfinished_balance_payment(order['order_id'], telegram_id, amount)
                 keyboard = [[InlineKeyboardButton("🔙 Главное меню", callback_data='start')]]
                 reply_markup = InlineKeyboardMarkup(keyboard)
-                
                 await safe_telegram_call(update.effective_message.reply_text(
-            """❌ Не удалось создать shipping label.
-            Оплата не списана. Ваш баланс не изменился.
-            Пожалуйста, свяжитесь с администратором.""",
-            reply_markup=reply_markup
-        ))
-                
-                # Mark order as completed to prevent stale button interactions
-                context.user_data.clear()
-                context.user_data['order_completed'] = True
+                    failure_text,
+                    reply_markup=reply_markup
+                ))
+            
+            # Mark order as completed to prevent stale button interactions
+            context.user_data.clear()
+            context.user_data['order_completed'] = True
             
         elif query.data == 'pay_with_crypto':
             # Import required functions
@@ -4,7 +4,6 @@ Handles fetching and displaying shipping rates
 """
 import logging
 import os
-import time
 from datetime import datetime, timezone
 from telegram import Update, ForceReply, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
@@ -12,7 +11,9 @@ from handlers.common_handlers import safe_telegram_call
 from handlers.admin_handlers import notify_admin_error
 from services.api_services import get_shipstation_carrier_ids
 from services.shipping_service import display_shipping_rates
+from services.shipstation_cache import shipstation_cache
 from utils.session_utils import save_to_session
+from utils.retry_utils import SHIPSTATION_CIRCUIT
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +23,160 @@ from server import CONFIRM_DATA
 # Get ShipStation API key from environment
 SHIPSTATION_API_KEY = os.environ.get('SHIPSTATION_API_KEY_TEST') or os.environ.get('SHIPSTATION_API_KEY_PROD')  # ⚠️ TEST MODE ENABLED
 
+async def refresh_cached_rates(order_data: dict) -> bool:
+    """
+    Fetch fresh rates for an order and store them in the rate cache
+    
+    Used for background revalidation of stale cache entries - no Telegram
+    messages are sent. Returns True if the cache was updated.
+    """
+    from config.performance_config import BotPerformanceConfig
+    from services.carrier_catalog import get_carrier_catalog
+    from services.rate_engine import RateFanOut
+    
+    carrier_catalog = get_carrier_catalog()
+    carrier_ids = await carrier_catalog.get_carrier_ids() if carrier_catalog else await get_shipstation_carrier_ids()
+    if not carrier_ids:
+        return False
+    
+    headers = {
+        'API-Key': SHIPSTATION_API_KEY,
+        'Content-Type': 'application/json'
+    }
+    fan_out = RateFanOut(
+        order_data,
+        carrier_ids,
+        headers,
+        cache_key=shipstation_cache.key_for_order(order_data),
+        **BotPerformanceConfig.get_rate_fanout_config()
+    )
+    fan_out.start()
+    rates = await fan_out.wait_all()
+    if not rates:
+        logger.warning(f"Background rate refresh failed: {fan_out.error_message()}")
+        return False
+    
+    await shipstation_cache.set(
+        from_zip=order_data['from_zip'],
+        to_zip=order_data['to_zip'],
+        weight=order_data['parcel_weight'],
+        length=order_data.get('parcel_length', 10),
+        width=order_data.get('parcel_width', 10),
+        height=order_data.get('parcel_height', 10),
+        rates=rates
+    )
+    return True
+
+async def _store_rates(update: Update, context: ContextTypes.DEFAULT_TYPE, order_data: dict, rates: list):
+    """Save the complete rate list to cache and session"""
+    from services.shipping_service import save_rates_to_cache_and_session
+    from server import session_manager
+    
+    await save_rates_to_cache_and_session(
+        rates=rates,
+        order_data=order_data,
+        user_id=update.effective_user.id,
+        context=context,
+        shipstation_cache=shipstation_cache,
+        session_manager=session_manager
+    )
+
+
+async def _complete_rates(update: Update, context: ContextTypes.DEFAULT_TYPE, fan_out, first_rates: list,
+                          rates_message, rates_message_id):
+    """
+    Wait for the remaining carriers and update the rates message once
+    
+    The message is left alone if the user already moved on from the rate screen.
+    """
+    try:
+        rates = await fan_out.wait_all()
+        logger.info(f"⚡ All carriers in {fan_out.total_ms or 0:.2f}ms, dropped: {fan_out.dropped or 'none'}")
+        
+        still_on_rates = (
+            context.user_data.get('rates') is first_rates
+            and context.user_data.get('last_bot_message_id') == rates_message_id
+        )
+        if not still_on_rates:
+            await shipstation_cache.set(
+                from_zip=fan_out.order_data['from_zip'],
+                to_zip=fan_out.order_data['to_zip'],
+                weight=fan_out.order_data['parcel_weight'],
+                length=fan_out.order_data.get('parcel_length', 10),
+                width=fan_out.order_data.get('parcel_width', 10),
+                height=fan_out.order_data.get('parcel_height', 10),
+                rates=rates
+            )
+            return
+        
+        if [rate.get('rate_id') for rate in rates] != [rate.get('rate_id') for rate in first_rates]:
+            from repositories import get_user_repo
+            from server import STATE_NAMES, SELECT_CARRIER
+            
+            user_repo = get_user_repo()
+            await display_shipping_rates(
+                update,
+                context,
+                rates,
+                find_user_by_telegram_id_func=user_repo.find_by_telegram_id,
+                safe_telegram_call_func=safe_telegram_call,
+                STATE_NAMES=STATE_NAMES,
+                SELECT_CARRIER=SELECT_CARRIER,
+                edit_message=rates_message
+            )
+        
+        await _store_rates(update, context, fan_out.order_data, rates)
+    except Exception as e:
+        logger.error(f"Error completing rates: {e}", exc_info=True)
+
+
+async def _show_fallback_rates(update: Update, context: ContextTypes.DEFAULT_TYPE, data: dict, progress_msg):
+    """
+    ShipStation circuit is open: show the last known (or estimated) rates
+    for the route, marked as such, instead of waiting for timeouts
+    """
+    from utils.ui_utils import ShippingRatesUI
+    
+    fallback = await shipstation_cache.get_fallback(data)
+    if not fallback:
+        from utils.ui_utils import get_retry_edit_cancel_keyboard
+        reply_markup = get_retry_edit_cancel_keyboard()
+        edited = None
+        if progress_msg:
+            edited = await safe_telegram_call(
+                progress_msg.edit_text(ShippingRatesUI.service_unavailable(), reply_markup=reply_markup)
+            )
+        if not edited:
+            await safe_telegram_call(update.effective_message.reply_text(
+                ShippingRatesUI.service_unavailable(), reply_markup=reply_markup
+            ))
+        return CONFIRM_DATA
+    
+    rates = fallback['rates']
+    context.user_data['rates'] = rates
+    await save_to_session(update.effective_user.id, "CARRIER_SELECTION", {
+        'rates': rates,
+        'cached': True,
+        'fallback': fallback['kind'],
+        'cache_timestamp': datetime.now(timezone.utc).isoformat()
+    }, context)
+    
+    from repositories import get_user_repo
+    from server import STATE_NAMES, SELECT_CARRIER
+    
+    user_repo = get_user_repo()
+    return await display_shipping_rates(
+        update,
+        context,
+        rates,
+        find_user_by_telegram_id_func=user_repo.find_by_telegram_id,
+        safe_telegram_call_func=safe_telegram_call,
+        STATE_NAMES=STATE_NAMES,
+        SELECT_CARRIER=SELECT_CARRIER,
+        edit_message=progress_msg
+    )
+
+
 async def fetch_shipping_rates(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Fetch shipping rates from ShipStation with caching"""
     logger.info("🚀 fetch_shipping_rates called")
@@ -36,14 +191,24 @@ async def fetch_shipping_rates(update: Update, context: ContextTypes.DEFAULT_TYP
     data = context.user_data
     logger.info(f"📋 User data keys: {list(data.keys())}")
     
+    # Prefetch outcome: rates already cached, or the prefetch is still in flight
+    # and the request below joins it
+    from services.rate_prefetch import rate_prefetcher
+    prefetch_result = rate_prefetcher.consume(update.effective_user.id, data)
+    if prefetch_result:
+        logger.info(f"🔮 Rate prefetch: {prefetch_result}")
+    
     # Check cache first (before showing progress message)
-    cached_rates = shipstation_cache.get(
+    # Stale rates are shown immediately and refreshed in the background
+    order_snapshot = dict(data)
+    cached_rates = await shipstation_cache.get(
         from_zip=data['from_zip'],
         to_zip=data['to_zip'],
         weight=data['parcel_weight'],
         length=data.get('parcel_length', 10),
         width=data.get('parcel_width', 10),
-        height=data.get('parcel_height', 10)
+        height=data.get('parcel_height', 10),
+        refresh=lambda: refresh_cached_rates(order_snapshot)
     )
     
     if cached_rates:
@@ -83,7 +248,7 @@ async def fetch_shipping_rates(update: Update, context: ContextTypes.DEFAULT_TYP
     # Cache MISS - need to fetch from API
     # Send initial progress message
     from utils.ui_utils import ShippingRatesUI
-    progress_msg = await safe_telegram_call(message.reply_text(ShippingRatesUI.progress_message(0)))
+    progress_msg = await safe_telegram_call(message.reply_text(ShippingRatesUI.loading_message()))
     
     try:
         import asyncio
@@ -113,16 +278,27 @@ async def fetch_shipping_rates(update: Update, context: ContextTypes.DEFAULT_TYP
             ))
             return CONFIRM_DATA
         
+        # ShipStation is down: every call would fail fast anyway
+        if SHIPSTATION_CIRCUIT.retry_after() > 0:
+            return await _show_fallback_rates(update, context, data, progress_msg)
+        
         # Get carrier IDs
         logger.info("📦 About to fetch carrier IDs from ShipStation...")
         headers = {
             'API-Key': SHIPSTATION_API_KEY,
             'Content-Type': 'application/json'
         }
-        carrier_ids = await get_shipstation_carrier_ids()
+        from services.carrier_catalog import get_carrier_catalog
+        carrier_catalog = get_carrier_catalog()
+        if carrier_catalog:
+            carrier_ids = await carrier_catalog.get_carrier_ids()
+        else:
+            carrier_ids = await get_shipstation_carrier_ids()
         logger.info(f"📦 Received carrier IDs: {len(carrier_ids) if carrier_ids else 0}")
         logger.info(f"📦 Carrier IDs dict: {carrier_ids}")
         if not carrier_ids:
+            if SHIPSTATION_CIRCUIT.state == "OPEN":
+                return await _show_fallback_rates(update, context, data, progress_msg)
             from utils.ui_utils import get_edit_addresses_keyboard
             reply_markup = get_edit_addresses_keyboard()
             await safe_telegram_call(message.reply_text(
@@ -131,88 +307,32 @@ async def fetch_shipping_rates(update: Update, context: ContextTypes.DEFAULT_TYP
         ))
             return CONFIRM_DATA
         
-        headers = {
-            'API-Key': SHIPSTATION_API_KEY,
-            'Content-Type': 'application/json'
-        }
-        
-        # Build rate request using service
-        from services.shipping_service import build_shipstation_rates_request
-        # Convert carrier_ids dict to list of IDs
-        carrier_ids_list = list(carrier_ids.values())
-        logger.info(f"📦 Carrier IDs list for API: {carrier_ids_list}")
-        rate_request = build_shipstation_rates_request(data, carrier_ids_list)
-        
-        # Log the request for debugging
-        logger.info(f"ShipStation rate request: {rate_request}")
-        
-        # Get rates from ShipStation with progress updates
-        async def update_progress():
-            """Update progress message every 0.3 seconds"""
-            start_time = datetime.now(timezone.utc)
-            while True:
-                await asyncio.sleep(0.3)
-                elapsed = int((datetime.now(timezone.utc) - start_time).total_seconds())
-                try:
-                    await safe_telegram_call(progress_msg.edit_text(
-                        ShippingRatesUI.progress_message(elapsed)
-                    ))
-                except Exception:
-                    break  # Stop if message was deleted or can't be edited
-        
-        # Start progress update task
-        progress_task = asyncio.create_task(update_progress())
-        
-        # Fetch rates from ShipStation using service
-        from services.shipping_service import fetch_rates_from_shipstation
-        
-        api_start_time = time.perf_counter()
-        success, all_rates, error_msg = await fetch_rates_from_shipstation(
-            rate_request=rate_request,
-            headers=headers,
-            api_url='https://api.shipstation.com/v2/rates',
-            timeout=30
+        # Query carriers concurrently - the first usable batch is shown right away,
+        # slow carriers are dropped after their deadline
+        from services.rate_engine import RateFanOut
+        from config.performance_config import BotPerformanceConfig
+        
+        fan_out = RateFanOut(
+            data,
+            carrier_ids,
+            headers,
+            cache_key=shipstation_cache.key_for_order(data),
+            **BotPerformanceConfig.get_rate_fanout_config()
         )
-        api_duration_ms = (time.perf_counter() - api_start_time) * 1000
-        logger.info(f"⚡ ShipStation /rates API took {api_duration_ms:.2f}ms")
+        fan_out.start()
+        first_rates = await fan_out.first_batch()
+        logger.info(f"⚡ First rates batch in {fan_out.first_batch_ms or fan_out.total_ms or 0:.2f}ms "
+                    f"({len(fan_out.groups)} carrier requests)")
         
-        if not success and "timeout" in error_msg.lower():
-            # Handle timeout error
-            logger.error(f"ShipStation rate request failed: {error_msg}")
-            
-            # Log error to session
-            user_id = update.effective_user.id
-            await session_manager.update_session_atomic(user_id, data={
-                'last_error': f'ShipStation API error: {error_msg}',
-                'error_step': 'FETCH_RATES',
-                'error_timestamp': datetime.now(timezone.utc).isoformat()
-            })
-            
-            # Stop progress task
-            progress_task.cancel()
-            try:
-                await progress_task
-            except asyncio.CancelledError:
-                pass
-            
-            # Delete progress message
-            try:
-                await safe_telegram_call(progress_msg.delete())
-            except Exception:
-                pass
-            
-            from utils.ui_utils import get_retry_edit_cancel_keyboard
-            reply_markup = get_retry_edit_cancel_keyboard()
-            
-            await safe_telegram_call(message.reply_text(
-                "❌ Превышено время ожидания ответа от сервиса доставки.\n\nПопробуйте еще раз или проверьте правильность адресов.",
-                reply_markup=reply_markup
-            ))
-            return CONFIRM_DATA
-        
-        if not success:
-            # Handle other API errors
+        if not first_rates:
+            error_msg = fan_out.error_message()
             logger.error(f"ShipStation rate request failed: {error_msg}")
+            if SHIPSTATION_CIRCUIT.state == "OPEN":
+                # Circuit opened during this request
+                return await _show_fallback_rates(update, context, data, progress_msg)
+            if carrier_catalog and 'carrier' in error_msg.lower():
+                # Cached carrier ids may be outdated (carrier disconnected in ShipStation)
+                carrier_catalog.request_refresh()
             
             # Log error to session
             from server import session_manager
@@ -229,136 +349,54 @@ async def fetch_shipping_rates(update: Update, context: ContextTypes.DEFAULT_TYP
             except Exception:
                 pass
             
-            from utils.ui_utils import get_edit_addresses_keyboard, ShippingRatesUI
-            reply_markup = get_edit_addresses_keyboard()
-            
-            await safe_telegram_call(message.reply_text(
-                "❌ Не удалось получить тарифы доставки.\n\nПожалуйста, проверьте корректность адресов и попробуйте снова.",
-                reply_markup=reply_markup,
-            ))
-            
-            # Stop progress task
-            progress_task.cancel()
-            try:
-                await progress_task
-            except asyncio.CancelledError:
-                pass
-            
-            return CONFIRM_DATA
-        
-        # Stop progress updates on success
-        progress_task.cancel()
-        try:
-            await progress_task
-        except asyncio.CancelledError:
-            pass
-        
-        # Log all rates received from API for debugging
-        logger.info(f"📦 Received {len(all_rates)} rates from ShipStation API")
-        for idx, rate in enumerate(all_rates[:10]):  # Log first 10
-            carrier = rate.get('carrier_friendly_name', rate.get('carrier', 'Unknown'))
-            service = rate.get('service_type', rate.get('service', 'Unknown'))
-            logger.info(f"   Rate {idx+1}: {carrier} - {service}")
-        
-        # Filter and format rates using service
-        
-        # First apply basic exclusion
-        excluded_carriers = ['globalpost']
-        filtered_rates = [
-            rate for rate in all_rates
-            if rate.get('carrier_code', '').lower() not in excluded_carriers
-        ]
-        all_rates = filtered_rates
-        
-        # Apply service filter using service
-        from services.shipping_service import apply_service_filter
-        all_rates = apply_service_filter(all_rates)
-        
-        if not all_rates or len(all_rates) == 0:
-            # Delete progress message
-            try:
-                await safe_telegram_call(progress_msg.delete())
-            except Exception:
-                pass
-            
-            from utils.ui_utils import get_edit_addresses_keyboard, ShippingRatesUI
-            reply_markup = get_edit_addresses_keyboard()
-            
-            await safe_telegram_call(message.reply_text(
-            ShippingRatesUI.no_rates_found(),
-            reply_markup=reply_markup,
-        ))
-            return CONFIRM_DATA  # Stay to handle callback
-        
-        # Log carriers
-        carriers = set([r.get('carrier_friendly_name', 'Unknown') for r in all_rates])
-        logger.info(f"Got {len(all_rates)} rates from carriers: {carriers}")
-        
-        # Balance and deduplicate rates using service
-        from services.shipping_service import balance_and_deduplicate_rates
-        context.user_data['rates'] = balance_and_deduplicate_rates(all_rates, max_per_carrier=5)[:15]
-        
-        # Add $10 markup to all rates (hidden from user - shown as part of shipping cost)
-        LABEL_MARKUP = 10.0
-        for rate in context.user_data['rates']:
-            # Get original amount from shipping_amount dict or amount field
-            if 'shipping_amount' in rate and isinstance(rate['shipping_amount'], dict):
-                original_amount = rate['shipping_amount'].get('amount', 0.0)
-            elif 'amount' in rate:
-                original_amount = rate['amount']
+            if fan_out.timed_out:
+                from utils.ui_utils import get_retry_edit_cancel_keyboard
+                reply_markup = get_retry_edit_cancel_keyboard()
+                text = "❌ Превышено время ожидания ответа от сервиса доставки.\n\nПопробуйте еще раз или проверьте правильность адресов."
+            elif fan_out.raw_rates:
+                # Rates came back but none passed the service filter
+                from utils.ui_utils import get_edit_addresses_keyboard
+                reply_markup = get_edit_addresses_keyboard()
+                text = ShippingRatesUI.no_rates_found()
             else:
-                original_amount = 0.0
-            
-            # Store original amount for reference
-            rate['original_amount'] = original_amount
+                from utils.ui_utils import get_edit_addresses_keyboard
+                reply_markup = get_edit_addresses_keyboard()
+                text = "❌ Не удалось получить тарифы доставки.\n\nПожалуйста, проверьте корректность адресов и попробуйте снова."
             
-            # Add markup to displayed amount
-            if 'shipping_amount' in rate and isinstance(rate['shipping_amount'], dict):
-                rate['shipping_amount']['amount'] = original_amount + LABEL_MARKUP
-            elif 'amount' in rate:
-                rate['amount'] = original_amount + LABEL_MARKUP
-            else:
-                # Create shipping_amount structure if it doesn't exist
-                rate['shipping_amount'] = {'amount': original_amount + LABEL_MARKUP}
-                rate['amount'] = original_amount + LABEL_MARKUP
-        
-        logger.info(f"💰 Added ${LABEL_MARKUP} markup to {len(context.user_data['rates'])} rates")
-        
-        # Save to cache and session using service
-        from services.shipping_service import save_rates_to_cache_and_session
-        from server import session_manager
-        
-        user_id = update.effective_user.id
-        await save_rates_to_cache_and_session(
-            rates=context.user_data['rates'],
-            order_data=data,
-            user_id=user_id,
-            context=context,
-            shipstation_cache=shipstation_cache,
-            session_manager=session_manager
-        )
+            await safe_telegram_call(message.reply_text(text, reply_markup=reply_markup))
+            return CONFIRM_DATA
         
-        # Delete progress message
-        try:
-            await safe_telegram_call(progress_msg.delete())
-        except Exception:
-            pass
+        context.user_data['rates'] = first_rates
+        carriers = set([r.get('carrier_friendly_name', 'Unknown') for r in first_rates])
+        logger.info(f"Got {len(first_rates)} rates from carriers: {carriers}")
         
-        # Display rates using reusable function
+        # Display rates in place of the progress message
         from repositories import get_user_repo
         from server import STATE_NAMES, SELECT_CARRIER
         
         user_repo = get_user_repo()
-        return await display_shipping_rates(
+        state = await display_shipping_rates(
             update, 
             context, 
-            context.user_data['rates'],
+            first_rates,
             find_user_by_telegram_id_func=user_repo.find_by_telegram_id,
             safe_telegram_call_func=safe_telegram_call,
             STATE_NAMES=STATE_NAMES,
-            SELECT_CARRIER=SELECT_CARRIER
+            SELECT_CARRIER=SELECT_CARRIER,
+            edit_message=progress_msg
         )
         
+        if fan_out.done():
+            await _store_rates(update, context, data, first_rates)
+        else:
+            # Remaining carriers: one more edit when they are in (or dropped)
+            asyncio.create_task(_complete_rates(
+                update, context, fan_out, first_rates,
+                progress_msg, context.user_data.get('last_bot_message_id')
+            ))
+        
+        return state
+        
     except Exception as e:
         logger.error(f"Error getting rates: {e}", exc_info=True)
         
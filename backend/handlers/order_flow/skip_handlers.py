@@ -94,11 +94,11 @@ async def handle_skip_field(
 async def skip_from_address2(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Skip FROM address line 2"""
     from server import FROM_CITY
-    from utils.ui_utils import TemplateEditMessages
+    from utils.ui_utils import TemplateEditMessages, city_prompt
     
     # Check if editing - use different message
     editing = context.user_data.get('editing_template_from') or context.user_data.get('editing_from_address')
-    next_message = TemplateEditMessages.FROM_CITY if editing else OrderStepMessages.FROM_CITY
+    next_message = city_prompt(TemplateEditMessages if editing else OrderStepMessages, 'FROM')
     
     return await handle_skip_field(
         update, context,
@@ -115,11 +115,11 @@ async def skip_from_address2(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def skip_to_address2(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Skip TO address line 2"""
     from server import TO_CITY
-    from utils.ui_utils import TemplateEditMessages
+    from utils.ui_utils import TemplateEditMessages, city_prompt
     
     # Check if editing - use different message
     editing = context.user_data.get('editing_template_to') or context.user_data.get('editing_to_address')
-    next_message = TemplateEditMessages.TO_CITY if editing else OrderStepMessages.TO_CITY
+    next_message = city_prompt(TemplateEditMessages if editing else OrderStepMessages, 'TO')
     
     return await handle_skip_field(
         update, context,
@@ -12,6 +12,7 @@ logger = logging.getLogger(__name__)
 # Import shared utilities
 from handlers.common_handlers import safe_telegram_call, mark_message_as_selected
 from utils.handler_decorators import with_user_session, safe_handler, with_typing_action, with_services
+from services.address_verification import address_verifier
 from telegram.ext import ConversationHandler
 
 
@@ -163,12 +164,12 @@ async def order_to_address2(update: Update, context: ContextTypes.DEFAULT_TYPE,
     asyncio.create_task(mark_message_as_selected(update, context, prompt_text=old_prompt_text))
     
     # ✅ МАГИЧЕСКИЙ ГИБРИД 2025
-    from utils.ui_utils import ask_with_cancel_and_focus, OrderStepMessages, TemplateEditMessages
+    from utils.ui_utils import ask_with_cancel_and_focus, city_prompt, OrderStepMessages, TemplateEditMessages
     
     if context.user_data.get('editing_template_to') or context.user_data.get('editing_to_address'):
-        message_text = TemplateEditMessages.TO_CITY
+        message_text = city_prompt(TemplateEditMessages, 'TO')
     else:
-        message_text = OrderStepMessages.TO_CITY
+        message_text = city_prompt(OrderStepMessages, 'TO')
     
     await ask_with_cancel_and_focus(
         update,
@@ -193,6 +194,18 @@ async def order_to_city(update: Update, context: ContextTypes.DEFAULT_TYPE, sess
     
     
     city = update.effective_message.text.strip()
+    
+    # ZIP instead of the city: city and state from the offline index, two steps skipped
+    from utils.zip_index import zip_index, normalize_zip
+    if normalize_zip(city) and zip_index.available:
+        found = zip_index.lookup(city)
+        if not found:
+            await safe_telegram_call(update.effective_message.reply_text(
+                "❌ Не удалось определить город по этому ZIP коду. Введите название города:"
+            ))
+            return TO_CITY
+        return await _autofill_to_zip(update, context, session_service, normalize_zip(city), *found)
+    
     city = sanitize_string(city, max_length=50)
     
     # Store
@@ -295,10 +308,22 @@ async def order_to_zip(update: Update, context: ContextTypes.DEFAULT_TYPE, sessi
     
     zip_code = update.effective_message.text.strip()
     
+    # ZIP that cannot belong to the entered state - checked locally, ask again
+    from utils.zip_index import zip_index
+    state = context.user_data.get('to_state', '')
+    if not zip_index.is_consistent(zip_code, state):
+        await safe_telegram_call(update.effective_message.reply_text(
+            f"❌ ZIP {zip_code} не относится к штату {state}. Проверьте ZIP код:"
+        ))
+        return TO_ZIP
+    
     # Store
     user_id = update.effective_user.id
     context.user_data['to_zip'] = zip_code
     
+    # Address complete - verify while the user answers the next prompts
+    address_verifier.schedule(user_id, 'to', context.user_data)
+    
     # Update session via repository (skip if editing template)
     # Session service injected via decorator
     if not context.user_data.get('editing_template_to'):
@@ -307,14 +332,16 @@ async def order_to_zip(update: Update, context: ContextTypes.DEFAULT_TYPE, sessi
         # await session_service.update_session_step(user_id, step="TO_PHONE")
     
     # ✅ 2025 FIX: Get OLD prompt text BEFORE updating context
-
-    
     old_prompt_text = context.user_data.get('last_bot_message_text', '')
-
-    
     asyncio.create_task(mark_message_as_selected(update, context, prompt_text=old_prompt_text))
     
-    from utils.ui_utils import get_skip_and_cancel_keyboard, OrderStepMessages, CallbackData, TemplateEditMessages
+    return await _ask_to_phone(update, context)
+
+
+async def _ask_to_phone(update: Update, context: ContextTypes.DEFAULT_TYPE, prefix: str = ''):
+    """Ask for the recipient phone (after the ZIP step or a ZIP autofill)"""
+    from server import TO_PHONE
+    from utils.ui_utils import OrderStepMessages, CallbackData, TemplateEditMessages
     
     # Use different messages for template editing vs order creation
     if context.user_data.get('editing_template_to') or context.user_data.get('editing_to_address'):
@@ -328,7 +355,7 @@ async def order_to_zip(update: Update, context: ContextTypes.DEFAULT_TYPE, sessi
     await ask_with_skip_cancel_and_focus(
         update,
         context,
-        message_text,
+        prefix + message_text,
         skip_callback=CallbackData.SKIP_TO_PHONE,
         next_state=TO_PHONE,
         safe_telegram_call_func=safe_telegram_call
@@ -337,6 +364,26 @@ async def order_to_zip(update: Update, context: ContextTypes.DEFAULT_TYPE, sessi
     return TO_PHONE
 
 
+async def _autofill_to_zip(update: Update, context: ContextTypes.DEFAULT_TYPE, session_service,
+                           zip_code: str, city: str, state: str):
+    """City step answered with a ZIP: store city/state/ZIP and go straight to the phone"""
+    user_id = update.effective_user.id
+    fields = {'to_city': city, 'to_state': state, 'to_zip': zip_code}
+    context.user_data.update(fields)
+    address_verifier.schedule(user_id, 'to', context.user_data)
+    
+    if not context.user_data.get('editing_template_to'):
+        for field, value in fields.items():
+            await session_service.save_order_field(user_id, field, value)
+    
+    logger.info(f"📮 TO ZIP autofill - User: {user_id}, {zip_code} → {city}, {state}")
+    
+    old_prompt_text = context.user_data.get('last_bot_message_text', '')
+    asyncio.create_task(mark_message_as_selected(update, context, prompt_text=old_prompt_text))
+    
+    return await _ask_to_phone(update, context, prefix=f"✅ {city}, {state} {zip_code}\n\n")
+
+
 @safe_handler(fallback_state=ConversationHandler.END)
 @with_typing_action()
 @with_user_session(create_user=False, require_session=True)
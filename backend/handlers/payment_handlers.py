@@ -132,27 +132,14 @@ async def deduct_balance(telegram_id: int, amount: float, db):
         from repositories import get_user_repo
         user_repo = get_user_repo()
         
-        # Check current balance first
-        current_balance = await user_repo.get_balance(telegram_id)
-        
-        if current_balance == 0.0:
-            # User might not exist
-            user = await user_repo.find_by_telegram_id(telegram_id)
-            if not user:
-                logger.warning(f"⚠️ User {telegram_id} not found")
-                return False
-        
-        if current_balance < amount:
-            logger.warning(f"⚠️ Insufficient balance for user {telegram_id}: ${current_balance:.2f} < ${amount:.2f}")
-            return False
-        
-        # Deduct balance
+        # Deducts only if the balance covers it (single conditional update)
         result = await user_repo.update_balance(telegram_id, amount, operation="subtract")
         
         if result:
             logger.info(f"💸 Deducted ${amount:.2f} from user {telegram_id}")
             return True
         else:
+            logger.warning(f"⚠️ Insufficient balance or unknown user {telegram_id} for ${amount:.2f}")
             return False
             
     except Exception as e:
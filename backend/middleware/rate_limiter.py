@@ -1,16 +1,84 @@
 """
 Rate Limiter Middleware for Telegram Bot
 Prevents API rate limiting and potential bans
+
+OutboundTelegramScheduler is plugged into the PTB Application as its rate
+limiter, so every Bot API call (handlers, notifications, label delivery,
+broadcasts) passes through one place:
+- O(1) token buckets: one global, one per chat, one per lane
+- priority lanes: interactive > label > admin > broadcast
+- RetryAfter pauses all lanes for the time Telegram asked for
 """
 import asyncio
+import contextvars
+import functools
 import time
 from collections import defaultdict, deque
-from typing import Dict, Optional
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Any, Callable, Coroutine, Dict, Optional
 import logging
 
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
 logger = logging.getLogger(__name__)
 
 
+class TokenBucket:
+    """
+    Classic token bucket - refill is computed lazily, every operation is O(1)
+    """
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_at')
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum burst size
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens if available"""
+        self._refill(time.monotonic())
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def time_until(self, tokens: float = 1.0) -> float:
+        """Seconds until `tokens` are available (0 if available now)"""
+        self._refill(time.monotonic())
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        Take tokens now, going into debt if needed
+
+        Returns:
+            float: Seconds the caller must wait before using the tokens
+        """
+        wait = self.time_until(tokens)
+        self.tokens -= tokens
+        return wait
+
+    @property
+    def is_full(self) -> bool:
+        return self.time_until(self.capacity) == 0.0
+
+
 class TelegramRateLimiter:
     """
     Smart rate limiter for Telegram Bot API
@@ -18,20 +86,18 @@ class TelegramRateLimiter:
     """
     
     def __init__(self):
-        # Per-chat rate limiting
-        self.chat_message_times: Dict[int, deque] = defaultdict(lambda: deque(maxlen=30))
-        self.global_message_times = deque(maxlen=100)
-        
         # Rate limits (slightly below Telegram limits for safety)
         self.MESSAGES_PER_SECOND = 25      # Telegram limit: 30/sec
         self.MESSAGES_PER_MINUTE = 1500    # Safe margin
         self.MESSAGES_PER_CHAT_MINUTE = 60 # Per-chat limit
         
+        self.global_bucket = TokenBucket(self.MESSAGES_PER_SECOND, self.MESSAGES_PER_SECOND)
+        self.chat_buckets: Dict[int, TokenBucket] = defaultdict(
+            lambda: TokenBucket(self.MESSAGES_PER_CHAT_MINUTE / 60, self.MESSAGES_PER_CHAT_MINUTE)
+        )
+        
         # Semaphores for concurrent control
         self.global_semaphore = asyncio.Semaphore(50)
-        self.chat_semaphores: Dict[int, asyncio.Semaphore] = defaultdict(
-            lambda: asyncio.Semaphore(5)
-        )
     
     async def acquire(self, chat_id: Optional[int] = None) -> bool:
         """
@@ -39,62 +105,23 @@ class TelegramRateLimiter:
         Returns True if allowed, False if rate limited
         """
         async with self.global_semaphore:
-            current_time = time.time()
+            # Chat-specific rate check
+            if chat_id and self.chat_buckets[chat_id].time_until() > 0:
+                logger.warning(f"Chat {chat_id} rate limit reached, delaying...")
+                await asyncio.sleep(min(self.chat_buckets[chat_id].time_until(), 0.05))
+                return False
             
             # Global rate check
-            if not self._check_global_rate(current_time):
+            if not self.global_bucket.try_acquire():
                 logger.warning("Global rate limit reached, delaying...")
-                await asyncio.sleep(0.1)  # Brief delay
-                return False
-            
-            # Chat-specific rate check
-            if chat_id and not self._check_chat_rate(chat_id, current_time):
-                logger.warning(f"Chat {chat_id} rate limit reached, delaying...")
-                await asyncio.sleep(0.05)  # Very brief delay
+                await asyncio.sleep(min(self.global_bucket.time_until(), 0.1))
                 return False
             
-            # Record message time
-            self.global_message_times.append(current_time)
             if chat_id:
-                self.chat_message_times[chat_id].append(current_time)
+                self.chat_buckets[chat_id].try_acquire()
             
             return True
     
-    def _check_global_rate(self, current_time: float) -> bool:
-        """Check global rate limits"""
-        # Remove old entries
-        while (self.global_message_times and 
-               current_time - self.global_message_times[0] > 60):
-            self.global_message_times.popleft()
-        
-        # Check per-second limit (last 1 second)
-        recent_messages = sum(
-            1 for t in self.global_message_times 
-            if current_time - t <= 1.0
-        )
-        if recent_messages >= self.MESSAGES_PER_SECOND:
-            return False
-        
-        # Check per-minute limit
-        if len(self.global_message_times) >= self.MESSAGES_PER_MINUTE:
-            return False
-        
-        return True
-    
-    def _check_chat_rate(self, chat_id: int, current_time: float) -> bool:
-        """Check per-chat rate limits"""
-        chat_times = self.chat_message_times[chat_id]
-        
-        # Remove old entries
-        while chat_times and current_time - chat_times[0] > 60:
-            chat_times.popleft()
-        
-        # Check per-chat per-minute limit
-        if len(chat_times) >= self.MESSAGES_PER_CHAT_MINUTE:
-            return False
-        
-        return True
-    
     async def safe_send_message(self, send_func, chat_id: int, *args, **kwargs):
         """
         Safely send message with rate limiting
@@ -123,10 +150,336 @@ class TelegramRateLimiter:
         raise Exception(f"Failed to send message after {max_retries} attempts (rate limited)")
 
 
+# ============================================================
+# OUTBOUND SCHEDULER (PTB rate limiter)
+# ============================================================
+
+# Priority lanes, highest priority first
+LANE_INTERACTIVE = 'interactive'   # Replies to the user's own updates
+LANE_LABEL = 'label'               # Label delivery after payment
+LANE_ADMIN = 'admin'               # Admin notifications
+LANE_BROADCAST = 'broadcast'       # Mass mailings
+LANES = (LANE_INTERACTIVE, LANE_LABEL, LANE_ADMIN, LANE_BROADCAST)
+
+_current_lane: contextvars.ContextVar[str] = contextvars.ContextVar('outbound_lane', default=LANE_INTERACTIVE)
+
+
+@contextmanager
+def outbound_lane(lane: str):
+    """
+    Send all Bot API calls made inside the block through `lane`
+
+    Usage:
+        with outbound_lane(LANE_BROADCAST):
+            await bot.send_message(chat_id, text)
+    """
+    if lane not in LANES:
+        raise ValueError(f"Unknown outbound lane: {lane}")
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+def in_outbound_lane(lane: str):
+    """Decorator: run an async function with all its Bot API calls in `lane`"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with outbound_lane(lane):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class OutboundTelegramScheduler(BaseRateLimiter):
+    """
+    Priority scheduler for all outgoing Bot API requests
+
+    Requests wait for their chat bucket first, then queue in their lane.
+    A single dispatcher hands out global tokens strictly by lane priority,
+    and lower lanes additionally have their own rate caps, so a broadcast
+    can never take the capacity interactive replies need.
+
+    Lane selection: `rate_limit_args='broadcast'` (or {'lane': 'broadcast'})
+    on an ExtBot call, otherwise the `outbound_lane()` context, otherwise
+    interactive.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 28,
+        private_chat_rate: float = 1.0,
+        private_chat_burst: int = 5,
+        group_chat_rate: float = 20 / 60,
+        group_chat_burst: int = 3,
+        lane_rates: Optional[Dict[str, float]] = None,
+        max_retries: int = 3,
+        max_chat_buckets: int = 10000,
+    ):
+        """
+        Args:
+            global_rate: Requests per second across all chats (Telegram: ~30/s)
+            private_chat_rate: Requests per second to one private chat
+            private_chat_burst: Burst size for one private chat
+            group_chat_rate: Requests per second to one group (Telegram: 20/min)
+            group_chat_burst: Burst size for one group
+            lane_rates: Optional per-lane caps in requests per second
+            max_retries: How many times a request is retried after RetryAfter
+            max_chat_buckets: Idle chat buckets are pruned above this size
+        """
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.private_chat_rate = private_chat_rate
+        self.private_chat_burst = private_chat_burst
+        self.group_chat_rate = group_chat_rate
+        self.group_chat_burst = group_chat_burst
+        self.max_retries = max_retries
+        self.max_chat_buckets = max_chat_buckets
+
+        self.lane_buckets: Dict[str, TokenBucket] = {
+            lane: TokenBucket(rate, max(1.0, rate))
+            for lane, rate in (lane_rates or {}).items()
+            if lane in LANES and rate
+        }
+        self._chat_buckets: Dict[Any, TokenBucket] = {}
+        self._lanes: Dict[str, deque] = {lane: deque() for lane in LANES}
+        self._paused_until = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        self._wait_ms: Dict[str, deque] = {lane: deque(maxlen=500) for lane in LANES}
+        self.stats = {
+            'sent': {lane: 0 for lane in LANES},
+            'retry_after': 0,
+            'retry_after_seconds': 0.0,
+            'failed_after_retries': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # BaseRateLimiter interface
+    # ------------------------------------------------------------------
+
+    async def initialize(self) -> None:
+        self._ensure_dispatcher()
+        logger.info(f"✅ Outbound Telegram scheduler started ({self.global_bucket.rate}/s global)")
+
+    async def shutdown(self) -> None:
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        # Let anything still queued go out unthrottled instead of hanging
+        for queue in self._lanes.values():
+            while queue:
+                future = queue.popleft()
+                if not future.done():
+                    future.set_result(None)
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Any],
+    ) -> Any:
+        lane = self._resolve_lane(rate_limit_args)
+        chat_id = data.get('chat_id')
+
+        for attempt in range(self.max_retries + 1):
+            await self._wait_for_slot(lane, chat_id)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                delay = _retry_after_seconds(e)
+                self._pause(delay)
+                if attempt >= self.max_retries:
+                    self.stats['failed_after_retries'] += 1
+                    raise
+                logger.warning(f"⏸️ Telegram RetryAfter {delay}s on {endpoint} ({lane}), all lanes paused")
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _resolve_lane(rate_limit_args: Optional[Any]) -> str:
+        if isinstance(rate_limit_args, dict):
+            rate_limit_args = rate_limit_args.get('lane')
+        if rate_limit_args in LANES:
+            return rate_limit_args
+        return _current_lane.get()
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self.max_chat_buckets:
+                self._prune_chat_buckets()
+            is_group = isinstance(chat_id, str) or (isinstance(chat_id, int) and chat_id < 0)
+            if is_group:
+                bucket = TokenBucket(self.group_chat_rate, self.group_chat_burst)
+            else:
+                bucket = TokenBucket(self.private_chat_rate, self.private_chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _prune_chat_buckets(self) -> None:
+        """Drop buckets of chats that were not used recently (full buckets)"""
+        for chat_id in [chat_id for chat_id, bucket in self._chat_buckets.items() if bucket.is_full]:
+            del self._chat_buckets[chat_id]
+
+    def _pause(self, seconds: float) -> None:
+        self.stats['retry_after'] += 1
+        self.stats['retry_after_seconds'] += seconds
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _ensure_dispatcher(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch_loop(), name='telegram-outbound-scheduler')
+
+    async def _wait_for_slot(self, lane: str, chat_id: Any) -> None:
+        start = time.perf_counter()
+
+        # Per-chat limit: reserve a token and sleep exactly as long as needed
+        if chat_id is not None:
+            delay = self._chat_bucket(chat_id).reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        # Global limit: wait for the dispatcher to grant a token in priority order
+        self._ensure_dispatcher()
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[lane].append(future)
+        self._wakeup.set()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future in self._lanes[lane]:
+                self._lanes[lane].remove(future)
+            raise
+
+        self._wait_ms[lane].append((time.perf_counter() - start) * 1000)
+        self.stats['sent'][lane] += 1
+
+    def _next_lane(self) -> tuple:
+        """
+        Pick the highest-priority lane that may send now
+
+        Returns:
+            (lane or None, seconds until a capped lane frees up)
+        """
+        wait = None
+        for lane in LANES:
+            queue = self._lanes[lane]
+            while queue and queue[0].done():
+                queue.popleft()
+            if not queue:
+                continue
+            bucket = self.lane_buckets.get(lane)
+            if bucket is None:
+                return lane, 0.0
+            lane_wait = bucket.time_until()
+            if lane_wait == 0.0:
+                return lane, 0.0
+            wait = lane_wait if wait is None else min(wait, lane_wait)
+        return None, wait
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+
+            lane, lane_wait = self._next_lane()
+            if lane is None:
+                self._wakeup.clear()
+                if lane_wait is None:
+                    await self._wakeup.wait()
+                else:
+                    # A capped lane is waiting; wake early if a higher lane gets work
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=lane_wait)
+                    except asyncio.TimeoutError:
+                        pass
+                continue
+
+            global_wait = self.global_bucket.time_until()
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+                continue
+
+            self.global_bucket.try_acquire()
+            if lane in self.lane_buckets:
+                self.lane_buckets[lane].try_acquire()
+            self._lanes[lane].popleft().set_result(None)
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth and wait time per lane"""
+        def percentile(values, p: float) -> float:
+            if not values:
+                return 0.0
+            ordered = sorted(values)
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 2)
+
+        return {
+            'lanes': {
+                lane: {
+                    'queued': sum(1 for future in self._lanes[lane] if not future.done()),
+                    'sent': self.stats['sent'][lane],
+                    'wait_p50_ms': percentile(self._wait_ms[lane], 0.50),
+                    'wait_p99_ms': percentile(self._wait_ms[lane], 0.99),
+                    'rate_cap': self.lane_buckets[lane].rate if lane in self.lane_buckets else None,
+                }
+                for lane in LANES
+            },
+            'global_rate': self.global_bucket.rate,
+            'paused_for_s': round(max(0.0, self._paused_until - time.monotonic()), 2),
+            'retry_after': self.stats['retry_after'],
+            'retry_after_seconds': round(self.stats['retry_after_seconds'], 2),
+            'failed_after_retries': self.stats['failed_after_retries'],
+            'tracked_chats': len(self._chat_buckets),
+        }
+
+
 # Global rate limiter instance
 rate_limiter = TelegramRateLimiter()
 
 
+# Outbound scheduler (passed to Application.builder().rate_limiter() in server.py)
+_outbound_scheduler: Optional[OutboundTelegramScheduler] = None
+
+
+def init_outbound_scheduler(**kwargs) -> OutboundTelegramScheduler:
+    """Create the global outbound scheduler"""
+    global _outbound_scheduler
+    _outbound_scheduler = OutboundTelegramScheduler(**kwargs)
+    return _outbound_scheduler
+
+
+def get_outbound_scheduler() -> Optional[OutboundTelegramScheduler]:
+    """Get the global outbound scheduler (None if not initialized)"""
+    return _outbound_scheduler
+
+
 # Decorator for automatic rate limiting
 def rate_limited(func):
     """
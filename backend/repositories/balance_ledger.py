@@ -0,0 +1,458 @@
+"""
+Balance Ledger
+Журнал операций с балансом пользователей (append-only)
+
+users.balance stays the value every read uses (one indexed lookup). Every
+change to it goes through one conditional write on the user document:
+
+    find_one_and_update({'telegram_id': id, 'balance': {'$gte': amount}},
+                        {'$inc': {'balance': -amount, 'ledger_seq': 1},
+                         '$push': {'ledger_pending': entry}})
+
+A debit without funds matches nothing, so there is no read-then-deduct
+window. The same write numbers the operation (ledger_seq) and parks the
+entry on the user document; it is then copied to the append-only
+balance_ledger collection ({telegram_id, seq} unique) and pulled from
+ledger_pending. An entry left behind by a crash between the two writes is
+written by the maintenance pass, which maps leftover entries to the missing
+seq numbers in order.
+
+The maintenance pass also snapshots changed users (balance_snapshots:
+balance at seq, computed from the ledger), so rebuilding one balance reads
+only the entries after its snapshot. reconcile() rebuilds all balances from
+the ledger with one $group aggregation and reports (or fixes) drift.
+
+Users created before the ledger get an 'opening' entry with their current
+balance on their first operation.
+
+An operation can carry an idempotency key (e.g. 'topup:<track_id>'). The
+key is checked in the same conditional write ({'ledger_keys': {'$ne': key}}),
+recorded on the user document (last KEEP_KEYS keys) and used as the entry
+id, so a retried credit is applied exactly once.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Balances are USD; differences below a cent are float noise
+TOLERANCE = 0.005
+
+# Idempotency keys kept on a user document (older ones are found in the ledger)
+KEEP_KEYS = 50
+
+
+class BalanceLedger:
+    """Conditional balance updates recorded in an append-only ledger"""
+
+    def __init__(
+        self,
+        db,
+        maintenance_interval: float = 300,
+        batch_size: int = 500,
+        pending_grace: float = 30,
+    ):
+        """
+        Args:
+            db: MongoDB database
+            maintenance_interval: Seconds between snapshot / recovery passes
+            batch_size: Changed users handled per pass
+            pending_grace: Unwritten entries younger than this are left to their writer
+        """
+        self.users = db.users
+        self.entries = db.balance_ledger
+        self.snapshots = db.balance_snapshots
+        self.maintenance_interval = maintenance_interval
+        self.batch_size = batch_size
+        self.pending_grace = pending_grace
+
+        self._task: Optional[asyncio.Task] = None
+
+        self.applied = 0
+        self.rejected = 0
+        self.opened = 0
+        self.recovered = 0
+        self.snapshots_taken = 0
+        self.drift = 0
+        self.errors = 0
+
+    # ==================== OPERATIONS ====================
+
+    async def credit(
+        self, telegram_id: int, amount: float, reason: str, ref: Optional[str] = None, key: Optional[str] = None
+    ) -> Optional[float]:
+        """Add to the balance (once per key). Returns the new balance, None if the user does not exist"""
+        return await self.apply(telegram_id, abs(amount), reason, ref, key=key)
+
+    async def debit(self, telegram_id: int, amount: float, reason: str, ref: Optional[str] = None) -> Optional[float]:
+        """Deduct if the balance covers it. Returns the new balance, None if insufficient / no user"""
+        return await self.apply(telegram_id, -abs(amount), reason, ref)
+
+    async def apply(
+        self,
+        telegram_id: int,
+        amount: float,
+        reason: str,
+        ref: Optional[str] = None,
+        require_funds: bool = True,
+        key: Optional[str] = None
+    ) -> Optional[float]:
+        """
+        Change a balance by amount and record it in the ledger
+
+        Args:
+            telegram_id: Telegram ID
+            amount: Signed change (negative = debit)
+            reason: Entry reason (order, topup, refund, admin, ...)
+            ref: Related order / payment id
+            require_funds: Debits only apply while balance >= -amount
+            key: Idempotency key; an operation with a key already applied
+                 returns the current balance without changing it
+
+        Returns:
+            New balance, or None if nothing was applied
+        """
+        query = {'telegram_id': telegram_id, 'ledger_seq': {'$exists': True}}
+        if amount < 0 and require_funds:
+            query['balance'] = {'$gte': -amount}
+        if key:
+            query['ledger_keys'] = {'$ne': key}
+
+        entry = self._entry(amount, reason, ref, key)
+        user = await self._apply(query, entry)
+        # Pre-ledger user: open and retry. Credits also retry when a concurrent
+        # first operation opened it; a debit refused in that race is not retried.
+        if user is None and (await self._open(telegram_id) or 'balance' not in query):
+            user = await self._apply(query, entry)
+        if user is None and key:
+            applied = await self._applied_balance(telegram_id, key)
+            if applied is not None:
+                return applied
+        if user is None:
+            self.rejected += 1
+            return None
+
+        self.applied += 1
+        await self._append(telegram_id, entry, user['ledger_seq'], user['balance'])
+        return user['balance']
+
+    async def set_balance(self, telegram_id: int, balance: float, reason: str, attempts: int = 5) -> Optional[float]:
+        """
+        Set a balance to an exact value (admin), recorded as the difference
+
+        Returns:
+            New balance, or None if the user does not exist
+        """
+        for _ in range(attempts):
+            user = await self.users.find_one(
+                {'telegram_id': telegram_id}, {'_id': 0, 'balance': 1, 'ledger_seq': 1}
+            )
+            if user is None:
+                return None
+            if 'ledger_seq' not in user:
+                await self._open(telegram_id)
+                continue
+            # Applies only if no other operation got in between
+            entry = self._entry(round(balance - (user.get('balance') or 0.0), 2), reason, None)
+            updated = await self._apply({'telegram_id': telegram_id, 'ledger_seq': user['ledger_seq']}, entry)
+            if updated is not None:
+                self.applied += 1
+                await self._append(telegram_id, entry, updated['ledger_seq'], updated['balance'])
+                return updated['balance']
+        return None
+
+    @staticmethod
+    def _entry(amount: float, reason: str, ref: Optional[str], key: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            'id': key or uuid.uuid4().hex,
+            'amount': amount,
+            'reason': reason,
+            'ref': ref,
+            'at': datetime.now(timezone.utc).isoformat(),
+        }
+
+    async def _apply(self, query: Dict[str, Any], entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        push = {'ledger_pending': entry}
+        if 'ledger_keys' in query:
+            push['ledger_keys'] = {'$each': [entry['id']], '$slice': -KEEP_KEYS}
+        return await self.users.find_one_and_update(
+            query,
+            {'$inc': {'balance': entry['amount'], 'ledger_seq': 1},
+             '$push': push,
+             '$set': {'ledger_dirty': True}},
+            projection={'_id': 0, 'balance': 1, 'ledger_seq': 1},
+            return_document=True
+        )
+
+    async def _applied_balance(self, telegram_id: int, key: str) -> Optional[float]:
+        """Current balance if the operation with this key was already applied"""
+        user = await self.users.find_one({'telegram_id': telegram_id}, {'_id': 0, 'balance': 1, 'ledger_keys': 1})
+        if user is None:
+            return None
+        if key in (user.get('ledger_keys') or []) or await self.entries.find_one({'_id': key}, {'_id': 1}):
+            return user.get('balance') or 0.0
+        return None
+
+    async def _open(self, telegram_id: int) -> bool:
+        """Start the ledger of a pre-ledger user with an opening entry. True if opened now"""
+        entry = self._entry(0.0, 'opening', None)
+        user = await self.users.find_one_and_update(
+            {'telegram_id': telegram_id, 'ledger_seq': {'$exists': False}},
+            {'$set': {'ledger_seq': 1, 'ledger_dirty': True}},
+            projection={'_id': 0, 'balance': 1},
+            return_document=True
+        )
+        if user is None:
+            return False
+        entry['amount'] = user.get('balance') or 0.0
+        self.opened += 1
+        await self._write_entry(telegram_id, entry, 1, entry['amount'])
+        return True
+
+    async def _append(self, telegram_id: int, entry: Dict[str, Any], seq: int, balance_after: Optional[float]) -> None:
+        """Copy a parked entry to the ledger and unpark it"""
+        try:
+            await self._write_entry(telegram_id, entry, seq, balance_after)
+            await self.users.update_one(
+                {'telegram_id': telegram_id},
+                {'$pull': {'ledger_pending': {'id': entry['id']}}}
+            )
+        except Exception as e:
+            # Balance is already updated; the maintenance pass writes the entry
+            self.errors += 1
+            logger.error(f"Ledger entry {entry['id']} for user {telegram_id} not written: {e}")
+
+    async def _write_entry(self, telegram_id: int, entry: Dict[str, Any], seq: int, balance_after: Optional[float]) -> None:
+        try:
+            await self.entries.insert_one({
+                '_id': entry['id'],
+                'telegram_id': telegram_id,
+                'seq': seq,
+                'amount': entry['amount'],
+                'balance_after': balance_after,
+                'reason': entry['reason'],
+                'ref': entry['ref'],
+                'at': entry['at'],
+            })
+        except DuplicateKeyError:
+            pass  # Already written by the maintenance pass
+
+    # ==================== SNAPSHOTS / RECOVERY ====================
+
+    async def _snapshot_seq(self, telegram_id: int) -> tuple:
+        snapshot = await self.snapshots.find_one({'_id': telegram_id})
+        if snapshot is None:
+            return 0, 0.0
+        return snapshot['seq'], snapshot['balance']
+
+    async def recover(self, user: Dict[str, Any]) -> int:
+        """
+        Write entries left on a user document by an interrupted operation
+
+        Leftover entries are assigned, in order, to the seq numbers missing
+        from the ledger. Returns the number of entries written.
+        """
+        telegram_id = user['telegram_id']
+        pending = user.get('ledger_pending') or []
+        if not pending:
+            return 0
+
+        written = set(await self.entries.distinct('_id', {'_id': {'$in': [e['id'] for e in pending]}}))
+        unwritten = [e for e in pending if e['id'] not in written]
+        since, _ = await self._snapshot_seq(telegram_id)
+        present = set(await self.entries.distinct(
+            'seq', {'telegram_id': telegram_id, 'seq': {'$gt': since, '$lte': user['ledger_seq']}}
+        ))
+        missing = [seq for seq in range(since + 1, user['ledger_seq'] + 1) if seq not in present]
+        if len(missing) != len(unwritten):
+            self.errors += 1
+            logger.error(
+                f"Ledger of user {telegram_id}: {len(unwritten)} unwritten entries "
+                f"for {len(missing)} missing seq numbers, needs review"
+            )
+            return 0
+
+        for entry in pending:
+            if entry['id'] in written:
+                await self.users.update_one(
+                    {'telegram_id': telegram_id}, {'$pull': {'ledger_pending': {'id': entry['id']}}}
+                )
+        for entry, seq in zip(unwritten, missing):
+            await self._append(telegram_id, entry, seq, None)
+        self.recovered += len(unwritten)
+        if unwritten:
+            logger.warning(f"📒 Recovered {len(unwritten)} ledger entries for user {telegram_id}")
+        return len(unwritten)
+
+    async def snapshot(self, telegram_id: int, seq: int, balance: Optional[float] = None) -> bool:
+        """
+        Advance the user's snapshot to seq from the entries after the previous one
+
+        Args:
+            telegram_id: Telegram ID
+            seq: Ledger seq to snapshot at
+            balance: users.balance at that seq, compared to the ledger
+
+        Returns:
+            False if the ledger is missing entries up to seq
+        """
+        since, total = await self._snapshot_seq(telegram_id)
+        if since >= seq:
+            return True
+        count = 0
+        async for entry in self.entries.find(
+            {'telegram_id': telegram_id, 'seq': {'$gt': since, '$lte': seq}}, {'_id': 0, 'amount': 1}
+        ):
+            total += entry['amount']
+            count += 1
+        if count != seq - since:
+            return False
+
+        total = round(total, 2)
+        await self.snapshots.update_one(
+            {'_id': telegram_id},
+            {'$set': {'telegram_id': telegram_id, 'balance': total, 'seq': seq,
+                      'taken_at': datetime.now(timezone.utc).isoformat()}},
+            upsert=True
+        )
+        self.snapshots_taken += 1
+        if balance is not None and abs(balance - total) >= TOLERANCE:
+            self.drift += 1
+            logger.warning(f"📒 User {telegram_id} balance ${balance:.2f} != ledger ${total:.2f} (seq {seq})")
+        return True
+
+    async def rebuild(self, telegram_id: int) -> float:
+        """Balance from the ledger: last snapshot plus the entries after it"""
+        since, total = await self._snapshot_seq(telegram_id)
+        async for entry in self.entries.find(
+            {'telegram_id': telegram_id, 'seq': {'$gt': since}}, {'_id': 0, 'amount': 1}
+        ):
+            total += entry['amount']
+        return round(total, 2)
+
+    async def maintain(self) -> Dict[str, int]:
+        """
+        One pass over users changed since their last snapshot:
+        write leftover entries, then snapshot and mark clean
+        """
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=self.pending_grace)).isoformat()
+        result = {'users': 0, 'recovered': 0, 'snapshots': 0}
+        users = await self.users.find(
+            {'ledger_dirty': True},
+            {'_id': 0, 'telegram_id': 1, 'balance': 1, 'ledger_seq': 1, 'ledger_pending': 1}
+        ).limit(self.batch_size).to_list(self.batch_size)
+
+        for user in users:
+            result['users'] += 1
+            pending = user.get('ledger_pending') or []
+            if pending:
+                # In-flight operations write their own entries
+                if all(entry['at'] < cutoff for entry in pending):
+                    result['recovered'] += await self.recover(user)
+                continue
+            if await self.snapshot(user['telegram_id'], user['ledger_seq'], user.get('balance')):
+                result['snapshots'] += 1
+                # Stays dirty if another operation arrived meanwhile
+                await self.users.update_one(
+                    {'telegram_id': user['telegram_id'], 'ledger_seq': user['ledger_seq']},
+                    {'$unset': {'ledger_dirty': ''}}
+                )
+        return result
+
+    # ==================== RECONCILIATION ====================
+
+    async def reconcile(self, fix: bool = False, telegram_ids: Optional[Iterable[int]] = None) -> Dict[str, Any]:
+        """
+        Rebuild balances from the ledger in one aggregation and compare with users
+
+        Args:
+            fix: Overwrite drifted users.balance with the ledger balance
+            telegram_ids: Limit to these users (default: all)
+
+        Returns:
+            Counts plus the list of drifted users
+        """
+        match = {'telegram_id': {'$in': list(telegram_ids)}} if telegram_ids is not None else {}
+        pipeline = ([{'$match': match}] if match else []) + [
+            {'$group': {'_id': '$telegram_id', 'balance': {'$sum': '$amount'},
+                        'entries': {'$sum': 1}}}
+        ]
+        ledger = {row['_id']: row async for row in self.entries.aggregate(pipeline)}
+
+        report = {'checked': 0, 'consistent': 0, 'incomplete': 0, 'fixed': 0, 'drift': []}
+        fixes = []
+        async for user in self.users.find(
+            {**match, 'ledger_seq': {'$exists': True}},
+            {'_id': 0, 'telegram_id': 1, 'balance': 1, 'ledger_seq': 1}
+        ):
+            report['checked'] += 1
+            row = ledger.get(user['telegram_id']) or {'balance': 0.0, 'entries': 0}
+            if row['entries'] != user['ledger_seq']:
+                report['incomplete'] += 1  # entries still parked on the user document
+                continue
+            expected = round(row['balance'], 2)
+            actual = user.get('balance') or 0.0
+            if abs(actual - expected) < TOLERANCE:
+                report['consistent'] += 1
+                continue
+            report['drift'].append({'telegram_id': user['telegram_id'], 'balance': actual, 'ledger': expected})
+            if fix:
+                fixes.append(UpdateOne(
+                    {'telegram_id': user['telegram_id'], 'ledger_seq': user['ledger_seq']},
+                    {'$set': {'balance': expected}}
+                ))
+
+        if fixes:
+            result = await self.users.bulk_write(fixes, ordered=False)
+            report['fixed'] = result.modified_count
+        if report['drift']:
+            logger.warning(f"📒 Ledger reconcile: {len(report['drift'])} drifted balances (fixed {report['fixed']})")
+        return report
+
+    # ==================== LIFECYCLE ====================
+
+    async def _maintenance_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.maintenance_interval)
+            try:
+                await self.maintain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Balance ledger maintenance error: {e}")
+
+    async def start(self) -> None:
+        """Start periodic snapshots / recovery (indexes: utils/db_indexes.py)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._maintenance_loop())
+        logger.info(f"✅ Balance ledger started (maintenance every {self.maintenance_interval}s)")
+
+    async def stop(self) -> None:
+        """Stop the maintenance loop"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Operation and maintenance counters"""
+        return {
+            'applied': self.applied,
+            'rejected': self.rejected,
+            'opened': self.opened,
+            'recovered': self.recovered,
+            'snapshots': self.snapshots_taken,
+            'drift': self.drift,
+            'errors': self.errors,
+            'running': self._task is not None and not self._task.done(),
+        }
@@ -10,6 +10,19 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def normalize_payment_id(value) -> Optional[str]:
+    """
+    Oxapay trackId в каноническом виде (строка)
+    
+    Oxapay присылает trackId то числом, то строкой - в БД всегда строка,
+    чтобы webhook находил платёж одним запросом по индексу track_id.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
 class PaymentRepository(BaseRepository):
     """Репозиторий для коллекции payments"""
     
@@ -47,6 +60,7 @@ class PaymentRepository(BaseRepository):
             "currency": currency,
             "provider": provider,
             "invoice_id": invoice_id,
+            "track_id": normalize_payment_id(invoice_id),
             "order_id": order_id,
             "status": "pending",
             "payment_data": payment_data or {},
@@ -55,6 +69,30 @@ class PaymentRepository(BaseRepository):
         
         return await self.insert_one(payment_doc)
     
+    async def insert_payment(self, payment_dict: Dict):
+        """
+        Вставить платёж с нормализованным track_id
+        
+        Args:
+            payment_dict: Документ платежа (track_id или invoice_id = Oxapay trackId)
+        """
+        track_id = normalize_payment_id(payment_dict.get('track_id') or payment_dict.get('invoice_id'))
+        if track_id:
+            payment_dict['track_id'] = track_id
+        return await self.collection.insert_one(payment_dict)
+    
+    async def find_by_track_id(self, track_id) -> Optional[Dict]:
+        """
+        Найти платеж по Oxapay trackId (строка или число)
+        
+        Args:
+            track_id: trackId из webhook
+            
+        Returns:
+            Документ платежа или None
+        """
+        return await self.find_one({"track_id": normalize_payment_id(track_id)})
+    
     async def find_by_invoice_id(
         self,
         invoice_id: str,
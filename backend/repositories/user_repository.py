@@ -4,6 +4,8 @@ User Repository
 """
 from typing import Dict, List, Optional
 from repositories.base_repository import BaseRepository
+from repositories.balance_ledger import BalanceLedger
+from config.performance_config import BotPerformanceConfig
 from utils.simple_cache import cached, cache, clear_user_cache
 import logging
 
@@ -15,6 +17,7 @@ class UserRepository(BaseRepository):
     
     def __init__(self, db):
         super().__init__(db.users, "users")
+        self.ledger = BalanceLedger(db, **BotPerformanceConfig.get_balance_ledger_config())
     
     @cached(ttl=30, key_prefix="user")
     async def find_by_telegram_id(self, telegram_id: int) -> Optional[Dict]:
@@ -129,30 +132,41 @@ class UserRepository(BaseRepository):
         self,
         telegram_id: int,
         amount: float,
-        operation: str = "add"
+        operation: str = "add",
+        reason: Optional[str] = None,
+        ref: Optional[str] = None,
+        key: Optional[str] = None
     ) -> bool:
         """
-        Обновить баланс пользователя (атомарно)
+        Обновить баланс пользователя (атомарно, с записью в balance_ledger)
+        
+        Списание выполняется одной условной операцией (balance >= amount),
+        отдельная проверка баланса перед ним не нужна.
         
         Args:
             telegram_id: Telegram ID
             amount: Сумма
             operation: "add" или "subtract"
+            reason: Причина для журнала (по умолчанию operation)
+            ref: ID заказа / платежа
+            key: Ключ идемпотентности для зачисления (повтор с тем же
+                 ключом не меняет баланс)
             
         Returns:
-            True если обновлено успешно
+            True если обновлено (или уже применено с этим key),
+            False если пользователь не найден
+            или баланса недостаточно
         """
         if operation == "subtract":
-            amount = -abs(amount)
+            new_balance = await self.ledger.debit(telegram_id, amount, reason or operation, ref)
         else:
-            amount = abs(amount)
+            new_balance = await self.ledger.credit(telegram_id, amount, reason or operation, ref, key=key)
         
-        result = await self.update_one(
-            {"telegram_id": telegram_id},
-            {"$inc": {"balance": amount}}
-        )
+        if new_balance is None:
+            return False
         
-        return result
+        clear_user_cache(telegram_id)
+        return True
     
     async def get_balance(self, telegram_id: int) -> float:
         """
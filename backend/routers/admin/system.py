@@ -225,15 +225,16 @@ async def get_system_logs(
 
 @router.post("/shipstation/check-balance")
 async def check_shipstation_balance(
+    refresh: bool = False,
     authenticated: bool = Depends(verify_admin_key)
 ):
     """
-    Check ShipStation account balance
+    Check ShipStation account balance (cached; refresh=true fetches it now)
     """
     from services.admin.system_admin_service import system_admin_service
     
     try:
-        result = await system_admin_service.check_shipstation_balance()
+        result = await system_admin_service.check_shipstation_balance(refresh=refresh)
         
         if not result.get("success", False):
             raise HTTPException(status_code=500, detail=result.get("error", "Unknown error"))
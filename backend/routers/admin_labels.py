@@ -5,18 +5,13 @@ Admin Labels Router
 from fastapi import APIRouter, HTTPException, Depends
 from typing import Optional
 import logging
+from handlers.admin_handlers import verify_admin_key
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/admin", tags=["admin-labels"])
 
 
-async def verify_admin_key():
-    """Verify admin authorization"""
-    # This is a placeholder - actual implementation in server.py
-    pass
-
-
 @router.post("/create-label/{order_id}", dependencies=[Depends(verify_admin_key)])
 async def admin_create_label(order_id: str):
     """
@@ -35,11 +30,12 @@ async def admin_create_label(order_id: str):
         if order['payment_status'] != 'paid':
             raise HTTPException(status_code=400, detail="Order must be paid first")
         
-        # Create label
+        # Create label (admin retry: also restarts a job stopped for review)
         success = await create_and_send_label(
             order_id,
             order['telegram_id'],
-            None  # No context in API call
+            None,  # No context in API call
+            reviewed=True
         )
         
         if success:
@@ -115,3 +111,25 @@ async def admin_create_label_manual(
     except Exception as e:
         logger.error(f"Error adding manual label: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/labels/{order_id}/pdf", dependencies=[Depends(verify_admin_key)])
+async def admin_label_pdf(order_id: str):
+    """
+    Admin endpoint to reprint / export a label PDF (served from the local archive)
+    """
+    from server import db
+    from routers.shipping import label_pdf_response
+    
+    try:
+        label = await db.shipping_labels.find_one({"order_id": order_id}, {"_id": 0})
+        if not label:
+            raise HTTPException(status_code=404, detail="Label not found")
+        
+        return await label_pdf_response(label, f"label_{order_id}.pdf")
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error exporting label: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -5,6 +5,7 @@ All admin endpoints migrated from server.py
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from typing import Optional
 from handlers.admin_handlers import verify_admin_key, get_stats_data, get_expense_stats_data
+from repositories.balance_ledger import BalanceLedger
 import logging
 
 logger = logging.getLogger(__name__)
@@ -601,30 +602,29 @@ async def get_bot_metrics(authenticated: bool = Depends(verify_admin_key)):
 # ============================================================
 
 @admin_router.post("/shipstation/check-balance")
-async def check_shipstation_balance_endpoint(authenticated: bool = Depends(verify_admin_key)):
-    """Check ShipStation carrier balances"""
-    from services.api_services import check_shipstation_balance
+async def check_shipstation_balance_endpoint(refresh: bool = False, authenticated: bool = Depends(verify_admin_key)):
+    """ShipStation account balance (cached by the balance monitor; refresh=true fetches it now)"""
+    from services.balance_monitor import get_balance_monitor
     
     try:
-        low_balance_carriers = await check_shipstation_balance()
-        
-        if low_balance_carriers is None:
+        balance_monitor = get_balance_monitor()
+        if balance_monitor is None:
             return {
                 "success": False,
-                "message": "Failed to check ShipStation balance"
+                "message": "Balance monitor is not running"
             }
         
-        if len(low_balance_carriers) == 0:
+        balance = await balance_monitor.get_balance(refresh=refresh)
+        if balance["balance"] is None:
             return {
-                "success": True,
-                "message": "All carriers have sufficient balance",
-                "carriers": []
+                "success": False,
+                "message": "Failed to check ShipStation balance"
             }
         
         return {
             "success": True,
-            "message": f"Found {len(low_balance_carriers)} carriers with low balance",
-            "carriers": low_balance_carriers
+            "message": "Balance is low" if balance["low_balance"] else "Balance is sufficient",
+            **balance
         }
     except Exception as e:
         logger.error(f"Error checking ShipStation balance: {e}")
@@ -752,14 +752,11 @@ async def deduct_user_balance_legacy(
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        current_balance = user.get("balance", 0)
-        new_balance = max(0, current_balance - amount)
-        
-        # Update balance
-        await db.users.update_one(
-            {"telegram_id": telegram_id},
-            {"$set": {"balance": new_balance}}
-        )
+        # Recorded in balance_ledger; a deduct larger than the balance empties it
+        ledger = BalanceLedger(db)
+        new_balance = await ledger.debit(telegram_id, amount, "admin_deduct")
+        if new_balance is None:
+            new_balance = await ledger.set_balance(telegram_id, 0.0, "admin_deduct")
         
         # Send beautiful notification to user
         if bot_instance:
@@ -4,6 +4,7 @@ These endpoints don't have /admin prefix for backward compatibility
 """
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from handlers.admin_handlers import verify_admin_key
+from repositories.balance_ledger import BalanceLedger
 import logging
 
 logger = logging.getLogger(__name__)
@@ -133,13 +134,11 @@ async def deduct_balance_legacy(
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        current_balance = user.get("balance", 0)
-        new_balance = max(0, current_balance - amount)
-        
-        await db.users.update_one(
-            {"telegram_id": telegram_id},
-            {"$set": {"balance": new_balance}}
-        )
+        # Recorded in balance_ledger; a deduct larger than the balance empties it
+        ledger = BalanceLedger(db)
+        new_balance = await ledger.debit(telegram_id, amount, "admin_deduct")
+        if new_balance is None:
+            new_balance = await ledger.set_balance(telegram_id, 0.0, "admin_deduct")
         
         # Send beautiful notification to user
         logger.info(f"💬 [DEDUCT_BALANCE] Attempting to send notification, bot_instance={'AVAILABLE' if bot_instance else 'NONE'}")
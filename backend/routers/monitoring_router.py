@@ -2,7 +2,7 @@
 Monitoring Router
 API endpoints для мониторинга и health checks
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 import logging
 from handlers.admin_handlers import verify_admin_key
 from utils.monitoring import (
@@ -218,6 +218,364 @@ async def reset_metrics(authenticated: bool = Depends(verify_admin_key)):
     }
 
 
+# ============================================================
+# PIPELINE METRICS
+# ============================================================
+
+@router.get("/inbox")
+async def get_inbox_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Метрики очереди входящих Telegram updates
+
+    Глубина очередей, переполнение в MongoDB, задержка приёма,
+    отброшенные дубликаты update_id
+    """
+    from services.update_inbox import get_update_inbox
+    from utils.update_deduplicator import update_deduplicator
+    
+    inbox = get_update_inbox()
+    
+    return {
+        "success": True,
+        "inbox": inbox.get_stats() if inbox else {"running": False},
+        "deduplication": update_deduplicator.get_stats()
+    }
+
+
+@router.get("/persistence")
+async def get_persistence_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Метрики write-behind persistence (состояния диалогов и user_data)
+    """
+    import server as srv
+    
+    persistence = srv.application.persistence if srv.application else None
+    stats = persistence.get_stats() if hasattr(persistence, 'get_stats') else {}
+    
+    return {
+        "success": True,
+        "persistence": stats
+    }
+
+
+@router.get("/user-data")
+async def get_user_data_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Резидентные user_data в памяти и статистика вытеснения
+    """
+    from utils.user_data_eviction import get_user_data_evictor
+
+    evictor = get_user_data_evictor()
+
+    return {
+        "success": True,
+        "user_data": evictor.get_stats() if evictor else {"enabled": False}
+    }
+
+
+@router.get("/outbound")
+async def get_outbound_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Очереди исходящих запросов к Telegram по приоритетам
+    """
+    from middleware.rate_limiter import get_outbound_scheduler
+
+    scheduler = get_outbound_scheduler()
+
+    return {
+        "success": True,
+        "outbound": scheduler.get_stats() if scheduler else {"enabled": False}
+    }
+
+
+@router.get("/http-pools")
+async def get_http_pool_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Утилизация HTTP пулов внешних API (ShipStation, Oxapay, CryptoBot, лейблы)
+    """
+    from utils.http_clients import http_clients
+
+    return {
+        "success": True,
+        "pools": http_clients.get_stats()
+    }
+
+
+@router.get("/rate-cache")
+async def get_rate_cache_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Кэш тарифов ShipStation: L1/L2/stale попадания по маршрутам и весу
+    """
+    from services.shipstation_cache import shipstation_cache
+
+    return {
+        "success": True,
+        "rate_cache": shipstation_cache.get_stats()
+    }
+
+
+@router.get("/carriers")
+async def get_carrier_latency_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Запросы тарифов по перевозчикам: успехи, ошибки, отброшенные по дедлайну, задержка
+    """
+    from services.rate_engine import get_rate_engine_stats
+
+    return {
+        "success": True,
+        "carriers": get_rate_engine_stats()
+    }
+
+
+@router.get("/rate-prefetch")
+async def get_rate_prefetch_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Спекулятивная загрузка тарифов: доля попаданий и лишние запросы
+    """
+    from services.rate_prefetch import rate_prefetcher
+
+    return {
+        "success": True,
+        "prefetch": rate_prefetcher.get_stats()
+    }
+
+
+@router.get("/hedging")
+async def get_hedging_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Задержки внешних API (p50/p95/p99) и дублирующие запросы: доля, выигрыши, бюджет
+    """
+    from utils.hedging import get_hedging_stats as collect_stats
+
+    return {
+        "success": True,
+        "endpoints": collect_stats()
+    }
+
+
+@router.get("/single-flight")
+async def get_single_flight_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Объединение одинаковых параллельных запросов к внешним API
+    """
+    from utils.single_flight import get_single_flight_stats as collect_stats
+
+    return {
+        "success": True,
+        "groups": collect_stats()
+    }
+
+
+@router.get("/carrier-catalog")
+async def get_carrier_catalog_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Кэш каталога перевозчиков ShipStation: возраст снапшота, обновления, ошибки
+    """
+    from services.carrier_catalog import get_carrier_catalog
+
+    catalog = get_carrier_catalog()
+
+    return {
+        "success": True,
+        "catalog": catalog.get_stats() if catalog else {"enabled": False}
+    }
+
+
+@router.get("/shipstation-balance")
+async def get_balance_monitor_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Баланс ShipStation: последнее значение, локальная оценка, объединённые обновления
+    """
+    from services.balance_monitor import get_balance_monitor
+
+    balance_monitor = get_balance_monitor()
+
+    return {
+        "success": True,
+        "balance": balance_monitor.get_stats() if balance_monitor else {"enabled": False}
+    }
+
+
+@router.get("/thank-you-pool")
+async def get_thank_you_pool_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Пул AI-благодарностей: глубина, задержка генерации, доля fallback
+    """
+    from services.thank_you_pool import thank_you_pool
+
+    return {
+        "success": True,
+        "pool": thank_you_pool.get_stats()
+    }
+
+
+@router.get("/payment-webhooks")
+async def get_payment_webhook_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Вебхуки Oxapay: захваченные платежи, дубликаты, очередь follow-up
+    """
+    from services.payment_webhooks import get_payment_webhooks
+
+    payment_webhooks = get_payment_webhooks()
+
+    return {
+        "success": True,
+        "webhooks": payment_webhooks.get_stats() if payment_webhooks else {"enabled": False}
+    }
+
+
+@router.get("/payment-reconciler")
+async def get_payment_reconciler_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Сверка ожидающих платежей с провайдерами: проверено, найдено оплаченных
+    """
+    from services.payment_reconciler import get_payment_reconciler
+
+    payment_reconciler = get_payment_reconciler()
+
+    return {
+        "success": True,
+        "reconciler": payment_reconciler.get_stats() if payment_reconciler else {"enabled": False}
+    }
+
+
+@router.get("/balance-ledger")
+async def get_balance_ledger_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Журнал балансов: операции, отказы по недостатку средств, снапшоты
+    """
+    from repositories import get_user_repo
+
+    return {
+        "success": True,
+        "ledger": get_user_repo().ledger.get_stats()
+    }
+
+
+@router.post("/balance-ledger/reconcile")
+async def reconcile_balance_ledger(
+    fix: bool = Query(False, description="Перезаписать расходящиеся балансы значением из журнала"),
+    authenticated: bool = Depends(verify_admin_key)
+):
+    """
+    Пересчитать балансы из журнала (одна агрегация) и сравнить с users
+    """
+    from repositories import get_user_repo
+
+    report = await get_user_repo().ledger.reconcile(fix=fix)
+
+    return {
+        "success": True,
+        "reconcile": report
+    }
+
+
+@router.get("/db-indexes")
+async def get_db_index_stats(
+    verify: bool = Query(False, description="Проверить планы горячих запросов через explain()"),
+    authenticated: bool = Depends(verify_admin_key)
+):
+    """
+    Индексы по манифесту: созданные при старте, конфликты, лишние; COLLSCAN в горячих запросах
+    """
+    from server import db
+    from utils.db_indexes import get_last_report, verify_query_plans
+
+    result = {
+        "success": True,
+        "indexes": get_last_report() or {"enabled": False}
+    }
+    if verify:
+        result["query_plans"] = await verify_query_plans(db)
+    return result
+
+
+@router.get("/circuit-breakers")
+async def get_circuit_breaker_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Circuit breakers внешних API: состояние, переходы, отклонённые вызовы
+    """
+    from utils.retry_utils import SHIPSTATION_CIRCUIT, OXAPAY_CIRCUIT
+
+    return {
+        "success": True,
+        "circuits": {
+            "shipstation": SHIPSTATION_CIRCUIT.get_stats(),
+            "oxapay": OXAPAY_CIRCUIT.get_stats()
+        }
+    }
+
+
+@router.get("/label-jobs")
+async def get_label_job_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Очередь создания лейблов: задания по этапам, повторы, возобновления, ошибки
+    """
+    from services.label_jobs import get_label_jobs
+
+    label_jobs = get_label_jobs()
+    stats = {"enabled": False}
+    if label_jobs:
+        stats = {**label_jobs.get_stats(), "pending": await label_jobs.pending()}
+
+    return {
+        "success": True,
+        "label_jobs": stats
+    }
+
+
+@router.get("/label-delivery")
+async def get_label_delivery_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Отправка PDF лейблов: по file_id / по URL / загрузкой, задержка, сэкономленные байты
+    """
+    from services.label_delivery import label_delivery
+
+    return {
+        "success": True,
+        "label_delivery": label_delivery.get_stats()
+    }
+
+
+@router.get("/label-archive")
+async def get_label_archive_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Локальный архив PDF лейблов: размер, дедупликация, отдачи из архива, вытеснение
+    """
+    from services.label_archive import label_archive
+
+    return {
+        "success": True,
+        "label_archive": label_archive.get_stats()
+    }
+
+
+@router.get("/zip-index")
+async def get_zip_index_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Офлайн индекс ZIP → город/штат: размер, время загрузки, попадания
+    """
+    from utils.zip_index import zip_index
+
+    return {
+        "success": True,
+        "zip_index": zip_index.get_stats()
+    }
+
+
+@router.get("/address-verification")
+async def get_address_verification_stats(authenticated: bool = Depends(verify_admin_key)):
+    """
+    Фоновая проверка адресов: попадания в кэш, вызовы API, готовность к подтверждению
+    """
+    from services.address_verification import address_verifier
+
+    return {
+        "success": True,
+        "address_verification": address_verifier.get_stats()
+    }
+
+
 # ============================================================
 # ДОПОЛНИТЕЛЬНЫЕ ЭНДПОИНТЫ
 # ============================================================
@@ -256,7 +256,9 @@ async def refund_order(order_id: str, refund_reason: Optional[str] = None):
     """Refund an order - void label and return money"""
     from repositories import get_repositories, get_user_repo
     from server import db, SHIPSTATION_API_KEY
-    import httpx
+    from utils.http_clients import get_http_client
+    from services.api_services import is_outage_response
+    from utils.retry_utils import SHIPSTATION_CIRCUIT
     
     try:
         repos = get_repositories()
@@ -280,11 +282,15 @@ async def refund_order(order_id: str, refund_reason: Optional[str] = None):
                     'Content-Type': 'application/json'
                 }
                 
-                async with httpx.AsyncClient(timeout=10.0) as client:
-                    void_response = await client.put(
+                client = get_http_client('shipstation')
+                void_response = await SHIPSTATION_CIRCUIT.call(
+                    lambda: client.put(
                         f'https://api.shipstation.com/v2/labels/{label["label_id"]}/void',
-                        headers=headers
-                    )
+                        headers=headers,
+                        timeout=10.0
+                    ),
+                    is_failure=is_outage_response
+                )
                 
                 void_success = void_response.status_code == 200
             except Exception as e:
@@ -296,7 +302,9 @@ async def refund_order(order_id: str, refund_reason: Optional[str] = None):
         await user_repo.update_balance(
             order['telegram_id'],
             refund_amount,
-            f"Refund for order {order_id}"
+            operation="add",
+            reason="refund",
+            ref=order_id
         )
         
         # Update order status
@@ -7,6 +7,7 @@ from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timezone
 from handlers.admin_handlers import verify_admin_key
+from repositories.balance_ledger import BalanceLedger
 import logging
 
 logger = logging.getLogger(__name__)
@@ -285,9 +286,8 @@ async def update_refund_status(
             
             # If processed, refund balance to user
             if update.refund_amount and update.refund_amount > 0:
-                await db.users.update_one(
-                    {"telegram_id": request["telegram_id"]},
-                    {"$inc": {"balance": update.refund_amount}}
+                await BalanceLedger(db).credit(
+                    request["telegram_id"], update.refund_amount, "refund", request_id
                 )
                 
                 # Mark orders as refunded
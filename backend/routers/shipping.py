@@ -4,6 +4,8 @@ Shipping Router
 """
 from fastapi import APIRouter, HTTPException
 import logging
+from services.api_services import is_outage_response
+from utils.retry_utils import SHIPSTATION_CIRCUIT, CircuitOpenError
 
 logger = logging.getLogger(__name__)
 
@@ -55,7 +57,7 @@ async def create_shipping_label(order_id: str):
 async def track_shipment(tracking_number: str, carrier: str):
     """Get detailed tracking information with progress status"""
     from server import SHIPSTATION_API_KEY
-    import httpx
+    from utils.http_clients import get_http_client
     
     try:
         if not SHIPSTATION_API_KEY:
@@ -66,11 +68,15 @@ async def track_shipment(tracking_number: str, carrier: str):
             'Content-Type': 'application/json'
         }
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
+        client = get_http_client('shipstation')
+        response = await SHIPSTATION_CIRCUIT.call(
+            lambda: client.get(
                 f'https://api.shipstation.com/v2/tracking?tracking_number={tracking_number}&carrier_code={carrier}',
-                headers=headers
-            )
+                headers=headers,
+                timeout=10.0
+            ),
+            is_failure=is_outage_response
+        )
         
         if response.status_code == 200:
             tracking_data = response.json()
@@ -108,44 +114,71 @@ async def track_shipment(tracking_number: str, carrier: str):
                 "progress_color": "gray",
                 "message": "Tracking information not available"
             }
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error tracking shipment: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def label_pdf_response(label: dict, filename: str):
+    """
+    PDF response for a stored label
+    
+    Served from the local label archive when present (FileResponse -
+    sendfile where the server supports it), else streamed from ShipStation.
+    """
+    from server import SHIPSTATION_API_KEY
+    from fastapi.responses import FileResponse, StreamingResponse
+    from starlette.background import BackgroundTask
+    from services.label_archive import label_archive
+    from utils.http_clients import get_http_client
+    
+    disposition = {"Content-Disposition": f"attachment; filename={filename}"}
+    
+    path = label_archive.locate(label)
+    label_archive.record_hit(path is not None)
+    if path is not None:
+        if path.suffix == '.zst':
+            return StreamingResponse(label_archive.iter_pdf(path), media_type="application/pdf", headers=disposition)
+        return FileResponse(path, media_type="application/pdf", headers=disposition)
+    
+    if not SHIPSTATION_API_KEY:
+        raise HTTPException(status_code=500, detail="ShipStation API not configured")
+    
+    label_url = label.get('label_url')
+    if not label_url:
+        raise HTTPException(status_code=404, detail="Label URL not available")
+    
+    headers = {'API-Key': SHIPSTATION_API_KEY}
+    
+    client = get_http_client('labels')
+    response = await client.send(client.build_request('GET', label_url, headers=headers), stream=True)
+    
+    if response.status_code == 200:
+        return StreamingResponse(
+            response.aiter_bytes(),
+            media_type="application/pdf",
+            headers=disposition,
+            background=BackgroundTask(response.aclose)
+        )
+    else:
+        await response.aclose()
+        logger.error(f"Failed to download label: {response.status_code}")
+        raise HTTPException(status_code=502, detail="Failed to download label from ShipStation")
+
+
 @router.get("/labels/{label_id}/download")
 async def download_label(label_id: str):
-    """Proxy endpoint to download label PDF from ShipStation"""
-    from server import SHIPSTATION_API_KEY, db
-    from fastapi.responses import Response
-    import httpx
+    """Download label PDF (local archive, else streamed from ShipStation)"""
+    from server import db
     
     try:
-        if not SHIPSTATION_API_KEY:
-            raise HTTPException(status_code=500, detail="ShipStation API not configured")
-        
         label = await db.shipping_labels.find_one({"label_id": label_id}, {"_id": 0})
         if not label:
             raise HTTPException(status_code=404, detail="Label not found")
         
-        label_url = label.get('label_url')
-        if not label_url:
-            raise HTTPException(status_code=404, detail="Label URL not available")
-        
-        headers = {'API-Key': SHIPSTATION_API_KEY}
-        
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(label_url, headers=headers)
-        
-        if response.status_code == 200:
-            return Response(
-                content=response.content,
-                media_type="application/pdf",
-                headers={"Content-Disposition": f"attachment; filename=label_{label_id}.pdf"}
-            )
-        else:
-            logger.error(f"Failed to download label: {response.status_code}")
-            raise HTTPException(status_code=502, detail="Failed to download label from ShipStation")
+        return await label_pdf_response(label, f"label_{label_id}.pdf")
             
     except HTTPException:
         raise
@@ -158,7 +191,7 @@ async def download_label(label_id: str):
 async def get_carriers():
     """Get available carriers from ShipStation"""
     from server import SHIPSTATION_API_KEY
-    import httpx
+    from utils.http_clients import get_http_client
     
     try:
         if not SHIPSTATION_API_KEY:
@@ -166,17 +199,23 @@ async def get_carriers():
         
         headers = {'API-Key': SHIPSTATION_API_KEY}
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
+        client = get_http_client('shipstation')
+        response = await SHIPSTATION_CIRCUIT.call(
+            lambda: client.get(
                 'https://api.shipstation.com/carriers',
-                headers=headers
-            )
+                headers=headers,
+                timeout=10.0
+            ),
+            is_failure=is_outage_response
+        )
         
         if response.status_code == 200:
             return response.json()
         else:
             raise HTTPException(status_code=502, detail="Failed to fetch carriers")
             
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching carriers: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -174,12 +174,12 @@ async def add_user_balance(telegram_id: int, amount: float, description: str = "
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        success = await user_repo.update_balance(telegram_id, amount, operation="add")
+        success = await user_repo.update_balance(telegram_id, amount, operation="add", reason=description)
         
         if not success:
             raise HTTPException(status_code=500, detail="Failed to add balance")
         
-        new_balance = user.get('balance', 0) + amount
+        new_balance = await user_repo.get_balance(telegram_id)
         
         logger.info(f"💰 Added ${amount} to user {telegram_id}. New balance: ${new_balance}")
         
@@ -212,20 +212,16 @@ async def deduct_user_balance(telegram_id: int, amount: float, description: str
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        current_balance = user.get('balance', 0)
-        if current_balance < amount:
+        # Conditional deduct: fails instead of overdrawing
+        success = await user_repo.update_balance(telegram_id, amount, operation="subtract", reason=description)
+        
+        new_balance = await user_repo.get_balance(telegram_id)
+        if not success:
             raise HTTPException(
                 status_code=400,
-                detail=f"Insufficient balance. Current: ${current_balance}, Required: ${amount}"
+                detail=f"Insufficient balance. Current: ${new_balance}, Required: ${amount}"
             )
         
-        success = await user_repo.update_balance(telegram_id, amount, operation="subtract")
-        
-        if not success:
-            raise HTTPException(status_code=500, detail="Failed to deduct balance")
-        
-        new_balance = current_balance - amount
-        
         logger.info(f"💸 Deducted ${amount} from user {telegram_id}. New balance: ${new_balance}")
         
         return {
@@ -12,43 +12,22 @@ router = APIRouter(prefix="/api", tags=["webhooks"])
 
 @router.post("/oxapay/webhook")
 async def oxapay_webhook(request: Request):
-    """Handle Oxapay payment webhooks"""
+    """Handle Oxapay payment webhooks (claim + ack; follow-up runs in background)"""
     logger.info("🔔 [OXAPAY_WEBHOOK] Webhook endpoint called!")
     
     try:
         from handlers.webhook_handlers import handle_oxapay_webhook
-        from repositories import get_user_repo
-        # Import from server inside function to avoid circular import
-        import server as srv
-        
-        # Get bot_instance from app.state instead of server module
-        bot_instance = getattr(request.app.state, 'bot_instance', None)
-        logger.info(f"🔔 [OXAPAY_WEBHOOK] bot_instance from app.state: {'AVAILABLE' if bot_instance else 'NONE'}")
-        
-        user_repo = get_user_repo()
+        from services.payment_webhooks import get_payment_webhooks
         
-        # Simple pending order lookup by telegram_id (for topup flow) or order_id (for order flow)
-        async def find_pending_order(identifier):
-            # Try telegram_id first (for topup), then order_id (for order payment)
-            result = await srv.db.pending_orders.find_one({"telegram_id": identifier}, {"_id": 0})
-            if not result:
-                result = await srv.db.pending_orders.find_one({"order_id": identifier}, {"_id": 0})
-            return result
+        payment_webhooks = get_payment_webhooks()
+        if payment_webhooks is None:
+            logger.error("❌ [OXAPAY_WEBHOOK] Payment webhooks not initialized")
+            return {"status": "error", "message": "Not ready"}
         
-        logger.info("🔔 [OXAPAY_WEBHOOK] About to call handle_oxapay_webhook")
-        result = await handle_oxapay_webhook(
-            request, 
-            srv.db, 
-            bot_instance,  # Use bot_instance from app.state
-            srv.safe_telegram_call, 
-            user_repo.find_by_telegram_id,
-            find_pending_order,
-            srv.create_and_send_label
-        )
+        result = await handle_oxapay_webhook(request, payment_webhooks)
         logger.info(f"✅ [OXAPAY_WEBHOOK] Webhook processed: {result}")
         return result
     except Exception as e:
-        logger.info(f"❌ [OXAPAY_WEBHOOK] Webhook error: {e}")
         logger.error(f"❌ Webhook error: {e}", exc_info=True)
         return {"status": "error", "message": str(e)}
 
@@ -81,6 +60,19 @@ async def telegram_webhook(request: Request):
             if 'is_bot' not in update_data['callback_query']['from']:
                 update_data['callback_query']['from']['is_bot'] = False
         
+        # Drop updates Telegram re-sent because an earlier delivery was slow
+        from utils.update_deduplicator import is_duplicate_update
+        if await is_duplicate_update(update_data.get('update_id')):
+            return {"ok": True}
+        
+        # Fast ack: hand the update to the inbox, workers process it in background
+        from services.update_inbox import get_update_inbox
+        inbox = get_update_inbox()
+        if inbox and inbox.running:
+            if await inbox.submit(update_data):
+                return {"ok": True}
+            logger.error("❌ Update inbox rejected update, processing inline")
+        
         # Create a Telegram Update object using application's bot
         update = Update.de_json(update_data, srv.application.bot)
         
@@ -0,0 +1,43 @@
+"""
+Archive existing shipping_labels PDFs into the local label archive
+
+    python scripts/backfill_label_archive.py [limit]
+
+The server also backfills in the background (LABEL_ARCHIVE_CONFIG
+backfill_batch per maintenance pass); this runs it in one go.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+
+from services.label_archive import label_archive
+
+
+async def backfill(limit):
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ.get('DB_NAME', 'telegram_shipping_bot')]
+    label_archive.init_storage(db)
+
+    pending = await db.shipping_labels.count_documents(
+        {'archive': {'$exists': False}, 'label_url': {'$nin': [None, '']}}
+    )
+    print(f"Labels without archive copy: {pending}")
+
+    archived = await label_archive.backfill(limit)
+    stats = label_archive.get_stats()
+    print(f"✅ Archived {archived} labels ({stats['stored']} new files, "
+          f"{stats['deduplicated']} duplicates, {stats['failures']} failed) in {label_archive.root}")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill(int(sys.argv[1]) if len(sys.argv) > 1 else None))
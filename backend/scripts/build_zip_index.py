@@ -0,0 +1,34 @@
+"""
+Build data/zip_index.bin from the GeoNames US postal code dataset
+
+    wget https://download.geonames.org/export/zip/US.zip && unzip US.zip
+    python scripts/build_zip_index.py US.txt
+
+GeoNames US.txt is tab-separated:
+country, postal code, place name, state name, state code, ...
+(CC BY 4.0, https://www.geonames.org)
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.zip_index import DEFAULT_PATH, write_index
+
+
+def read_geonames(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) > 4 and fields[0] == 'US':
+                yield fields[1], fields[2], fields[4]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python scripts/build_zip_index.py US.txt [output]")
+        sys.exit(1)
+
+    output = Path(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PATH
+    count = write_index(output, read_geonames(sys.argv[1]))
+    print(f"✅ {count} ZIP codes written to {output} ({output.stat().st_size / 1024:.0f} KB)")
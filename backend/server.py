@@ -63,7 +63,8 @@ if not os.environ.get('SHIPSTATION_API_KEY_PROD'):
 from bot_protection import BotProtection
 from telegram_safety import TelegramSafetySystem, TelegramBestPractices
 import logging
-import httpx
+from utils.http_clients import http_clients, get_http_client
+from utils.hedging import get_hedger
 
 # Configure logging for production
 logging.basicConfig(
@@ -95,9 +96,9 @@ logger = logging.getLogger(__name__)
 # Performance monitoring
 
 # API Services
-from services.api_services import (
-    check_shipstation_balance
-)
+from services.api_services import is_outage_response
+from utils.retry_utils import SHIPSTATION_CIRCUIT, CircuitOpenError
+from services.label_jobs import LabelJobFailed, LabelJobRetry, get_label_jobs
 
 # Business Logic Services
 
@@ -305,14 +306,17 @@ button_click_tracker = {}  # {user_id: {button_data: last_click_timestamp}}
 BUTTON_DEBOUNCE_SECONDS = 0.1  # Максимально быстрый: 100ms между нажатиями
 
 # Rate limiting для защиты от Telegram бана
-# Using optimized rate limiter from middleware
-
-# Note: Old simple RateLimiter replaced with advanced TelegramRateLimiter
-# from middleware.rate_limiter which has:
-# - Per-chat and global rate limiting
-# - Smart retry logic for "Too Many Requests" errors
-# - Semaphore-based concurrency control
-# - Safe message sending with automatic rate limiting
+# All Bot API calls go through OutboundTelegramScheduler (middleware.rate_limiter),
+# installed as the PTB Application rate limiter:
+# - O(1) token buckets: global, per chat and per lane
+# - Priority lanes: interactive > label > admin > broadcast
+# - RetryAfter pauses all lanes and retries the request
+from middleware.rate_limiter import (
+    LANE_ADMIN,
+    LANE_LABEL,
+    in_outbound_lane,
+    init_outbound_scheduler,
+)
 
 # Helper function for session management
 # DEPRECATED: Use utils.session_utils.save_to_session instead
@@ -341,7 +345,7 @@ generate_random_phone = util_generate_random_phone
 # DEPRECATED: Use utils.settings_cache.clear_settings_cache instead
 clear_settings_cache = util_clear_settings_cache
 
-# check_shipstation_balance - imported from services/api_services.py
+# check_shipstation_balance - see services/balance_monitor.py (cached, debounced)
 
 # DEPRECATED: Use utils.telegram_utils.generate_thank_you_message instead
 generate_thank_you_message = util_generate_thank_you_message
@@ -856,289 +860,375 @@ async def create_order_in_db(user, data, selected_rate, amount, discount_percent
     
     return order_dict
 
-async def create_and_send_label(order_id, telegram_id, message):
-    try:
-        # Get order using Repository Pattern
-        from repositories import get_repositories
-        repos = get_repositories()
-        order = await repos.orders.find_by_order_id(order_id)
-        
-        logger.info(f"Creating label for order {order_id}")
-        
-        
-        headers = {
-            'API-Key': SHIPSTATION_API_KEY,
-            'Content-Type': 'application/json'
-        }
-        
-        # Prepare order data in expected format
-        from_phone = order['address_from'].get('phone', generate_random_phone())
-        from_phone = from_phone.strip() if from_phone else generate_random_phone()
-        to_phone = order['address_to'].get('phone', generate_random_phone())
-        to_phone = to_phone.strip() if to_phone else generate_random_phone()
-        
-        logger.info(f"Sending phones to ShipStation - from: '{from_phone}', to: '{to_phone}'")
-        
-        # Format order for label request
-        formatted_order = {
-            'from_name': order['address_from']['name'],
-            'from_phone': from_phone,
-            'from_street': order['address_from']['street1'],
-            'from_street2': order['address_from'].get('street2', ''),
-            'from_city': order['address_from']['city'],
-            'from_state': order['address_from']['state'],
-            'from_zip': order['address_from']['zip'],
-            'to_name': order['address_to']['name'],
-            'to_phone': to_phone,
-            'to_street': order['address_to']['street1'],
-            'to_street2': order['address_to'].get('street2', ''),
-            'to_city': order['address_to']['city'],
-            'to_state': order['address_to']['state'],
-            'to_zip': order['address_to']['zip'],
-            'weight': order['parcel']['weight'],
-            'length': order['parcel'].get('length', 10),
-            'width': order['parcel'].get('width', 10),
-            'height': order['parcel'].get('height', 10)
-        }
-        
-        selected_rate = {
-            'service_code': order.get('selected_service_code', order.get('service_code', '')),
-            'carrier_id': order.get('carrier_id'),
-            'rate_id': order.get('rate_id')
-        }
-        
-        # Build label request using service (simplified - maintaining backward compatibility)
-        label_request = {
-            'label_layout': 'letter',
-            'label_format': 'pdf',
-            'shipment': {
-                'ship_to': {
-                    'name': formatted_order['to_name'],
-                    'phone': formatted_order['to_phone'],
-                    'address_line1': formatted_order['to_street'],
-                    'address_line2': formatted_order['to_street2'],
-                    'city_locality': formatted_order['to_city'],
-                    'state_province': formatted_order['to_state'],
-                    'postal_code': formatted_order['to_zip'],
-                    'country_code': 'US'
-                },
-                'ship_from': {
-                    'name': formatted_order['from_name'],
-                    'company_name': '-',
-                    'phone': formatted_order['from_phone'],
-                    'address_line1': formatted_order['from_street'],
-                    'address_line2': formatted_order['from_street2'],
-                    'city_locality': formatted_order['from_city'],
-                    'state_province': formatted_order['from_state'],
-                    'postal_code': formatted_order['from_zip'],
-                    'country_code': 'US',
-                    'address_residential_indicator': 'yes'
-                },
-                'packages': [{
-                    'weight': {'value': formatted_order['weight'], 'unit': 'pound'},
-                    'dimensions': {
-                        'length': formatted_order['length'],
-                        'width': formatted_order['width'],
-                        'height': formatted_order['height'],
-                        'unit': 'inch'
-                    }
-                }],
-                'service_code': selected_rate['service_code']
+# ==================== LABEL PIPELINE ====================
+# purchase → persist → download → deliver → notify, run by services/label_jobs.py
+
+def build_label_request(order):
+    """ShipStation v2 label request for an order"""
+    # Prepare order data in expected format
+    from_phone = order['address_from'].get('phone', generate_random_phone())
+    from_phone = from_phone.strip() if from_phone else generate_random_phone()
+    to_phone = order['address_to'].get('phone', generate_random_phone())
+    to_phone = to_phone.strip() if to_phone else generate_random_phone()
+    
+    logger.info(f"Sending phones to ShipStation - from: '{from_phone}', to: '{to_phone}'")
+    
+    # Format order for label request
+    formatted_order = {
+        'from_name': order['address_from']['name'],
+        'from_phone': from_phone,
+        'from_street': order['address_from']['street1'],
+        'from_street2': order['address_from'].get('street2', ''),
+        'from_city': order['address_from']['city'],
+        'from_state': order['address_from']['state'],
+        'from_zip': order['address_from']['zip'],
+        'to_name': order['address_to']['name'],
+        'to_phone': to_phone,
+        'to_street': order['address_to']['street1'],
+        'to_street2': order['address_to'].get('street2', ''),
+        'to_city': order['address_to']['city'],
+        'to_state': order['address_to']['state'],
+        'to_zip': order['address_to']['zip'],
+        'weight': order['parcel']['weight'],
+        'length': order['parcel'].get('length', 10),
+        'width': order['parcel'].get('width', 10),
+        'height': order['parcel'].get('height', 10)
+    }
+    
+    selected_rate = {
+        'service_code': order.get('selected_service_code', order.get('service_code', '')),
+        'carrier_id': order.get('carrier_id'),
+        'rate_id': order.get('rate_id')
+    }
+    
+    # Build label request using service (simplified - maintaining backward compatibility)
+    return {
+        'label_layout': 'letter',
+        'label_format': 'pdf',
+        'shipment': {
+            # Lets an uncertain purchase be looked up in ShipStation by order
+            'external_shipment_id': order['order_id'],
+            'ship_to': {
+                'name': formatted_order['to_name'],
+                'phone': formatted_order['to_phone'],
+                'address_line1': formatted_order['to_street'],
+                'address_line2': formatted_order['to_street2'],
+                'city_locality': formatted_order['to_city'],
+                'state_province': formatted_order['to_state'],
+                'postal_code': formatted_order['to_zip'],
+                'country_code': 'US'
             },
-            'rate_id': selected_rate['rate_id']
-        }
-        
-        logger.info(f"Purchasing label with rate_id: {selected_rate['rate_id']}")
-        
-        # Profile label creation API call (now truly async!)
-        api_start_time = time.perf_counter()
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                'https://api.shipstation.com/v2/labels',
-                headers=headers,
-                json=label_request
-            )
-        api_duration_ms = (time.perf_counter() - api_start_time) * 1000
-        logger.info(f"⚡ ShipStation create label API took {api_duration_ms:.2f}ms")
-        
-        # ShipStation API returns 200 or 201 for success
-        if response.status_code not in [200, 201]:
-            error_data = response.json() if response.text else {}
-            error_msg = error_data.get('message', f'Status code: {response.status_code}')
-            logger.error(f"Label creation failed: {error_msg}")
-            logger.error(f"Response: {response.text}")
-            
-            # Log error to session for debugging
-            await session_manager.update_session_atomic(telegram_id, data={
-                'last_error': f'ShipStation label API error: {error_msg}',
-                'error_step': 'CREATE_LABEL_API',
-                'error_timestamp': datetime.now(timezone.utc).isoformat(),
-                'error_response': response.text[:500]
-            })
-            
-            # Notify admin about label creation error
-            from repositories import get_user_repo
-            user_repo = get_user_repo()
-            user = await user_repo.find_by_telegram_id(telegram_id)
-            if user:
-                error_details = f"ShipStation API Error:\n{response.text[:500]}"
-                await notify_admin_error(
-                    user_info=user,
-                    error_type="Label Creation Failed",
-                    error_details=error_details,
-                    order_id=order_id
-                )
-            
-            raise Exception(error_msg)
-        
-        label_response = response.json()
-        
-        # Extract label data
-        label_id = label_response.get('label_id', '')  # ShipStation label ID
-        shipment_id = label_response.get('shipment_id', '')  # ShipStation shipment ID
-        tracking_number = label_response.get('tracking_number', '')
-        label_download_url = label_response.get('label_download', {}).get('pdf', '')
-        
-        # Ensure .pdf extension is present
-        if label_download_url and not label_download_url.endswith('.pdf'):
-            label_download_url = label_download_url + '.pdf'
-        
-        logger.info(f"Label created: label_id={label_id}, tracking={tracking_number}, label_url={label_download_url}")
-        
-        # Save label
-        label = ShippingLabel(
-            order_id=order_id,
-            label_id=label_id,
-            shipment_id=shipment_id,
-            tracking_number=tracking_number,
-            label_url=label_download_url,
-            carrier=order['selected_carrier'],
-            service_level=order['selected_service'],
-            amount=str(order['amount']),  # User paid amount (with markup)
-            status='created'
+            'ship_from': {
+                'name': formatted_order['from_name'],
+                'company_name': '-',
+                'phone': formatted_order['from_phone'],
+                'address_line1': formatted_order['from_street'],
+                'address_line2': formatted_order['from_street2'],
+                'city_locality': formatted_order['from_city'],
+                'state_province': formatted_order['from_state'],
+                'postal_code': formatted_order['from_zip'],
+                'country_code': 'US',
+                'address_residential_indicator': 'yes'
+            },
+            'packages': [{
+                'weight': {'value': formatted_order['weight'], 'unit': 'pound'},
+                'dimensions': {
+                    'length': formatted_order['length'],
+                    'width': formatted_order['width'],
+                    'height': formatted_order['height'],
+                    'unit': 'inch'
+                }
+            }],
+            'service_code': selected_rate['service_code']
+        },
+        'rate_id': selected_rate['rate_id']
+    }
+
+
+@in_outbound_lane(LANE_LABEL)
+async def purchase_label(job):
+    """
+    Stage 1: buy the label (never twice for one order)
+    
+    ShipStation circuit open: paid orders wait in the queue until it
+    recovers. A balance payment run inline fails fast - its caller already
+    charged the balance and refunds it with the final message. Unpaid
+    orders fail fast and the user can retry later.
+    """
+    order_id, telegram_id, order = job.order_id, job.telegram_id, job.order
+    
+    # Bought earlier (old code path or a job lost after the API call was recorded)
+    existing = await db.shipping_labels.find_one({"order_id": order_id}, {"_id": 0})
+    if existing:
+        await job.save(label={
+            'label_id': existing.get('label_id', ''),
+            'shipment_id': existing.get('shipment_id', ''),
+            'tracking_number': existing.get('tracking_number', ''),
+            'label_url': existing.get('label_url', '')
+        })
+        return
+    if job.doc.get('purchase_started_at'):
+        raise LabelJobFailed(
+            "Previous label purchase attempt has no recorded result - check ShipStation "
+            f"(external_shipment_id={order_id}) before retrying",
+            needs_review=True
         )
+    
+    logger.info(f"Creating label for order {order_id}")
+    headers = {
+        'API-Key': SHIPSTATION_API_KEY,
+        'Content-Type': 'application/json'
+    }
+    label_request = build_label_request(order)
+    logger.info(f"Purchasing label with rate_id: {label_request['rate_id']}")
+    
+    # Write-ahead: from here on a lost result must not lead to a second purchase
+    await job.save(purchase_started_at=datetime.now(timezone.utc))
+    
+    # Profile label creation API call (now truly async!)
+    api_start_time = time.perf_counter()
+    client = get_http_client('shipstation')
+    # Label purchase is not idempotent: measured for latency stats, never hedged
+    try:
+        response = await SHIPSTATION_CIRCUIT.call(
+            lambda: get_hedger('shipstation_labels').call(
+                lambda: client.post(
+                    'https://api.shipstation.com/v2/labels',
+                    headers=headers,
+                    json=label_request
+                ),
+                idempotent=False
+            ),
+            is_failure=is_outage_response
+        )
+    except CircuitOpenError as e:
+        # Rejected before sending - no label was bought
+        await job.save(purchase_started_at=None)
+        payment_status = order.get('payment_status')
+        if payment_status == 'processing' and job.message is not None:
+            # Balance payment waiting inline: process_payment refunds and tells the user
+            raise LabelJobFailed(str(e), notify=False)
+        if payment_status not in ('paid', 'processing'):
+            raise LabelJobFailed(str(e), user_message="""⏳ Сервис доставки временно недоступен.
+
+Оплата не списана. Пожалуйста, попробуйте через несколько минут.""")
+        if not job.doc.get('deferred_notified'):
+            await send_label_job_message(job, """⏳ Сервис доставки временно недоступен.
+
+Ваш заказ оплачен - shipping label будет создан и отправлен автоматически, как только сервис восстановится.""")
+            await job.save(deferred_notified=True)
+        raise LabelJobRetry(max(SHIPSTATION_CIRCUIT.retry_after(), 1.0), str(e))
+    except Exception as e:
+        raise LabelJobFailed(f"Label purchase outcome unknown: {e}", needs_review=True)
+    api_duration_ms = (time.perf_counter() - api_start_time) * 1000
+    logger.info(f"⚡ ShipStation create label API took {api_duration_ms:.2f}ms")
+    
+    # ShipStation API returns 200 or 201 for success
+    if response.status_code not in [200, 201]:
+        error_data = response.json() if response.text else {}
+        error_msg = error_data.get('message', f'Status code: {response.status_code}')
+        logger.error(f"Label creation failed: {error_msg}")
+        logger.error(f"Response: {response.text}")
+        await job.save(purchase_started_at=None)
         
-        label_dict = label.model_dump()
-        label_dict['created_at'] = label_dict['created_at'].isoformat()
-        label_dict['original_amount'] = order.get('original_amount')  # ShipStation price
-        await db.shipping_labels.insert_one(label_dict)
-        
-        # Update order using Repository Pattern
-        from repositories import get_repositories
-        repos = get_repositories()
-        await repos.orders.update_by_id(order_id, {
-            "shipping_status": "label_created",
-            "tracking_number": tracking_number,
-            "label_id": label_id,
-            "shipment_id": shipment_id
+        # Log error to session for debugging
+        await session_manager.update_session_atomic(telegram_id, data={
+            'last_error': f'ShipStation label API error: {error_msg}',
+            'error_step': 'CREATE_LABEL_API',
+            'error_timestamp': datetime.now(timezone.utc).isoformat(),
+            'error_response': response.text[:500]
         })
-        
-        # Send label to user
-        if bot_instance:
-            try:
-                # Download label PDF using service
-                from services.shipping_service import download_label_pdf
-                success, pdf_bytes, error = await download_label_pdf(label_download_url, timeout=30)
-                
-                if success:
-                    # Generate AI thank you message
-                    try:
-                        thank_you_msg = await generate_thank_you_message()
-                    except Exception as e:
-                        logger.error(f"Error generating thank you message: {e}")
-                        thank_you_msg = "Спасибо за использование нашего сервиса!"
-                    
-                    # Send label using service
-                    from services.shipping_service import send_label_to_user
-                    success, error = await send_label_to_user(
-                        bot_instance=bot_instance,
-                        telegram_id=telegram_id,
-                        pdf_bytes=pdf_bytes,
-                        order_id=order_id,
-                        tracking_number=tracking_number,
-                        carrier=order['selected_carrier'].upper(),
-                        safe_telegram_call_func=safe_telegram_call
-                    )
-                    
-                    if success:
-                        # Send tracking info
-                        await safe_telegram_call(bot_instance.send_message(
-                            chat_id=telegram_id,
-                            text=f"🔗 Трекинг номер:\n\n`{tracking_number}`",
-                            parse_mode='Markdown'
-                        ))
-                        
-                        # Send thank you message
-                        logger.info(f"Sending thank you message to user {telegram_id}")
-                        await safe_telegram_call(bot_instance.send_message(
-                            chat_id=telegram_id,
-                            text=thank_you_msg
-                        ))
-                        logger.info(f"Label sent successfully to user {telegram_id}")
-                    else:
-                        logger.error(f"Failed to send label: {error}")
-                        raise Exception(error)
-                else:
-                    # Fallback if PDF download fails
-                    logger.error(f"Failed to download PDF: {error}")
-                    await safe_telegram_call(bot_instance.send_message(
-                        chat_id=telegram_id,
-                        text=f"""📦 Shipping label создан!
+        raise LabelJobFailed(f"ShipStation API Error:\n{response.text[:500]}")
+    
+    label_response = response.json()
+    
+    # Extract label data
+    label_download_url = label_response.get('label_download', {}).get('pdf', '')
+    
+    # Ensure .pdf extension is present
+    if label_download_url and not label_download_url.endswith('.pdf'):
+        label_download_url = label_download_url + '.pdf'
+    
+    label = {
+        'label_id': label_response.get('label_id', ''),  # ShipStation label ID
+        'shipment_id': label_response.get('shipment_id', ''),  # ShipStation shipment ID
+        'tracking_number': label_response.get('tracking_number', ''),
+        'label_url': label_download_url
+    }
+    logger.info(f"Label created: label_id={label['label_id']}, tracking={label['tracking_number']}, label_url={label_download_url}")
+    await job.save(label=label)
+
+
+async def persist_label(job):
+    """Stage 2: store the label and mark the order (upserts - safe to repeat)"""
+    order_id, order, label = job.order_id, job.order, job.doc['label']
+    
+    shipping_label = ShippingLabel(
+        order_id=order_id,
+        label_id=label['label_id'],
+        shipment_id=label['shipment_id'],
+        tracking_number=label['tracking_number'],
+        label_url=label['label_url'],
+        carrier=order['selected_carrier'],
+        service_level=order['selected_service'],
+        amount=str(order['amount']),  # User paid amount (with markup)
+        status='created'
+    )
+    
+    label_dict = shipping_label.model_dump()
+    label_dict['created_at'] = label_dict['created_at'].isoformat()
+    label_dict['original_amount'] = order.get('original_amount')  # ShipStation price
+    result = await db.shipping_labels.update_one(
+        {"order_id": order_id},
+        {"$setOnInsert": label_dict},
+        upsert=True
+    )
+    if result.upserted_id is not None:
+        # Local balance estimate; the monitor refreshes once per purchase burst
+        from services.balance_monitor import get_balance_monitor
+        balance_monitor = get_balance_monitor()
+        if balance_monitor:
+            await balance_monitor.record_purchase(label_dict['original_amount'])
+    
+    from repositories import get_repositories
+    repos = get_repositories()
+    await repos.orders.update_one({"order_id": order_id}, {"$set": {
+        "shipping_status": "label_created",
+        "tracking_number": label['tracking_number'],
+        "label_id": label['label_id'],
+        "shipment_id": label['shipment_id']
+    }})
+    # Balance payment whose inline run was postponed: charged, label now stored
+    await repos.orders.update_one(
+        {"order_id": order_id, "payment_status": "processing"},
+        {"$set": {"payment_status": "paid"}}
+    )
+
+
+@in_outbound_lane(LANE_LABEL)
+async def download_label(job):
+    """
+    Stage 3: get the label PDF to the user
+    
+    Telegram fetches the PDF from ShipStation (or reuses a stored file_id) -
+    the bot never downloads it (services/label_delivery.py).
+    """
+    if not bot_instance:
+        return
+    
+    label = await db.shipping_labels.find_one({"order_id": job.order_id}, {"_id": 0})
+    if not label:
+        label = {'order_id': job.order_id, **job.doc['label']}
+    
+    from services.shipping_service import send_label_to_user
+    success, error = await send_label_to_user(
+        bot_instance=bot_instance,
+        telegram_id=job.telegram_id,
+        label=label,
+        carrier=job.order['selected_carrier'].upper(),
+        safe_telegram_call_func=safe_telegram_call
+    )
+    if not success:
+        # Delivered as a link instead
+        logger.error(f"Failed to send label: {error}")
+    await job.save(document_sent=success)
+
+
+@in_outbound_lane(LANE_LABEL)
+async def deliver_label(job):
+    """Stage 4: send the tracking number and thank-you message to the user"""
+    if not bot_instance:
+        return
+    
+    order_id, telegram_id, order, label = job.order_id, job.telegram_id, job.order, job.doc['label']
+    tracking_number = label['tracking_number']
+    
+    try:
+        if job.doc.get('document_sent'):
+            # Send tracking info
+            await safe_telegram_call(bot_instance.send_message(
+                chat_id=telegram_id,
+                text=f"🔗 Трекинг номер:\n\n`{tracking_number}`",
+                parse_mode='Markdown'
+            ))
+            
+            # Send thank you message (pre-generated - never waits for the LLM)
+            from services.thank_you_pool import thank_you_pool
+            from repositories import get_user_repo
+            user = await get_user_repo().find_by_telegram_id(telegram_id)
+            first_name = user.get('first_name') if user else None
+            logger.info(f"Sending thank you message to user {telegram_id}")
+            await safe_telegram_call(bot_instance.send_message(
+                chat_id=telegram_id,
+                text=thank_you_pool.take(first_name)
+            ))
+            logger.info(f"Label sent successfully to user {telegram_id}")
+        else:
+            # Fallback if the PDF could not be sent
+            await safe_telegram_call(bot_instance.send_message(
+                chat_id=telegram_id,
+                text=f"""📦 Shipping label создан!
 
 Tracking: {tracking_number}
 Carrier: {order['selected_carrier']}
 Service: {order['selected_service']}
 
-Label PDF: {label_download_url}
+Label PDF: {label['label_url']}
 
 Вы оплатили: ${order['amount']:.2f}"""
-                    ))
-                    logger.warning("Could not download label PDF, sent URL instead")
-                    
-            except Exception as e:
-                logger.error(f"Error sending label to user: {e}")
+            ))
+            logger.warning("Could not send label PDF, sent URL instead")
             
-            # STEP 4: Save completed label and clear session
-            await session_manager.save_completed_label(telegram_id, {
-                'order_id': order_id,
-                'tracking_number': tracking_number,
-                'carrier': order['selected_carrier'],
-                'label_url': label_download_url,
-                'amount': order['amount']
-            })
-            logger.info(f"✅ Label saved and session cleared for user {telegram_id}")
-                
-        # Send notification to admin about new label
-        if ADMIN_TELEGRAM_ID:
-            try:
-                # Get user info using Repository Pattern
-                from repositories import get_user_repo
-                user_repo = get_user_repo()
-                user = await user_repo.find_by_telegram_id(telegram_id)
-                user_name = user.get('first_name', 'Unknown') if user else 'Unknown'
-                username = user.get('username', '') if user else ''
-                user_display = f"{user_name}" + (f" (@{username})" if username else f" (ID: {telegram_id})")
-                
-                # Format admin notification
-                # Format FROM address with proper alignment
-                from_addr_lines = []
-                from_addr_lines.append(f"📍 *От:* {order['address_from']['name']}")
-                from_addr_lines.append(f"     📍 {order['address_from']['street1']}")
-                if order['address_from'].get('street2'):
-                    from_addr_lines.append(f"     📍 {order['address_from']['street2']}")
-                from_addr_lines.append(f"     🏙️ {order['address_from']['city']}, {order['address_from']['state']} {order['address_from']['zip']}")
-                from_addr_str = '\n'.join(from_addr_lines)
-                
-                # Format TO address with proper alignment
-                to_addr_lines = []
-                to_addr_lines.append(f"📍 *Кому:* {order['address_to']['name']}")
-                to_addr_lines.append(f"     📍 {order['address_to']['street1']}")
-                if order['address_to'].get('street2'):
-                    to_addr_lines.append(f"     📍 {order['address_to']['street2']}")
-                to_addr_lines.append(f"     🏙️ {order['address_to']['city']}, {order['address_to']['state']} {order['address_to']['zip']}")
-                to_addr_str = '\n'.join(to_addr_lines)
-                
-                admin_message = f"""📦 *Новый лейбл создан!*
+    except Exception as e:
+        logger.error(f"Error sending label to user: {e}")
+    
+    # STEP 4: Save completed label and clear session
+    await session_manager.save_completed_label(telegram_id, {
+        'order_id': order_id,
+        'tracking_number': tracking_number,
+        'carrier': order['selected_carrier'],
+        'label_url': label['label_url'],
+        'amount': order['amount']
+    })
+    logger.info(f"✅ Label saved and session cleared for user {telegram_id}")
+
+
+async def notify_label(job):
+    """Stage 5: tell the admin about the new label and re-check the ShipStation balance"""
+    telegram_id, order = job.telegram_id, job.order
+    tracking_number = job.doc['label']['tracking_number']
+    
+    # Send notification to admin about new label
+    if ADMIN_TELEGRAM_ID and application is not None:
+        try:
+            # Get user info using Repository Pattern
+            from repositories import get_user_repo
+            user_repo = get_user_repo()
+            user = await user_repo.find_by_telegram_id(telegram_id)
+            user_name = user.get('first_name', 'Unknown') if user else 'Unknown'
+            username = user.get('username', '') if user else ''
+            user_display = f"{user_name}" + (f" (@{username})" if username else f" (ID: {telegram_id})")
+            
+            # Format admin notification
+            # Format FROM address with proper alignment
+            from_addr_lines = []
+            from_addr_lines.append(f"📍 *От:* {order['address_from']['name']}")
+            from_addr_lines.append(f"     📍 {order['address_from']['street1']}")
+            if order['address_from'].get('street2'):
+                from_addr_lines.append(f"     📍 {order['address_from']['street2']}")
+            from_addr_lines.append(f"     🏙️ {order['address_from']['city']}, {order['address_from']['state']} {order['address_from']['zip']}")
+            from_addr_str = '\n'.join(from_addr_lines)
+            
+            # Format TO address with proper alignment
+            to_addr_lines = []
+            to_addr_lines.append(f"📍 *Кому:* {order['address_to']['name']}")
+            to_addr_lines.append(f"     📍 {order['address_to']['street1']}")
+            if order['address_to'].get('street2'):
+                to_addr_lines.append(f"     📍 {order['address_to']['street2']}")
+            to_addr_lines.append(f"     🏙️ {order['address_to']['city']}, {order['address_to']['state']} {order['address_to']['zip']}")
+            to_addr_str = '\n'.join(to_addr_lines)
+            
+            admin_message = f"""📦 *Новый лейбл создан!*
 
 👤 *Пользователь:* {user_display}
 
@@ -1153,75 +1243,161 @@ Label PDF: {label_download_url}
 
 🕐 *Время:* {datetime.now(timezone.utc).strftime('%d.%m.%Y %H:%M UTC')}"""
 
-                # Send to admin
-                if 'application' in globals() and hasattr(application, 'bot'):
-                    admin_bot = application.bot
-                else:
-                    from telegram import Bot
-                    admin_bot = Bot(TELEGRAM_BOT_TOKEN)
-                
-                await safe_telegram_call(admin_bot.send_message(
-                    chat_id=ADMIN_TELEGRAM_ID,
-                    text=admin_message,
-                    parse_mode='Markdown'
-                ))
-                logger.info(f"Label creation notification sent to admin {ADMIN_TELEGRAM_ID}")
-            except Exception as e:
-                logger.error(f"Failed to send label notification to admin: {e}")
-        
-        # Check ShipStation balance after label creation
-        asyncio.create_task(check_shipstation_balance())
-        
-        logger.info(f"Label created successfully for order {order_id}")
-        return True  # Success
-        
-    except Exception as e:
-        logger.error(f"Error creating label: {e}", exc_info=True)
-        
-        # Log error to session for debugging
-        await session_manager.update_session_atomic(telegram_id, data={
-            'last_error': f'Label creation failed: {str(e)[:200]}',
-            'error_step': 'CREATE_LABEL',
-            'error_timestamp': datetime.now(timezone.utc).isoformat(),
-            'error_order_id': order_id
-        })
-        
-        # Notify admin about error
-        from repositories import get_user_repo
-        user_repo = get_user_repo()
-        user = await user_repo.find_by_telegram_id(telegram_id)
-        if user:
-            await notify_admin_error(
-                user_info=user,
-                error_type="Label Creation Exception",
-                error_details=str(e),
-                order_id=order_id
-            )
-        
-        # Send polite message to user with admin contact button
-        user_message = """😔 К сожалению, в данный момент мы не можем сгенерировать shipping label.
+            # Send to admin (application.bot goes through the outbound scheduler)
+            admin_bot = application.bot
+
+            await safe_telegram_call(admin_bot.send_message(
+                chat_id=ADMIN_TELEGRAM_ID,
+                text=admin_message,
+                parse_mode='Markdown'
+            ), lane=LANE_ADMIN)
+            logger.info(f"Label creation notification sent to admin {ADMIN_TELEGRAM_ID}")
+            
+            # Admin copy of the PDF by Telegram file_id (never downloaded again)
+            label = await db.shipping_labels.find_one({"order_id": job.order_id}, {"_id": 0})
+            if label:
+                from services.label_delivery import label_delivery
+                await label_delivery.send(
+                    admin_bot, ADMIN_TELEGRAM_ID, label, f"📄 {tracking_number}",
+                    lambda coro: safe_telegram_call(coro, lane=LANE_ADMIN),
+                    allow_upload=False
+                )
+        except Exception as e:
+            logger.error(f"Failed to send label notification to admin: {e}")
+
+    logger.info(f"Label created successfully for order {job.order_id}")
+
+
+async def archive_label(job):
+    """Stage 6: keep a local copy of the PDF (misses are retried by the archive backfill)"""
+    from services.label_archive import label_archive
+    label = await db.shipping_labels.find_one({"order_id": job.order_id}, {"_id": 0})
+    if label:
+        await label_archive.store(label)
+
+
+LABEL_JOB_STAGES = (
+    ('purchase', purchase_label),
+    ('persist', persist_label),
+    ('download', download_label),
+    ('deliver', deliver_label),
+    ('notify', notify_label),
+    ('archive', archive_label),
+)
+
+
+async def notify_low_shipstation_balance(balance):
+    """Balance monitor alert: ShipStation balance dropped below the threshold"""
+    if not (ADMIN_TELEGRAM_ID and bot_instance):
+        return
+    await safe_telegram_call(bot_instance.send_message(
+        chat_id=ADMIN_TELEGRAM_ID,
+        text=f"⚠️ *Низкий баланс ShipStation*\n\nБаланс: `${balance:.2f}`\nПополните счёт, чтобы покупка лейблов не остановилась.",
+        parse_mode='Markdown'
+    ), lane=LANE_ADMIN)
+
+
+async def send_label_job_message(job, text, reply_markup=None):
+    """Reply to the payment message of an inline run, else message the user"""
+    if job.message:
+        await safe_telegram_call(job.message.reply_text(text, reply_markup=reply_markup))
+    elif bot_instance:
+        await safe_telegram_call(bot_instance.send_message(
+            chat_id=job.telegram_id,
+            text=text,
+            reply_markup=reply_markup
+        ))
+
+
+@in_outbound_lane(LANE_LABEL)
+async def label_job_failed(job, error):
+    """Label pipeline gave up: log, alert the admin, apologise to the user"""
+    order_id, telegram_id = job.order_id, job.telegram_id
+    
+    if error.user_message:
+        await send_label_job_message(job, error.user_message)
+        return
+    
+    # Log error to session for debugging
+    await session_manager.update_session_atomic(telegram_id, data={
+        'last_error': f'Label creation failed: {str(error)[:200]}',
+        'error_step': 'CREATE_LABEL',
+        'error_timestamp': datetime.now(timezone.utc).isoformat(),
+        'error_order_id': order_id
+    })
+    
+    # Notify admin about error
+    from repositories import get_user_repo
+    user_repo = get_user_repo()
+    user = await user_repo.find_by_telegram_id(telegram_id)
+    if user:
+        await notify_admin_error(
+            user_info=user,
+            error_type="Label Purchase Needs Review" if error.needs_review else "Label Creation Failed",
+            error_details=str(error),
+            order_id=order_id
+        )
+    
+    # Send polite message to user with admin contact button
+    user_message = """😔 К сожалению, в данный момент мы не можем сгенерировать shipping label.
 
 Пожалуйста, свяжитесь с администратором.
 
 Приносим извинения за неудобства!"""
-        
-        # Add button to contact admin
-        keyboard = []
-        if ADMIN_TELEGRAM_ID:
-            keyboard.append([InlineKeyboardButton("💬 Связаться с администратором", url=f"tg://user?id={ADMIN_TELEGRAM_ID}")])
-        keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data='main_menu')])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        if message:
-            await safe_telegram_call(message.reply_text(user_message, reply_markup=reply_markup))
-        elif bot_instance:
-            await safe_telegram_call(bot_instance.send_message(
-                chat_id=telegram_id,
-                text=user_message,
-                reply_markup=reply_markup
-            ))
-        
-        return False  # Failed
+    
+    # Add button to contact admin
+    keyboard = []
+    if ADMIN_TELEGRAM_ID:
+        keyboard.append([InlineKeyboardButton("💬 Связаться с администратором", url=f"tg://user?id={ADMIN_TELEGRAM_ID}")])
+    keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data='main_menu')])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    await send_label_job_message(job, user_message, reply_markup=reply_markup)
+
+
+async def create_and_send_label(order_id, telegram_id, message, reviewed=False):
+    """
+    Buy the label now and hand delivery to the label job workers
+    
+    Used where the caller needs the outcome (balance payment settles its
+    charge via LabelJobQueue.settlement() if this returns False,
+    admin/API label creation).
+    
+    Args:
+        reviewed: Admin checked ShipStation - restart a job stopped for review
+    
+    Returns:
+        bool: True once the label is bought and stored
+    """
+    return await get_label_jobs().run(order_id, telegram_id, message=message, until='download', reviewed=reviewed)
+
+
+async def queue_label_purchase(order_id, telegram_id, message=None):
+    """Queue the whole label pipeline and return immediately (paid orders, webhooks)"""
+    await get_label_jobs().submit(order_id, telegram_id)
+    return True
+
+async def find_pending_order(identifier):
+    """Pending order by telegram_id (top-up flow), then by order_id (order flow)"""
+    result = await db.pending_orders.find_one({"telegram_id": identifier}, {"_id": 0})
+    if not result:
+        result = await db.pending_orders.find_one({"order_id": identifier}, {"_id": 0})
+    return result
+
+
+async def complete_payment(payment):
+    """Payment webhook follow-up: credit balance / queue the label, notify"""
+    from handlers.webhook_handlers import complete_oxapay_payment
+    from repositories import get_user_repo
+    await complete_oxapay_payment(
+        payment,
+        db,
+        bot_instance,
+        safe_telegram_call,
+        get_user_repo().find_by_telegram_id,
+        find_pending_order,
+        queue_label_purchase
+    )
 
 # MIGRATED: Use handlers.order_flow.cancellation.cancel_order
 # Keeping alias for backward compatibility
@@ -1370,19 +1546,77 @@ async def startup_event():
     logger.info("🛡️ Telegram Safety System initialized (Rate Limiting, Anti-Block)")
     logger.info(f"📋 Best Practices: {len(TelegramBestPractices.get_guidelines())} guidelines active")
     
-    # Create MongoDB indexes for performance optimization (5000+ users)
+    # Shared HTTP pools for ShipStation / Oxapay / CryptoBot / label downloads
+    http_clients.start()
+    asyncio.create_task(http_clients.warm_up())
+    
+    # MongoDB indexes from the manifest (utils/db_indexes.py): only missing ones are built,
+    # all collections concurrently
+    from utils.db_indexes import apply_index_manifest
     try:
-        logger.info("Creating MongoDB indexes for high performance...")
-        await db.users.create_index("telegram_id", unique=True)
-        await db.users.create_index([("created_at", -1)])
-        await db.orders.create_index("telegram_id")
-        await db.orders.create_index([("created_at", -1)])
-        await db.orders.create_index("order_id", unique=True)
-        await db.templates.create_index([("telegram_id", 1), ("created_at", -1)])
-        await db.settings.create_index("key", unique=True)
-        logger.info("✅ MongoDB indexes created successfully")
+        await apply_index_manifest(db)
     except Exception as e:
-        logger.warning(f"Index creation skipped (may already exist): {e}")
+        logger.warning(f"Index manifest not applied: {e}")
+    
+    # Shared L2 for the rate cache (all workers, survives restarts)
+    from services.shipstation_cache import shipstation_cache
+    await shipstation_cache.init_storage(db)
+    
+    # Telegram file_ids of sent labels (reprints without re-uploading)
+    from services.label_delivery import label_delivery
+    label_delivery.init_storage(db)
+    
+    # Local label PDF archive (reprints work while ShipStation is down)
+    from services.label_archive import label_archive
+    label_archive.init_storage(db)
+    await label_archive.start()
+    
+    # Shared cache of verified addresses (repeat senders skip the API)
+    from services.address_verification import address_verifier
+    await address_verifier.init_storage(db)
+    
+    # Carrier ids for rate requests: persisted snapshot + background refresh
+    from services.carrier_catalog import init_carrier_catalog
+    carrier_catalog = init_carrier_catalog(db, **BotPerformanceConfig.get_carrier_catalog_config())
+    await carrier_catalog.start()
+    
+    # AI thank-you messages generated ahead of time, off the label path
+    from services.thank_you_pool import thank_you_pool
+    await thank_you_pool.start()
+    
+    # Oxapay webhooks: claim + ack; credit and notifications run as follow-ups.
+    # Claims only queue follow-ups; the workers start once the Application bot
+    # (and its outbound scheduler) is in place - see the end of startup
+    from services.payment_webhooks import init_payment_webhooks
+    payment_webhooks = init_payment_webhooks(
+        db,
+        follow_up=complete_payment,
+        **BotPerformanceConfig.get_payment_webhooks_config()
+    )
+    
+    # Pending payments whose webhook was lost: polled from the providers, credited via claim()
+    from services.payment_reconciler import init_payment_reconciler
+    payment_reconciler = init_payment_reconciler(
+        db,
+        claim=payment_webhooks.claim,
+        **BotPerformanceConfig.get_payment_reconciler_config()
+    )
+    await payment_reconciler.start()
+    
+    # User balance ledger: periodic snapshots, entries left by a crash are written
+    await repository_manager.users.ledger.start()
+    
+    # ShipStation balance: cached, estimated per label, refreshed once per burst
+    from services.balance_monitor import init_balance_monitor
+    balance_monitor = init_balance_monitor(
+        on_low_balance=notify_low_shipstation_balance,
+        **BotPerformanceConfig.get_balance_monitor_config()
+    )
+    await balance_monitor.start()
+    
+    # Label pipeline (workers start with the payment follow-ups below)
+    from services.label_jobs import init_label_jobs
+    label_jobs = init_label_jobs(db, **BotPerformanceConfig.get_label_jobs_config())
     
     if TELEGRAM_BOT_TOKEN and TELEGRAM_BOT_TOKEN != "your_telegram_bot_token_here":
         try:
@@ -1399,11 +1633,11 @@ async def startup_event():
             # Get optimized settings from performance config
             app_settings = BotPerformanceConfig.get_optimized_application_settings()
             
-            # DictPersistence for webhook mode - stores conversation state between HTTP requests
-            # This is CRITICAL for webhook mode to work correctly!
-            from telegram.ext import DictPersistence
-            persistence = DictPersistence()
-            logger.info("✅ DictPersistence initialized for webhook mode")
+            # Write-behind MongoDB persistence - conversation state and user_data survive restarts
+            # Changes are buffered in memory and flushed in batches (no DB round trip per keystroke)
+            from utils.mongodb_persistence import WriteBehindMongoDBPersistence
+            persistence = WriteBehindMongoDBPersistence(db, **BotPerformanceConfig.get_persistence_config())
+            logger.info("✅ WriteBehindMongoDBPersistence initialized")
             
             # Optimize: Only receive needed update types (saves ~20-40ms)
             from telegram import Update
@@ -1414,21 +1648,23 @@ async def startup_event():
             ]
             logger.info(f"⚡ Optimized: Only accepting {len(allowed_update_types)} update types")
             
+            # Outbound scheduler - every Bot API call is rate limited by priority lane
+            outbound_scheduler = init_outbound_scheduler(**BotPerformanceConfig.get_outbound_scheduler_config())
+            
             application = (
                 Application.builder()
                 .token(TELEGRAM_BOT_TOKEN)
-                .persistence(persistence)  # DictPersistence for webhook mode - preserves conversation state
+                .persistence(persistence)  # MongoDB write-behind persistence - preserves conversation state
                 .concurrent_updates(True)  # Allow concurrent updates for better performance in webhook mode
                 .connect_timeout(app_settings['connect_timeout'])  # Fast connection
                 .read_timeout(app_settings['read_timeout'])   # Optimized read timeout
                 .write_timeout(app_settings['write_timeout'])  # Reliable message delivery
                 .pool_timeout(app_settings['pool_timeout'])    # Connection pool optimization
-                # Keep default rate limiter to prevent Telegram ban
+                .rate_limiter(outbound_scheduler)  # Priority lanes + token buckets for every Bot API call
                 .build()
             )
             
-            logger.info("✅ Application built with DictPersistence for webhook mode")
-            logger.info("🔧 CRITICAL FIX: DictPersistence preserves conversation state between HTTP requests")
+            logger.info("✅ Application built with write-behind MongoDB persistence")
             
             # CRITICAL: Update global bot_instance with the application's bot for notifications
             # Without this, notifications will NOT work!
@@ -1460,7 +1696,7 @@ async def startup_event():
                 per_message=False,  # False is correct: we use MessageHandler (not only CallbackQueryHandler)
                 allow_reentry=True,
                 name='template_rename_conversation',
-                persistent=True  # Enabled: Using DictPersistence
+                persistent=True  # Enabled: Using WriteBehindMongoDBPersistence
             )
             
             # Import order conversation handler from modular setup
@@ -1509,7 +1745,7 @@ async def startup_event():
                     CommandHandler('start', start_command)
                 ],
                 name='refund_conversation',
-                persistent=True,  # Enabled: Using DictPersistence
+                persistent=True,  # Enabled: Using WriteBehindMongoDBPersistence
                 per_chat=True,
                 per_user=True,
                 allow_reentry=True
@@ -1590,9 +1826,28 @@ async def startup_event():
                     logger.error(f"Failed to notify admin about error: {notify_error}")
             
             application.add_error_handler(global_error_handler)
+            
+            # Bounded user_data: idle users are evicted to MongoDB and restored on next update
+            from utils.user_data_eviction import init_user_data_evictor
+            user_data_evictor = init_user_data_evictor(
+                application,
+                persistence,
+                **BotPerformanceConfig.get_user_data_eviction_config()
+            )
+            user_data_evictor.install()
 
             await application.initialize()
             await application.start()
+            user_data_evictor.start()
+            
+            # Broadcast engine - resume broadcasts interrupted by a restart
+            from services.broadcast_service import init_broadcast_engine
+            broadcast_engine = init_broadcast_engine(
+                db,
+                application.bot,
+                **BotPerformanceConfig.get_broadcast_config()
+            )
+            await broadcast_engine.resume_unfinished()
             
             # Set bot commands for menu button
             commands = [
@@ -1640,6 +1895,27 @@ async def startup_event():
                 
                 logger.info(f"✅ Webhook set successfully: {webhook_url}")
                 
+                # Shared update_id index for multi-worker deployments
+                dedup_config = BotPerformanceConfig.get_update_dedup_config()
+                if dedup_config['shared_store']:
+                    from utils.update_deduplicator import update_deduplicator
+                    await update_deduplicator.enable_shared_store(db)
+                
+                # Start update inbox: webhook acks immediately, workers process in background
+                from services.update_inbox import init_update_inbox
+                
+                async def process_raw_update(update_data):
+                    update = Update.de_json(update_data, application.bot)
+                    if update:
+                        await application.process_update(update)
+                
+                update_inbox = init_update_inbox(
+                    db,
+                    process_raw_update,
+                    **BotPerformanceConfig.get_update_inbox_config()
+                )
+                await update_inbox.start()
+                
             else:
                 # Polling mode
                 logger.info("🔄 POLLING MODE")
@@ -1665,6 +1941,10 @@ async def startup_event():
         logger.warning("Telegram Bot Token not configured. Bot features will be disabled.")
         logger.info("To enable Telegram Bot, add TELEGRAM_BOT_TOKEN to backend/.env")
     
+    # Payment follow-up and label pipeline workers (resumed ones notify users through application.bot)
+    await payment_webhooks.start()
+    await label_jobs.start()
+    
     # Final check: verify bot_instance is available
     if bot_instance:
         logger.info("✅✅✅ bot_instance is AVAILABLE and ready for notifications!")
@@ -1674,4 +1954,64 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_db_client():
     """Cleanup on shutdown"""
-    pass
+    # Save queued Telegram updates so they are processed after restart
+    from services.update_inbox import get_update_inbox
+    update_inbox = get_update_inbox()
+    if update_inbox:
+        await update_inbox.stop()
+    
+    # Running broadcasts keep their position and continue after restart
+    from services.broadcast_service import get_broadcast_engine
+    broadcast_engine = get_broadcast_engine()
+    if broadcast_engine:
+        await broadcast_engine.stop()
+    
+    from utils.user_data_eviction import get_user_data_evictor
+    user_data_evictor = get_user_data_evictor()
+    if user_data_evictor:
+        await user_data_evictor.stop()
+    
+    from services.carrier_catalog import get_carrier_catalog
+    carrier_catalog = get_carrier_catalog()
+    if carrier_catalog:
+        await carrier_catalog.stop()
+    
+    from services.payment_reconciler import get_payment_reconciler
+    payment_reconciler = get_payment_reconciler()
+    if payment_reconciler:
+        await payment_reconciler.stop()
+    
+    from services.payment_webhooks import get_payment_webhooks
+    payment_webhooks = get_payment_webhooks()
+    if payment_webhooks:
+        await payment_webhooks.stop()
+    
+    from services.balance_monitor import get_balance_monitor
+    balance_monitor = get_balance_monitor()
+    if balance_monitor:
+        await balance_monitor.stop()
+    
+    await repository_manager.users.ledger.stop()
+    
+    from services.thank_you_pool import thank_you_pool
+    await thank_you_pool.stop()
+    
+    label_jobs = get_label_jobs()
+    if label_jobs:
+        await label_jobs.stop()
+    
+    from services.label_archive import label_archive
+    await label_archive.stop()
+    
+    # Stop the bot: PTB flushes the write-behind persistence on stop
+    if application is not None and application.running:
+        try:
+            if application.updater and application.updater.running:
+                await application.updater.stop()
+            await application.stop()
+            await application.shutdown()
+        except Exception as e:
+            logger.error(f"Error stopping Telegram application: {e}")
+    
+    # Close shared HTTP pools after everything that may still call external APIs
+    await http_clients.close()
@@ -0,0 +1,299 @@
+"""
+Address Verification
+Background ShipStation address validation with a shared result cache
+
+Verification starts as soon as an address is complete (ZIP step or ZIP
+autofill) and runs while the user answers the next prompts. Results are
+cached by normalized address:
+- L1: bounded in-process LRU (read by the confirmation screen, no awaits)
+- L2: MongoDB address_cache collection with a TTL index, shared by all
+  workers - repeat senders never hit the API twice for the same address
+
+Only definitive answers are cached. validate_address_with_shipstation
+reports API errors (and an open circuit) as "valid, no correction"; those
+results are returned but not stored.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from config.performance_config import BotPerformanceConfig
+
+logger = logging.getLogger(__name__)
+
+# USPS suffix / unit abbreviations for cache keys
+ABBREVIATIONS = {
+    'STREET': 'ST', 'AVENUE': 'AVE', 'ROAD': 'RD', 'BOULEVARD': 'BLVD', 'DRIVE': 'DR',
+    'LANE': 'LN', 'COURT': 'CT', 'PLACE': 'PL', 'TERRACE': 'TER', 'PARKWAY': 'PKWY',
+    'HIGHWAY': 'HWY', 'CIRCLE': 'CIR', 'SQUARE': 'SQ', 'APARTMENT': 'APT', 'SUITE': 'STE',
+    'NORTH': 'N', 'SOUTH': 'S', 'EAST': 'E', 'WEST': 'W',
+}
+
+
+def _normalize_part(value: Any) -> str:
+    words = re.sub(r'[^\w\s]', ' ', str(value or '')).upper().split()
+    return ' '.join(ABBREVIATIONS.get(word, word) for word in words)
+
+
+def normalize_address(data: Dict[str, Any], prefix: str) -> Optional[Dict[str, str]]:
+    """
+    Normalized address from order data ('from' / 'to' fields)
+
+    Returns None while the address is incomplete.
+    """
+    address = {
+        'street1': _normalize_part(data.get(f'{prefix}_address') or data.get(f'{prefix}_street')),
+        'street2': _normalize_part(data.get(f'{prefix}_address2') or data.get(f'{prefix}_street2')),
+        'city': _normalize_part(data.get(f'{prefix}_city')),
+        'state': _normalize_part(data.get(f'{prefix}_state')),
+        'zip': str(data.get(f'{prefix}_zip') or '').strip()[:5],
+    }
+    if not all(address[field] for field in ('street1', 'city', 'state', 'zip')):
+        return None
+    return address
+
+
+def address_key(address: Dict[str, str]) -> str:
+    """Cache key for a normalized address"""
+    return hashlib.sha1(json.dumps(address, sort_keys=True).encode()).hexdigest()
+
+
+def _corrections(address: Dict[str, str], corrected: Dict[str, Any]) -> Dict[str, str]:
+    """Fields where ShipStation's address differs from the entered one"""
+    suggested = {
+        'street1': _normalize_part(corrected.get('address_line1') or corrected.get('street1')),
+        'city': _normalize_part(corrected.get('city_locality') or corrected.get('city')),
+        'state': _normalize_part(corrected.get('state_province') or corrected.get('state')),
+        'zip': str(corrected.get('postal_code') or corrected.get('postalCode') or '').strip()[:5],
+    }
+    return {field: value for field, value in suggested.items() if value and value != address[field]}
+
+
+class _Verification:
+    __slots__ = ('key', 'task')
+
+    def __init__(self, key: str, task: asyncio.Task):
+        self.key = key
+        self.task = task
+
+
+class AddressVerifier:
+    """Background address verification with L1/L2 result cache"""
+
+    def __init__(
+        self,
+        validator: Optional[Callable[..., Awaitable[Tuple[bool, Any]]]] = None,
+        ttl_days: int = 30,
+        max_concurrent: int = 5,
+        max_entries: int = 10000,
+        collection_name: str = 'address_cache'
+    ):
+        """
+        Args:
+            validator: Coroutine (name, street1, street2, city, state, zip_code) -> (is_valid, corrected_or_error)
+                       (default: services.api_services.validate_address_with_shipstation)
+            ttl_days: How long a verification result is reused
+            max_concurrent: Validation API calls in flight across all users
+            max_entries: L1 LRU size per process
+            collection_name: MongoDB collection for L2
+        """
+        self._validator = validator
+        self.ttl = timedelta(days=ttl_days)
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.max_entries = max_entries
+        self.collection_name = collection_name
+        self._collection = None
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._pending: Dict[Tuple[int, str], _Verification] = {}
+
+        self.scheduled = 0
+        self.api_calls = 0
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.not_cached = 0
+        self.errors = 0
+        self.shown_ready = 0
+        self.shown_pending = 0
+
+    async def init_storage(self, db) -> None:
+        """Connect the shared L2 (MongoDB; TTL index in utils/db_indexes.py)"""
+        self._collection = db[self.collection_name]
+        logger.info(f"✅ Address cache L2 enabled ({self.collection_name})")
+
+    def _remember(self, key: str, result: Dict[str, Any]) -> None:
+        self._cache[key] = result
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def _load_l2(self, key: str) -> Optional[Dict[str, Any]]:
+        if self._collection is None:
+            return None
+        try:
+            doc = await self._collection.find_one({'_id': key})
+        except Exception as e:
+            logger.warning(f"Address cache L2 read failed: {e}")
+            return None
+        return doc['result'] if doc else None
+
+    async def _store_l2(self, key: str, result: Dict[str, Any]) -> None:
+        if self._collection is None:
+            return
+        now = datetime.now(timezone.utc)
+        try:
+            await self._collection.replace_one(
+                {'_id': key},
+                {'_id': key, 'result': result, 'created_at': now, 'expires_at': now + self.ttl},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Address cache L2 write failed: {e}")
+
+    async def _validate(self, name: str, raw: Dict[str, str]) -> Tuple[bool, Any]:
+        validator = self._validator
+        if validator is None:
+            from services.api_services import validate_address_with_shipstation
+            validator = validate_address_with_shipstation
+        return await validator(name, raw['street1'], raw['street2'], raw['city'], raw['state'], raw['zip'])
+
+    async def verify(self, data: Dict[str, Any], prefix: str) -> Optional[Dict[str, Any]]:
+        """
+        Verify an address (cache first)
+
+        Returns:
+            {'status': 'valid' | 'corrected' | 'invalid', 'message', 'corrections'}
+            or None if the address is incomplete or could not be checked
+        """
+        address = normalize_address(data, prefix)
+        if address is None:
+            return None
+        key = address_key(address)
+
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+            self.l1_hits += 1
+            return result
+        result = await self._load_l2(key)
+        if result is not None:
+            self.l2_hits += 1
+            self._remember(key, result)
+            return result
+
+        raw = {
+            'street1': data.get(f'{prefix}_address') or data.get(f'{prefix}_street') or '',
+            'street2': data.get(f'{prefix}_address2') or data.get(f'{prefix}_street2') or '',
+            'city': data.get(f'{prefix}_city', ''),
+            'state': data.get(f'{prefix}_state', ''),
+            'zip': data.get(f'{prefix}_zip', ''),
+        }
+        async with self._semaphore:
+            self.api_calls += 1
+            is_valid, details = await self._validate(data.get(f'{prefix}_name', ''), raw)
+
+        if not is_valid:
+            result = {'status': 'invalid', 'message': details, 'corrections': {}}
+        elif isinstance(details, dict):
+            corrections = _corrections(address, details)
+            result = {'status': 'corrected' if corrections else 'valid', 'message': None, 'corrections': corrections}
+        else:
+            # API error / not configured / circuit open - no verdict to cache
+            self.not_cached += 1
+            return None
+
+        self._remember(key, result)
+        await self._store_l2(key, result)
+        return result
+
+    async def _run(self, data: Dict[str, Any], prefix: str) -> Optional[Dict[str, Any]]:
+        try:
+            return await self.verify(data, prefix)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Address verification failed: {e}")
+            return None
+
+    def schedule(self, user_id: int, prefix: str, data: Dict[str, Any]) -> bool:
+        """
+        Start verifying the user's current address in the background
+
+        Returns True if a new verification was started.
+        """
+        address = normalize_address(data, prefix)
+        if address is None:
+            return False
+        key = address_key(address)
+        current = self._pending.get((user_id, prefix))
+        if current is not None and current.key == key:
+            return False
+
+        task = asyncio.create_task(self._run(dict(data), prefix))
+        self._pending.pop((user_id, prefix), None)
+        self._pending[(user_id, prefix)] = _Verification(key, task)
+        self.scheduled += 1
+        self._trim()
+        return True
+
+    def _trim(self) -> None:
+        """Forget finished verifications of users who never reached confirmation"""
+        for pending_key in list(self._pending):
+            if len(self._pending) <= self.max_entries:
+                break
+            if self._pending[pending_key].task.done():
+                del self._pending[pending_key]
+
+    def peek(self, user_id: int, prefix: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Result for the confirmation screen without waiting
+
+        Returns the cached / finished result, or None while verification is
+        still running (it is started now if it never was).
+        """
+        address = normalize_address(data, prefix)
+        if address is None:
+            return None
+        key = address_key(address)
+
+        result = self._cache.get(key)
+        if result is None:
+            current = self._pending.get((user_id, prefix))
+            if current is not None and current.key == key and current.task.done() and not current.task.cancelled():
+                result = current.task.result()
+            elif current is None or current.key != key:
+                self.schedule(user_id, prefix, data)
+
+        if result is None:
+            self.shown_pending += 1
+        else:
+            self.shown_ready += 1
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache efficiency and readiness at the confirmation screen"""
+        lookups = self.l1_hits + self.l2_hits + self.api_calls
+        shown = self.shown_ready + self.shown_pending
+        return {
+            'cache_size': len(self._cache),
+            'l2_enabled': self._collection is not None,
+            'scheduled': self.scheduled,
+            'in_flight': sum(1 for v in self._pending.values() if not v.task.done()),
+            'api_calls': self.api_calls,
+            'l1_hits': self.l1_hits,
+            'l2_hits': self.l2_hits,
+            'cache_hit_rate': f"{((lookups - self.api_calls) / lookups * 100) if lookups else 0:.1f}%",
+            'not_cached': self.not_cached,
+            'errors': self.errors,
+            'ready_at_confirmation': f"{(self.shown_ready / shown * 100) if shown else 0:.1f}%",
+        }
+
+
+# Global instance
+# L2 is connected in server.py startup: await address_verifier.init_storage(db)
+address_verifier = AddressVerifier(**BotPerformanceConfig.get_address_verification_config())
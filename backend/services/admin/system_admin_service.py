@@ -193,54 +193,34 @@ class SystemAdminService:
     
     
     @staticmethod
-    async def check_shipstation_balance() -> Dict:
+    async def check_shipstation_balance(refresh: bool = False) -> Dict:
         """
         Check ShipStation account balance
         
+        Served from the balance monitor cache (services/balance_monitor.py).
+        
+        Args:
+            refresh: Fetch a fresh value from ShipStation first
+        
         Returns:
             Balance information
         """
-        import os
-        import aiohttp
-        import base64
+        from services.balance_monitor import get_balance_monitor
         
         try:
-            api_key = os.environ.get('SHIPSTATION_API_KEY')
-            api_secret = os.environ.get('SHIPSTATION_API_SECRET')
+            balance_monitor = get_balance_monitor()
+            if balance_monitor is None:
+                return {"success": False, "error": "Balance monitor is not running"}
             
-            if not api_key or not api_secret:
-                return {"error": "ShipStation credentials not configured"}
+            balance = await balance_monitor.get_balance(refresh=refresh)
+            if balance["balance"] is None:
+                return {"success": False, "error": "ShipStation balance unavailable"}
             
-            # Create basic auth
-            credentials = f"{api_key}:{api_secret}"
-            encoded = base64.b64encode(credentials.encode()).decode()
-            
-            headers = {
-                "Authorization": f"Basic {encoded}",
-                "Content-Type": "application/json"
+            return {
+                "success": True,
+                "data": balance,
+                "timestamp": datetime.now(timezone.utc).isoformat()
             }
-            
-            # Check account info (balance not directly available in API)
-            # This is a placeholder - actual implementation depends on ShipStation API
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    "https://ssapi.shipstation.com/accounts/listaccounts",
-                    headers=headers,
-                    timeout=aiohttp.ClientTimeout(total=10)
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return {
-                            "success": True,
-                            "data": data,
-                            "timestamp": datetime.now(timezone.utc).isoformat()
-                        }
-                    else:
-                        error_text = await response.text()
-                        return {
-                            "success": False,
-                            "error": f"API returned {response.status}: {error_text}"
-                        }
         
         except Exception as e:
             logger.error(f"Error checking ShipStation balance: {e}")
@@ -6,6 +6,8 @@ import logging
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timezone
 
+from repositories.balance_ledger import BalanceLedger
+
 logger = logging.getLogger(__name__)
 
 
@@ -192,26 +194,18 @@ class UserAdminService:
             Tuple of (success, new_balance, error)
         """
         try:
+            # Recorded in balance_ledger
+            ledger = BalanceLedger(db)
             if operation == "add":
-                result = await db.users.update_one(
-                    {"telegram_id": telegram_id},
-                    {"$inc": {"balance": amount}}
-                )
+                new_balance = await ledger.apply(telegram_id, amount, "admin", require_funds=False)
             else:  # set
-                result = await db.users.update_one(
-                    {"telegram_id": telegram_id},
-                    {"$set": {"balance": amount}}
-                )
+                new_balance = await ledger.set_balance(telegram_id, amount, "admin_set")
             
-            if result.modified_count > 0:
+            if new_balance is not None:
                 # ⚠️ CRITICAL: Clear cache after balance update!
                 from utils.simple_cache import clear_user_cache
                 clear_user_cache(telegram_id)
                 logger.info(f"🗑️ Cleared cache for user {telegram_id} after balance update")
-                
-                # Get new balance
-                user = await db.users.find_one({"telegram_id": telegram_id}, {"balance": 1})
-                new_balance = user.get("balance", 0)
                 return True, new_balance, None
             else:
                 return False, 0, "User not found"
@@ -5,12 +5,20 @@ Handles communication with ShipStation, Oxapay, and other external services
 import os
 import logging
 import time
-import httpx
+from utils.http_clients import get_http_client
 from fastapi import HTTPException
-from utils.retry_utils import retry_on_api_error
+from utils.retry_utils import retry_on_api_error, SHIPSTATION_CIRCUIT, CircuitOpenError
+from utils.single_flight import single_flight
+from utils.hedging import get_hedger
 
 logger = logging.getLogger(__name__)
 
+
+def is_outage_response(response) -> bool:
+    """ShipStation response that counts against SHIPSTATION_CIRCUIT (5xx / 429)"""
+    return response.status_code >= 500 or response.status_code == 429
+
+
 # Configuration from environment
 OXAPAY_API_KEY = os.environ.get('OXAPAY_API_KEY', '')
 OXAPAY_API_URL = 'https://api.oxapay.com'
@@ -57,12 +65,12 @@ async def create_oxapay_invoice(amount: float, order_id: str, description: str =
         
         # Profile Oxapay API call (now truly async!)
         api_start_time = time.perf_counter()
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{OXAPAY_API_URL}/v1/payment/invoice",
-                json=payload,
-                headers=headers
-            )
+        client = get_http_client('oxapay')
+        response = await client.post(
+            f"{OXAPAY_API_URL}/v1/payment/invoice",
+            json=payload,
+            headers=headers
+        )
         api_duration_ms = (time.perf_counter() - api_start_time) * 1000
         logger.info(f"⚡ Oxapay create invoice API took {api_duration_ms:.2f}ms")
         
@@ -106,12 +114,12 @@ async def check_oxapay_payment(track_id: str):
             "trackId": track_id
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{OXAPAY_API_URL}/v1/payment/info",
-                json=payload,
-                headers=headers
-            )
+        client = get_http_client('oxapay')
+        response = await client.post(
+            f"{OXAPAY_API_URL}/v1/payment/info",
+            json=payload,
+            headers=headers
+        )
         
         if response.status_code == 200:
             data = response.json()
@@ -124,6 +132,7 @@ async def check_oxapay_payment(track_id: str):
         return None
 
 
+@single_flight('shipstation_balance')
 async def check_shipstation_balance():
     """Check ShipStation account balance"""
     try:
@@ -149,11 +158,15 @@ async def check_shipstation_balance():
             "Content-Type": "application/json"
         }
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
+        client = get_http_client('shipstation')
+        response = await SHIPSTATION_CIRCUIT.call(
+            lambda: client.get(
                 'https://api.shipstation.com/v2/account',
-                headers=headers
-            )
+                headers=headers,
+                timeout=10.0
+            ),
+            is_failure=is_outage_response
+        )
         
         if response.status_code == 200:
             account_data = response.json()
@@ -164,11 +177,15 @@ async def check_shipstation_balance():
             logger.error(f"Failed to check balance: {response.status_code} - {response.text}")
             return {"success": False, "error": f"Status {response.status_code}"}
             
+    except CircuitOpenError as e:
+        logger.warning(f"Balance check skipped: {e}")
+        return {"success": False, "error": str(e)}
     except Exception as e:
         logger.error(f"Balance check error: {e}")
         return {"success": False, "error": str(e)}
 
 
+@single_flight('shipstation_carriers')
 @retry_on_api_error(max_attempts=2, min_wait=1, max_wait=5)
 async def get_shipstation_carrier_ids():
     """
@@ -195,11 +212,17 @@ async def get_shipstation_carrier_ids():
         logger.info("   URL: https://api.shipstation.com/v2/carriers")
         logger.info(f"   API Key (first 10 chars): {api_key[:10]}...")
         
-        async with httpx.AsyncClient(timeout=30.0) as client:  # Increased timeout to 30 sec
-            response = await client.get(
-                'https://api.shipstation.com/v2/carriers',
-                headers=headers
-            )
+        client = get_http_client('shipstation')
+        response = await SHIPSTATION_CIRCUIT.call(
+            lambda: get_hedger('shipstation_carriers').call(
+                lambda: client.get(
+                    'https://api.shipstation.com/v2/carriers',
+                    headers=headers
+                ),
+                is_success=lambda r: r.status_code == 200
+            ),
+            is_failure=is_outage_response
+        )
         
         logger.info(f"📡 ShipStation carriers response: status={response.status_code}")
         logger.info(f"📡 Response body (first 200 chars): {response.text[:200]}")
@@ -235,11 +258,15 @@ async def get_shipstation_carrier_ids():
             logger.error(f"   Response body: {response.text[:1000]}")
             return {}
             
+    except CircuitOpenError as e:
+        logger.warning(f"⚠️ Carriers not loaded: {e}")
+        return {}
     except Exception as e:
         logger.error(f"❌ Error getting ShipStation carriers: {e}", exc_info=True)
         return {}
 
 
+@single_flight('shipstation_address_validation')
 async def validate_address_with_shipstation(name, street1, street2, city, state, zip_code):
     """
     Validate address with ShipStation API
@@ -268,12 +295,19 @@ async def validate_address_with_shipstation(name, street1, street2, city, state,
             "country": "US"
         }
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                'https://api.shipstation.com/v2/addresses/validate',
-                json=payload,
-                headers=headers
-            )
+        client = get_http_client('shipstation')
+        response = await SHIPSTATION_CIRCUIT.call(
+            lambda: get_hedger('shipstation_address_validation').call(
+                lambda: client.post(
+                    'https://api.shipstation.com/v2/addresses/validate',
+                    json=payload,
+                    headers=headers,
+                    timeout=10.0
+                ),
+                is_success=lambda r: r.status_code == 200
+            ),
+            is_failure=is_outage_response
+        )
         
         if response.status_code == 200:
             data = response.json()
@@ -293,6 +327,9 @@ async def validate_address_with_shipstation(name, street1, street2, city, state,
             logger.warning(f"Address validation failed: {response.status_code}")
             return True, None
             
+    except CircuitOpenError:
+        # Don't block user while ShipStation is down
+        return True, None
     except Exception as e:
         logger.error(f"Address validation error: {e}")
         # Don't block user on API errors
@@ -0,0 +1,245 @@
+"""
+Balance Monitor
+Cached ShipStation account balance with debounced refresh
+
+Every purchased label used to trigger its own /v2/account call. The monitor
+instead keeps the last fetched balance and estimates it locally between
+refreshes by subtracting the ShipStation price (original_amount) of each
+label bought since. The API is called:
+- on a schedule (refresh_interval)
+- once per debounce window after purchases (a burst of labels = one call)
+- when an admin explicitly asks for a fresh value
+
+Low-balance alerts fire once when the estimate drops below the threshold and
+re-arm after a refresh shows the balance back above it.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BalanceMonitor:
+    """Last known ShipStation balance plus local spend estimate"""
+
+    def __init__(
+        self,
+        fetcher: Optional[Callable[[], Awaitable[Dict[str, Any]]]] = None,
+        on_low_balance: Optional[Callable[[float], Awaitable[Any]]] = None,
+        refresh_interval: float = 900,
+        debounce_seconds: float = 30,
+        low_balance_threshold: float = 50,
+    ):
+        """
+        Args:
+            fetcher: Coroutine returning {'success', 'balance'}
+                     (default: services.api_services.check_shipstation_balance)
+            on_low_balance: Coroutine called with the balance when it drops below the threshold
+            refresh_interval: Seconds between scheduled refreshes
+            debounce_seconds: Purchases within this window share one refresh
+            low_balance_threshold: Alert below this balance (USD)
+        """
+        self._fetcher = fetcher
+        self._on_low_balance = on_low_balance
+        self.refresh_interval = refresh_interval
+        self.debounce_seconds = debounce_seconds
+        self.low_balance_threshold = low_balance_threshold
+
+        self._balance: Optional[float] = None
+        self._updated_at: Optional[datetime] = None
+        self._test_mode = False
+        # Label prices not yet reflected in the fetched balance
+        self._pending: List[float] = []
+        self._alerted = False
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self._refreshes = 0
+        self._failures = 0
+        self._triggers = 0
+        self._coalesced = 0
+        self._served = 0
+        self._alerts = 0
+        self._last_error: Optional[str] = None
+
+    async def _fetch(self) -> Dict[str, Any]:
+        if self._fetcher is not None:
+            return await self._fetcher()
+        from services.api_services import check_shipstation_balance
+        return await check_shipstation_balance()
+
+    @property
+    def balance(self) -> Optional[float]:
+        """Estimated balance: last fetched value minus labels bought since"""
+        if self._balance is None:
+            return None
+        return round(self._balance - sum(self._pending), 2)
+
+    async def refresh(self) -> bool:
+        """
+        Fetch the balance from ShipStation
+
+        Concurrent callers share one fetch. Returns True if the balance was updated.
+        """
+        async with self._lock:
+            # Purchases recorded after this point may not be in the response yet
+            reflected = len(self._pending)
+            try:
+                result = await self._fetch()
+                error = None if result.get('success') else result.get('error', 'unknown error')
+            except Exception as e:
+                result, error = {}, f"{type(e).__name__}: {e}"
+
+            if error:
+                self._failures += 1
+                self._last_error = error
+                logger.warning(f"⚠️ Balance refresh failed ({error}), serving estimate")
+                return False
+
+            self._balance = float(result.get('balance', 0))
+            self._test_mode = bool(result.get('test_mode'))
+            self._updated_at = datetime.now(timezone.utc)
+            del self._pending[:reflected]
+            self._refreshes += 1
+            self._last_error = None
+            if self.balance >= self.low_balance_threshold:
+                self._alerted = False
+        await self._check_low_balance()
+        return True
+
+    async def get_balance(self, refresh: bool = False) -> Dict[str, Any]:
+        """
+        Balance snapshot for alerts and the admin panel
+
+        Served from memory; fetches inline only when asked to or when nothing
+        has been fetched yet.
+        """
+        if refresh or self._balance is None:
+            await self.refresh()
+        self._served += 1
+        return self.snapshot()
+
+    async def record_purchase(self, amount: Optional[float]) -> None:
+        """
+        Account for a purchased label and schedule a (debounced) refresh
+
+        Args:
+            amount: ShipStation price of the label (original_amount)
+        """
+        try:
+            amount = float(amount or 0)
+        except (TypeError, ValueError):
+            amount = 0.0
+        if amount > 0 and self._balance is not None:
+            self._pending.append(amount)
+        self.trigger()
+        await self._check_low_balance()
+
+    def trigger(self) -> None:
+        """Request a refresh; triggers within debounce_seconds are coalesced"""
+        self._triggers += 1
+        if self._wake.is_set():
+            self._coalesced += 1
+        self._wake.set()
+
+    async def _check_low_balance(self) -> None:
+        balance = self.balance
+        if balance is None or self._test_mode or self._alerted:
+            return
+        if balance >= self.low_balance_threshold:
+            return
+        self._alerted = True
+        self._alerts += 1
+        logger.warning(f"💸 ShipStation balance low: ${balance:.2f}")
+        if self._on_low_balance:
+            try:
+                await self._on_low_balance(balance)
+            except Exception as e:
+                logger.error(f"Low balance alert failed: {e}")
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.refresh_interval)
+                # Let the rest of a purchase burst arrive before calling the API
+                await asyncio.sleep(self.debounce_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Balance refresh loop error: {e}")
+
+    async def start(self) -> None:
+        """Fetch the balance and start background refresh"""
+        self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+        logger.info(
+            f"✅ Balance monitor started (refresh every {self.refresh_interval}s, "
+            f"debounce {self.debounce_seconds}s)"
+        )
+
+    async def stop(self) -> None:
+        """Stop background refresh"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current balance estimate"""
+        age = None
+        if self._updated_at:
+            age = round((datetime.now(timezone.utc) - self._updated_at).total_seconds(), 1)
+        return {
+            'balance': self.balance,
+            'fetched_balance': self._balance,
+            'pending_labels': len(self._pending),
+            'pending_amount': round(sum(self._pending), 2),
+            'estimated': bool(self._pending),
+            'test_mode': self._test_mode,
+            'low_balance': self.balance is not None and self.balance < self.low_balance_threshold,
+            'threshold': self.low_balance_threshold,
+            'updated_at': self._updated_at.isoformat() if self._updated_at else None,
+            'age_seconds': age,
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Balance snapshot and refresh counters"""
+        return {
+            **self.snapshot(),
+            'refreshes': self._refreshes,
+            'failures': self._failures,
+            'last_error': self._last_error,
+            'triggers': self._triggers,
+            'coalesced': self._coalesced,
+            'served': self._served,
+            'alerts': self._alerts,
+            'running': self._task is not None and not self._task.done(),
+        }
+
+
+# Global instance (initialized in server.py startup)
+_balance_monitor: Optional[BalanceMonitor] = None
+
+
+def init_balance_monitor(**kwargs) -> BalanceMonitor:
+    """Create the global balance monitor"""
+    global _balance_monitor
+    _balance_monitor = BalanceMonitor(**kwargs)
+    return _balance_monitor
+
+
+def get_balance_monitor() -> Optional[BalanceMonitor]:
+    """Get the global balance monitor (None if not initialized)"""
+    return _balance_monitor
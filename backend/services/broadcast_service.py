@@ -0,0 +1,401 @@
+"""
+Broadcast Service
+Persistent, resumable broadcast jobs
+
+A broadcast is stored as a job document; the admin request only creates it.
+The engine streams the audience from MongoDB in telegram_id order (keyset
+pagination, one batch in memory at a time), sends each batch concurrently
+through the outbound scheduler's broadcast lane and records per-recipient
+outcomes with bulk_write. The job keeps the last processed telegram_id, so
+after a crash it continues from there; at most the batch that was in flight
+is re-sent.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from middleware.rate_limiter import LANE_BROADCAST, outbound_lane
+
+logger = logging.getLogger(__name__)
+
+TARGETS = ('all', 'active', 'premium')
+
+# Errors that mean the user can not receive messages anymore
+_BLOCKED_MARKERS = ('chat not found', 'bot was blocked', 'user is deactivated')
+
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+
+class BroadcastEngine:
+    """
+    Runs broadcast jobs in the background
+
+    Usage:
+        engine = BroadcastEngine(db, bot)
+        job = await engine.create_job(message, target='all')
+        engine.start_job(job['_id'])
+        progress = await engine.get_progress(job['_id'])
+    """
+
+    def __init__(
+        self,
+        db,
+        bot,
+        concurrency: int = 25,
+        batch_size: int = 500,
+        lease_seconds: int = 60,
+        jobs_collection: str = 'broadcast_jobs',
+        deliveries_collection: str = 'broadcast_deliveries',
+    ):
+        """
+        Args:
+            db: MongoDB database
+            bot: Telegram bot (application.bot)
+            concurrency: Sends in flight at once (the scheduler enforces the rate)
+            batch_size: Recipients loaded and recorded per batch
+            lease_seconds: How long a worker owns a running job without progress
+            jobs_collection: Collection for job documents
+            deliveries_collection: Collection for per-recipient outcomes
+        """
+        self.db = db
+        self.bot = bot
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.lease = timedelta(seconds=lease_seconds)
+        self.jobs = db[jobs_collection]
+        self.deliveries = db[deliveries_collection]
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    # ------------------------------------------------------------------
+    # Jobs
+    # ------------------------------------------------------------------
+
+    async def audience_filter(self, target: str) -> Dict[str, Any]:
+        """MongoDB filter on users for a broadcast target"""
+        query: Dict[str, Any] = {'bot_blocked_by_user': {'$ne': True}}
+        if target == 'active':
+            # One distinct() instead of a lookup per order owner
+            owners = await self.db.orders.distinct('telegram_id')
+            query['telegram_id'] = {'$in': owners}
+        elif target == 'premium':
+            query['balance'] = {'$gt': 0}
+        elif target != 'all':
+            raise ValueError(f"Invalid target: {target}")
+        return query
+
+    async def create_job(
+        self,
+        message: str,
+        target: str = 'all',
+        image_url: Optional[str] = None,
+        file_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Store a new broadcast job
+
+        Returns:
+            dict: Job document (total is the audience size at creation time)
+        """
+        audience = await self.audience_filter(target)
+        total = await self.db.users.count_documents(audience)
+        job = {
+            '_id': uuid.uuid4().hex,
+            'status': JOB_PENDING,
+            'target': target,
+            'message': message,
+            'image_url': image_url,
+            'file_id': file_id,
+            'total': total,
+            'counts': {'sent': 0, 'failed': 0, 'blocked': 0},
+            'last_telegram_id': None,
+            'created_at': datetime.now(timezone.utc),
+            'started_at': None,
+            'finished_at': None,
+            'lease_owner': None,
+            'lease_until': None,
+        }
+        await self.jobs.insert_one(job)
+        logger.info(f"📢 Broadcast job {job['_id']} created: target={target}, recipients={total}")
+        return job
+
+    def start_job(self, job_id: str) -> asyncio.Task:
+        """Run a job in the background (no-op if it already runs here)"""
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            task = asyncio.create_task(self.run_job(job_id), name=f'broadcast-{job_id}')
+            self._tasks[job_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        return task
+
+    async def resume_unfinished(self) -> int:
+        """Restart jobs left pending/running by a previous process"""
+        jobs = await self.jobs.find(
+            {'status': {'$in': [JOB_PENDING, JOB_RUNNING]}},
+            {'_id': 1}
+        ).to_list(100)
+        for job in jobs:
+            self.start_job(job['_id'])
+        if jobs:
+            logger.warning(f"📢 Resuming {len(jobs)} unfinished broadcast jobs")
+        return len(jobs)
+
+    async def cancel_job(self, job_id: str) -> bool:
+        result = await self.jobs.update_one(
+            {'_id': job_id, 'status': {'$in': [JOB_PENDING, JOB_RUNNING]}},
+            {'$set': {'status': JOB_CANCELLED, 'finished_at': datetime.now(timezone.utc)}}
+        )
+        return result.modified_count > 0
+
+    async def _claim(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Take the job lease so only one worker sends it"""
+        now = datetime.now(timezone.utc)
+        return await self.jobs.find_one_and_update(
+            {
+                '_id': job_id,
+                'status': {'$in': [JOB_PENDING, JOB_RUNNING]},
+                '$or': [
+                    {'lease_owner': self.worker_id},
+                    {'lease_until': None},
+                    {'lease_until': {'$lt': now}},
+                ],
+            },
+            {'$set': {
+                'status': JOB_RUNNING,
+                'lease_owner': self.worker_id,
+                'lease_until': now + self.lease,
+            }}
+        )
+
+    async def run_job(self, job_id: str) -> None:
+        """Send a job to its audience, batch by batch"""
+        job = await self._claim(job_id)
+        if not job:
+            logger.info(f"📢 Broadcast job {job_id} is finished or owned by another worker")
+            return
+
+        if not job.get('started_at'):
+            await self.jobs.update_one({'_id': job_id}, {'$set': {'started_at': datetime.now(timezone.utc)}})
+
+        try:
+            audience = await self.audience_filter(job['target'])
+            last_id = job.get('last_telegram_id')
+
+            while True:
+                query = dict(audience)
+                if last_id is not None:
+                    query['$and'] = [{'telegram_id': {'$gt': last_id}}]
+                batch = await self.db.users.find(query, {'telegram_id': 1}).sort(
+                    'telegram_id', 1
+                ).limit(self.batch_size).to_list(self.batch_size)
+                if not batch:
+                    break
+
+                recipients = [user['telegram_id'] for user in batch]
+                job = await self._send_batch(job, recipients)
+                last_id = recipients[-1]
+
+                current = await self._checkpoint(job, last_id)
+                if not current or current['status'] != JOB_RUNNING or current.get('lease_owner') != self.worker_id:
+                    logger.warning(f"📢 Broadcast job {job_id} stopped (cancelled or taken over)")
+                    return
+
+            await self.jobs.update_one(
+                {'_id': job_id, 'status': JOB_RUNNING},
+                {'$set': {'status': JOB_COMPLETED, 'finished_at': datetime.now(timezone.utc), 'lease_until': None}}
+            )
+            final = await self.jobs.find_one({'_id': job_id})
+            logger.info(f"✅ Broadcast job {job_id} complete: {final['counts'] if final else {}}")
+        except asyncio.CancelledError:
+            # Shutdown: leave the job running, the lease expires and it is resumed
+            raise
+        except Exception as e:
+            logger.error(f"❌ Broadcast job {job_id} failed: {e}", exc_info=True)
+            await self.jobs.update_one(
+                {'_id': job_id},
+                {'$set': {'status': JOB_FAILED, 'error': str(e), 'finished_at': datetime.now(timezone.utc)}}
+            )
+
+    async def _checkpoint(self, job: Dict[str, Any], last_id: int) -> Optional[Dict[str, Any]]:
+        """Save the resume position and renew the lease"""
+        from pymongo import ReturnDocument
+
+        return await self.jobs.find_one_and_update(
+            {'_id': job['_id']},
+            {'$set': {
+                'last_telegram_id': last_id,
+                'file_id': job.get('file_id'),
+                'lease_until': datetime.now(timezone.utc) + self.lease,
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+
+    # ------------------------------------------------------------------
+    # Sending
+    # ------------------------------------------------------------------
+
+    async def _send_batch(self, job: Dict[str, Any], recipients: List[int]) -> Dict[str, Any]:
+        """Send to one batch concurrently and record outcomes in bulk"""
+        from pymongo import ReplaceOne
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        now = datetime.now(timezone.utc)
+
+        # Recipients already recorded for this job (resume after a crash mid-batch)
+        done = set(await self.deliveries.distinct(
+            'telegram_id', {'job_id': job['_id'], 'telegram_id': {'$in': recipients}}
+        ))
+
+        async def deliver(telegram_id: int):
+            async with semaphore:
+                return telegram_id, await self._send_one(job, telegram_id)
+
+        with outbound_lane(LANE_BROADCAST):
+            pending = [telegram_id for telegram_id in recipients if telegram_id not in done]
+            if pending and job.get('image_url') and not job.get('file_id'):
+                # First photo uploads the URL; the rest reuse Telegram's file_id
+                first = await deliver(pending[0])
+                outcomes = [first] + list(await asyncio.gather(*(deliver(t) for t in pending[1:])))
+            else:
+                outcomes = list(await asyncio.gather(*(deliver(t) for t in pending)))
+
+        counts = {'sent': 0, 'failed': 0, 'blocked': 0}
+        operations = []
+        blocked = []
+        for telegram_id, (status, error) in outcomes:
+            counts[status] += 1
+            if status == 'blocked':
+                blocked.append(telegram_id)
+            operations.append(ReplaceOne(
+                {'_id': f"{job['_id']}:{telegram_id}"},
+                {'job_id': job['_id'], 'telegram_id': telegram_id, 'status': status, 'error': error, 'at': now},
+                upsert=True
+            ))
+
+        if operations:
+            await self.deliveries.bulk_write(operations, ordered=False)
+        if blocked:
+            await self.db.users.update_many(
+                {'telegram_id': {'$in': blocked}},
+                {'$set': {'bot_blocked_by_user': True}}
+            )
+        await self.jobs.update_one(
+            {'_id': job['_id']},
+            {'$inc': {f'counts.{key}': value for key, value in counts.items()}}
+        )
+        return job
+
+    async def _send_one(self, job: Dict[str, Any], telegram_id: int) -> tuple:
+        """
+        Returns:
+            (status, error): status is 'sent', 'blocked' or 'failed'
+        """
+        try:
+            photo = job.get('file_id') or job.get('image_url')
+            if photo:
+                result = await self.bot.send_photo(chat_id=telegram_id, photo=photo, caption=job['message'])
+                if not job.get('file_id') and getattr(result, 'photo', None):
+                    job['file_id'] = result.photo[-1].file_id
+            else:
+                await self.bot.send_message(chat_id=telegram_id, text=job['message'])
+            return 'sent', None
+        except Forbidden as e:
+            return 'blocked', str(e)
+        except BadRequest as e:
+            if any(marker in str(e).lower() for marker in _BLOCKED_MARKERS):
+                return 'blocked', str(e)
+            return 'failed', str(e)
+        except RetryAfter as e:
+            # The scheduler already retried; count as failed instead of stalling the batch
+            return 'failed', str(e)
+        except TelegramError as e:
+            return 'failed', str(e)
+        except Exception as e:
+            logger.error(f"❌ Broadcast send to {telegram_id} failed: {e}")
+            return 'failed', str(e)
+
+    # ------------------------------------------------------------------
+    # Progress
+    # ------------------------------------------------------------------
+
+    async def get_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job status with processed count, throughput and ETA"""
+        job = await self.jobs.find_one({'_id': job_id})
+        if not job:
+            return None
+        return self._progress(job)
+
+    async def list_jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        jobs = await self.jobs.find({}).sort('created_at', -1).limit(limit).to_list(limit)
+        return [self._progress(job) for job in jobs]
+
+    @staticmethod
+    def _progress(job: Dict[str, Any]) -> Dict[str, Any]:
+        counts = job.get('counts', {})
+        processed = sum(counts.values())
+        total = job.get('total', 0)
+        rate = 0.0
+        eta_seconds = None
+
+        started_at = job.get('started_at')
+        if started_at:
+            if started_at.tzinfo is None:
+                started_at = started_at.replace(tzinfo=timezone.utc)
+            finished_at = job.get('finished_at') or datetime.now(timezone.utc)
+            if finished_at.tzinfo is None:
+                finished_at = finished_at.replace(tzinfo=timezone.utc)
+            elapsed = (finished_at - started_at).total_seconds()
+            if elapsed > 0 and processed:
+                rate = processed / elapsed
+            if job['status'] == JOB_RUNNING and rate:
+                eta_seconds = round(max(0, total - processed) / rate, 1)
+
+        return {
+            'job_id': job['_id'],
+            'status': job['status'],
+            'target': job.get('target'),
+            'total': total,
+            'processed': processed,
+            'success_count': counts.get('sent', 0),
+            'failed_count': counts.get('failed', 0),
+            'blocked_count': counts.get('blocked', 0),
+            'progress': round(processed / total * 100, 1) if total else 100.0,
+            'rate_per_second': round(rate, 2),
+            'eta_seconds': eta_seconds,
+            'created_at': job.get('created_at'),
+            'finished_at': job.get('finished_at'),
+            'error': job.get('error'),
+            'message': (job.get('message') or '')[:100],
+        }
+
+    async def stop(self) -> None:
+        """Cancel running jobs; they are resumed on next startup"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Global instance (initialized in server.py startup)
+_broadcast_engine: Optional[BroadcastEngine] = None
+
+
+def init_broadcast_engine(db, bot, **kwargs) -> BroadcastEngine:
+    """Create the global broadcast engine"""
+    global _broadcast_engine
+    _broadcast_engine = BroadcastEngine(db, bot, **kwargs)
+    return _broadcast_engine
+
+
+def get_broadcast_engine() -> Optional[BroadcastEngine]:
+    """Get the global broadcast engine (None if not initialized)"""
+    return _broadcast_engine
@@ -0,0 +1,226 @@
+"""
+Carrier Catalog
+Cached ShipStation carrier ids with background refresh
+
+Rate requests need the account's carrier ids. Instead of calling
+/v2/carriers before every /v2/rates request, the catalog keeps the last good
+snapshot in memory, persists it to MongoDB (so a cold process has carrier ids
+right after startup) and refreshes it in the background:
+- on a schedule (refresh_interval)
+- sooner after a failed refresh (exponential backoff from error_retry_interval)
+- on demand when a rate request reports an unknown carrier
+
+A failed or empty refresh never replaces the current snapshot.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ID = 'shipstation'
+
+
+class CarrierCatalog:
+    """In-memory carrier snapshot backed by MongoDB"""
+
+    def __init__(
+        self,
+        db,
+        fetcher: Optional[Callable[[], Awaitable[Dict[str, str]]]] = None,
+        refresh_interval: float = 3600,
+        error_retry_interval: float = 30,
+        max_error_retry_interval: float = 600,
+    ):
+        """
+        Args:
+            db: MongoDB database (snapshot stored in carrier_catalog collection)
+            fetcher: Coroutine returning {carrier_name: carrier_id}
+                     (default: services.api_services.get_shipstation_carrier_ids)
+            refresh_interval: Seconds between scheduled refreshes
+            error_retry_interval: First retry delay after a failed refresh
+            max_error_retry_interval: Backoff cap for repeated failures
+        """
+        self.db = db
+        self._fetcher = fetcher
+        self.refresh_interval = refresh_interval
+        self.error_retry_interval = error_retry_interval
+        self.max_error_retry_interval = max_error_retry_interval
+
+        self._carriers: Dict[str, str] = {}
+        self._updated_at: Optional[datetime] = None
+        self._source: Optional[str] = None
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self._refreshes = 0
+        self._failures = 0
+        self._consecutive_failures = 0
+        self._last_error: Optional[str] = None
+        self._served = 0
+        self._inline_loads = 0
+
+    async def _fetch(self) -> Dict[str, str]:
+        if self._fetcher is not None:
+            return await self._fetcher()
+        from services.api_services import get_shipstation_carrier_ids
+        return await get_shipstation_carrier_ids()
+
+    async def load_snapshot(self) -> bool:
+        """Load the persisted snapshot (startup). Returns True if one was found"""
+        try:
+            doc = await self.db.carrier_catalog.find_one({'_id': SNAPSHOT_ID})
+        except Exception as e:
+            logger.warning(f"Carrier catalog snapshot load failed: {e}")
+            return False
+        if not doc or not doc.get('carriers'):
+            return False
+        self._carriers = dict(doc['carriers'])
+        self._updated_at = doc.get('updated_at')
+        self._source = 'snapshot'
+        logger.info(f"📦 Carrier catalog loaded from snapshot: {len(self._carriers)} carriers")
+        return True
+
+    async def _save_snapshot(self) -> None:
+        try:
+            await self.db.carrier_catalog.update_one(
+                {'_id': SNAPSHOT_ID},
+                {'$set': {'carriers': self._carriers, 'updated_at': self._updated_at}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Carrier catalog snapshot save failed: {e}")
+
+    async def refresh(self) -> bool:
+        """
+        Fetch carriers from ShipStation and replace the snapshot
+
+        Concurrent callers share one fetch. Returns True if the snapshot was updated.
+        """
+        async with self._lock:
+            try:
+                carriers = await self._fetch()
+                error = None if carriers else 'empty carrier list'
+            except Exception as e:
+                carriers, error = {}, f"{type(e).__name__}: {e}"
+
+            if error:
+                self._failures += 1
+                self._consecutive_failures += 1
+                self._last_error = error
+                logger.warning(
+                    f"⚠️ Carrier catalog refresh failed ({error}), "
+                    f"serving {'last snapshot' if self._carriers else 'nothing'}"
+                )
+                return False
+
+            self._carriers = dict(carriers)
+            self._updated_at = datetime.now(timezone.utc)
+            self._source = 'api'
+            self._refreshes += 1
+            self._consecutive_failures = 0
+            self._last_error = None
+            await self._save_snapshot()
+            logger.info(f"📦 Carrier catalog refreshed: {len(self._carriers)} carriers")
+            return True
+
+    async def get_carrier_ids(self) -> Dict[str, str]:
+        """
+        Carrier ids {name: carrier_id}
+
+        Served from memory; only a process without any snapshot fetches inline.
+        """
+        if not self._carriers:
+            self._inline_loads += 1
+            await self.refresh()
+        self._served += 1
+        return dict(self._carriers)
+
+    def request_refresh(self) -> None:
+        """Refresh in the background as soon as possible (e.g. unknown carrier_id)"""
+        self._wake.set()
+
+    def _next_delay(self) -> float:
+        if self._consecutive_failures:
+            delay = self.error_retry_interval * (2 ** (self._consecutive_failures - 1))
+            return min(delay, self.max_error_retry_interval)
+        if self._source == 'snapshot' and self._updated_at:
+            updated_at = self._updated_at
+            if updated_at.tzinfo is None:
+                updated_at = updated_at.replace(tzinfo=timezone.utc)
+            age = (datetime.now(timezone.utc) - updated_at).total_seconds()
+            return max(0.0, self.refresh_interval - age)
+        return self.refresh_interval
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._next_delay())
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Carrier catalog refresh loop error: {e}")
+
+    async def start(self) -> None:
+        """Load the persisted snapshot and start background refresh"""
+        if not await self.load_snapshot():
+            # Nothing persisted yet - fetch right away in the background
+            self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+        logger.info(f"✅ Carrier catalog started (refresh every {self.refresh_interval}s)")
+
+    async def stop(self) -> None:
+        """Stop background refresh"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Catalog freshness and refresh counters"""
+        age = None
+        if self._updated_at:
+            updated_at = self._updated_at
+            if updated_at.tzinfo is None:
+                updated_at = updated_at.replace(tzinfo=timezone.utc)
+            age = round((datetime.now(timezone.utc) - updated_at).total_seconds(), 1)
+        return {
+            'carriers': len(self._carriers),
+            'source': self._source,
+            'updated_at': self._updated_at.isoformat() if self._updated_at else None,
+            'age_seconds': age,
+            'refreshes': self._refreshes,
+            'failures': self._failures,
+            'consecutive_failures': self._consecutive_failures,
+            'last_error': self._last_error,
+            'served': self._served,
+            'inline_loads': self._inline_loads,
+            'running': self._task is not None and not self._task.done(),
+        }
+
+
+# Global instance (initialized in server.py startup)
+_carrier_catalog: Optional[CarrierCatalog] = None
+
+
+def init_carrier_catalog(db, **kwargs) -> CarrierCatalog:
+    """Create the global carrier catalog"""
+    global _carrier_catalog
+    _carrier_catalog = CarrierCatalog(db, **kwargs)
+    return _carrier_catalog
+
+
+def get_carrier_catalog() -> Optional[CarrierCatalog]:
+    """Get the global carrier catalog (None if not initialized)"""
+    return _carrier_catalog
@@ -0,0 +1,377 @@
+"""
+Label Archive
+Content-addressed local store of label PDFs
+
+Labels otherwise exist only behind ShipStation label_download URLs. Every
+label is copied here once (last stage of the label pipeline, plus a backfill
+for older labels), so reprints and exports are served from local disk and
+keep working while ShipStation is down.
+
+Layout (files named by SHA-256 of the PDF, sharded two levels deep):
+    <root>/ab/cd/abcd....pdf        plain - served with FileResponse (sendfile)
+    <root>/ab/cd/abcd....pdf.zst    zstd  - streamed through a decompressor
+The shipping_labels document records {'archive': {sha256, size, ...}};
+identical PDFs share one file.
+
+zstd compression is optional (zstandard package); without it files are
+stored plain. Retention: files older than retention_days, then the oldest
+files above max_bytes, are evicted and their 'archive' field removed, so
+readers fall back to the ShipStation URL.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config.performance_config import BotPerformanceConfig
+from utils.http_clients import get_http_client
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+DEFAULT_ROOT = Path(__file__).resolve().parent.parent / 'data' / 'labels'
+
+
+class LabelArchive:
+    """Sharded, content-addressed PDF store"""
+
+    def __init__(
+        self,
+        root=None,
+        compress: bool = False,
+        retention_days: int = 400,
+        max_gb: float = 10,
+        max_concurrent: int = 4,
+        chunk_size: int = 64 * 1024,
+        maintenance_interval: int = 3600,
+        backfill_batch: int = 200,
+        backfill_attempts: int = 5,
+        backfill_retry_hours: float = 6,
+        collection_name: str = 'shipping_labels'
+    ):
+        """
+        Args:
+            root: Archive directory (default: LABEL_ARCHIVE_DIR env or data/labels)
+            compress: Store zstd-compressed (ignored if zstandard is not installed)
+            retention_days: Files older than this are evicted
+            max_gb: Archive size cap; oldest files are evicted above it
+            max_concurrent: Label downloads in flight
+            chunk_size: Bytes per streamed chunk
+            maintenance_interval: Seconds between eviction + backfill passes
+            backfill_batch: Labels archived per background backfill pass
+            backfill_attempts: Failed downloads before backfill gives up on a label
+                               (expired ShipStation URLs never come back)
+            backfill_retry_hours: Wait before retrying a failed label, doubled per attempt
+            collection_name: Label collection
+        """
+        self.root = Path(root or os.environ.get('LABEL_ARCHIVE_DIR') or DEFAULT_ROOT)
+        if compress and not ZSTD_AVAILABLE:
+            logger.warning("zstandard not installed - label archive stores plain PDFs")
+        self.compress = compress and ZSTD_AVAILABLE
+        self.retention_seconds = retention_days * 86400
+        self.max_bytes = int(max_gb * 1024 ** 3)
+        self.chunk_size = chunk_size
+        self.maintenance_interval = maintenance_interval
+        self.backfill_batch = backfill_batch
+        self.backfill_attempts = backfill_attempts
+        self.backfill_retry = timedelta(hours=backfill_retry_hours)
+        self.collection_name = collection_name
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._labels = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.stored = 0
+        self.deduplicated = 0
+        self.failures = 0
+        self.served = 0
+        self.misses = 0
+        self.evicted = 0
+        self.bytes_stored = 0
+
+    def init_storage(self, db) -> None:
+        """Connect the label collection the archive entries are recorded in"""
+        self._labels = db[self.collection_name]
+
+    # ==================== PATHS ====================
+
+    def path_for(self, sha256: str, compressed: bool) -> Path:
+        """Sharded file path for a content hash"""
+        suffix = '.pdf.zst' if compressed else '.pdf'
+        return self.root / sha256[:2] / sha256[2:4] / f"{sha256}{suffix}"
+
+    def locate(self, label: Dict[str, Any]) -> Optional[Path]:
+        """Archived file of a label, None if not archived (or evicted)"""
+        archive = label.get('archive')
+        if not archive:
+            return None
+        path = self.path_for(archive['sha256'], archive.get('compressed', False))
+        return path if path.exists() else None
+
+    # ==================== WRITE ====================
+
+    async def store(self, label: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Archive a label PDF (no-op if already archived)
+
+        Args:
+            label: shipping_labels document (order_id, label_url)
+
+        Returns:
+            The 'archive' entry, or None if the PDF could not be fetched
+        """
+        if self.locate(label):
+            return label['archive']
+        label_url = label.get('label_url')
+        if not label_url:
+            return None
+
+        async with self._semaphore:
+            try:
+                archive = await self._download(label_url)
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"Label archive: order {label.get('order_id')} not archived: {e}")
+                await self._record_failure(label)
+                return None
+
+        label['archive'] = archive
+        if self._labels is not None and label.get('order_id'):
+            await self._labels.update_one(
+                {'order_id': label['order_id']},
+                {'$set': {'archive': archive}, '$unset': {'archive_attempts': '', 'archive_retry_at': ''}}
+            )
+        return archive
+
+    async def _record_failure(self, label: Dict[str, Any]) -> None:
+        """Count a failed download and schedule the next backfill attempt"""
+        if self._labels is None or not label.get('order_id'):
+            return
+        attempts = (label.get('archive_attempts') or 0) + 1
+        now = datetime.now(timezone.utc)
+        await self._labels.update_one(
+            {'order_id': label['order_id']},
+            {'$set': {'archive_attempts': attempts,
+                      'archive_failed_at': now.isoformat(),
+                      'archive_retry_at': (now + self.backfill_retry * 2 ** (attempts - 1)).isoformat()}}
+        )
+
+    async def _download(self, label_url: str) -> Dict[str, Any]:
+        """Stream the PDF to a temp file while hashing, then move it into place"""
+        tmp_dir = self.root / 'tmp'
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = tmp_dir / uuid.uuid4().hex
+        digest = hashlib.sha256()
+        size = 0
+        compressor = zstandard.ZstdCompressor().compressobj() if self.compress else None
+
+        try:
+            client = get_http_client('labels')
+            with open(tmp_path, 'wb') as f:
+                async with client.stream('GET', label_url) as response:
+                    if response.status_code != 200:
+                        raise RuntimeError(f"HTTP {response.status_code}")
+                    async for chunk in response.aiter_bytes(self.chunk_size):
+                        digest.update(chunk)
+                        size += len(chunk)
+                        f.write(compressor.compress(chunk) if compressor else chunk)
+                if compressor:
+                    f.write(compressor.flush())
+            if not size:
+                raise RuntimeError("empty PDF")
+
+            sha256 = digest.hexdigest()
+            path = self.path_for(sha256, self.compress)
+            if path.exists():
+                # Same PDF already archived (content addressing)
+                self.deduplicated += 1
+                os.utime(path)
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, path)
+                self.stored += 1
+                self.bytes_stored += path.stat().st_size
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+        return {
+            'sha256': sha256,
+            'size': size,
+            'compressed': self.compress,
+            'archived_at': datetime.now(timezone.utc).isoformat(),
+        }
+
+    # ==================== READ ====================
+
+    def iter_pdf(self, path: Path) -> Iterator[bytes]:
+        """PDF bytes of an archived file in chunks (decompressing .zst)"""
+        with open(path, 'rb') as f:
+            if path.suffix == '.zst':
+                reader = zstandard.ZstdDecompressor().stream_reader(f)
+                while chunk := reader.read(self.chunk_size):
+                    yield chunk
+            else:
+                while chunk := f.read(self.chunk_size):
+                    yield chunk
+
+    def open_pdf(self, label: Dict[str, Any]):
+        """
+        Binary file object with the label PDF, None if not archived
+
+        Plain files are opened directly; compressed ones are decompressed
+        into a spooled temp file. The caller closes it.
+        """
+        path = self.locate(label)
+        if path is None:
+            self.misses += 1
+            return None
+        self.served += 1
+        if path.suffix != '.zst':
+            return open(path, 'rb')
+        spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        for chunk in self.iter_pdf(path):
+            spool.write(chunk)
+        spool.seek(0)
+        return spool
+
+    def record_hit(self, hit: bool) -> None:
+        """Count a reprint served from (or missing in) the archive"""
+        if hit:
+            self.served += 1
+        else:
+            self.misses += 1
+
+    # ==================== RETENTION / BACKFILL ====================
+
+    def _scan(self) -> List[Tuple[Path, os.stat_result]]:
+        files = []
+        for dirpath, _, filenames in os.walk(self.root):
+            if Path(dirpath).name == 'tmp':
+                continue
+            for name in filenames:
+                path = Path(dirpath) / name
+                try:
+                    files.append((path, path.stat()))
+                except FileNotFoundError:
+                    continue
+        return files
+
+    async def evict(self) -> int:
+        """
+        Apply the retention policy
+
+        Returns:
+            int: Number of files removed
+        """
+        files = await asyncio.to_thread(self._scan)
+        files.sort(key=lambda item: item[1].st_mtime)
+        cutoff = time.time() - self.retention_seconds
+        total = sum(stat.st_size for _, stat in files)
+
+        removed = []
+        for path, stat in files:
+            if stat.st_mtime >= cutoff and total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+            removed.append(path.name.split('.', 1)[0])
+
+        if removed and self._labels is not None:
+            await self._labels.update_many({'archive.sha256': {'$in': removed}}, {'$unset': {'archive': ''}})
+        self.evicted += len(removed)
+        if removed:
+            logger.info(f"🗑️ Label archive: {len(removed)} files evicted")
+        return len(removed)
+
+    async def backfill(self, limit: Optional[int] = None) -> int:
+        """
+        Archive labels created before the archive existed
+
+        Newest labels first. A label whose download failed is retried with
+        backoff and skipped after backfill_attempts failures, so dead
+        ShipStation URLs do not fill every batch.
+
+        Args:
+            limit: Max labels this pass (None = all)
+
+        Returns:
+            int: Number of labels archived
+        """
+        if self._labels is None:
+            return 0
+        now = datetime.now(timezone.utc).isoformat()
+        cursor = self._labels.find(
+            {'archive': {'$exists': False}, 'label_url': {'$nin': [None, '']},
+             '$and': [
+                 {'$or': [{'archive_attempts': {'$exists': False}},
+                          {'archive_attempts': {'$lt': self.backfill_attempts}}]},
+                 {'$or': [{'archive_retry_at': {'$exists': False}},
+                          {'archive_retry_at': {'$lte': now}}]},
+             ]},
+            {'_id': 0, 'order_id': 1, 'label_url': 1, 'archive_attempts': 1}
+        ).sort('created_at', -1)
+        labels = await cursor.to_list(limit)
+        results = await asyncio.gather(*(self.store(label) for label in labels))
+        archived = sum(1 for result in results if result)
+        if labels:
+            logger.info(f"📦 Label archive backfill: {archived}/{len(labels)} archived")
+        return archived
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.maintenance_interval)
+            try:
+                await self.evict()
+                await self.backfill(self.backfill_batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Label archive maintenance error: {e}")
+
+    async def start(self) -> None:
+        """Start periodic eviction + backfill"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        logger.info(f"✅ Label archive at {self.root} (zstd: {self.compress})")
+
+    async def stop(self) -> None:
+        """Stop background maintenance"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Archive counters"""
+        reads = self.served + self.misses
+        return {
+            'root': str(self.root),
+            'compressed': self.compress,
+            'stored': self.stored,
+            'deduplicated': self.deduplicated,
+            'bytes_stored': self.bytes_stored,
+            'failures': self.failures,
+            'served': self.served,
+            'misses': self.misses,
+            'hit_rate': f"{(self.served / reads * 100) if reads else 0:.1f}%",
+            'evicted': self.evicted,
+        }
+
+
+# Global archive (label collection connected in server.py startup)
+label_archive = LabelArchive(**BotPerformanceConfig.get_label_archive_config())
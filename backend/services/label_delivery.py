@@ -0,0 +1,203 @@
+"""
+Label Delivery
+Send label PDFs to Telegram without passing them through the bot
+
+Order of preference for every send:
+1. file_id   - label was uploaded before (reprint, admin copy, resend
+               after a crash): no download, no upload
+2. URL       - Telegram fetches the PDF from ShipStation itself
+               (sendDocument accepts HTTP URLs for PDF files)
+3. upload    - Telegram could not fetch the URL: the PDF is uploaded from
+               the local label archive, or else streamed in chunks into a
+               spooled temp file (disk above spool_max) and uploaded from there
+
+The file_id Telegram returns is stored on the shipping_labels document, so
+each label is transferred at most once.
+"""
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from telegram import InputFile
+
+from utils.hedging import LatencyWindow
+from utils.http_clients import get_http_client
+
+logger = logging.getLogger(__name__)
+
+MODES = ('file_id', 'url', 'upload')
+
+
+class LabelDelivery:
+    """Label PDF sends with Telegram file_id reuse"""
+
+    def __init__(self, chunk_size: int = 64 * 1024, spool_max: int = 256 * 1024, timeout: float = 30,
+                 collection_name: str = 'shipping_labels'):
+        """
+        Args:
+            chunk_size: Bytes per chunk when streaming the PDF
+            spool_max: Bytes kept in memory before the upload spills to disk
+            timeout: Label download timeout (upload fallback)
+            collection_name: Collection the file_id is recorded in
+        """
+        self.chunk_size = chunk_size
+        self.spool_max = spool_max
+        self.timeout = timeout
+        self.collection_name = collection_name
+        self._labels = None
+
+        self.sends = {mode: 0 for mode in MODES}
+        self.latency = {mode: LatencyWindow() for mode in MODES}
+        self.failures = 0
+        self.url_rejected = 0
+        self.bytes_uploaded = 0
+        self.bytes_saved = 0
+
+    def init_storage(self, db) -> None:
+        """Connect the collection used to record file_ids"""
+        self._labels = db[self.collection_name]
+
+    async def send(
+        self,
+        bot,
+        chat_id: int,
+        label: Dict[str, Any],
+        caption: str,
+        safe_telegram_call_func: Callable,
+        allow_upload: bool = True
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Send a label document
+
+        Args:
+            bot: Telegram bot
+            chat_id: Recipient chat
+            label: shipping_labels document (order_id, label_url, tracking_number, telegram_file_id)
+            caption: Document caption
+            safe_telegram_call_func: Safe telegram call wrapper
+            allow_upload: False = only send if a file_id is already known
+
+        Returns:
+            (success, error_message)
+        """
+        file_id = label.get('telegram_file_id')
+        if file_id:
+            start = time.perf_counter()
+            message = await safe_telegram_call_func(bot.send_document(chat_id=chat_id, document=file_id, caption=caption))
+            if message:
+                self._record('file_id', start, saved=label.get('file_size') or 0)
+                return True, None
+            logger.warning(f"Label file_id for order {label.get('order_id')} rejected, sending the PDF again")
+
+        if not allow_upload:
+            return False, "Label not uploaded yet"
+
+        label_url = label.get('label_url')
+        if not label_url:
+            self.failures += 1
+            return False, "Label URL not available"
+
+        start = time.perf_counter()
+        message = await safe_telegram_call_func(bot.send_document(chat_id=chat_id, document=label_url, caption=caption))
+        if message:
+            size = self._file_size(message)
+            self._record('url', start, saved=size)
+            await self._remember(label, message)
+            return True, None
+        self.url_rejected += 1
+
+        start = time.perf_counter()
+        filename = f"{label.get('tracking_number') or label.get('order_id')}.pdf"
+        try:
+            message, size = await self._upload(bot, chat_id, label, caption, filename, safe_telegram_call_func)
+        except Exception as e:
+            self.failures += 1
+            return False, f"Error sending label: {str(e)}"
+        if not message:
+            self.failures += 1
+            return False, "Error sending label: upload failed"
+        self.bytes_uploaded += size
+        self._record('upload', start)
+        await self._remember(label, message)
+        return True, None
+
+    async def _upload(self, bot, chat_id, label, caption, filename, safe_telegram_call_func):
+        """Upload from the local archive, else stream from label_url"""
+        from services.label_archive import label_archive
+        archived = label_archive.open_pdf(label)
+        if archived is not None:
+            with archived:
+                size = archived.seek(0, os.SEEK_END)
+                archived.seek(0)
+                message = await safe_telegram_call_func(bot.send_document(
+                    chat_id=chat_id,
+                    document=InputFile(archived, filename=filename),
+                    caption=caption
+                ))
+            return message, size
+
+        client = get_http_client('labels')
+        with tempfile.SpooledTemporaryFile(max_size=self.spool_max) as spool:
+            async with client.stream('GET', label['label_url'], timeout=self.timeout) as response:
+                if response.status_code != 200:
+                    raise RuntimeError(f"Failed to download label: HTTP {response.status_code}")
+                async for chunk in response.aiter_bytes(self.chunk_size):
+                    spool.write(chunk)
+            size = spool.tell()
+            spool.seek(0)
+            message = await safe_telegram_call_func(bot.send_document(
+                chat_id=chat_id,
+                document=InputFile(spool, filename=filename),
+                caption=caption
+            ))
+        return message, size
+
+    @staticmethod
+    def _file_size(message) -> int:
+        document = getattr(message, 'document', None)
+        return getattr(document, 'file_size', None) or 0
+
+    async def _remember(self, label: Dict[str, Any], message) -> None:
+        """Store the file_id so later sends skip the transfer"""
+        document = getattr(message, 'document', None)
+        if document is None or not label.get('order_id'):
+            return
+        fields = {'telegram_file_id': document.file_id, 'file_size': document.file_size}
+        label.update(fields)
+        if self._labels is None:
+            return
+        try:
+            await self._labels.update_one({'order_id': label['order_id']}, {'$set': fields})
+        except Exception as e:
+            logger.warning(f"Could not store label file_id for order {label['order_id']}: {e}")
+
+    def _record(self, mode: str, start: float, saved: int = 0) -> None:
+        self.sends[mode] += 1
+        self.latency[mode].add(time.perf_counter() - start)
+        self.bytes_saved += saved
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Sends per mode, latency and bytes kept off the bot"""
+        latency = {}
+        for mode, window in self.latency.items():
+            p50, p95 = window.percentile(50), window.percentile(95)
+            latency[mode] = {
+                'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+                'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+            }
+        total = sum(self.sends.values())
+        return {
+            'sends': dict(self.sends),
+            'file_id_reuse_rate': f"{(self.sends['file_id'] / total * 100) if total else 0:.1f}%",
+            'url_rejected': self.url_rejected,
+            'failures': self.failures,
+            'bytes_uploaded': self.bytes_uploaded,
+            'bytes_saved': self.bytes_saved,
+            'latency': latency,
+        }
+
+
+# Global instance (file_id storage connected in server.py startup)
+label_delivery = LabelDelivery()
@@ -0,0 +1,427 @@
+"""
+Label Jobs
+Durable label-purchase pipeline: purchase → persist → download → deliver → notify → archive
+
+One job per order in the label_jobs collection (_id = order_id is the
+idempotency key). The current stage is persisted after every step, so a
+crash or timeout resumes from the last finished stage instead of leaving a
+paid order unlabeled or buying the label twice:
+- jobs are claimed with a lease and a claim token; every write is
+  conditioned on the token, so two workers never run the same job
+- a lease left by a crashed process expires and any worker picks the job
+  up again (resume on startup)
+- purchase is write-ahead: if a previous attempt may have reached
+  ShipStation without a recorded result, the job stops for admin review
+  instead of buying again
+
+Payment webhooks only submit() the job and return. The balance payment flow
+charges first, so it uses run(..., until=...) to execute purchase + persist
+inline and leaves the rest to the workers; if the run does not get there,
+settlement() tells it whether to refund, hold for review or wait for the
+workers to finish a postponed job.
+Stage implementations live in server.py (LABEL_JOB_STAGES).
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('purchase', 'persist', 'download', 'deliver', 'notify', 'archive')
+DONE = 'done'
+FAILED = 'failed'
+
+
+class LabelJobRetry(Exception):
+    """Stage cannot run now (e.g. ShipStation circuit open) - retry later"""
+
+    def __init__(self, delay: float, reason: str = ''):
+        super().__init__(reason or f"retry in {delay:.0f}s")
+        self.delay = delay
+
+
+class LabelJobFailed(Exception):
+    """Stage failed permanently (notify=False: the inline caller reports it itself)"""
+
+    def __init__(
+        self, reason: str, user_message: Optional[str] = None, needs_review: bool = False, notify: bool = True
+    ):
+        super().__init__(reason)
+        self.user_message = user_message
+        self.needs_review = needs_review
+        self.notify = notify
+
+
+class LabelJobLost(Exception):
+    """Claim expired and the job was taken over by another worker"""
+
+
+class LabelJob:
+    """A claimed job as seen by a stage"""
+
+    def __init__(self, queue: 'LabelJobQueue', doc: Dict[str, Any], order: Dict[str, Any], message=None):
+        self.queue = queue
+        self.doc = doc
+        self.order = order
+        self.message = message  # Telegram message of an inline run (not persisted)
+
+    @property
+    def order_id(self) -> str:
+        return self.doc['_id']
+
+    @property
+    def telegram_id(self) -> int:
+        return self.doc['telegram_id']
+
+    @property
+    def stage(self) -> str:
+        return self.doc['stage']
+
+    async def save(self, **fields) -> None:
+        """Persist stage results (only while this claim is held)"""
+        await self.queue._save(self, fields)
+
+
+class LabelJobQueue:
+    """MongoDB-backed label pipeline with bounded workers"""
+
+    def __init__(
+        self,
+        db,
+        stages: Optional[Sequence[Tuple[str, Callable[[LabelJob], Awaitable[None]]]]] = None,
+        on_failure: Optional[Callable[[LabelJob, LabelJobFailed], Awaitable[None]]] = None,
+        workers: int = 4,
+        poll_interval: float = 5,
+        claim_timeout: float = 120,
+        max_attempts: int = 5,
+        retention_days: int = 7,
+        collection_name: str = 'label_jobs',
+    ):
+        """
+        Args:
+            db: MongoDB database
+            stages: (name, coroutine(job)) in STAGES order (default: server.LABEL_JOB_STAGES)
+            on_failure: Coroutine (job, error) telling the user/admin (default: server.label_job_failed)
+            workers: Jobs processed concurrently by this process
+            poll_interval: Seconds between queue polls when idle
+            claim_timeout: Lease on a claimed job; an expired lease is resumed by any worker
+            max_attempts: Claims before a job that keeps erroring is failed
+            retention_days: How long finished jobs are kept
+            collection_name: Queue collection
+        """
+        self.db = db
+        self._stages = stages
+        self._on_failure = on_failure
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self.max_attempts = max_attempts
+        self.retention = timedelta(days=retention_days)
+        self.collection = db[collection_name]
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.resumed = 0
+        self.stage_errors: Dict[str, int] = {stage: 0 for stage in STAGES}
+
+    def _get_stages(self):
+        if self._stages is None:
+            from server import LABEL_JOB_STAGES
+            self._stages = LABEL_JOB_STAGES
+        return self._stages
+
+    async def _notify_failure(self, job: LabelJob, error: LabelJobFailed) -> None:
+        on_failure = self._on_failure
+        if on_failure is None:
+            from server import label_job_failed
+            on_failure = label_job_failed
+        try:
+            await on_failure(job, error)
+        except Exception as e:
+            logger.error(f"Label job {job.order_id} failure notification error: {e}")
+
+    # ==================== SUBMIT ====================
+
+    async def submit(self, order_id: str, telegram_id: int) -> bool:
+        """
+        Queue a label purchase for the workers (idempotent per order)
+
+        Returns:
+            bool: True if the job was created, False if it already exists
+        """
+        now = datetime.now(timezone.utc)
+        result = await self.collection.update_one(
+            {'_id': order_id},
+            {'$setOnInsert': {
+                'telegram_id': telegram_id, 'stage': STAGES[0], 'attempts': 0,
+                'claimed_until': now, 'created_at': now, 'updated_at': now
+            }},
+            upsert=True
+        )
+        created = result.upserted_id is not None
+        if created:
+            self.submitted += 1
+            logger.info(f"📥 Label job queued for order {order_id}")
+        self._wakeup.set()
+        return created
+
+    async def run(
+        self, order_id: str, telegram_id: int, message=None, until: str = 'download', reviewed: bool = False
+    ) -> bool:
+        """
+        Run a job inline up to a stage, then hand it to the workers
+
+        An explicit run restarts a failed job. A job stopped for review
+        ("purchase outcome unknown") is only restarted with reviewed=True,
+        passed by the admin endpoint after checking ShipStation.
+
+        Returns:
+            bool: True if every stage before `until` has finished
+        """
+        now = datetime.now(timezone.utc)
+        token = uuid.uuid4().hex
+        result = await self.collection.update_one(
+            {'_id': order_id},
+            {'$setOnInsert': {
+                'telegram_id': telegram_id, 'stage': STAGES[0], 'attempts': 1, 'claim': token,
+                'claimed_until': now + timedelta(seconds=self.claim_timeout),
+                'created_at': now, 'updated_at': now
+            }},
+            upsert=True
+        )
+        if result.upserted_id is not None:
+            self.submitted += 1
+            doc = await self.collection.find_one({'_id': order_id})
+        else:
+            restart = {'_id': order_id, 'stage': FAILED}
+            if not reviewed:
+                restart['needs_review'] = {'$ne': True}
+            await self.collection.update_one(
+                restart,
+                {'$set': {'stage': STAGES[0], 'attempts': 0, 'claimed_until': now, 'error': None,
+                          'needs_review': False, 'purchase_started_at': None, 'telegram_id': telegram_id}}
+            )
+            doc = await self._claim({'_id': order_id})
+
+        if doc is None:
+            # Finished, or another worker holds it right now
+            doc = await self.collection.find_one({'_id': order_id}) or {}
+            return self._reached(doc.get('stage'), until)
+
+        stage = await self._process(doc, message=message, until=until)
+        return self._reached(stage, until)
+
+    async def settlement(self, order_id: str) -> str:
+        """
+        What a caller that charged up front may do after an unsuccessful run
+
+        Returns:
+            str: 'refund' - the job failed before a label was bought,
+                 'review' - the job failed, but a label was (or may have been) bought,
+                 'pending' - the job was postponed; the workers will finish it
+        """
+        doc = await self.collection.find_one({'_id': order_id}, {'stage': 1, 'label': 1, 'needs_review': 1})
+        if doc is None:
+            return 'refund'
+        if doc.get('stage') == FAILED:
+            return 'review' if doc.get('label') or doc.get('needs_review') else 'refund'
+        return 'pending'
+
+    @staticmethod
+    def _reached(stage: Optional[str], until: str) -> bool:
+        if stage == DONE:
+            return True
+        if stage not in STAGES:
+            return False
+        return STAGES.index(stage) >= STAGES.index(until)
+
+    # ==================== PROCESSING ====================
+
+    async def _claim(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        return await self.collection.find_one_and_update(
+            {**query, 'stage': {'$in': list(STAGES)}, 'claimed_until': {'$lte': now}},
+            {
+                '$set': {'claim': uuid.uuid4().hex, 'claimed_until': now + timedelta(seconds=self.claim_timeout)},
+                '$inc': {'attempts': 1}
+            },
+            sort=[('created_at', 1)],
+            return_document=True
+        )
+
+    async def _save(self, job: LabelJob, fields: Dict[str, Any]) -> None:
+        # Every stage write also renews the lease
+        now = datetime.now(timezone.utc)
+        fields = {'claimed_until': now + timedelta(seconds=self.claim_timeout), **fields, 'updated_at': now}
+        result = await self.collection.update_one(
+            {'_id': job.order_id, 'claim': job.doc['claim']},
+            {'$set': fields}
+        )
+        if result.matched_count == 0:
+            raise LabelJobLost(job.order_id)
+        job.doc.update(fields)
+
+    async def _heartbeat(self, job: LabelJob) -> None:
+        """Keep the lease while a long stage runs (waiting on ShipStation, slow download)"""
+        while True:
+            await asyncio.sleep(self.claim_timeout / 3)
+            result = await self.collection.update_one(
+                {'_id': job.order_id, 'claim': job.doc['claim']},
+                {'$set': {'claimed_until': datetime.now(timezone.utc) + timedelta(seconds=self.claim_timeout)}}
+            )
+            if result.matched_count == 0:
+                return
+
+    async def _release(self, job: LabelJob, delay: float = 0) -> None:
+        await job.save(claim=None, claimed_until=datetime.now(timezone.utc) + timedelta(seconds=delay))
+        self._wakeup.set()
+
+    async def _finish(self, job: LabelJob, stage: str, **fields) -> None:
+        now = datetime.now(timezone.utc)
+        await job.save(stage=stage, claim=None, finished_at=now, expires_at=now + self.retention, **fields)
+
+    async def _process(self, doc: Dict[str, Any], message=None, until: Optional[str] = None) -> str:
+        """Run stages of a claimed job; returns the stage the job stopped at"""
+        order = await self.db.orders.find_one({'order_id': doc['_id']}, {'_id': 0})
+        job = LabelJob(self, doc, order, message)
+        if doc['attempts'] > 1 and doc['stage'] != STAGES[0]:
+            self.resumed += 1
+            logger.info(f"🔁 Resuming label job {job.order_id} at '{job.stage}'")
+
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            if order is None:
+                raise LabelJobFailed(f"Order {job.order_id} not found")
+
+            for name, stage in self._get_stages():
+                if STAGES.index(name) < STAGES.index(job.stage):
+                    continue
+                if name == until:
+                    await self._release(job)
+                    return job.stage
+                try:
+                    await stage(job)
+                except (LabelJobRetry, LabelJobFailed, LabelJobLost, asyncio.CancelledError):
+                    raise
+                except Exception:
+                    self.stage_errors[name] += 1
+                    raise
+                next_index = STAGES.index(name) + 1
+                if next_index < len(STAGES):
+                    await job.save(stage=STAGES[next_index])
+
+            await self._finish(job, DONE)
+            self.completed += 1
+            logger.info(f"✅ Label job {job.order_id} done")
+
+        except LabelJobRetry as e:
+            self.retried += 1
+            logger.warning(f"⏳ Label job {job.order_id} at '{job.stage}' postponed {e.delay:.0f}s: {e}")
+            await self._release(job, e.delay)
+
+        except LabelJobFailed as e:
+            await self._fail(job, e)
+
+        except LabelJobLost:
+            logger.warning(f"Label job {job.order_id} claim lost, another worker continues it")
+
+        except Exception as e:
+            logger.error(f"Label job {job.order_id} error at '{job.stage}': {e}", exc_info=True)
+            if job.doc['attempts'] >= self.max_attempts:
+                await self._fail(job, LabelJobFailed(str(e)))
+            else:
+                self.retried += 1
+                await job.save(error=str(e)[:500])
+                await self._release(job, min(5 * 2 ** job.doc['attempts'], 300))
+
+        finally:
+            heartbeat.cancel()
+
+        return job.stage
+
+    async def _fail(self, job: LabelJob, error: LabelJobFailed) -> None:
+        self.failed += 1
+        logger.error(f"❌ Label job {job.order_id} failed at '{job.stage}': {error}")
+        try:
+            await self._finish(job, FAILED, failed_stage=job.stage, error=str(error)[:500],
+                               needs_review=error.needs_review)
+        except LabelJobLost:
+            return
+        if error.notify:
+            await self._notify_failure(job, error)
+
+    # ==================== WORKERS ====================
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                doc = await self._claim({})
+                if doc is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._process(doc)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Label job worker error: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def start(self) -> None:
+        """Start the workers (expired claims are resumed)"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"✅ Label job queue started ({self.workers} workers)")
+
+    async def stop(self) -> None:
+        """Stop the workers (jobs stay in MongoDB and resume on the next start)"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def pending(self) -> Dict[str, int]:
+        """Unfinished jobs per stage"""
+        return {stage: await self.collection.count_documents({'stage': stage}) for stage in STAGES}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue counters"""
+        return {
+            'workers': self.workers,
+            'running': any(not task.done() for task in self._tasks),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'retried': self.retried,
+            'resumed': self.resumed,
+            'stage_errors': dict(self.stage_errors),
+        }
+
+
+# Global queue (initialized in server.py startup)
+_label_jobs: Optional[LabelJobQueue] = None
+
+
+def init_label_jobs(db, **kwargs) -> LabelJobQueue:
+    """Create the global label job queue"""
+    global _label_jobs
+    _label_jobs = LabelJobQueue(db, **kwargs)
+    return _label_jobs
+
+
+def get_label_jobs() -> Optional[LabelJobQueue]:
+    """Get the global label job queue (None if not initialized)"""
+    return _label_jobs
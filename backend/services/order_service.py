@@ -182,22 +182,13 @@ class OrderService:
             amount = order['amount']
             
             if payment_method == 'balance':
-                # Оплата с баланса
-                user_balance = await self.user_repo.get_balance(telegram_id)
-                
-                if user_balance < amount:
-                    return {
-                        'success': False,
-                        'error': 'Insufficient balance',
-                        'required': amount,
-                        'available': user_balance
-                    }
-                
-                # Списать с баланса
+                # Оплата с баланса: списание проверяет баланс атомарно
                 success = await self.user_repo.update_balance(
                     telegram_id,
                     amount,
-                    operation='subtract'
+                    operation='subtract',
+                    reason='order',
+                    ref=order_id
                 )
                 
                 if success:
@@ -217,7 +208,9 @@ class OrderService:
                 else:
                     return {
                         'success': False,
-                        'error': 'Failed to deduct balance'
+                        'error': 'Insufficient balance',
+                        'required': amount,
+                        'available': await self.user_repo.get_balance(telegram_id)
                     }
             
             else:
@@ -275,7 +268,9 @@ class OrderService:
                 await self.user_repo.update_balance(
                     telegram_id,
                     amount,
-                    operation='add'
+                    operation='add',
+                    reason='refund',
+                    ref=order_id
                 )
                 refund_amount = amount
                 logger.info(f"💰 Refunded ${amount} to user {telegram_id}")
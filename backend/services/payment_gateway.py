@@ -3,10 +3,11 @@ Payment Gateway - Unified Interface for All Payment Providers
 Единый интерфейс для всех платежных систем (Oxapay, CryptoBot, и т.д.)
 """
 from abc import ABC, abstractmethod
-from typing import Dict, Optional, Literal
+from typing import Dict, List, Optional, Literal
 from datetime import datetime, timezone
 import logging
 import httpx
+from utils.http_clients import get_http_client
 from utils.retry_utils import retry_on_api_error
 
 logger = logging.getLogger(__name__)
@@ -86,13 +87,14 @@ class PaymentGateway(ABC):
     def __init__(self, api_key: str, provider_name: PaymentProvider):
         self.api_key = api_key
         self.provider_name = provider_name
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # Shared keep-alive pool of the provider (closed on app shutdown)
+        self.client = get_http_client(provider_name)
     
     async def __aenter__(self):
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.client.aclose()
+        pass
     
     @abstractmethod
     async def create_invoice(
@@ -163,8 +165,8 @@ class PaymentGateway(ABC):
         pass
     
     async def close(self):
-        """Закрыть HTTP клиент"""
-        await self.client.aclose()
+        """HTTP клиент общий - закрывается при остановке приложения"""
+        pass
 
 
 class OxapayGateway(PaymentGateway):
@@ -457,6 +459,31 @@ class CryptoBotGateway(PaymentGateway):
             logger.error(f"❌ Error verifying CryptoBot payment: {e}")
             raise
     
+    async def get_invoice_statuses(self, invoice_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Статусы нескольких инвойсов одним запросом (getInvoices, до 100 id)
+        
+        Returns:
+            {invoice_id: {'status': active|paid|expired, 'amount': float}}
+        """
+        response = await self.client.get(
+            f"{self.BASE_URL}/getInvoices",
+            headers={"Crypto-Pay-API-Token": self.api_token},
+            params={"invoice_ids": ",".join(invoice_ids), "count": len(invoice_ids)}
+        )
+        response.raise_for_status()
+        data = response.json()
+        if not data.get('ok'):
+            raise ValueError(f"CryptoBot error: {data.get('error')}")
+        
+        return {
+            str(item['invoice_id']): {
+                'status': item.get('status'),
+                'amount': float(item.get('paid_amount') or item.get('amount') or 0)
+            }
+            for item in data.get('result', {}).get('items', [])
+        }
+    
     async def verify_webhook(
         self,
         payload: Dict,
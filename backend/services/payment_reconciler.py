@@ -0,0 +1,315 @@
+"""
+Payment Reconciler
+Polls payment providers for pending payments whose webhook never arrived
+
+A lost or late Oxapay / CryptoBot callback used to leave a paid top-up
+pending until the user complained. The reconciler scans pending payments
+through the (status, created_at) index and asks the provider for their
+state:
+- Oxapay: one /v1/payment/info call per payment
+- CryptoBot: getInvoices for up to 100 invoices per call
+Calls run in bounded concurrent batches on the shared provider clients.
+
+Found state changes go through PaymentWebhooks.claim, the same idempotent
+path as the webhook: a payment credited by the webhook meanwhile is a
+duplicate, a paid one is credited exactly once by the follow-up.
+
+Each payment carries its own next check time. The interval grows with the
+payment's age (backoff_factor x age, between min_interval and
+max_interval), so fresh invoices - the ones users are waiting on - are
+checked often and a day-old invoice costs a call every half hour. A paid
+payment whose webhook was lost is credited within about
+max(min_interval, backoff_factor x age) + poll_interval.
+Payments older than expire_after_hours are marked expired.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROVIDER = 'oxapay'
+
+# Payments per provider call
+PROVIDER_BATCH = {
+    'oxapay': 1,
+    'cryptobot': 100,
+}
+
+# Provider states that end polling without a payment
+FINAL_UNPAID = ('expired', 'failed', 'canceled', 'cancelled', 'refunded')
+
+# Checker: track ids -> {track_id: {'status', 'amount'}} for the ones found
+Checker = Callable[[List[str]], Awaitable[Dict[str, Dict[str, Any]]]]
+
+
+async def check_oxapay(track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Payment state from Oxapay (services.api_services.check_oxapay_payment)"""
+    from services.api_services import check_oxapay_payment
+
+    found = {}
+    for track_id in track_ids:
+        data = await check_oxapay_payment(track_id)
+        if not data:
+            continue
+        info = data.get('data') or data
+        if not info.get('status'):
+            continue
+        amount = info.get('paid_amount') or info.get('paidAmount') or info.get('amount') or 0
+        found[track_id] = {'status': info['status'], 'amount': float(amount)}
+    return found
+
+
+_cryptobot_gateway = None
+
+
+async def check_cryptobot(invoice_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Invoice states from CryptoBot (one getInvoices call)"""
+    global _cryptobot_gateway
+    if _cryptobot_gateway is None:
+        from services.payment_gateway import PaymentGatewayFactory
+        _cryptobot_gateway = PaymentGatewayFactory.create_gateway('cryptobot')
+    found = await _cryptobot_gateway.get_invoice_statuses(invoice_ids)
+    # 'active' is CryptoBot's waiting state
+    return {invoice_id: state for invoice_id, state in found.items() if state['status'] != 'active'}
+
+
+class PaymentReconciler:
+    """Background provider polling for pending payments"""
+
+    def __init__(
+        self,
+        db,
+        claim: Callable[..., Awaitable[str]],
+        checkers: Optional[Dict[str, Checker]] = None,
+        poll_interval: float = 15,
+        min_interval: float = 30,
+        max_interval: float = 1800,
+        backoff_factor: float = 0.1,
+        batch_size: int = 50,
+        max_concurrent: int = 5,
+        expire_after_hours: int = 24,
+        collection_name: str = 'payments'
+    ):
+        """
+        Args:
+            db: MongoDB database
+            claim: PaymentWebhooks.claim (track_id, status, paid_amount)
+            checkers: Provider name -> Checker (default: Oxapay and CryptoBot)
+            poll_interval: Seconds between scans for due payments
+            min_interval: First check / shortest interval after creation
+            max_interval: Longest interval between checks of one payment
+            backoff_factor: Check interval as a fraction of the payment's age
+            batch_size: Payments checked per scan batch
+            max_concurrent: Provider calls in flight
+            expire_after_hours: Pending payments older than this are expired
+            collection_name: Payment collection
+        """
+        self.payments = db[collection_name]
+        self.db = db
+        self.claim = claim
+        self.checkers = checkers if checkers is not None else {
+            'oxapay': check_oxapay,
+            'cryptobot': check_cryptobot,
+        }
+        self.poll_interval = poll_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.batch_size = batch_size
+        self.max_concurrent = max_concurrent
+        self.expire_after_hours = expire_after_hours
+
+        self._task: Optional[asyncio.Task] = None
+        self._last_expiry = 0.0
+
+        self.passes = 0
+        self.checked = 0
+        self.recovered = 0
+        self.expired = 0
+        self.provider_errors = 0
+        self.last_pass_ms: Optional[float] = None
+
+    def next_interval(self, age_seconds: float) -> float:
+        """Seconds until the next check of a payment of this age"""
+        return min(self.max_interval, max(self.min_interval, age_seconds * self.backoff_factor))
+
+    # ==================== SCAN ====================
+
+    async def _due(self, now: datetime) -> List[Dict[str, Any]]:
+        oldest = now - timedelta(hours=self.expire_after_hours)
+        youngest = now - timedelta(seconds=self.min_interval)
+        return await self.payments.find(
+            {'status': 'pending',
+             'created_at': {'$gte': oldest.isoformat(), '$lte': youngest.isoformat()},
+             'track_id': {'$exists': True},
+             '$or': [{'reconcile_next_at': {'$exists': False}},
+                     {'reconcile_next_at': {'$lte': now}}]},
+            {'_id': 0, 'track_id': 1, 'provider': 1, 'created_at': 1}
+        ).sort('created_at', 1).limit(self.batch_size).to_list(self.batch_size)
+
+    async def _check(self, provider: str, track_ids: List[str], semaphore: asyncio.Semaphore) -> Dict[str, Dict[str, Any]]:
+        checker = self.checkers.get(provider)
+        if checker is None:
+            return {}
+        async with semaphore:
+            try:
+                return await checker(track_ids)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.provider_errors += 1
+                logger.warning(f"Payment reconcile: {provider} check failed: {e}")
+                return {}
+
+    async def _apply(self, track_id: str, state: Dict[str, Any]) -> None:
+        from services.payment_webhooks import CLAIMED
+
+        status = str(state.get('status') or '').lower()
+        outcome = await self.claim(track_id, status, state.get('amount') or 0.0)
+        if outcome == CLAIMED:
+            self.recovered += 1
+            logger.warning(f"💳 Payment {track_id} found paid by reconciler (webhook missing)")
+        elif status in FINAL_UNPAID:
+            result = await self.payments.update_one(
+                {'track_id': track_id, 'status': 'pending'},
+                {'$set': {'status': 'expired', 'expired_at': datetime.now(timezone.utc).isoformat()}}
+            )
+            self.expired += result.modified_count
+
+    async def reconcile_once(self) -> int:
+        """
+        Check one batch of due payments
+
+        Returns:
+            Number of payments checked
+        """
+        now = datetime.now(timezone.utc)
+        due = await self._due(now)
+        if not due:
+            return 0
+
+        by_provider: Dict[str, List[str]] = {}
+        for payment in due:
+            by_provider.setdefault(payment.get('provider') or DEFAULT_PROVIDER, []).append(payment['track_id'])
+
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        calls = []
+        for provider, track_ids in by_provider.items():
+            size = PROVIDER_BATCH.get(provider, 1)
+            calls.extend(
+                self._check(provider, track_ids[i:i + size], semaphore)
+                for i in range(0, len(track_ids), size)
+            )
+        states: Dict[str, Dict[str, Any]] = {}
+        for found in await asyncio.gather(*calls):
+            states.update(found)
+
+        for track_id, state in states.items():
+            await self._apply(track_id, state)
+
+        # Reschedule everything still pending (one round trip)
+        schedule = []
+        for payment in due:
+            try:
+                created = datetime.fromisoformat(payment['created_at'])
+                age = (now - created).total_seconds()
+            except (TypeError, ValueError):
+                age = self.max_interval / self.backoff_factor if self.backoff_factor else 0
+            schedule.append(UpdateOne(
+                {'track_id': payment['track_id'], 'status': 'pending'},
+                {'$set': {'reconcile_next_at': now + timedelta(seconds=self.next_interval(age))},
+                 '$inc': {'reconcile_checks': 1}}
+            ))
+        await self.payments.bulk_write(schedule, ordered=False)
+
+        self.checked += len(due)
+        return len(due)
+
+    async def expire_stale(self) -> int:
+        """Mark pending payments older than expire_after_hours as expired"""
+        from repositories.payment_repository import PaymentRepository
+
+        expired = await PaymentRepository(self.db).expire_old_pending_payments(self.expire_after_hours)
+        self.expired += expired
+        return expired
+
+    async def run_pass(self) -> int:
+        """Check every due payment (batch after batch). Returns the number checked"""
+        started = time.monotonic()
+        checked = 0
+        while True:
+            count = await self.reconcile_once()
+            checked += count
+            if count < self.batch_size:
+                break
+        if time.monotonic() - self._last_expiry >= self.max_interval:
+            self._last_expiry = time.monotonic()
+            await self.expire_stale()
+        self.passes += 1
+        self.last_pass_ms = round((time.monotonic() - started) * 1000, 1)
+        return checked
+
+    # ==================== LIFECYCLE ====================
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_pass()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Payment reconcile error: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def start(self) -> None:
+        """Start polling (the pending-scan index is in utils/db_indexes.py)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+        logger.info(
+            f"✅ Payment reconciler started (every {self.poll_interval}s, "
+            f"per-payment interval {self.min_interval}-{self.max_interval}s)"
+        )
+
+    async def stop(self) -> None:
+        """Stop polling"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Polling counters"""
+        return {
+            'passes': self.passes,
+            'checked': self.checked,
+            'recovered': self.recovered,
+            'expired': self.expired,
+            'provider_errors': self.provider_errors,
+            'last_pass_ms': self.last_pass_ms,
+            'providers': sorted(self.checkers),
+            'running': self._task is not None and not self._task.done(),
+        }
+
+
+# Global instance (initialized in server.py startup)
+_payment_reconciler: Optional[PaymentReconciler] = None
+
+
+def init_payment_reconciler(db, **kwargs) -> PaymentReconciler:
+    """Create the global payment reconciler"""
+    global _payment_reconciler
+    _payment_reconciler = PaymentReconciler(db, **kwargs)
+    return _payment_reconciler
+
+
+def get_payment_reconciler() -> Optional[PaymentReconciler]:
+    """Get the global payment reconciler (None if not initialized)"""
+    return _payment_reconciler
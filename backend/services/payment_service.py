@@ -60,21 +60,18 @@ class PaymentService:
         Returns:
             (success, error_message)
         """
-        # Проверить достаточность баланса
-        sufficient, balance = await self.check_balance_sufficient(telegram_id, amount)
-        
-        if not sufficient:
-            return False, f"Insufficient balance. Required: ${amount:.2f}, Available: ${balance:.2f}"
-        
-        # Списать с баланса
+        # Списать с баланса: одна условная операция (balance >= amount)
         success = await self.user_repo.update_balance(
             telegram_id,
             amount,
-            operation="subtract"
+            operation="subtract",
+            reason="order",
+            ref=order_id
         )
         
         if not success:
-            return False, "Failed to deduct balance"
+            balance = await self.user_repo.get_balance(telegram_id)
+            return False, f"Insufficient balance. Required: ${amount:.2f}, Available: ${balance:.2f}"
         
         return True, None
     
@@ -98,7 +95,8 @@ class PaymentService:
         return await self.user_repo.update_balance(
             telegram_id,
             amount,
-            description
+            operation="add",
+            reason=description
         )
     
     @staticmethod
@@ -145,87 +143,6 @@ async def get_user_balance(telegram_id: int, find_user_func) -> float:
     return user.get('balance', 0.0) if user else 0.0
 
 
-async def add_balance(
-    telegram_id: int,
-    amount: float,
-    db,
-    find_user_func
-) -> Tuple[bool, float, Optional[str]]:
-    """
-    Add funds to user balance
-    
-    Args:
-        telegram_id: Telegram user ID
-        amount: Amount to add
-        db: Database connection
-        find_user_func: Function to find user
-    
-    Returns:
-        (success, new_balance, error_message)
-    """
-    try:
-        user = await find_user_func(telegram_id)
-        if not user:
-            return False, 0.0, "User not found"
-        
-        new_balance = user.get('balance', 0.0) + amount
-        
-        await db.users.update_one(
-            {"telegram_id": telegram_id},
-            {"$set": {"balance": new_balance}}
-        )
-        
-        logger.info(f"💰 Balance added: user={telegram_id}, amount=${amount:.2f}, new_balance=${new_balance:.2f}")
-        return True, new_balance, None
-        
-    except Exception as e:
-        logger.error(f"❌ Error adding balance: {e}")
-        return False, 0.0, str(e)
-
-
-async def deduct_balance(
-    telegram_id: int,
-    amount: float,
-    db,
-    find_user_func
-) -> Tuple[bool, float, Optional[str]]:
-    """
-    Deduct funds from user balance
-    
-    Args:
-        telegram_id: Telegram user ID
-        amount: Amount to deduct
-        db: Database connection
-        find_user_func: Function to find user
-    
-    Returns:
-        (success, new_balance, error_message)
-    """
-    try:
-        user = await find_user_func(telegram_id)
-        if not user:
-            return False, 0.0, "User not found"
-        
-        current_balance = user.get('balance', 0.0)
-        
-        if current_balance < amount:
-            return False, current_balance, "Insufficient balance"
-        
-        new_balance = current_balance - amount
-        
-        await db.users.update_one(
-            {"telegram_id": telegram_id},
-            {"$set": {"balance": new_balance}}
-        )
-        
-        logger.info(f"💳 Balance deducted: user={telegram_id}, amount=${amount:.2f}, new_balance=${new_balance:.2f}")
-        return True, new_balance, None
-        
-    except Exception as e:
-        logger.error(f"❌ Error deducting balance: {e}")
-        return False, 0.0, str(e)
-
-
 # ============================================================
 # PAYMENT VALIDATION
 # ============================================================
@@ -272,64 +189,6 @@ def validate_payment_amount(amount: float, user_balance: float) -> Tuple[bool, O
     return True, None
 
 
-# ============================================================
-# PAYMENT PROCESSING
-# ============================================================
-
-async def process_balance_payment(
-    telegram_id: int,
-    amount: float,
-    order_id: str,
-    db,
-    find_user_func,
-    update_order_func
-) -> Tuple[bool, Optional[float], Optional[str]]:
-    """
-    Process payment from user balance
-    
-    Args:
-        telegram_id: Telegram user ID
-        amount: Payment amount
-        order_id: Order ID to update
-        db: Database connection
-        find_user_func: Function to find user
-        update_order_func: Function to update order
-    
-    Returns:
-        (success, new_balance, error_message)
-    """
-    try:
-        # Get current balance
-        user = await find_user_func(telegram_id)
-        if not user:
-            return False, None, "User not found"
-        
-        current_balance = user.get('balance', 0.0)
-        
-        # Validate
-        is_valid, error_msg = validate_payment_amount(amount, current_balance)
-        if not is_valid:
-            return False, current_balance, error_msg
-        
-        # Deduct balance
-        success, new_balance, error = await deduct_balance(
-            telegram_id, amount, db, find_user_func
-        )
-        
-        if not success:
-            return False, current_balance, error
-        
-        # Update order status
-        await update_order_func(order_id, {"payment_status": "paid"})
-        
-        logger.info(f"✅ Payment processed: order={order_id}, amount=${amount:.2f}, new_balance=${new_balance:.2f}")
-        return True, new_balance, None
-        
-    except Exception as e:
-        logger.error(f"❌ Error processing payment: {e}")
-        return False, None, str(e)
-
-
 # ============================================================
 # INVOICE CREATION
 # ============================================================
@@ -411,11 +270,10 @@ async def create_payment_invoice(
 PAYMENT SERVICE ARCHITECTURE:
 
 This module centralizes all payment-related operations:
-1. Balance management (add, deduct, check)
+1. Balance management (PaymentService -> UserRepository.update_balance,
+   every change is a BalanceLedger entry)
 2. Payment validation
-3. Payment processing
-4. Invoice creation
-5. Transaction logging
+3. Invoice creation
 
 BENEFITS:
 - Single source of truth for payment logic
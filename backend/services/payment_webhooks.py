@@ -0,0 +1,312 @@
+"""
+Payment Webhooks
+Atomic, idempotent processing of Oxapay payment callbacks
+
+The webhook request only claims the payment:
+    find_one_and_update({'track_id': id, 'status': {'$ne': 'paid'}},
+                        {'$set': {'status': 'paid', 'followup': 'pending', ...}})
+One conditional write records the status transition and the processed event
+id. Exactly one of any number of concurrent duplicate callbacks wins it;
+the others see the already-claimed payment and are acked as duplicates.
+The response never waits for Telegram.
+
+Balance credit, label purchase and notifications run afterwards as a
+follow-up, queued in process and tracked on the payment document
+(followup: pending -> done | failed). A follow-up interrupted by a crash
+is picked up again by the periodic sweep once its lease expires.
+
+track_id is normalized to a string when the payment is written
+(repositories.payment_repository.normalize_payment_id), so a webhook is
+one indexed lookup.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from repositories.payment_repository import normalize_payment_id
+
+logger = logging.getLogger(__name__)
+
+PAID = 'paid'
+
+# Claim outcomes
+CLAIMED = 'claimed'
+DUPLICATE = 'duplicate'
+RECORDED = 'recorded'
+UNKNOWN = 'unknown'
+
+
+def payment_event_id(track_id: str, status: str) -> str:
+    """Oxapay sends no event id; a track id reaches each status once"""
+    return f"oxapay:{track_id}:{status}"
+
+
+class PaymentWebhooks:
+    """Claims payments from webhooks and runs their follow-ups"""
+
+    def __init__(
+        self,
+        db,
+        follow_up: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]] = None,
+        workers: int = 4,
+        claim_timeout: int = 120,
+        max_attempts: int = 5,
+        sweep_interval: int = 60,
+        collection_name: str = 'payments'
+    ):
+        """
+        Args:
+            db: MongoDB database
+            follow_up: Coroutine run once per paid payment (credit, label, notifications)
+            workers: Follow-ups processed concurrently
+            claim_timeout: Follow-up lease; expired leases are retried by the sweep
+            max_attempts: Follow-up attempts before it is marked failed
+            sweep_interval: Seconds between sweeps for interrupted follow-ups
+            collection_name: Payment collection
+        """
+        self.payments = db[collection_name]
+        self.follow_up = follow_up
+        self.workers = workers
+        self.claim_timeout = claim_timeout
+        self.max_attempts = max_attempts
+        self.sweep_interval = sweep_interval
+
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks = []
+
+        self.claimed = 0
+        self.duplicates = 0
+        self.recorded = 0
+        self.unknown = 0
+        self.completed = 0
+        self.failed = 0
+        self.errors = 0
+
+    # ==================== STORAGE ====================
+
+    async def init_storage(self) -> int:
+        """
+        Normalize ids of older pending payments (indexes: utils/db_indexes.py)
+
+        Returns:
+            int: Payments whose track_id was rewritten
+        """
+        fixed = 0
+        async for payment in self.payments.find(
+            {'status': {'$ne': PAID}},
+            {'_id': 1, 'track_id': 1, 'invoice_id': 1}
+        ):
+            track_id = normalize_payment_id(payment.get('track_id') or payment.get('invoice_id'))
+            if track_id and payment.get('track_id') != track_id:
+                await self.payments.update_one({'_id': payment['_id']}, {'$set': {'track_id': track_id}})
+                fixed += 1
+        if fixed:
+            logger.info(f"💳 Normalized track_id of {fixed} pending payments")
+        return fixed
+
+    # ==================== WEBHOOK ====================
+
+    async def claim(self, track_id, status: str, paid_amount: float = 0.0) -> str:
+        """
+        Record a webhook delivery; queue the follow-up if it paid the payment
+
+        Args:
+            track_id: Oxapay trackId (string or int)
+            status: Oxapay status (Waiting, Confirming, Paid, Expired, ...)
+            paid_amount: Amount actually paid
+
+        Returns:
+            str: CLAIMED, DUPLICATE, RECORDED (non-final status) or UNKNOWN
+        """
+        track_id = normalize_payment_id(track_id)
+        status = (status or '').lower()
+        if not track_id or not status:
+            self.unknown += 1
+            return UNKNOWN
+
+        now = datetime.now(timezone.utc).isoformat()
+        event_id = payment_event_id(track_id, status)
+
+        if status != PAID:
+            result = await self.payments.update_one(
+                {'track_id': track_id, 'status': {'$ne': PAID}},
+                {'$set': {'provider_status': status, 'provider_status_at': now},
+                 '$addToSet': {'processed_events': event_id}}
+            )
+            if result.matched_count:
+                self.recorded += 1
+                return RECORDED
+            return await self._not_claimed(track_id)
+
+        before = await self.payments.find_one_and_update(
+            {'track_id': track_id, 'status': {'$ne': PAID}},
+            {'$set': {
+                'status': PAID,
+                'paid_amount': paid_amount,
+                'paid_at': now,
+                'provider_status': status,
+                'followup': 'pending',
+                'followup_attempts': 0,
+             },
+             '$push': {'status_history': {'status': PAID, 'event_id': event_id, 'at': now}},
+             '$addToSet': {'processed_events': event_id}},
+            projection={'status': 1}
+        )
+        if before is None:
+            return await self._not_claimed(track_id)
+
+        self.claimed += 1
+        logger.info(f"💳 Payment {track_id}: {before.get('status')} → paid (${paid_amount})")
+        self._queue.put_nowait(track_id)
+        return CLAIMED
+
+    async def _not_claimed(self, track_id: str) -> str:
+        if await self.payments.find_one({'track_id': track_id}, {'_id': 1}):
+            self.duplicates += 1
+            logger.info(f"⚠️ Duplicate webhook for payment {track_id} ignored")
+            return DUPLICATE
+        self.unknown += 1
+        logger.warning(f"Webhook for unknown payment {track_id}")
+        return UNKNOWN
+
+    # ==================== FOLLOW-UP ====================
+
+    async def run_follow_up(self, track_id: str) -> Optional[str]:
+        """
+        Lease and run the follow-up of one paid payment
+
+        Returns:
+            'done', 'failed', 'retry' or None if another worker holds it / nothing to do
+        """
+        now = datetime.now(timezone.utc)
+        payment = await self.payments.find_one_and_update(
+            {'track_id': track_id, 'followup': 'pending',
+             '$or': [{'followup_claimed_until': {'$exists': False}},
+                     {'followup_claimed_until': {'$lte': now}}]},
+            {'$set': {'followup_claimed_until': now + timedelta(seconds=self.claim_timeout)},
+             '$inc': {'followup_attempts': 1}},
+            projection={'_id': 0},
+            return_document=True
+        )
+        if payment is None:
+            return None
+
+        try:
+            if self.follow_up:
+                await self.follow_up(payment)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.errors += 1
+            if payment.get('followup_attempts', 1) >= self.max_attempts:
+                self.failed += 1
+                logger.error(f"❌ Payment {track_id} follow-up failed: {e}")
+                await self.payments.update_one(
+                    {'track_id': track_id},
+                    {'$set': {'followup': 'failed', 'followup_error': str(e)[:500]}}
+                )
+                return 'failed'
+            logger.warning(f"Payment {track_id} follow-up error (retrying): {e}")
+            await self.payments.update_one(
+                {'track_id': track_id},
+                {'$set': {'followup_error': str(e)[:500]}}
+            )
+            return 'retry'
+
+        self.completed += 1
+        await self.payments.update_one(
+            {'track_id': track_id},
+            {'$set': {'followup': 'done', 'followup_done_at': datetime.now(timezone.utc).isoformat()},
+             '$unset': {'followup_claimed_until': ''}}
+        )
+        return 'done'
+
+    async def sweep(self) -> int:
+        """Queue follow-ups left pending (crash, error retry). Returns the number queued"""
+        now = datetime.now(timezone.utc)
+        queued = 0
+        async for payment in self.payments.find(
+            {'followup': 'pending',
+             '$or': [{'followup_claimed_until': {'$exists': False}},
+                     {'followup_claimed_until': {'$lte': now}}]},
+            {'_id': 0, 'track_id': 1}
+        ):
+            self._queue.put_nowait(payment['track_id'])
+            queued += 1
+        return queued
+
+    async def drain(self) -> None:
+        """Run every queued follow-up now (tests, shutdown)"""
+        while not self._queue.empty():
+            await self.run_follow_up(self._queue.get_nowait())
+
+    async def _worker(self) -> None:
+        while True:
+            track_id = await self._queue.get()
+            try:
+                await self.run_follow_up(track_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Payment follow-up worker error: {e}")
+
+    async def _sweeper(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Payment follow-up sweep error: {e}")
+
+    async def start(self) -> None:
+        """Prepare storage, requeue interrupted follow-ups and start workers"""
+        await self.init_storage()
+        requeued = await self.sweep()
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            self._tasks.append(asyncio.create_task(self._sweeper()))
+        logger.info(f"✅ Payment webhooks: {self.workers} follow-up workers ({requeued} resumed)")
+
+    async def stop(self) -> None:
+        """Stop workers (unfinished follow-ups stay pending for the next start)"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Claim outcomes and follow-up counters"""
+        return {
+            'claimed': self.claimed,
+            'duplicates': self.duplicates,
+            'recorded': self.recorded,
+            'unknown': self.unknown,
+            'queued': self._queue.qsize(),
+            'completed': self.completed,
+            'failed': self.failed,
+            'errors': self.errors,
+            'workers': len(self._tasks),
+        }
+
+
+# Global instance (initialized in server.py startup)
+_payment_webhooks: Optional[PaymentWebhooks] = None
+
+
+def init_payment_webhooks(db, **kwargs) -> PaymentWebhooks:
+    """Create the global payment webhook processor"""
+    global _payment_webhooks
+    _payment_webhooks = PaymentWebhooks(db, **kwargs)
+    return _payment_webhooks
+
+
+def get_payment_webhooks() -> Optional[PaymentWebhooks]:
+    """Get the global payment webhook processor (None if not initialized)"""
+    return _payment_webhooks
@@ -0,0 +1,180 @@
+"""
+Rate Engine
+Concurrent per-carrier ShipStation rate requests
+
+A single /v2/rates request with all carrier ids is as slow as the slowest
+carrier. RateFanOut sends one request per carrier (or per group of
+carriers), merges results as they arrive and lets the caller show the first
+usable batch before the rest are in. Every request has its own deadline;
+carriers that miss it are dropped instead of holding the whole screen.
+
+Usage:
+    fan_out = RateFanOut(order_data, carrier_ids, headers, cache_key=key)
+    fan_out.start()
+    first = await fan_out.first_batch()   # prepared rates, [] if none usable
+    final = await fan_out.wait_all()      # all carriers that made the deadline
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from services.shipping_service import (
+    build_shipstation_rates_request,
+    fetch_rates_coalesced,
+    fetch_rates_hedged,
+    prepare_rates_for_display
+)
+
+logger = logging.getLogger(__name__)
+
+RATES_API_URL = 'https://api.shipstation.com/v2/rates'
+
+# Per-carrier outcome counters (monitoring)
+_carrier_stats: Dict[str, Dict[str, Any]] = {}
+
+
+def _record(carrier: str, outcome: str, elapsed_ms: float) -> None:
+    stats = _carrier_stats.setdefault(carrier, {
+        'requests': 0, 'ok': 0, 'errors': 0, 'dropped': 0, 'total_ms': 0.0, 'max_ms': 0.0
+    })
+    stats['requests'] += 1
+    stats[outcome] += 1
+    stats['total_ms'] += elapsed_ms
+    stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+
+def get_rate_engine_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-carrier request outcomes and latency"""
+    return {
+        carrier: {
+            'requests': stats['requests'],
+            'ok': stats['ok'],
+            'errors': stats['errors'],
+            'dropped': stats['dropped'],
+            'avg_ms': round(stats['total_ms'] / stats['requests'], 1) if stats['requests'] else 0,
+            'max_ms': round(stats['max_ms'], 1),
+        }
+        for carrier, stats in _carrier_stats.items()
+    }
+
+
+class RateFanOut:
+    """One rate request per carrier group, merged incrementally"""
+
+    def __init__(
+        self,
+        order_data: Dict[str, Any],
+        carrier_ids: Dict[str, str],
+        headers: Dict[str, str],
+        cache_key: Optional[str] = None,
+        carrier_deadline: float = 10.0,
+        carriers_per_request: int = 1,
+        api_url: str = RATES_API_URL
+    ):
+        """
+        Args:
+            order_data: Context user_data with order info
+            carrier_ids: {carrier_name: carrier_id} (see CarrierCatalog)
+            headers: API headers with auth
+            cache_key: Rate cache key - identical concurrent requests are coalesced
+            carrier_deadline: Seconds a carrier request may take before it is dropped
+            carriers_per_request: Carrier ids per /v2/rates request
+            api_url: ShipStation rates URL
+        """
+        self.order_data = dict(order_data)
+        self.headers = headers
+        self.cache_key = cache_key
+        self.carrier_deadline = carrier_deadline
+        self.api_url = api_url
+
+        items = list(carrier_ids.items())
+        size = max(1, carriers_per_request)
+        self.groups = [dict(items[i:i + size]) for i in range(0, len(items), size)]
+
+        self.raw_rates: List[Dict[str, Any]] = []
+        self.errors: List[str] = []
+        self.dropped: List[str] = []
+        self._tasks: List[asyncio.Task] = []
+        self._pending = len(self.groups)
+        self._first = asyncio.Event()
+        self._started_at: Optional[float] = None
+        self.first_batch_ms: Optional[float] = None
+        self.total_ms: Optional[float] = None
+
+    def start(self) -> None:
+        """Send all carrier requests"""
+        self._started_at = time.perf_counter()
+        if not self.groups:
+            self._first.set()
+            return
+        self._tasks = [asyncio.create_task(self._query(group)) for group in self.groups]
+
+    async def _query(self, group: Dict[str, str]) -> None:
+        label = ', '.join(group)
+        started = time.perf_counter()
+        rate_request = build_shipstation_rates_request(self.order_data, list(group.values()))
+        request_args = dict(
+            rate_request=rate_request,
+            headers=self.headers,
+            api_url=self.api_url,
+            timeout=self.carrier_deadline
+        )
+        if self.cache_key:
+            call = fetch_rates_coalesced(cache_key=f"{self.cache_key}:{','.join(group.values())}", **request_args)
+        else:
+            call = fetch_rates_hedged(**request_args)
+        try:
+            success, rates, error_msg = await asyncio.wait_for(call, timeout=self.carrier_deadline)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if success:
+                self.raw_rates.extend(rates)
+                _record(label, 'ok', elapsed_ms)
+                logger.info(f"📦 {label}: {len(rates)} rates in {elapsed_ms:.0f}ms")
+                if not self._first.is_set() and prepare_rates_for_display(self.raw_rates):
+                    self.first_batch_ms = (time.perf_counter() - self._started_at) * 1000
+                    self._first.set()
+            else:
+                self.errors.append(f"{label}: {error_msg}")
+                _record(label, 'errors', elapsed_ms)
+        except asyncio.TimeoutError:
+            self.dropped.append(label)
+            _record(label, 'dropped', (time.perf_counter() - started) * 1000)
+            logger.warning(f"⏱️ {label}: no rates within {self.carrier_deadline}s, dropped")
+        finally:
+            self._pending -= 1
+            if self._pending == 0:
+                self.total_ms = (time.perf_counter() - self._started_at) * 1000
+                self._first.set()
+
+    async def first_batch(self) -> List[Dict[str, Any]]:
+        """Wait for the first usable rates (or for all carriers if none are usable)"""
+        await self._first.wait()
+        return prepare_rates_for_display(self.raw_rates)
+
+    async def wait_all(self) -> List[Dict[str, Any]]:
+        """Wait for all carriers (up to their deadline) and return merged rates"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        return prepare_rates_for_display(self.raw_rates)
+
+    def done(self) -> bool:
+        """All carrier requests finished or dropped"""
+        return self._pending == 0
+
+    @property
+    def timed_out(self) -> bool:
+        """No carrier answered within its deadline"""
+        return self.done() and not self.raw_rates and not self.errors and bool(self.dropped)
+
+    def error_message(self) -> str:
+        """Summary of failures for logs / session"""
+        parts = list(self.errors)
+        if self.dropped:
+            parts.append(f"Request timeout - dropped after {self.carrier_deadline}s: {', '.join(self.dropped)}")
+        return '; '.join(parts) or 'No rates returned from ShipStation'
+
+    def cancel(self) -> None:
+        """Stop waiting for outstanding carriers"""
+        for task in self._tasks:
+            task.cancel()
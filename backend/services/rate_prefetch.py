@@ -0,0 +1,204 @@
+"""
+Rate Prefetch Service
+Speculative ShipStation rate requests during the order flow
+
+Both addresses and the weight are known when the weight step completes;
+dimensions and the confirmation screen take the user a few more seconds.
+The prefetcher starts the /v2/rates request at that point and stores the
+result in the rate cache, so pressing "confirm" usually hits the cache.
+
+- One prefetch per user: when the rate-relevant fields change (edit of a
+  ZIP, weight or dimensions) the previous prefetch is superseded.
+- If the user confirms while the prefetch is still running, the confirm
+  request joins the same in-flight call (single-flight on the cache key).
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config.performance_config import BotPerformanceConfig
+
+logger = logging.getLogger(__name__)
+
+
+class _Prefetch:
+    __slots__ = ('key', 'task', 'called', 'stored')
+
+    def __init__(self, key: str):
+        self.key = key
+        self.task: Optional[asyncio.Task] = None
+        self.called = False
+        self.stored = False
+
+
+class RatePrefetcher:
+    """Tracks the latest speculative rate request per user"""
+
+    def __init__(
+        self,
+        fetcher: Optional[Callable[[Dict[str, Any]], Awaitable[bool]]] = None,
+        max_concurrent: int = 20,
+        max_tracked_users: int = 5000
+    ):
+        """
+        Args:
+            fetcher: Coroutine fetching rates for order data into the cache
+                     (default: handlers.order_flow.rates.refresh_cached_rates)
+            max_concurrent: Speculative API calls in flight across all users
+            max_tracked_users: Users whose last prefetch is remembered
+        """
+        self._fetcher = fetcher
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.max_tracked_users = max_tracked_users
+        self._prefetches: Dict[int, _Prefetch] = {}
+
+        self.started = 0
+        self.skipped_cached = 0
+        self.stored = 0
+        self.failed = 0
+        self.superseded = 0
+        self.wasted = 0
+        self.hits = 0
+        self.joined = 0
+        self.misses = 0
+        self.without_prefetch = 0
+
+    async def _fetch(self, order_data: Dict[str, Any]) -> bool:
+        if self._fetcher is not None:
+            return await self._fetcher(order_data)
+        from handlers.order_flow.rates import refresh_cached_rates
+        return await refresh_cached_rates(order_data)
+
+    async def _run(self, user_id: int, prefetch: '_Prefetch', order_data: Dict[str, Any]) -> None:
+        from services.shipstation_cache import shipstation_cache
+
+        if await shipstation_cache.has_fresh(prefetch.key):
+            self.skipped_cached += 1
+            prefetch.stored = True
+            return
+
+        async with self._semaphore:
+            self.started += 1
+            prefetch.called = True
+            try:
+                if await self._fetch(order_data):
+                    self.stored += 1
+                    prefetch.stored = True
+                    logger.info(f"🔮 Prefetched rates for user {user_id}")
+                else:
+                    self.failed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"Rate prefetch failed for user {user_id}: {e}")
+
+    def _discard(self, prefetch: '_Prefetch') -> None:
+        """Drop a prefetch whose result will not be used"""
+        if not prefetch.task.done():
+            prefetch.task.cancel()
+        if prefetch.called:
+            self.wasted += 1
+
+    def schedule(self, user_id: int, order_data: Dict[str, Any]) -> bool:
+        """
+        Start (or supersede) the prefetch for the user's current order data
+
+        Returns True if a new prefetch was started.
+        """
+        from services.shipstation_cache import shipstation_cache
+
+        required = ('from_zip', 'to_zip', 'parcel_weight', 'from_city', 'from_state', 'to_city', 'to_state')
+        if not all(order_data.get(field) for field in required):
+            return False
+        try:
+            key = shipstation_cache.key_for_order(order_data)
+        except (KeyError, TypeError, ValueError):
+            return False
+
+        current = self._prefetches.get(user_id)
+        if current is not None:
+            if current.key == key:
+                return False
+            self.superseded += 1
+            self._discard(current)
+
+        prefetch = _Prefetch(key)
+        prefetch.task = asyncio.create_task(self._run(user_id, prefetch, dict(order_data)))
+        self._prefetches.pop(user_id, None)
+        self._prefetches[user_id] = prefetch
+        self._trim()
+        return True
+
+    def _trim(self) -> None:
+        """Forget finished prefetches of users who never confirmed (oldest first)"""
+        if len(self._prefetches) <= self.max_tracked_users:
+            return
+        for user_id in list(self._prefetches):
+            if len(self._prefetches) <= self.max_tracked_users:
+                break
+            if self._prefetches[user_id].task.done():
+                self._discard(self._prefetches.pop(user_id))
+
+    def consume(self, user_id: int, order_data: Dict[str, Any]) -> Optional[str]:
+        """
+        Record the outcome when the user confirms and rates are requested
+
+        Returns 'hit' (rates are in cache), 'joined' (prefetch still in flight -
+        the request will share it), 'miss' (prefetch was for other data or
+        failed) or None (no prefetch).
+        """
+        from services.shipstation_cache import shipstation_cache
+
+        prefetch = self._prefetches.pop(user_id, None)
+        if prefetch is None:
+            self.without_prefetch += 1
+            return None
+
+        try:
+            key = shipstation_cache.key_for_order(order_data)
+        except (KeyError, TypeError, ValueError):
+            key = None
+
+        if prefetch.key != key:
+            self.misses += 1
+            self._discard(prefetch)
+            return 'miss'
+        if not prefetch.task.done():
+            self.joined += 1
+            return 'joined'
+        if prefetch.stored:
+            self.hits += 1
+            return 'hit'
+        self.misses += 1
+        return 'miss'
+
+    def cancel(self, user_id: int) -> None:
+        """Order cancelled - drop the user's prefetch"""
+        prefetch = self._prefetches.pop(user_id, None)
+        if prefetch is not None:
+            self._discard(prefetch)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Prefetch hit rate and wasted calls"""
+        confirmed = self.hits + self.joined + self.misses
+        useful = self.hits + self.joined
+        return {
+            'in_flight': sum(1 for p in self._prefetches.values() if not p.task.done()),
+            'tracked_users': len(self._prefetches),
+            'started': self.started,
+            'skipped_cached': self.skipped_cached,
+            'stored': self.stored,
+            'failed': self.failed,
+            'superseded': self.superseded,
+            'wasted': self.wasted,
+            'hits': self.hits,
+            'joined_in_flight': self.joined,
+            'misses': self.misses,
+            'confirmed_without_prefetch': self.without_prefetch,
+            'hit_rate': f"{(useful / confirmed * 100) if confirmed else 0:.1f}%",
+        }
+
+
+# Global instance
+rate_prefetcher = RatePrefetcher(**BotPerformanceConfig.get_rate_prefetch_config())
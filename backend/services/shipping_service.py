@@ -4,10 +4,13 @@ Handles all shipping-related operations including rate calculations and label cr
 """
 import logging
 import httpx
+from utils.http_clients import get_http_client
 from typing import Optional, Dict, List, Any, Tuple
 from telegram import Update
 from telegram.ext import ContextTypes
-from utils.retry_utils import retry_on_api_error
+from utils.retry_utils import retry_on_api_error, SHIPSTATION_CIRCUIT, CircuitOpenError
+from utils.single_flight import get_single_flight
+from utils.hedging import get_hedger
 
 logger = logging.getLogger(__name__)
 
@@ -23,7 +26,8 @@ async def display_shipping_rates(
     find_user_by_telegram_id_func,
     safe_telegram_call_func,
     STATE_NAMES: dict,
-    SELECT_CARRIER: int
+    SELECT_CARRIER: int,
+    edit_message=None
 ) -> int:
     """
     Display shipping rates to user (reusable for both cached and fresh rates)
@@ -36,6 +40,8 @@ async def display_shipping_rates(
         safe_telegram_call_func: Function for safe telegram calls
         STATE_NAMES: State names mapping
         SELECT_CARRIER: Select carrier state constant
+        edit_message: Existing bot message to edit instead of sending a new one
+                      (progress message / first batch of rates)
     
     Returns:
         int: SELECT_CARRIER state
@@ -55,11 +61,20 @@ async def display_shipping_rates(
     
     # Save state
     
-    # Send message (use effective_message to support both callbacks and regular messages)
-    message_obj = update.effective_message
-    bot_msg = await safe_telegram_call_func(
-        message_obj.reply_text(message, reply_markup=reply_markup, parse_mode='HTML')
-    )
+    bot_msg = None
+    if edit_message is not None:
+        edited = await safe_telegram_call_func(
+            edit_message.edit_text(message, reply_markup=reply_markup, parse_mode='HTML')
+        )
+        if edited:
+            bot_msg = edit_message
+    
+    if bot_msg is None:
+        # Send message (use effective_message to support both callbacks and regular messages)
+        message_obj = update.effective_message
+        bot_msg = await safe_telegram_call_func(
+            message_obj.reply_text(message, reply_markup=reply_markup, parse_mode='HTML')
+        )
     
     if bot_msg:
         context.user_data['last_bot_message_id'] = bot_msg.message_id
@@ -189,8 +204,7 @@ This module centralizes all shipping-related operations:
 
 2. Label Creation & Delivery:
    - build_shipstation_label_request() - Build label request
-   - download_label_pdf() - Download PDF from URL
-   - send_label_to_user() - Send via Telegram
+   - send_label_to_user() - Send via Telegram (file_id / URL, no download)
 
 3. Validation:
    - validate_shipping_address() - Address validation
@@ -449,6 +463,63 @@ def balance_and_deduplicate_rates(
     return balanced_rates
 
 
+def prepare_rates_for_display(
+    all_rates: List[Dict],
+    max_per_carrier: int = 5,
+    limit: int = 15,
+    markup: float = 10.0
+) -> List[Dict[str, Any]]:
+    """
+    Turn raw ShipStation rates into the list shown to the user
+    
+    Excludes unsupported carriers, applies the service filter, balances
+    across carriers and adds the label markup (hidden from user - shown
+    as part of shipping cost).
+    
+    Args:
+        all_rates: Raw rates from ShipStation
+        max_per_carrier: Maximum rates to show per carrier
+        limit: Maximum rates in total
+        markup: Amount added to each rate
+    
+    Returns:
+        Formatted rates (empty if nothing is left after filtering)
+    """
+    excluded_carriers = ['globalpost']
+    filtered_rates = [
+        rate for rate in all_rates
+        if rate.get('carrier_code', '').lower() not in excluded_carriers
+    ]
+    filtered_rates = apply_service_filter(filtered_rates)
+    if not filtered_rates:
+        return []
+    
+    rates = balance_and_deduplicate_rates(filtered_rates, max_per_carrier=max_per_carrier)[:limit]
+    for rate in rates:
+        # Get original amount from shipping_amount dict or amount field
+        if 'shipping_amount' in rate and isinstance(rate['shipping_amount'], dict):
+            original_amount = rate['shipping_amount'].get('amount', 0.0)
+        elif 'amount' in rate:
+            original_amount = rate['amount']
+        else:
+            original_amount = 0.0
+        
+        # Store original amount for reference
+        rate['original_amount'] = original_amount
+        
+        # Add markup to displayed amount
+        if 'shipping_amount' in rate and isinstance(rate['shipping_amount'], dict):
+            rate['shipping_amount']['amount'] = original_amount + markup
+        elif 'amount' in rate:
+            rate['amount'] = original_amount + markup
+        else:
+            # Create shipping_amount structure if it doesn't exist
+            rate['shipping_amount'] = {'amount': original_amount + markup}
+            rate['amount'] = original_amount + markup
+    
+    return rates
+
+
 @retry_on_api_error(max_attempts=2, min_wait=1, max_wait=5)
 async def fetch_rates_from_shipstation(
     rate_request: Dict[str, Any],
@@ -472,12 +543,13 @@ async def fetch_rates_from_shipstation(
         # Create timeout config (connect, read, write, pool)
         timeout_config = httpx.Timeout(timeout, connect=10.0)
         
-        async with httpx.AsyncClient(timeout=timeout_config) as client:
-            response = await client.post(
-                api_url,
-                json=rate_request,
-                headers=headers
-            )
+        client = get_http_client('shipstation')
+        response = await client.post(
+            api_url,
+            json=rate_request,
+            headers=headers,
+            timeout=timeout_config
+        )
         
         if response.status_code == 200:
             data = response.json()
@@ -501,6 +573,79 @@ async def fetch_rates_from_shipstation(
         return False, None, f"Unexpected error: {str(e)}"
 
 
+CIRCUIT_OPEN_ERROR = "ShipStation temporarily unavailable (circuit open)"
+
+
+def is_shipstation_outage(error_msg: Optional[str]) -> bool:
+    """
+    Whether a fetch_rates_from_shipstation error means ShipStation itself is
+    failing (timeouts, network errors, 5xx, 429) rather than a bad request
+    """
+    if not error_msg:
+        return False
+    if error_msg.startswith(("Request timeout", "Network error")):
+        return True
+    if error_msg.startswith("ShipStation API error: "):
+        status = error_msg[len("ShipStation API error: "):].split(' ', 1)[0]
+        return status.startswith('5') or status == '429'
+    return False
+
+
+async def fetch_rates_hedged(
+    rate_request: Dict[str, Any],
+    headers: Dict[str, str],
+    api_url: str,
+    timeout: int = 30
+) -> Tuple[bool, Optional[List[Dict]], Optional[str]]:
+    """
+    fetch_rates_from_shipstation with a hedged duplicate when the call is
+    slower than the endpoint's recent p95 (rate requests are idempotent)
+    
+    Goes through SHIPSTATION_CIRCUIT: while the circuit is open the call
+    fails immediately with CIRCUIT_OPEN_ERROR.
+    """
+    try:
+        return await SHIPSTATION_CIRCUIT.call(
+            lambda: get_hedger('shipstation_rates').call(
+                lambda: fetch_rates_from_shipstation(
+                    rate_request=rate_request,
+                    headers=headers,
+                    api_url=api_url,
+                    timeout=timeout
+                ),
+                is_success=lambda result: result[0]
+            ),
+            is_failure=lambda result: is_shipstation_outage(result[2])
+        )
+    except CircuitOpenError:
+        return False, None, CIRCUIT_OPEN_ERROR
+
+
+async def fetch_rates_coalesced(
+    cache_key: str,
+    rate_request: Dict[str, Any],
+    headers: Dict[str, str],
+    api_url: str,
+    timeout: int = 30
+) -> Tuple[bool, Optional[List[Dict]], Optional[str]]:
+    """
+    fetch_rates_from_shipstation shared by concurrent identical requests
+    
+    Requests with the same cache key (same route and parcel, see
+    ShipStationCache.key_for_order) wait for one in-flight /v2/rates call
+    and get its result.
+    """
+    return await get_single_flight('shipstation_rates').do(
+        cache_key,
+        lambda: fetch_rates_hedged(
+            rate_request=rate_request,
+            headers=headers,
+            api_url=api_url,
+            timeout=timeout
+        )
+    )
+
+
 def filter_and_sort_rates(
     rates: List[Dict],
     excluded_carriers: Optional[List[str]] = None
@@ -569,7 +714,7 @@ async def save_rates_to_cache_and_session(
     from datetime import datetime, timezone
     
     # Save to cache
-    shipstation_cache.set(
+    await shipstation_cache.set(
         from_zip=order_data['from_zip'],
         to_zip=order_data['to_zip'],
         weight=order_data.get('weight') or order_data.get('parcel_weight', 1.0),
@@ -651,82 +796,36 @@ def build_shipstation_label_request(
     }
 
 
-async def download_label_pdf(label_url: str, timeout: int = 30) -> Tuple[bool, Optional[bytes], Optional[str]]:
-    """
-    Download label PDF from URL
-    
-    Args:
-        label_url: URL to download PDF from
-        timeout: Request timeout
-    
-    Returns:
-        (success, pdf_bytes, error_message)
-    """
-    try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.get(label_url)
-        
-        if response.status_code == 200:
-            return True, response.content, None
-        else:
-            return False, None, f"Failed to download label: HTTP {response.status_code}"
-            
-    except httpx.TimeoutException:
-        return False, None, "Timeout downloading label"
-    except httpx.RequestError as e:
-        return False, None, f"Network error: {str(e)}"
-    except Exception as e:
-        return False, None, f"Error downloading label: {str(e)}"
-
-
 async def send_label_to_user(
     bot_instance,
     telegram_id: int,
-    pdf_bytes: bytes,
-    order_id: str,
-    tracking_number: str,
+    label: dict,
     carrier: str,
     safe_telegram_call_func
 ) -> Tuple[bool, Optional[str]]:
     """
     Send label PDF to user via Telegram
     
+    The PDF never passes through the bot: a known Telegram file_id is
+    reused, otherwise Telegram fetches label_url itself
+    (services/label_delivery.py).
+    
     Args:
         bot_instance: Telegram bot instance
         telegram_id: User's telegram ID
-        pdf_bytes: PDF file content
-        order_id: Order ID
-        tracking_number: Tracking number
+        label: shipping_labels document (order_id, label_url, tracking_number)
         carrier: Carrier name
         safe_telegram_call_func: Safe telegram call wrapper
     
     Returns:
         (success, error_message)
     """
-    import io
+    from services.label_delivery import label_delivery
     
-    try:
-        # Create file-like object
-        pdf_file = io.BytesIO(pdf_bytes)
-        # Use only tracking number as filename
-        pdf_file.name = f"{tracking_number}.pdf"
-        
-        # Caption message
-        caption = f"""✅ Shipping Label
+    # Caption message
+    caption = f"""✅ Shipping Label
 
 Carrier: {carrier}
-Tracking: {tracking_number}"""
-        
-        # Send document
-        await safe_telegram_call_func(
-            bot_instance.send_document(
-                chat_id=telegram_id,
-                document=pdf_file,
-                caption=caption
-            )
-        )
-        
-        return True, None
-        
-    except Exception as e:
-        return False, f"Error sending label: {str(e)}"
+Tracking: {label.get('tracking_number', '')}"""
+    
+    return await label_delivery.send(bot_instance, telegram_id, label, caption, safe_telegram_call_func)
@@ -1,33 +1,102 @@
 """
 ShipStation API Response Caching
 Кэширование результатов запросов тарифов для ускорения работы
+
+Два уровня:
+- L1: ограниченный LRU в памяти процесса
+- L2: общая MongoDB коллекция rate_cache с TTL индексом (общая для всех
+  uvicorn воркеров и переживает рестарт)
+
+Stale-while-revalidate: запись свежая cache_duration минут, затем ещё
+stale_minutes отдаётся сразу, пока в фоне запрашиваются новые тарифы.
+
+Пока ShipStation недоступен (circuit open), get_fallback отдаёт последние
+известные тарифы любого возраста или оценку по соседнему весу на том же
+ZIP3 маршруте.
 """
+import asyncio
 import hashlib
 import json
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
-from typing import Optional, Dict, Any
+from typing import Awaitable, Callable, Optional, Dict, Any
 import logging
 
+from config.performance_config import BotPerformanceConfig
+
 logger = logging.getLogger(__name__)
 
+# Границы весовых корзин для метрик (фунты)
+WEIGHT_BUCKETS = ((1, '<1lb'), (5, '1-5lb'), (20, '5-20lb'), (70, '20-70lb'))
+
+# Максимум маршрутов в метриках (остальные попадают в 'other')
+MAX_METRIC_ROUTES = 500
+
+
+def weight_bucket(weight: float) -> str:
+    """Весовая корзина для метрик"""
+    for limit, name in WEIGHT_BUCKETS:
+        if weight < limit:
+            return name
+    return '70lb+'
+
+
+def route_zone(from_zip: str, to_zip: str) -> str:
+    """Маршрут по ZIP3 зонам (ограниченная кардинальность метрик)"""
+    return f"{str(from_zip)[:3]}→{str(to_zip)[:3]}"
+
 
 class ShipStationCache:
     """
     Кэш для результатов ShipStation API
     Кэширует тарифы доставки на основе маршрута и веса посылки
     """
-    
-    def __init__(self, cache_duration_minutes: int = 60):
+
+    def __init__(self,
+                 cache_duration_minutes: int = 60,
+                 stale_minutes: int = 120,
+                 max_entries: int = 5000,
+                 collection_name: str = 'rate_cache'):
         """
         Args:
-            cache_duration_minutes: Время жизни кэша в минутах (по умолчанию 60)
+            cache_duration_minutes: Время жизни свежей записи в минутах (по умолчанию 60)
+            stale_minutes: Сколько ещё отдавать устаревшую запись с фоновым обновлением
+            max_entries: Размер L1 LRU в памяти
+            collection_name: MongoDB коллекция L2
         """
-        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
         self.cache_duration = timedelta(minutes=cache_duration_minutes)
+        self.stale_duration = timedelta(minutes=stale_minutes)
+        self.max_entries = max_entries
+        self.collection_name = collection_name
+        self._collection = None
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
         self.hits = 0
         self.misses = 0
-    
-    def _generate_cache_key(self, 
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.l2_errors = 0
+        self.fallback_cached = 0
+        self.fallback_estimated = 0
+        self.fallback_misses = 0
+        self._by_route: Dict[str, Dict[str, int]] = {}
+        self._by_weight: Dict[str, Dict[str, int]] = {}
+
+    async def init_storage(self, db) -> None:
+        """
+        Подключить общий L2 (MongoDB; TTL индекс в utils/db_indexes.py)
+
+        Без вызова кэш работает только в памяти процесса.
+        """
+        self._collection = db[self.collection_name]
+        logger.info(f"✅ Rate cache L2 enabled ({self.collection_name})")
+
+    def _generate_cache_key(self,
                            from_zip: str,
                            to_zip: str,
                            weight: float,
@@ -36,13 +105,13 @@ class ShipStationCache:
                            height: float = 10) -> str:
         """
         Генерирует уникальный ключ кэша на основе параметров доставки
-        
+
         Args:
             from_zip: ZIP код отправителя
             to_zip: ZIP код получателя
             weight: Вес в фунтах
             length, width, height: Размеры в дюймах
-        
+
         Returns:
             str: MD5 хэш параметров
         """
@@ -55,53 +124,208 @@ class ShipStationCache:
         }
         key_string = json.dumps(key_data, sort_keys=True)
         return hashlib.md5(key_string.encode()).hexdigest()
-    
-    def get(self, 
-            from_zip: str,
-            to_zip: str,
-            weight: float,
-            length: float = 10,
-            width: float = 10,
-            height: float = 10) -> Optional[list]:
+
+    def key_for_order(self, order_data: Dict[str, Any]) -> str:
+        """Ключ кэша для данных заказа (context.user_data)"""
+        return self._generate_cache_key(
+            order_data['from_zip'],
+            order_data['to_zip'],
+            order_data['parcel_weight'],
+            order_data.get('parcel_length', 10),
+            order_data.get('parcel_width', 10),
+            order_data.get('parcel_height', 10)
+        )
+
+    def _record(self, outcome: str, from_zip: str, to_zip: str, weight: float) -> None:
+        """Учесть hit/stale/miss в разбивке по маршруту и весовой корзине"""
+        route = route_zone(from_zip, to_zip)
+        if route not in self._by_route and len(self._by_route) >= MAX_METRIC_ROUTES:
+            route = 'other'
+        for table, key in ((self._by_route, route), (self._by_weight, weight_bucket(weight))):
+            counters = table.setdefault(key, {'hits': 0, 'stale': 0, 'misses': 0})
+            counters[outcome] += 1
+
+    def _remember(self, cache_key: str, entry: Dict[str, Any]) -> None:
+        """Положить запись в L1 с вытеснением LRU"""
+        self._cache[cache_key] = entry
+        self._cache.move_to_end(cache_key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    @staticmethod
+    def _age(entry: Dict[str, Any]) -> timedelta:
+        cached_time = entry['timestamp']
+        if cached_time.tzinfo is None:
+            # MongoDB возвращает naive UTC
+            cached_time = cached_time.replace(tzinfo=timezone.utc)
+        return datetime.now(timezone.utc) - cached_time
+
+    async def _load_l2(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        if self._collection is None:
+            return None
+        try:
+            doc = await self._collection.find_one({'_id': cache_key})
+        except Exception as e:
+            self.l2_errors += 1
+            logger.warning(f"Rate cache L2 read failed: {e}")
+            return None
+        if not doc:
+            return None
+        return {
+            'rates': doc['rates'],
+            'timestamp': doc['timestamp'],
+            'route': doc.get('route'),
+            'zone': doc.get('zone'),
+            'weight': doc.get('weight')
+        }
+
+    async def has_fresh(self, cache_key: str) -> bool:
+        """Есть ли свежая запись (L1 или L2), без учёта в метриках"""
+        entry = self._cache.get(cache_key)
+        if entry is None:
+            entry = await self._load_l2(cache_key)
+            if entry is not None:
+                self._remember(cache_key, entry)
+        return entry is not None and self._age(entry) <= self.cache_duration
+
+    def _schedule_refresh(self, cache_key: str, refresh: Callable[[], Awaitable[Any]]) -> None:
+        """Запустить фоновое обновление (одно на ключ)"""
+        task = self._refreshing.get(cache_key)
+        if task and not task.done():
+            return
+
+        async def run():
+            try:
+                if await refresh():
+                    self.refreshes += 1
+                else:
+                    self.refresh_failures += 1
+            except Exception as e:
+                self.refresh_failures += 1
+                logger.warning(f"Background rate refresh failed: {e}")
+            finally:
+                self._refreshing.pop(cache_key, None)
+
+        self._refreshing[cache_key] = asyncio.create_task(run())
+
+    async def get(self,
+                  from_zip: str,
+                  to_zip: str,
+                  weight: float,
+                  length: float = 10,
+                  width: float = 10,
+                  height: float = 10,
+                  refresh: Optional[Callable[[], Awaitable[Any]]] = None) -> Optional[list]:
         """
         Получить закэшированные тарифы
-        
+
+        Args:
+            refresh: Корутина-фабрика для фонового обновления устаревшей записи
+                     (должна сама сохранить новые тарифы через set)
+
         Returns:
             list: Список тарифов или None если кэш устарел/не найден
         """
         cache_key = self._generate_cache_key(from_zip, to_zip, weight, length, width, height)
-        
-        if cache_key not in self._cache:
+
+        entry = self._cache.get(cache_key)
+        tier = 'L1'
+        if entry is None:
+            entry = await self._load_l2(cache_key)
+            tier = 'L2'
+
+        age = self._age(entry) if entry else None
+        if entry is None or age > self.cache_duration + self.stale_duration:
+            self._cache.pop(cache_key, None)
             self.misses += 1
+            self._record('misses', from_zip, to_zip, weight)
             logger.debug(f"❌ Cache MISS for route {from_zip} → {to_zip}")
             return None
-        
-        cache_entry = self._cache[cache_key]
-        cached_time = cache_entry['timestamp']
-        
-        # Проверяем, не устарел ли кэш
-        if datetime.now(timezone.utc) - cached_time > self.cache_duration:
-            # Кэш устарел - удаляем
-            del self._cache[cache_key]
-            self.misses += 1
-            logger.debug(f"⏰ Cache EXPIRED for route {from_zip} → {to_zip}")
-            return None
-        
+
+        if tier == 'L1':
+            self._cache.move_to_end(cache_key)
+            self.l1_hits += 1
+        else:
+            self._remember(cache_key, entry)
+            self.l2_hits += 1
         self.hits += 1
-        logger.info(f"✅ Cache HIT for route {from_zip} → {to_zip} (age: {(datetime.now(timezone.utc) - cached_time).seconds}s)")
-        return cache_entry['rates']
-    
-    def set(self,
-            from_zip: str,
-            to_zip: str,
-            weight: float,
-            rates: list,
-            length: float = 10,
-            width: float = 10,
-            height: float = 10) -> None:
+
+        if age > self.cache_duration:
+            # Устаревшая запись: отдаём сразу, обновляем в фоне
+            self.stale_hits += 1
+            self._record('stale', from_zip, to_zip, weight)
+            if refresh is not None:
+                self._schedule_refresh(cache_key, refresh)
+            logger.info(f"♻️ Cache STALE {tier} for route {from_zip} → {to_zip} (age: {int(age.total_seconds())}s), revalidating")
+        else:
+            self._record('hits', from_zip, to_zip, weight)
+            logger.info(f"✅ Cache HIT {tier} for route {from_zip} → {to_zip} (age: {int(age.total_seconds())}s)")
+        return entry['rates']
+
+    async def _nearest_entry(self, from_zip: str, to_zip: str, weight: float) -> Optional[Dict[str, Any]]:
+        """Запись того же ZIP3 маршрута с ближайшим весом (L1 и L2)"""
+        zone = route_zone(from_zip, to_zip)
+        candidates = [entry for entry in self._cache.values() if entry.get('zone') == zone]
+        if self._collection is not None:
+            try:
+                candidates.extend(await self._collection.find({'zone': zone}).limit(100).to_list(100))
+            except Exception as e:
+                self.l2_errors += 1
+                logger.warning(f"Rate cache L2 read failed: {e}")
+        candidates = [entry for entry in candidates if entry.get('rates')]
+        if not candidates:
+            return None
+        # При равном отличии берём более тяжёлую посылку - оценка не занижает цену
+        return min(candidates, key=lambda entry: (abs(float(entry.get('weight') or 0) - weight),
+                                                  -float(entry.get('weight') or 0)))
+
+    async def get_fallback(self, order_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Последние известные тарифы на время недоступности ShipStation
+
+        Точная запись отдаётся независимо от возраста ('cached'); если её
+        нет - тарифы ближайшего веса на том же ZIP3 маршруте ('estimated').
+        Каждый тариф помечается полями fallback и fallback_age_minutes.
+
+        Returns:
+            dict: {'rates', 'kind', 'age_minutes'} или None
+        """
+        cache_key = self.key_for_order(order_data)
+        entry = self._cache.get(cache_key) or await self._load_l2(cache_key)
+        kind = 'cached'
+        if entry is None:
+            entry = await self._nearest_entry(order_data['from_zip'], order_data['to_zip'],
+                                              float(order_data['parcel_weight']))
+            kind = 'estimated'
+        if entry is None:
+            self.fallback_misses += 1
+            return None
+
+        if kind == 'cached':
+            self.fallback_cached += 1
+        else:
+            self.fallback_estimated += 1
+        age_minutes = int(self._age(entry).total_seconds() // 60)
+        logger.warning(f"🛟 Rate fallback ({kind}, {age_minutes} min old) for route "
+                       f"{order_data['from_zip']} → {order_data['to_zip']}")
+        return {
+            'rates': [{**rate, 'fallback': kind, 'fallback_age_minutes': age_minutes} for rate in entry['rates']],
+            'kind': kind,
+            'age_minutes': age_minutes
+        }
+
+    async def set(self,
+                  from_zip: str,
+                  to_zip: str,
+                  weight: float,
+                  rates: list,
+                  length: float = 10,
+                  width: float = 10,
+                  height: float = 10) -> None:
         """
         Сохранить тарифы в кэш
-        
+
         Args:
             from_zip: ZIP код отправителя
             to_zip: ZIP код получателя
@@ -110,91 +334,138 @@ class ShipStationCache:
             length, width, height: Размеры в дюймах
         """
         cache_key = self._generate_cache_key(from_zip, to_zip, weight, length, width, height)
-        
-        self._cache[cache_key] = {
+        now = datetime.now(timezone.utc)
+        entry = {
             'rates': rates,
-            'timestamp': datetime.now(timezone.utc),
+            'timestamp': now,
             'route': f"{from_zip} → {to_zip}",
+            'zone': route_zone(from_zip, to_zip),
             'weight': weight
         }
-        
+        self._remember(cache_key, entry)
+
+        if self._collection is not None:
+            try:
+                await self._collection.replace_one(
+                    {'_id': cache_key},
+                    {'_id': cache_key, **entry, 'expires_at': now + self.cache_duration + self.stale_duration},
+                    upsert=True
+                )
+            except Exception as e:
+                self.l2_errors += 1
+                logger.warning(f"Rate cache L2 write failed: {e}")
+
         logger.info(f"💾 Cached {len(rates)} rates for route {from_zip} → {to_zip}")
-    
-    def delete(self,
-               from_zip: str,
-               to_zip: str,
-               weight: float,
-               length: float = 10,
-               width: float = 10,
-               height: float = 10) -> bool:
-        """
-        Удалить конкретную запись из кэша
-        
+
+    async def delete(self,
+                     from_zip: str,
+                     to_zip: str,
+                     weight: float,
+                     length: float = 10,
+                     width: float = 10,
+                     height: float = 10) -> bool:
+        """
+        Удалить конкретную запись из кэша (L1 и L2)
+
         Args:
             from_zip: ZIP код отправителя
             to_zip: ZIP код получателя
             weight: Вес в фунтах
             length, width, height: Размеры в дюймах
-        
+
         Returns:
             bool: True если запись была удалена, False если не найдена
         """
         cache_key = self._generate_cache_key(from_zip, to_zip, weight, length, width, height)
-        
-        if cache_key in self._cache:
-            del self._cache[cache_key]
+
+        deleted = self._cache.pop(cache_key, None) is not None
+        if self._collection is not None:
+            try:
+                result = await self._collection.delete_one({'_id': cache_key})
+                deleted = deleted or bool(getattr(result, 'deleted_count', 0))
+            except Exception as e:
+                self.l2_errors += 1
+                logger.warning(f"Rate cache L2 delete failed: {e}")
+
+        if deleted:
             logger.info(f"🗑️ Deleted cache entry for route {from_zip} → {to_zip}")
             return True
-        
+
         logger.debug(f"❌ Cache entry not found for route {from_zip} → {to_zip}")
         return False
-    
+
     def clear(self) -> None:
-        """Очистить весь кэш"""
+        """Очистить L1 кэш и счётчики (L2 истекает по TTL)"""
         self._cache.clear()
         self.hits = 0
         self.misses = 0
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.stale_hits = 0
+        self._by_route.clear()
+        self._by_weight.clear()
         logger.info("🧹 Cache cleared")
-    
+
     def cleanup_expired(self) -> int:
         """
-        Удалить устаревшие записи из кэша
-        
+        Удалить из L1 записи, которые нельзя отдать даже как устаревшие
+
         Returns:
             int: Количество удаленных записей
         """
-        now = datetime.now(timezone.utc)
+        max_age = self.cache_duration + self.stale_duration
         expired_keys = [
             key for key, entry in self._cache.items()
-            if now - entry['timestamp'] > self.cache_duration
+            if self._age(entry) > max_age
         ]
-        
+
         for key in expired_keys:
             del self._cache[key]
-        
+
         if expired_keys:
             logger.info(f"🧹 Removed {len(expired_keys)} expired cache entries")
-        
+
         return len(expired_keys)
-    
+
     def get_stats(self) -> Dict[str, Any]:
         """
         Получить статистику кэша
-        
+
         Returns:
-            dict: Статистика (hits, misses, hit_rate, size)
+            dict: Статистика (hits, misses, hit_rate, size, разбивка по маршрутам и весу)
         """
         total = self.hits + self.misses
         hit_rate = (self.hits / total * 100) if total > 0 else 0
-        
+
+        top_routes = sorted(
+            self._by_route.items(),
+            key=lambda item: sum(item[1].values()),
+            reverse=True
+        )[:20]
+
         return {
             'hits': self.hits,
             'misses': self.misses,
             'hit_rate': f"{hit_rate:.1f}%",
-            'cache_size': len(self._cache)
+            'cache_size': len(self._cache),
+            'max_entries': self.max_entries,
+            'l1_hits': self.l1_hits,
+            'l2_hits': self.l2_hits,
+            'stale_hits': self.stale_hits,
+            'evictions': self.evictions,
+            'refreshes': self.refreshes,
+            'refresh_failures': self.refresh_failures,
+            'refreshing': len(self._refreshing),
+            'l2_enabled': self._collection is not None,
+            'l2_errors': self.l2_errors,
+            'fallback_cached': self.fallback_cached,
+            'fallback_estimated': self.fallback_estimated,
+            'fallback_misses': self.fallback_misses,
+            'by_route': dict(top_routes),
+            'by_weight': dict(self._by_weight)
         }
 
 
 # Глобальный инстанс кэша (singleton)
-# Время жизни: 60 минут (тарифы не меняются часто)
-shipstation_cache = ShipStationCache(cache_duration_minutes=60)
+# L2 подключается в server.py startup: await shipstation_cache.init_storage(db)
+shipstation_cache = ShipStationCache(**BotPerformanceConfig.get_rate_cache_config())
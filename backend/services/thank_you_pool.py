@@ -0,0 +1,171 @@
+"""
+Thank-You Message Pool
+Pre-generated AI thank-you texts served without waiting for the LLM
+
+Generating a thank-you message is a full LLM round trip. It used to happen
+inline after every paid label, between payment and the user seeing their
+tracking number. The pool keeps up to `size` texts generated in the
+background:
+- take() is O(1): pops a pre-generated text, or a static fallback if the
+  pool is empty (the fallback rate shows when the pool is undersized)
+- dropping below low_watermark schedules one background refill
+- failed generations back off instead of hammering the LLM
+
+Texts are generic; personalization (the user's name) is applied on take().
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config.performance_config import BotPerformanceConfig
+from utils.hedging import LatencyWindow
+from utils.telegram_utils import THANK_YOU_FALLBACKS
+
+logger = logging.getLogger(__name__)
+
+
+class ThankYouPool:
+    """Bounded pool of pre-generated thank-you messages"""
+
+    def __init__(
+        self,
+        generator: Optional[Callable[[], Awaitable[str]]] = None,
+        size: int = 20,
+        low_watermark: int = 5,
+        max_concurrent: int = 2,
+        error_backoff: float = 60,
+        fallbacks: Optional[List[str]] = None,
+    ):
+        """
+        Args:
+            generator: Coroutine returning one message, raising on failure
+                       (default: utils.telegram_utils.request_thank_you_message)
+            size: Messages kept ready
+            low_watermark: Refill when fewer messages are left
+            max_concurrent: LLM requests in flight during a refill
+            error_backoff: Seconds to wait after a refill with failures
+            fallbacks: Static messages served while the pool is empty
+        """
+        self._generator = generator
+        self.size = size
+        self.low_watermark = low_watermark
+        self.max_concurrent = max_concurrent
+        self.error_backoff = error_backoff
+        self.fallbacks = fallbacks or THANK_YOU_FALLBACKS
+
+        self._messages: deque = deque(maxlen=size)
+        self._refill_task: Optional[asyncio.Task] = None
+        self._retry_after = 0.0
+
+        self.served = 0
+        self.fallback_served = 0
+        self.generated = 0
+        self.failures = 0
+        self.refills = 0
+        self.latency = LatencyWindow()
+
+    async def _generate(self) -> str:
+        if self._generator is not None:
+            return await self._generator()
+        from utils.telegram_utils import request_thank_you_message
+        return await request_thank_you_message()
+
+    def take(self, first_name: Optional[str] = None) -> str:
+        """
+        Thank-you message for one user (never waits)
+
+        Args:
+            first_name: Personalizes the message if given
+        """
+        if self._messages:
+            text = self._messages.popleft()
+            self.served += 1
+        else:
+            text = random.choice(self.fallbacks)
+            self.fallback_served += 1
+        self.refill()
+
+        if first_name:
+            text = f"{first_name}, {text[:1].lower()}{text[1:]}"
+        return text
+
+    def refill(self) -> None:
+        """Schedule a background refill if the pool is low (at most one at a time)"""
+        if len(self._messages) >= self.low_watermark:
+            return
+        if self._refill_task is not None and not self._refill_task.done():
+            return
+        if time.monotonic() < self._retry_after:
+            return
+        try:
+            self._refill_task = asyncio.get_running_loop().create_task(self._refill())
+        except RuntimeError:
+            pass  # No event loop (sync caller) - next take() schedules it
+
+    async def _refill(self) -> None:
+        self.refills += 1
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        async def generate_one():
+            async with semaphore:
+                started = time.monotonic()
+                try:
+                    text = await self._generate()
+                except Exception as e:
+                    self.failures += 1
+                    logger.warning(f"Thank-you pool: generation failed: {e}")
+                    return False
+                self.latency.add(time.monotonic() - started)
+                if text and text.strip():
+                    self._messages.append(text.strip())
+                    self.generated += 1
+                    return True
+                self.failures += 1
+                return False
+
+        missing = self.size - len(self._messages)
+        results = await asyncio.gather(*(generate_one() for _ in range(missing)))
+        if not all(results):
+            self._retry_after = time.monotonic() + self.error_backoff
+        logger.info(f"💬 Thank-you pool refilled: {sum(results)}/{missing} (depth {len(self._messages)})")
+
+    async def start(self) -> None:
+        """Fill the pool in the background"""
+        self.refill()
+        logger.info(f"✅ Thank-you pool started (size {self.size}, refill below {self.low_watermark})")
+
+    async def stop(self) -> None:
+        """Cancel a running refill"""
+        if self._refill_task and not self._refill_task.done():
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except asyncio.CancelledError:
+                pass
+        self._refill_task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool depth, refill latency and fallback rate"""
+        total = self.served + self.fallback_served
+        p50, p95 = self.latency.percentile(50), self.latency.percentile(95)
+        return {
+            'depth': len(self._messages),
+            'size': self.size,
+            'low_watermark': self.low_watermark,
+            'refilling': self._refill_task is not None and not self._refill_task.done(),
+            'served': self.served,
+            'fallback_served': self.fallback_served,
+            'fallback_rate': f"{(self.fallback_served / total * 100) if total else 0:.1f}%",
+            'generated': self.generated,
+            'failures': self.failures,
+            'refills': self.refills,
+            'generation_p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'generation_p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+# Global pool (filled in server.py startup)
+thank_you_pool = ThankYouPool(**BotPerformanceConfig.get_thank_you_pool_config())
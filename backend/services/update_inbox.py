@@ -0,0 +1,416 @@
+"""
+Telegram Update Inbox
+Fast-ack ingestion layer for Telegram webhook updates
+
+The webhook endpoint only validates the update and puts it into the inbox;
+a pool of workers drains the inbox in the background. Workers are sharded
+by user id, so updates of one user are processed strictly in order while
+different users are handled in parallel.
+
+When the in-memory queues are full, updates spill into a MongoDB overflow
+collection. The overflow is also used on shutdown (queued updates are
+saved) and drained on startup, so accepted updates survive a restart.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Update types that carry the user in a `from` field
+_USER_UPDATE_KEYS = (
+    'message',
+    'edited_message',
+    'callback_query',
+    'my_chat_member',
+    'chat_member',
+    'inline_query',
+    'pre_checkout_query',
+    'shipping_query',
+)
+
+
+def extract_user_id(update_data: Dict[str, Any]) -> int:
+    """
+    Get the Telegram user id an update belongs to
+
+    Args:
+        update_data: Raw update dict from Telegram
+
+    Returns:
+        int: User id, or 0 for updates without a user
+    """
+    for key in _USER_UPDATE_KEYS:
+        payload = update_data.get(key)
+        if isinstance(payload, dict):
+            sender = payload.get('from') or {}
+            if sender.get('id'):
+                return int(sender['id'])
+            chat = payload.get('chat') or {}
+            if chat.get('id'):
+                return int(chat['id'])
+    return 0
+
+
+class TelegramUpdateInbox:
+    """
+    Bounded, sharded inbox for incoming Telegram updates
+
+    Usage:
+        inbox = TelegramUpdateInbox(db, process_func, num_workers=16)
+        await inbox.start()
+        accepted = await inbox.submit(update_data)
+        ...
+        await inbox.stop()
+    """
+
+    def __init__(
+        self,
+        db,
+        process_func: Callable[[Dict[str, Any]], Awaitable[None]],
+        num_workers: int = 16,
+        max_queue_size: int = 1000,
+        overflow_collection: str = 'telegram_update_inbox',
+        drain_batch_size: int = 100,
+    ):
+        """
+        Args:
+            db: MongoDB database (used for the overflow store, may be None)
+            process_func: Coroutine that processes one raw update dict
+            num_workers: Number of worker shards
+            max_queue_size: Total in-memory capacity across all shards
+            overflow_collection: Collection name for spilled updates
+            drain_batch_size: How many overflow updates to restore at once
+        """
+        self.db = db
+        self.process_func = process_func
+        self.num_workers = max(1, num_workers)
+        self.shard_capacity = max(1, max_queue_size // self.num_workers)
+        self.max_queue_size = self.shard_capacity * self.num_workers
+        self.overflow = db[overflow_collection] if db is not None else None
+        self.drain_batch_size = drain_batch_size
+
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        self._drainer: Optional[asyncio.Task] = None
+        # Update each worker is processing right now, saved on shutdown
+        self._in_flight: Dict[int, Dict[str, Any]] = {}
+        self._drain_event = asyncio.Event()
+        self._running = False
+
+        # Number of updates currently stored in the overflow collection.
+        # While it is non-zero new updates also go to the overflow so that
+        # the original arrival order is preserved.
+        self._overflow_count = 0
+
+        self._submit_latencies_ms: deque = deque(maxlen=1000)
+        self.stats = {
+            'accepted': 0,
+            'processed': 0,
+            'failed': 0,
+            'overflowed': 0,
+            'restored': 0,
+            'rejected': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """Start workers and restore updates left in the overflow store"""
+        if self._running:
+            return
+
+        self._queues = [asyncio.Queue(maxsize=self.shard_capacity) for _ in range(self.num_workers)]
+        self._running = True
+
+        if self.overflow is not None:
+            try:
+                self._overflow_count = await self.overflow.count_documents({})
+                if self._overflow_count:
+                    logger.warning(f"📥 Inbox: {self._overflow_count} updates pending in overflow store, restoring")
+            except Exception as e:
+                logger.error(f"❌ Inbox: failed to read overflow store: {e}")
+                self._overflow_count = 0
+
+        self._workers = [
+            asyncio.create_task(self._worker(shard), name=f'update-inbox-worker-{shard}')
+            for shard in range(self.num_workers)
+        ]
+        self._drainer = asyncio.create_task(self._drain_overflow_loop(), name='update-inbox-drainer')
+        logger.info(f"✅ Update inbox started: {self.num_workers} workers, capacity {self.max_queue_size}")
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """
+        Stop workers
+
+        Waits up to `timeout` seconds for the queues to drain, then saves
+        whatever is still queued, including updates the cancelled workers
+        were in the middle of, to the overflow store.
+        """
+        if not self._running:
+            return
+
+        try:
+            await asyncio.wait_for(self._wait_until_empty(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        self._running = False
+        tasks = list(self._workers)
+        if self._drainer:
+            tasks.append(self._drainer)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._drainer = None
+
+        # Updates interrupted mid-processing go first: they arrived earlier
+        leftovers = [self._in_flight[shard] for shard in sorted(self._in_flight)]
+        self._in_flight.clear()
+        for queue in self._queues:
+            while not queue.empty():
+                leftovers.append(queue.get_nowait())
+
+        if leftovers and self.overflow is not None:
+            try:
+                await self.overflow.insert_many([self._overflow_doc(item) for item in leftovers])
+                logger.warning(f"💾 Inbox: saved {len(leftovers)} queued updates for next start")
+            except Exception as e:
+                logger.error(f"❌ Inbox: lost {len(leftovers)} queued updates on shutdown: {e}")
+        elif leftovers:
+            logger.error(f"❌ Inbox: dropped {len(leftovers)} queued updates on shutdown (no overflow store)")
+
+        logger.info("🛑 Update inbox stopped")
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    # ------------------------------------------------------------------
+    # Ingestion
+    # ------------------------------------------------------------------
+
+    async def submit(self, update_data: Dict[str, Any]) -> bool:
+        """
+        Accept an update for background processing
+
+        Args:
+            update_data: Raw update dict from Telegram
+
+        Returns:
+            bool: True if the update was queued or spilled to the overflow store
+        """
+        start = time.perf_counter()
+        user_id = extract_user_id(update_data)
+        item = {'user_id': user_id, 'update': update_data, 'received_at': time.time()}
+
+        accepted = False
+        if self._overflow_count == 0:
+            try:
+                self._shard_for(user_id).put_nowait(item)
+                accepted = True
+            except asyncio.QueueFull:
+                pass
+
+        if not accepted:
+            accepted = await self._spill(item)
+
+        if accepted:
+            self.stats['accepted'] += 1
+        else:
+            self.stats['rejected'] += 1
+
+        self._submit_latencies_ms.append((time.perf_counter() - start) * 1000)
+        return accepted
+
+    async def _spill(self, item: Dict[str, Any]) -> bool:
+        """Write an update to the overflow store"""
+        if self.overflow is None:
+            logger.error("❌ Inbox full and no overflow store configured - update rejected")
+            return False
+
+        try:
+            await self.overflow.insert_one(self._overflow_doc(item))
+        except Exception as e:
+            logger.error(f"❌ Inbox: overflow write failed: {e}")
+            return False
+
+        self._overflow_count += 1
+        self.stats['overflowed'] += 1
+        self._drain_event.set()
+        return True
+
+    @staticmethod
+    def _overflow_doc(item: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'user_id': item['user_id'],
+            'update': item['update'],
+            'received_at': item['received_at'],
+        }
+
+    def _shard_for(self, user_id: int) -> asyncio.Queue:
+        return self._queues[user_id % self.num_workers]
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    async def _worker(self, shard: int) -> None:
+        queue = self._queues[shard]
+        while True:
+            item = await queue.get()
+            self._in_flight[shard] = item
+            try:
+                await self.process_func(item['update'])
+                self.stats['processed'] += 1
+                del self._in_flight[shard]
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats['failed'] += 1
+                del self._in_flight[shard]
+                logger.error(f"❌ Inbox worker {shard}: error processing update for user {item['user_id']}: {e}", exc_info=True)
+            finally:
+                queue.task_done()
+                if self._overflow_count:
+                    self._drain_event.set()
+
+    async def _drain_overflow_loop(self) -> None:
+        """Move spilled updates back into memory as capacity frees up"""
+        while True:
+            try:
+                await asyncio.wait_for(self._drain_event.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+            self._drain_event.clear()
+
+            if not self._overflow_count or self.overflow is None:
+                continue
+
+            try:
+                await self._drain_overflow_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Inbox: overflow drain failed: {e}")
+                await asyncio.sleep(1.0)
+
+    async def _drain_overflow_once(self) -> int:
+        """
+        Restore one batch of updates from the overflow store
+
+        Each document is claimed with find_one_and_delete, so several
+        processes draining the shared collection never restore the same
+        update twice. Stops at the first shard that is full so that per-user
+        order is kept.
+
+        Returns:
+            int: Number of restored updates
+        """
+        cursor = self.overflow.find({}, {'user_id': 1}).sort([('received_at', 1), ('_id', 1)]).limit(self.drain_batch_size)
+        candidates = await cursor.to_list(self.drain_batch_size)
+
+        if not candidates:
+            self._overflow_count = 0
+            return 0
+
+        restored = 0
+        for candidate in candidates:
+            queue = self._shard_for(candidate.get('user_id', 0))
+            if queue.full():
+                break
+
+            doc = await self.overflow.find_one_and_delete({'_id': candidate['_id']})
+            if doc is None:
+                # Claimed by another process
+                self._overflow_count = max(0, self._overflow_count - 1)
+                continue
+
+            item = {
+                'user_id': doc.get('user_id', 0),
+                'update': doc['update'],
+                'received_at': doc.get('received_at', time.time()),
+            }
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                await self.overflow.insert_one(doc)
+                break
+            restored += 1
+            self._overflow_count = max(0, self._overflow_count - 1)
+
+        if restored:
+            self.stats['restored'] += restored
+            if self._overflow_count:
+                self._drain_event.set()
+
+        return restored
+
+    async def _wait_until_empty(self) -> None:
+        for queue in self._queues:
+            await queue.join()
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Backpressure metrics
+
+        Returns:
+            dict: Queue depths, overflow size, counters and submit latency
+        """
+        depths = [queue.qsize() for queue in self._queues]
+        queued = sum(depths)
+        latencies = sorted(self._submit_latencies_ms)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            index = min(len(latencies) - 1, int(len(latencies) * p))
+            return round(latencies[index], 3)
+
+        return {
+            'running': self._running,
+            'workers': self.num_workers,
+            'capacity': self.max_queue_size,
+            'queued': queued,
+            'utilization': f"{(queued / self.max_queue_size * 100) if self.max_queue_size else 0:.1f}%",
+            'max_shard_depth': max(depths) if depths else 0,
+            'overflow_pending': self._overflow_count,
+            **self.stats,
+            'submit_p50_ms': percentile(0.50),
+            'submit_p99_ms': percentile(0.99),
+        }
+
+
+# Global instance (initialized in server.py startup)
+_update_inbox: Optional[TelegramUpdateInbox] = None
+
+
+def init_update_inbox(db, process_func, **kwargs) -> TelegramUpdateInbox:
+    """
+    Create the global update inbox
+
+    Args:
+        db: MongoDB database
+        process_func: Coroutine that processes one raw update dict
+        **kwargs: TelegramUpdateInbox options
+
+    Returns:
+        TelegramUpdateInbox instance
+    """
+    global _update_inbox
+    _update_inbox = TelegramUpdateInbox(db, process_func, **kwargs)
+    return _update_inbox
+
+
+def get_update_inbox() -> Optional[TelegramUpdateInbox]:
+    """Get the global update inbox (None if not initialized)"""
+    return _update_inbox
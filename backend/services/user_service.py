@@ -177,7 +177,8 @@ class UserService:
             result = await self.user_repo.update_balance(
                 telegram_id,
                 amount,
-                operation='add'
+                operation='add',
+                reason=description
             )
             
             if result:
@@ -244,26 +245,17 @@ class UserService:
                     'error': 'Amount must be positive'
                 }
             
-            # Проверить баланс
-            current_balance = await self.user_repo.get_balance(telegram_id)
-            
-            if current_balance < amount:
-                return {
-                    'success': False,
-                    'error': 'Insufficient balance',
-                    'required': amount,
-                    'available': current_balance
-                }
-            
-            # Списать
+            # Списать (условно: только если баланса хватает)
             result = await self.user_repo.update_balance(
                 telegram_id,
                 amount,
-                operation='subtract'
+                operation='subtract',
+                reason=description
             )
             
             if result:
-                new_balance = current_balance - amount
+                new_balance = await self.user_repo.get_balance(telegram_id)
+                current_balance = new_balance + amount
                 
                 logger.info(
                     f"💸 User {telegram_id} balance updated: "
@@ -292,7 +284,9 @@ class UserService:
             else:
                 return {
                     'success': False,
-                    'error': 'Failed to update balance'
+                    'error': 'Insufficient balance',
+                    'required': amount,
+                    'available': await self.user_repo.get_balance(telegram_id)
                 }
                 
         except Exception as e:
@@ -30,22 +30,10 @@ class SessionManager:
         asyncio.create_task(self._create_indexes())
     
     async def _create_indexes(self):
-        """Create MongoDB indexes including TTL"""
+        """Create the session indexes of the manifest (unique user_id, TTL)"""
+        from utils.db_indexes import apply_index_manifest
         try:
-            # Unique index on user_id
-            await self.sessions.create_index("user_id", unique=True)
-            
-            # TTL index: автоматически удаляет документы старше 15 минут
-            await self.sessions.create_index(
-                "timestamp", 
-                expireAfterSeconds=900  # 15 минут = 900 секунд
-            )
-            logger.info("✅ Session indexes created (including TTL)")
-            
-            # Indexes for completed labels
-            await self.completed_labels.create_index("user_id")
-            await self.completed_labels.create_index("created_at")
-            
+            await apply_index_manifest(self.db, collections=['user_sessions', 'completed_labels'])
         except Exception as e:
             logger.error(f"Error creating session indexes: {e}")
     
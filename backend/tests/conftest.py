@@ -249,3 +249,382 @@ def sample_carrier_ids():
         'se-234567',  # FedEx
         'se-345678'   # USPS
     ]
+
+
+# ============================================================
+# IN-MEMORY MONGODB FIXTURES
+# ============================================================
+
+def _get_path(doc: Dict[str, Any], path: str):
+    """Resolve dotted path in a document"""
+    value = doc
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _set_path(doc: Dict[str, Any], path: str, value):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _unset_path(doc: Dict[str, Any], path: str):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+
+def _matches(doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    for key, condition in query.items():
+        if key == '$or':
+            if not any(_matches(doc, sub) for sub in condition):
+                return False
+            continue
+        if key == '$and':
+            if not all(_matches(doc, sub) for sub in condition):
+                return False
+            continue
+        value = _get_path(doc, key)
+        if isinstance(condition, dict) and any(k.startswith('$') for k in condition):
+            for op, operand in condition.items():
+                if op == '$in' and value not in operand:
+                    return False
+                if op == '$nin' and value in operand:
+                    return False
+                if op == '$ne' and (value == operand or (isinstance(value, list) and operand in value)):
+                    return False
+                if op == '$exists' and (value is not None) != bool(operand):
+                    return False
+                if op in ('$lt', '$lte', '$gt', '$gte'):
+                    if value is None:
+                        return False
+                    if op == '$lt' and not value < operand:
+                        return False
+                    if op == '$lte' and not value <= operand:
+                        return False
+                    if op == '$gt' and not value > operand:
+                        return False
+                    if op == '$gte' and not value >= operand:
+                        return False
+        elif value != condition:
+            return False
+    return True
+
+
+class InMemoryCursor:
+    """Minimal Motor cursor replacement"""
+
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, key_or_list, direction=None):
+        keys = [(key_or_list, direction or 1)] if isinstance(key_or_list, str) else list(key_or_list)
+        for key, order in reversed(keys):
+            self._docs.sort(key=lambda d: (_get_path(d, key) is None, _get_path(d, key)), reverse=order < 0)
+        return self
+
+    def limit(self, n):
+        if n:
+            self._docs = self._docs[:n]
+        return self
+
+    def skip(self, n):
+        self._docs = self._docs[n:]
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    async def to_list(self, length=None):
+        return list(self._docs if length is None else self._docs[:length])
+
+    def __aiter__(self):
+        self._iter = iter(list(self._docs))
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class InMemoryCollection:
+    """
+    Small subset of the Motor collection API backed by a list
+
+    Good enough for unit tests of code that stores documents and
+    queries them with simple filters and update operators.
+    """
+
+    def __init__(self, name: str = 'collection'):
+        self.name = name
+        self.docs = []
+        self.indexes = []
+        self._next_id = 1
+
+    def _assign_id(self, doc):
+        if '_id' not in doc:
+            doc['_id'] = self._next_id
+            self._next_id += 1
+        return doc
+
+    @staticmethod
+    def _project(doc, projection):
+        import copy
+        included = [k for k, v in (projection or {}).items() if v and k != '_id' and '.' not in k]
+        if included:
+            # Inclusion projection: top-level fields only
+            result = {k: copy.deepcopy(doc[k]) for k in ['_id'] + included if k in doc}
+        else:
+            result = copy.deepcopy(doc)
+        if projection and projection.get('_id') == 0:
+            result.pop('_id', None)
+        return result
+
+    def _apply_update(self, doc, update, inserting=False):
+        for op, fields in update.items():
+            if op == '$set':
+                for key, value in fields.items():
+                    _set_path(doc, key, value)
+            elif op == '$setOnInsert' and inserting:
+                for key, value in fields.items():
+                    _set_path(doc, key, value)
+            elif op == '$inc':
+                for key, value in fields.items():
+                    _set_path(doc, key, (_get_path(doc, key) or 0) + value)
+            elif op == '$unset':
+                for key in fields:
+                    _unset_path(doc, key)
+            elif op == '$push':
+                for key, value in fields.items():
+                    current = _get_path(doc, key) or []
+                    if isinstance(value, dict) and '$each' in value:
+                        current.extend(value['$each'])
+                        if '$slice' in value:
+                            current = current[value['$slice']:] if value['$slice'] < 0 else current[:value['$slice']]
+                    else:
+                        current.append(value)
+                    _set_path(doc, key, current)
+            elif op == '$addToSet':
+                for key, value in fields.items():
+                    current = _get_path(doc, key) or []
+                    if value not in current:
+                        current.append(value)
+                    _set_path(doc, key, current)
+            elif op == '$pull':
+                for key, condition in fields.items():
+                    current = _get_path(doc, key) or []
+                    if isinstance(condition, dict):
+                        kept = [v for v in current if not (isinstance(v, dict) and _matches(v, condition))]
+                    else:
+                        kept = [v for v in current if v != condition]
+                    _set_path(doc, key, kept)
+
+    def _upsert_doc(self, query, update):
+        doc = {k: v for k, v in query.items() if not k.startswith('$') and not isinstance(v, dict)}
+        self._apply_update(doc, update, inserting=True)
+        self._assign_id(doc)
+        self.docs.append(doc)
+        return doc
+
+    async def insert_one(self, doc):
+        self._assign_id(doc)
+        if any(d['_id'] == doc['_id'] for d in self.docs):
+            from pymongo.errors import DuplicateKeyError
+            raise DuplicateKeyError(f"duplicate _id {doc['_id']}")
+        self.docs.append(doc)
+        return Mock(inserted_id=doc['_id'])
+
+    async def insert_many(self, docs, ordered=True):
+        ids = [(await self.insert_one(doc)).inserted_id for doc in docs]
+        return Mock(inserted_ids=ids)
+
+    async def find_one(self, query=None, projection=None, sort=None):
+        docs = [d for d in self.docs if _matches(d, query or {})]
+        if sort:
+            docs = await InMemoryCursor(docs).sort(sort).to_list()
+        return self._project(docs[0], projection) if docs else None
+
+    def find(self, query=None, projection=None):
+        return InMemoryCursor([self._project(d, projection) for d in self.docs if _matches(d, query or {})])
+
+    async def count_documents(self, query=None):
+        return sum(1 for d in self.docs if _matches(d, query or {}))
+
+    async def estimated_document_count(self):
+        return len(self.docs)
+
+    async def distinct(self, key, query=None):
+        values = []
+        for d in self.docs:
+            if _matches(d, query or {}):
+                value = _get_path(d, key)
+                if value is not None and value not in values:
+                    values.append(value)
+        return values
+
+    async def update_one(self, query, update, upsert=False):
+        for doc in self.docs:
+            if _matches(doc, query):
+                self._apply_update(doc, update)
+                return Mock(matched_count=1, modified_count=1, upserted_id=None)
+        if upsert:
+            doc = self._upsert_doc(query, update)
+            return Mock(matched_count=0, modified_count=0, upserted_id=doc['_id'])
+        return Mock(matched_count=0, modified_count=0, upserted_id=None)
+
+    async def update_many(self, query, update, upsert=False):
+        matched = [d for d in self.docs if _matches(d, query)]
+        for doc in matched:
+            self._apply_update(doc, update)
+        return Mock(matched_count=len(matched), modified_count=len(matched))
+
+    async def replace_one(self, query, replacement, upsert=False):
+        for i, doc in enumerate(self.docs):
+            if _matches(doc, query):
+                replacement = dict(replacement)
+                replacement['_id'] = doc['_id']
+                self.docs[i] = replacement
+                return Mock(matched_count=1, modified_count=1)
+        if upsert:
+            await self.insert_one(dict(replacement))
+        return Mock(matched_count=0, modified_count=0)
+
+    async def find_one_and_update(self, query, update, projection=None, sort=None, upsert=False, return_document=False):
+        docs = [d for d in self.docs if _matches(d, query)]
+        if sort:
+            docs = await InMemoryCursor(docs).sort(sort).to_list()
+        if docs:
+            doc = docs[0]
+            before = self._project(doc, projection)
+            self._apply_update(doc, update)
+            return self._project(doc, projection) if return_document else before
+        if upsert:
+            doc = self._upsert_doc(query, update)
+            return self._project(doc, projection) if return_document else None
+        return None
+
+    async def find_one_and_delete(self, query, sort=None, projection=None):
+        docs = [d for d in self.docs if _matches(d, query)]
+        if sort:
+            docs = await InMemoryCursor(docs).sort(sort).to_list()
+        if not docs:
+            return None
+        self.docs.remove(docs[0])
+        return self._project(docs[0], projection)
+
+    async def delete_one(self, query):
+        for doc in self.docs:
+            if _matches(doc, query):
+                self.docs.remove(doc)
+                return Mock(deleted_count=1)
+        return Mock(deleted_count=0)
+
+    async def delete_many(self, query):
+        before = len(self.docs)
+        self.docs = [d for d in self.docs if not _matches(d, query)]
+        return Mock(deleted_count=before - len(self.docs))
+
+    async def bulk_write(self, requests, ordered=True):
+        from pymongo import UpdateOne, InsertOne, DeleteOne, ReplaceOne
+        upserted = modified = inserted = deleted = 0
+        for request in requests:
+            doc = getattr(request, '_doc', None)
+            if isinstance(request, InsertOne):
+                await self.insert_one(doc)
+                inserted += 1
+            elif isinstance(request, UpdateOne):
+                result = await self.update_one(request._filter, doc, upsert=bool(request._upsert))
+                modified += result.modified_count
+                upserted += 1 if result.upserted_id is not None else 0
+            elif isinstance(request, ReplaceOne):
+                await self.replace_one(request._filter, doc, upsert=bool(request._upsert))
+                modified += 1
+            elif isinstance(request, DeleteOne):
+                deleted += (await self.delete_one(request._filter)).deleted_count
+        return Mock(modified_count=modified, upserted_count=upserted,
+                    inserted_count=inserted, deleted_count=deleted)
+
+    def aggregate(self, pipeline):
+        """$match, $group ($sum/$max/$min/$first), $sort and $limit stages"""
+        docs = [dict(d) for d in self.docs]
+        for stage in pipeline:
+            (name, spec), = stage.items()
+            if name == '$match':
+                docs = [d for d in docs if _matches(d, spec)]
+            elif name == '$sort':
+                docs = InMemoryCursor(docs).sort(list(spec.items()))._docs
+            elif name == '$limit':
+                docs = docs[:spec]
+            elif name == '$group':
+                value_of = lambda d, expr: _get_path(d, expr[1:]) if isinstance(expr, str) and expr.startswith('$') else expr
+                groups = {}
+                for d in docs:
+                    key = value_of(d, spec['_id'])
+                    group = groups.setdefault(key, {'_id': key})
+                    for field, accumulator in spec.items():
+                        if field == '_id':
+                            continue
+                        (op, expr), = accumulator.items()
+                        value = value_of(d, expr)
+                        if op == '$sum':
+                            group[field] = group.get(field, 0) + (value or 0)
+                        elif op == '$first':
+                            group.setdefault(field, value)
+                        elif op in ('$max', '$min') and value is not None:
+                            current = group.get(field)
+                            if current is None or (value > current if op == '$max' else value < current):
+                                group[field] = value
+                docs = list(groups.values())
+        return InMemoryCursor(docs)
+
+    async def create_index(self, keys, **kwargs):
+        self.indexes.append((keys, kwargs))
+        return kwargs.get('name', str(keys))
+
+    async def create_indexes(self, models):
+        names = []
+        for model in models:
+            document = dict(model.document)
+            keys = list(document.pop('key').items())
+            names.append(await self.create_index(keys, **document))
+        return names
+
+    def list_indexes(self):
+        indexes = [{'name': '_id_', 'key': {'_id': 1}}]
+        for keys, kwargs in self.indexes:
+            key = {keys: 1} if isinstance(keys, str) else dict(keys)
+            name = kwargs.get('name') or '_'.join(f'{k}_{v}' for k, v in key.items())
+            indexes.append({**kwargs, 'name': name, 'key': key})
+        return InMemoryCursor(indexes)
+
+
+class InMemoryDatabase:
+    """Attribute/item access to InMemoryCollection instances"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = InMemoryCollection(name)
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+
+@pytest.fixture
+def memory_db():
+    """In-memory MongoDB replacement with real query semantics"""
+    return InMemoryDatabase()
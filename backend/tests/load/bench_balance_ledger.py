@@ -0,0 +1,147 @@
+"""
+Benchmark: balance debits under contention for one user
+
+    python tests/load/bench_balance_ledger.py [--debits 2000] [--concurrency 50]
+                                              [--latency-ms 1] [--mongo]
+
+Runs `debits` $1 debits for the same user, `concurrency` at a time, from a
+balance that covers only half of them, and reports debits/s and latency
+p50/p99 for two modes:
+- ledger:     conditional $inc + ledger entry (BalanceLedger.debit)
+- read-check: get_balance, compare, bare $inc (previous payment path)
+The run also reports overdrafts (successful debits beyond the balance) and
+checks the ledger with reconcile().
+
+Uses the in-memory test database by default, with --latency-ms of simulated
+round trip per database call so requests interleave like they do against a
+server; --mongo runs against MONGO_URL (a throwaway bench_balance_ledger
+database, dropped afterwards).
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from repositories.balance_ledger import BalanceLedger
+
+TELEGRAM_ID = 1
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class SlowCollection:
+    """Adds a fixed round trip to every awaited collection call"""
+
+    def __init__(self, collection, latency):
+        self._collection = collection
+        self._latency = latency
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            await asyncio.sleep(self._latency)
+            return await attr(*args, **kwargs)
+        return call
+
+
+class SlowDatabase:
+    def __init__(self, db, latency):
+        self._db = db
+        self._latency = latency
+
+    def __getattr__(self, name):
+        return SlowCollection(self._db[name], self._latency)
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+async def open_db(args):
+    if args.mongo:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        await client.drop_database('bench_balance_ledger')
+        return client, client['bench_balance_ledger']
+    from tests.conftest import InMemoryDatabase
+    return None, SlowDatabase(InMemoryDatabase(), args.latency_ms / 1000)
+
+
+async def run(mode, args):
+    client, db = await open_db(args)
+    ledger = BalanceLedger(db)
+    opening = args.debits // 2
+    await db.users.insert_one({'telegram_id': TELEGRAM_ID, 'balance': float(opening)})
+
+    async def debit_ledger(i):
+        return await ledger.debit(TELEGRAM_ID, 1.0, 'order', f'ORD-{i}') is not None
+
+    async def debit_read_check(i):
+        user = await db.users.find_one({'telegram_id': TELEGRAM_ID}, {'balance': 1})
+        if user['balance'] < 1.0:
+            return False
+        await db.users.update_one({'telegram_id': TELEGRAM_ID}, {'$inc': {'balance': -1.0}})
+        return True
+
+    debit = debit_ledger if mode == 'ledger' else debit_read_check
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            ok = await debit(i)
+            latencies.append(time.perf_counter() - started)
+            return ok
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(args.debits)))
+    elapsed = time.perf_counter() - started
+
+    succeeded = sum(results)
+    final = (await db.users.find_one({'telegram_id': TELEGRAM_ID}))['balance']
+    overdraft = max(0, succeeded - opening)
+    consistent = ''
+    if mode == 'ledger':
+        report = await ledger.reconcile()
+        assert report['consistent'] == 1, report
+        assert overdraft == 0 and final == 0.0, (succeeded, final)
+        consistent = ' | ledger consistent'
+    if client:
+        await client.drop_database('bench_balance_ledger')
+        client.close()
+
+    ms = lambda seconds: f"{seconds * 1000:7.2f} ms"
+    print(f"{mode:>10}: {args.debits / elapsed:8.0f} debits/s | p50 {ms(percentile(latencies, 50))} | "
+          f"p99 {ms(percentile(latencies, 99))} | succeeded {succeeded}/{opening} | "
+          f"overdraft ${overdraft} | final balance ${final:.2f}{consistent}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--debits', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=1)
+    parser.add_argument('--mongo', action='store_true')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    print(f"{args.debits} x $1 debits for one user, {args.concurrency} concurrent, "
+          f"balance covers {args.debits // 2}")
+    await run('ledger', args)
+    await run('read-check', args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
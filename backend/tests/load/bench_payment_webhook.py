@@ -0,0 +1,140 @@
+"""
+Benchmark: Oxapay webhook latency under concurrent duplicate deliveries
+
+    python tests/load/bench_payment_webhook.py [--payments 200] [--duplicates 5]
+                                               [--telegram-ms 300] [--mongo]
+
+Posts every payment's "Paid" callback `duplicates` times concurrently to
+/api/oxapay/webhook (in-process ASGI app) and reports response latency
+p50/p95/p99 for two modes:
+- ack:    claim + ack, follow-up queued (current handler)
+- inline: follow-up awaited before the response (previous behaviour)
+The follow-up simulates Telegram calls with --telegram-ms of latency and
+credits the balance through complete_oxapay_payment. The run fails if any
+payment is claimed or credited more than once.
+
+Uses the in-memory test database by default; --mongo runs against
+MONGO_URL (a throwaway bench_payment_webhook database, dropped afterwards).
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(BACKEND_DIR))
+
+import httpx
+from fastapi import FastAPI
+
+from handlers.webhook_handlers import complete_oxapay_payment
+from repositories.payment_repository import PaymentRepository
+from routers.webhooks import router as webhooks_router
+import services.payment_webhooks as payment_webhooks_module
+from services.payment_webhooks import PaymentWebhooks
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+async def open_db(use_mongo):
+    if use_mongo:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        await client.drop_database('bench_payment_webhook')
+        return client, client['bench_payment_webhook']
+    from tests.conftest import InMemoryDatabase
+    return None, InMemoryDatabase()
+
+
+async def run(mode, args):
+    client, db = await open_db(args.mongo)
+    repo = PaymentRepository(db)
+    for i in range(args.payments):
+        await db.users.insert_one({'telegram_id': i, 'balance': 0.0})
+        await repo.insert_payment({
+            'invoice_id': 700000 + i, 'telegram_id': i, 'amount': 10.0,
+            'status': 'pending', 'type': 'topup'
+        })
+
+    async def follow_up(payment):
+        await asyncio.sleep(args.telegram_ms / 1000)  # edit buttons, notify user and admin
+        await complete_oxapay_payment(payment, db, None, None, None, None, None)
+
+    webhooks = PaymentWebhooks(db, follow_up=follow_up, workers=args.workers)
+    await webhooks.start()
+    if mode == 'inline':
+        # Previous behaviour: the response waits for the follow-up
+        claim = webhooks.claim
+
+        async def claim_inline(track_id, status, paid_amount=0.0):
+            outcome = await claim(track_id, status, paid_amount)
+            if outcome == payment_webhooks_module.CLAIMED:
+                await webhooks.run_follow_up(str(track_id))
+            return outcome
+        webhooks.claim = claim_inline
+    payment_webhooks_module._payment_webhooks = webhooks
+
+    app = FastAPI()
+    app.include_router(webhooks_router)
+    latencies = []
+
+    async def deliver(http, track_id):
+        started = time.perf_counter()
+        response = await http.post('/api/oxapay/webhook', json={
+            'track_id': track_id, 'status': 'Paid', 'amount': 10.0
+        })
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200 and response.json()['status'] == 'ok', response.text
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            deliver(http, 700000 + i if d % 2 else str(700000 + i))
+            for i in range(args.payments) for d in range(args.duplicates)
+        ))
+        elapsed = time.perf_counter() - started
+
+    while webhooks.get_stats()['queued']:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(args.telegram_ms / 1000 + 0.1)
+    await webhooks.stop()
+
+    stats = webhooks.get_stats()
+    credited = [user['balance'] async for user in db.users.find({})]
+    assert stats['claimed'] == args.payments, stats
+    assert all(balance == 10.0 for balance in credited), "payment credited more or less than once"
+    if client:
+        await client.drop_database('bench_payment_webhook')
+        client.close()
+
+    ms = lambda seconds: f"{seconds * 1000:8.1f} ms"
+    print(f"{mode:>6}: {len(latencies)} deliveries in {elapsed:.2f}s | "
+          f"p50 {ms(percentile(latencies, 50))} | p95 {ms(percentile(latencies, 95))} | "
+          f"p99 {ms(percentile(latencies, 99))} | claimed {stats['claimed']}, duplicates {stats['duplicates']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--payments', type=int, default=200)
+    parser.add_argument('--duplicates', type=int, default=5)
+    parser.add_argument('--telegram-ms', type=float, default=300)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--mongo', action='store_true')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    print(f"{args.payments} payments x {args.duplicates} concurrent deliveries, "
+          f"follow-up {args.telegram_ms:.0f} ms")
+    await run('ack', args)
+    await run('inline', args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Tests for background address verification (services/address_verification.py)
+"""
+import asyncio
+
+import pytest
+
+from services.address_verification import AddressVerifier, normalize_address
+
+ADDRESS = {
+    'from_name': 'John Smith',
+    'from_address': '123 Main Street',
+    'from_address2': '',
+    'from_city': 'San Francisco',
+    'from_state': 'CA',
+    'from_zip': '94102',
+}
+
+
+class FakeValidator:
+    def __init__(self, result, delay=0.0):
+        self.result = result
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self, name, street1, street2, city, state, zip_code):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.result
+
+
+def test_normalization_ignores_case_punctuation_and_suffixes():
+    variant = {**ADDRESS, 'from_address': ' 123  main st. ', 'from_city': 'san francisco'}
+
+    assert normalize_address(variant, 'from') == normalize_address(ADDRESS, 'from')
+    assert normalize_address({**ADDRESS, 'from_zip': ''}, 'from') is None
+
+
+@pytest.mark.asyncio
+async def test_repeat_address_served_from_shared_cache(memory_db):
+    validator = FakeValidator((True, {'address_line1': '123 MAIN ST', 'city_locality': 'SAN FRANCISCO',
+                                      'state_province': 'CA', 'postal_code': '94103-1234'}))
+    worker = AddressVerifier(validator=validator)
+    await worker.init_storage(memory_db)
+
+    result = await worker.verify(ADDRESS, 'from')
+    assert result['status'] == 'corrected'
+    assert result['corrections'] == {'zip': '94103'}
+
+    # Another worker (empty L1) reuses the stored verdict
+    other = AddressVerifier(validator=validator)
+    await other.init_storage(memory_db)
+    assert await other.verify({**ADDRESS, 'from_address': '123 main st'}, 'from') == result
+    assert validator.calls == 1
+    assert other.get_stats()['l2_hits'] == 1
+
+
+@pytest.mark.asyncio
+async def test_confirmation_peek_never_waits():
+    validator = FakeValidator((False, 'Address not found'), delay=0.05)
+    verifier = AddressVerifier(validator=validator)
+
+    assert verifier.schedule(1, 'from', ADDRESS)
+    assert not verifier.schedule(1, 'from', ADDRESS)  # same address already in flight
+    assert verifier.peek(1, 'from', ADDRESS) is None
+
+    await asyncio.sleep(0.1)
+    result = verifier.peek(1, 'from', ADDRESS)
+    assert result == {'status': 'invalid', 'message': 'Address not found', 'corrections': {}}
+    assert validator.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_unverifiable_results_are_not_cached():
+    # API error / open circuit: validate_address_with_shipstation returns (True, None)
+    validator = FakeValidator((True, None))
+    verifier = AddressVerifier(validator=validator)
+
+    assert await verifier.verify(ADDRESS, 'from') is None
+    assert await verifier.verify(ADDRESS, 'from') is None
+    assert validator.calls == 2
+    assert verifier.get_stats()['not_cached'] == 2
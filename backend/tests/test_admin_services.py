@@ -94,7 +94,8 @@ class TestUserAdminService:
         mock_result = MagicMock()
         mock_result.modified_count = 1
         mock_db.users.update_one = AsyncMock(return_value=mock_result)
-        mock_db.users.find_one = AsyncMock(return_value={"balance": 150.0})
+        mock_db.users.find_one_and_update = AsyncMock(return_value={"balance": 150.0, "ledger_seq": 2})
+        mock_db.balance_ledger.insert_one = AsyncMock()
         
         # Test
         success, new_balance, error = await user_admin_service.update_user_balance(
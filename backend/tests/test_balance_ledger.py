@@ -0,0 +1,87 @@
+"""
+Tests for the append-only balance ledger (repositories/balance_ledger.py)
+"""
+import asyncio
+
+import pytest
+
+from repositories.balance_ledger import BalanceLedger
+
+
+@pytest.fixture
+def ledger(memory_db):
+    return BalanceLedger(memory_db, pending_grace=0)
+
+
+async def balance_of(memory_db, telegram_id):
+    return (await memory_db.users.find_one({'telegram_id': telegram_id}))['balance']
+
+
+@pytest.mark.asyncio
+async def test_concurrent_debits_never_overdraw(memory_db, ledger):
+    # Pre-ledger user: first operation opens the ledger with the current balance
+    await memory_db.users.insert_one({'telegram_id': 42, 'balance': 10.0})
+
+    results = await asyncio.gather(*(ledger.debit(42, 1.0, 'order', f'ORD-{i}') for i in range(25)))
+
+    assert sum(r is not None for r in results) == 10
+    assert await balance_of(memory_db, 42) == 0.0
+    entries = await memory_db.balance_ledger.find({'telegram_id': 42}).sort('seq').to_list()
+    assert [e['seq'] for e in entries] == list(range(1, 12))
+    assert entries[0]['reason'] == 'opening' and entries[0]['amount'] == 10.0
+    assert entries[-1]['balance_after'] == 0.0
+    assert (await memory_db.users.find_one({'telegram_id': 42}))['ledger_pending'] == []
+    assert ledger.get_stats()['rejected'] == 15
+
+    assert await ledger.debit(404, 1.0, 'order') is None  # unknown user
+    report = await ledger.reconcile()
+    assert report['consistent'] == 1 and report['drift'] == []
+
+
+@pytest.mark.asyncio
+async def test_interrupted_entry_is_recovered_then_snapshotted(memory_db, ledger):
+    await memory_db.users.insert_one({'telegram_id': 7, 'balance': 0.0, 'ledger_seq': 0})
+    assert await ledger.credit(7, 20.0, 'topup', 'TRK-1') == 20.0
+
+    # Process dies between the balance update and the ledger insert
+    insert_one = memory_db.balance_ledger.insert_one
+
+    async def crash(doc):
+        raise ConnectionError('connection reset')
+    memory_db.balance_ledger.insert_one = crash
+    assert await ledger.debit(7, 5.0, 'order', 'ORD-1') == 15.0
+    memory_db.balance_ledger.insert_one = insert_one
+    assert (await ledger.reconcile())['incomplete'] == 1
+
+    assert (await ledger.maintain())['recovered'] == 1
+    entry = await memory_db.balance_ledger.find_one({'telegram_id': 7, 'seq': 2})
+    assert entry['amount'] == -5.0 and entry['ref'] == 'ORD-1'
+
+    assert (await ledger.maintain())['snapshots'] == 1
+    assert (await memory_db.balance_snapshots.find_one({'_id': 7}))['seq'] == 2
+    assert 'ledger_dirty' not in await memory_db.users.find_one({'telegram_id': 7})
+    assert (await ledger.maintain())['users'] == 0
+
+    await ledger.credit(7, 2.5, 'refund', 'ORD-1')
+    assert await ledger.rebuild(7) == 17.5
+    assert (await ledger.reconcile())['consistent'] == 1
+
+
+@pytest.mark.asyncio
+async def test_reconcile_reports_and_fixes_drift(memory_db, ledger):
+    await memory_db.users.insert_one({'telegram_id': 1, 'balance': 30.0})
+    await memory_db.users.insert_one({'telegram_id': 2, 'balance': 0.0})
+    await ledger.debit(1, 10.0, 'order')
+    await ledger.set_balance(2, 12.0, 'admin_set')
+
+    # A write that bypassed the ledger
+    await memory_db.users.update_one({'telegram_id': 1}, {'$inc': {'balance': 100.0}})
+
+    report = await ledger.reconcile()
+    assert report['drift'] == [{'telegram_id': 1, 'balance': 120.0, 'ledger': 20.0}]
+    assert report['consistent'] == 1 and report['fixed'] == 0
+
+    report = await ledger.reconcile(fix=True, telegram_ids=[1])
+    assert report['fixed'] == 1
+    assert await balance_of(memory_db, 1) == 20.0
+    assert await balance_of(memory_db, 2) == 12.0
@@ -0,0 +1,72 @@
+"""
+Tests for the cached ShipStation balance monitor (services/balance_monitor.py)
+"""
+import asyncio
+
+import pytest
+
+from services.balance_monitor import BalanceMonitor
+
+
+class FakeAccount:
+    def __init__(self, balance):
+        self.balance = balance
+        self.calls = 0
+        self.fail = False
+
+    async def fetch(self):
+        self.calls += 1
+        if self.fail:
+            return {"success": False, "error": "Status 503"}
+        return {"success": True, "balance": self.balance}
+
+
+@pytest.mark.asyncio
+async def test_purchases_are_estimated_locally_and_burst_refreshes_once():
+    account = FakeAccount(100.0)
+    monitor = BalanceMonitor(fetcher=account.fetch, refresh_interval=3600, debounce_seconds=0.05)
+    await monitor.get_balance()
+    await monitor.start()
+
+    for _ in range(5):
+        await monitor.record_purchase(8.5)
+        account.balance -= 8.5
+    assert account.calls == 1
+    assert (await monitor.get_balance())['balance'] == 57.5
+
+    await asyncio.sleep(0.2)
+    await monitor.stop()
+
+    stats = monitor.get_stats()
+    assert account.calls == 2  # one refresh for the whole burst
+    assert stats['balance'] == 57.5
+    assert stats['pending_labels'] == 0
+    assert stats['coalesced'] >= 4
+
+
+@pytest.mark.asyncio
+async def test_low_balance_alerts_once_until_topped_up():
+    alerts = []
+
+    async def on_low_balance(balance):
+        alerts.append(balance)
+
+    account = FakeAccount(60.0)
+    monitor = BalanceMonitor(fetcher=account.fetch, on_low_balance=on_low_balance, low_balance_threshold=50)
+    await monitor.refresh()
+
+    await monitor.record_purchase(7)
+    await monitor.record_purchase(7)  # estimate 46 - alert
+    await monitor.record_purchase(7)
+    assert alerts == [46.0]
+
+    account.fail = True
+    assert not await monitor.refresh()  # failed refresh keeps the estimate
+    assert monitor.balance == 39.0
+
+    account.fail = False
+    account.balance = 500.0
+    await monitor.refresh()
+    account.balance = 20.0
+    await monitor.refresh()
+    assert alerts == [46.0, 20.0]
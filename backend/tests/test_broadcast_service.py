@@ -0,0 +1,98 @@
+"""
+Tests for the resumable broadcast engine (services/broadcast_service.py)
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from telegram.error import Forbidden
+from services.broadcast_service import BroadcastEngine
+
+
+async def seed_users(db, count, blocked=()):
+    await db.users.insert_many([
+        {'telegram_id': i, 'balance': i % 2, 'bot_blocked_by_user': i in blocked}
+        for i in range(1, count + 1)
+    ])
+
+
+def make_bot(fail_for=()):
+    async def send_message(chat_id, text):
+        if chat_id in fail_for:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        return True
+
+    bot = AsyncMock()
+    bot.send_message = AsyncMock(side_effect=send_message)
+    return bot
+
+
+@pytest.mark.asyncio
+async def test_job_streams_audience_and_records_outcomes(memory_db):
+    await seed_users(memory_db, 25, blocked={3})
+    bot = make_bot(fail_for={7})
+    engine = BroadcastEngine(memory_db, bot, concurrency=5, batch_size=10)
+
+    job = await engine.create_job('Hello', target='all')
+    assert job['total'] == 24
+    await engine.start_job(job['_id'])
+
+    progress = await engine.get_progress(job['_id'])
+    assert progress['status'] == 'completed'
+    assert progress['success_count'] == 23
+    assert progress['blocked_count'] == 1
+    assert progress['processed'] == 24
+    assert bot.send_message.await_count == 24
+
+    assert await memory_db.broadcast_deliveries.count_documents({'job_id': job['_id']}) == 24
+    assert (await memory_db.users.find_one({'telegram_id': 7}))['bot_blocked_by_user'] is True
+
+
+@pytest.mark.asyncio
+async def test_active_target_uses_order_owners(memory_db):
+    await seed_users(memory_db, 10)
+    await memory_db.orders.insert_many([{'telegram_id': 2}, {'telegram_id': 2}, {'telegram_id': 5}])
+    engine = BroadcastEngine(memory_db, make_bot())
+
+    job = await engine.create_job('Hi', target='active')
+    await engine.start_job(job['_id'])
+
+    assert (await engine.get_progress(job['_id']))['success_count'] == 2
+
+
+@pytest.mark.asyncio
+async def test_job_resumes_after_crash(memory_db):
+    await seed_users(memory_db, 30)
+    gate = asyncio.Event()
+    sent = []
+
+    async def slow_send(chat_id, text):
+        if chat_id > 10:
+            await gate.wait()
+        sent.append(chat_id)
+        return True
+
+    bot = AsyncMock()
+    bot.send_message = AsyncMock(side_effect=slow_send)
+    engine = BroadcastEngine(memory_db, bot, batch_size=10, lease_seconds=0)
+    job = await engine.create_job('Hi')
+    task = engine.start_job(job['_id'])
+
+    # Crash while the second batch is in flight
+    for _ in range(100):
+        if (await memory_db.broadcast_jobs.find_one({'_id': job['_id']}))['last_telegram_id'] == 10:
+            break
+        await asyncio.sleep(0.01)
+    await engine.stop()
+    assert task.cancelled()
+    assert (await memory_db.broadcast_jobs.find_one({'_id': job['_id']}))['status'] == 'running'
+
+    gate.set()
+    restarted = BroadcastEngine(memory_db, bot, batch_size=10)
+    assert await restarted.resume_unfinished() == 1
+    await asyncio.gather(*restarted._tasks.values())
+
+    progress = await restarted.get_progress(job['_id'])
+    assert progress['status'] == 'completed'
+    assert progress['success_count'] == 30
+    # First batch was not sent again
+    assert sorted(sent) == list(range(1, 31))
@@ -0,0 +1,66 @@
+"""
+Tests for the carrier catalog cache (services/carrier_catalog.py)
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from services.carrier_catalog import CarrierCatalog
+
+
+@pytest.mark.asyncio
+async def test_snapshot_served_without_fetch_and_persisted(memory_db):
+    fetcher = AsyncMock(return_value={'USPS': 'se-1', 'UPS': 'se-2'})
+    catalog = CarrierCatalog(memory_db, fetcher=fetcher)
+
+    assert await catalog.get_carrier_ids() == {'USPS': 'se-1', 'UPS': 'se-2'}
+    assert await catalog.get_carrier_ids() == {'USPS': 'se-1', 'UPS': 'se-2'}
+    assert fetcher.await_count == 1
+
+    # A cold process gets carrier ids from the snapshot
+    cold_fetcher = AsyncMock(return_value={})
+    cold = CarrierCatalog(memory_db, fetcher=cold_fetcher)
+    assert await cold.load_snapshot()
+    assert await cold.get_carrier_ids() == {'USPS': 'se-1', 'UPS': 'se-2'}
+    cold_fetcher.assert_not_awaited()
+    assert cold.get_stats()['source'] == 'snapshot'
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_last_good_snapshot(memory_db):
+    fetcher = AsyncMock(side_effect=[{'USPS': 'se-1'}, {}, TimeoutError('slow')])
+    catalog = CarrierCatalog(memory_db, fetcher=fetcher, error_retry_interval=10)
+
+    assert await catalog.refresh()
+    assert not await catalog.refresh()
+    assert not await catalog.refresh()
+
+    assert await catalog.get_carrier_ids() == {'USPS': 'se-1'}
+    stats = catalog.get_stats()
+    assert stats['failures'] == 2
+    assert stats['consecutive_failures'] == 2
+    assert 'TimeoutError' in stats['last_error']
+    # Backoff after repeated failures
+    assert catalog._next_delay() == 20
+
+
+@pytest.mark.asyncio
+async def test_background_refresh_on_request(memory_db):
+    fetcher = AsyncMock(side_effect=[{'USPS': 'se-1'}, {'USPS': 'se-9'}])
+    catalog = CarrierCatalog(memory_db, fetcher=fetcher, refresh_interval=3600)
+
+    await catalog.start()
+    for _ in range(50):
+        if catalog.get_stats()['refreshes'] == 1:
+            break
+        await asyncio.sleep(0.01)
+
+    catalog.request_refresh()
+    for _ in range(50):
+        if catalog.get_stats()['refreshes'] == 2:
+            break
+        await asyncio.sleep(0.01)
+    await catalog.stop()
+
+    assert await catalog.get_carrier_ids() == {'USPS': 'se-9'}
+    snapshot = await memory_db.carrier_catalog.find_one({'_id': 'shipstation'})
+    assert snapshot['carriers'] == {'USPS': 'se-9'}
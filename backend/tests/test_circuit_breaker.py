@@ -0,0 +1,81 @@
+"""
+Tests for the ShipStation circuit breaker path
+(utils/retry_utils.py, rate fallback)
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from utils.retry_utils import CircuitBreaker, CircuitOpenError
+from services.shipstation_cache import ShipStationCache
+
+
+async def failing():
+    raise TimeoutError('slow')
+
+
+@pytest.mark.asyncio
+async def test_opens_rejects_and_half_open_allows_single_probe():
+    circuit = CircuitBreaker(failure_threshold=2, timeout=0.05, name='test')
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            await circuit.call(failing)
+    assert circuit.state == "OPEN"
+
+    with pytest.raises(CircuitOpenError):
+        await circuit.call(AsyncMock())
+    await asyncio.sleep(0.06)
+
+    async def probe():
+        # Second caller arrives while the probe is in flight
+        with pytest.raises(CircuitOpenError):
+            await circuit.call(AsyncMock())
+        return 'ok'
+
+    assert await circuit.call(probe) == 'ok'
+    assert circuit.state == "CLOSED"
+    stats = circuit.get_stats()
+    assert stats['transitions'] == {'CLOSED->OPEN': 1, 'OPEN->HALF_OPEN': 1, 'HALF_OPEN->CLOSED': 1}
+    assert stats['rejected'] == 2
+
+
+@pytest.mark.asyncio
+async def test_rates_fail_fast_and_client_errors_do_not_trip():
+    from services.shipping_service import fetch_rates_hedged, CIRCUIT_OPEN_ERROR
+
+    circuit = CircuitBreaker(failure_threshold=2, timeout=60, name='test')
+    fetch = AsyncMock(return_value=(False, None, 'ShipStation API error: 400 - bad address'))
+    with patch('services.shipping_service.SHIPSTATION_CIRCUIT', circuit), \
+            patch('services.shipping_service.fetch_rates_from_shipstation', fetch):
+        for _ in range(3):
+            await fetch_rates_hedged({}, {}, 'url')
+        assert circuit.state == "CLOSED"
+
+        fetch.return_value = (False, None, 'ShipStation API error: 503 - unavailable')
+        for _ in range(2):
+            await fetch_rates_hedged({}, {}, 'url')
+        assert circuit.state == "OPEN"
+
+        assert await fetch_rates_hedged({}, {}, 'url') == (False, None, CIRCUIT_OPEN_ERROR)
+    assert fetch.await_count == 5
+
+
+@pytest.mark.asyncio
+async def test_fallback_prefers_exact_entry_then_nearest_weight():
+    cache = ShipStationCache()
+    await cache.set('10001', '90210', 2.0, [{'rate_id': 'exact', 'amount': 10.0}])
+    await cache.set('10002', '90299', 3.0, [{'rate_id': 'heavier', 'amount': 12.0}])
+    await cache.set('10002', '90299', 1.0, [{'rate_id': 'lighter', 'amount': 8.0}])
+
+    order = {'from_zip': '10001', 'to_zip': '90210', 'parcel_weight': 2.0}
+    fallback = await cache.get_fallback(order)
+    assert fallback['kind'] == 'cached'
+    assert fallback['rates'][0]['rate_id'] == 'exact'
+    assert fallback['rates'][0]['fallback'] == 'cached'
+
+    # Same ZIP3 route, no exact entry: equally close weights -> the heavier one
+    fallback = await cache.get_fallback({'from_zip': '10003', 'to_zip': '90211', 'parcel_weight': 2.5})
+    assert fallback['kind'] == 'estimated'
+    assert fallback['rates'][0]['rate_id'] == 'heavier'
+
+    assert await cache.get_fallback({'from_zip': '60601', 'to_zip': '90210', 'parcel_weight': 2.0}) is None
+    assert cache.get_stats()['fallback_misses'] == 1
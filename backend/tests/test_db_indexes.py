@@ -0,0 +1,97 @@
+"""
+Tests for the index manifest and query-plan verification (utils/db_indexes.py)
+"""
+import pytest
+
+from utils.db_indexes import (
+    INDEX_MANIFEST, HOT_QUERIES, apply_index_manifest, diff_indexes, plan_stages, verify_query_plans
+)
+
+
+def test_diff_matches_by_keys_and_options():
+    specs = [
+        {'name': 'idx_user_id_unique', 'keys': [('user_id', 1)], 'unique': True},
+        {'name': 'idx_sessions_timestamp_ttl', 'keys': [('timestamp', 1)], 'expireAfterSeconds': 900},
+        {'name': 'idx_new', 'keys': [('status', 1), ('created_at', -1)]},
+        {'name': 'idx_label_id', 'keys': [('label_id', 1)], 'sparse': True},
+    ]
+    existing = [
+        {'name': '_id_', 'key': {'_id': 1}},
+        {'name': 'user_id_1', 'key': {'user_id': 1.0}, 'unique': True},  # old auto name still counts
+        {'name': 'timestamp_1', 'key': {'timestamp': 1}, 'expireAfterSeconds': 3600},
+        {'name': 'idx_session_ttl', 'key': {'last_updated': 1}, 'expireAfterSeconds': 3600},
+        {'name': 'label_id_1', 'key': {'label_id': 1}, 'unique': True, 'sparse': True},
+    ]
+
+    diff = diff_indexes(specs, existing)
+
+    assert [spec['name'] for spec in diff['missing']] == ['idx_new']
+    assert [index['name'] for _, index in diff['ttl']] == ['timestamp_1']
+    assert diff['conflicts'] == []  # a unique index serves a non-unique spec
+    assert diff['unmanaged'] == ['idx_session_ttl']
+
+    diff = diff_indexes([{'name': 'u', 'keys': [('user_id', 1)], 'unique': True}],
+                        [{'name': 'user_id_1', 'key': {'user_id': 1}}])
+    assert [reason for _, _, reason in diff['conflicts']] == ['not unique']
+
+
+@pytest.mark.asyncio
+async def test_apply_builds_only_missing_indexes(memory_db):
+    # Existing deployment: startup indexes under their auto names
+    await memory_db.users.create_index('telegram_id', unique=True)
+    await memory_db.orders.create_index('order_id', unique=True)
+
+    report = await apply_index_manifest(memory_db)
+
+    assert report['errors'] == 0
+    assert 'idx_telegram_id_unique' not in report['collections']['users']['created']
+    assert 'idx_orders_order_id' not in report['collections']['orders']['created']
+    assert report['created'] == sum(len(specs) for specs in INDEX_MANIFEST.values()) - 2
+    refunds = await memory_db.refund_requests.list_indexes().to_list(None)
+    assert {'name': 'idx_request_id', 'key': {'request_id': 1}, 'unique': True} in refunds
+
+    # Second start: nothing to build
+    report = await apply_index_manifest(memory_db)
+    assert report['created'] == 0
+    assert all(not result['unmanaged'] for result in report['collections'].values())
+
+
+class FakeCursor:
+    def __init__(self, stage):
+        self.stage = stage
+
+    def sort(self, keys):
+        return self
+
+    def limit(self, n):
+        return self
+
+    async def explain(self):
+        return {'queryPlanner': {
+            'winningPlan': {'stage': 'LIMIT', 'inputStage': {'stage': 'FETCH', 'inputStage': {'stage': self.stage}}},
+            'rejectedPlans': [{'stage': 'COLLSCAN'}],
+        }}
+
+
+class FakeDatabase:
+    def __init__(self, unindexed):
+        self.unindexed = unindexed
+
+    def __getitem__(self, name):
+        stage = 'COLLSCAN' if name in self.unindexed else 'IXSCAN'
+        return type('Collection', (), {'find': lambda _, query: FakeCursor(stage)})()
+
+
+@pytest.mark.asyncio
+async def test_verify_flags_collscans():
+    assert plan_stages(await FakeCursor('IXSCAN').explain()) == ['LIMIT', 'FETCH', 'IXSCAN']
+
+    report = await verify_query_plans(FakeDatabase({'refund_requests'}))
+
+    assert report['collscans'] == [q['source'] for q in HOT_QUERIES if q['collection'] == 'refund_requests']
+    assert len(report['plans']) == len(HOT_QUERIES)
+    # Every hot query is backed by a manifest index whose keys start with its first filter (or sort) field
+    for query in HOT_QUERIES:
+        prefixes = {spec['keys'][0][0] for spec in INDEX_MANIFEST[query['collection']]}
+        first = next(iter(query['filter']), None) or query['sort'][0][0]
+        assert first in prefixes, query['source']
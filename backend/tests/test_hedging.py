@@ -0,0 +1,65 @@
+"""
+Tests for hedged requests (utils/hedging.py)
+"""
+import asyncio
+import pytest
+from utils.hedging import Hedger
+
+
+def warmed_up(**kwargs):
+    hedger = Hedger('test', min_samples=5, **kwargs)
+    for _ in range(5):
+        hedger.latency.add(0.02)
+    return hedger
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_hedge_wins():
+    hedger = warmed_up(max_extra_load=1.0)
+    attempts = []
+
+    async def request():
+        attempts.append(1)
+        # First attempt hangs, the hedge answers quickly
+        await asyncio.sleep(1.0 if len(attempts) == 1 else 0.01)
+        return len(attempts)
+
+    assert await hedger.call(request) == 2
+    stats = hedger.get_stats()
+    assert stats['hedges'] == 1
+    assert stats['hedge_wins'] == 1
+
+
+@pytest.mark.asyncio
+async def test_non_idempotent_and_budget_disable_hedging():
+    hedger = warmed_up(max_extra_load=0.0)
+    attempts = []
+
+    async def request():
+        attempts.append(1)
+        await asyncio.sleep(0.05)
+        return 'label'
+
+    assert await hedger.call(request) == 'label'
+    assert hedger.get_stats()['budget_exhausted'] == 1
+
+    hedger.max_extra_load = 1.0
+    assert await hedger.call(request, idempotent=False) == 'label'
+    assert len(attempts) == 2
+    assert hedger.get_stats()['hedges'] == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_hedge_falls_back_to_primary():
+    hedger = warmed_up(max_extra_load=1.0)
+    attempts = []
+
+    async def request():
+        attempts.append(1)
+        if len(attempts) == 2:
+            return (False, None, 'Request timeout')
+        await asyncio.sleep(0.1)
+        return (True, ['rate'], None)
+
+    assert await hedger.call(request, is_success=lambda r: r[0]) == (True, ['rate'], None)
+    assert hedger.get_stats()['hedge_wins'] == 0
@@ -0,0 +1,41 @@
+"""
+Tests for shared HTTP client pools (utils/http_clients.py)
+"""
+import pytest
+from utils.http_clients import HttpClientRegistry
+
+PROVIDERS = {
+    'shipstation': {'timeout': 30.0, 'connect_timeout': 10.0, 'max_connections': 50, 'max_keepalive_connections': 20},
+    'oxapay': {'timeout': 15.0},
+}
+
+
+@pytest.mark.asyncio
+async def test_one_client_per_provider_with_own_settings():
+    registry = HttpClientRegistry(PROVIDERS)
+    registry.start()
+
+    shipstation = registry.get('shipstation')
+    assert registry.get('shipstation') is shipstation
+    assert registry.get('oxapay') is not shipstation
+    assert shipstation.timeout.read == 30.0
+    assert shipstation.timeout.connect == 10.0
+    assert registry.get('oxapay').timeout.read == 15.0
+
+    stats = registry.get_stats()
+    assert stats['shipstation']['max_connections'] == 50
+    assert stats['shipstation']['utilization'] == '0.0%'
+    await registry.close()
+
+
+@pytest.mark.asyncio
+async def test_close_and_reopen():
+    registry = HttpClientRegistry(PROVIDERS)
+    client = registry.get('shipstation')
+    await registry.close()
+    assert client.is_closed
+
+    reopened = registry.get('shipstation')
+    assert reopened is not client
+    assert not reopened.is_closed
+    await registry.close()
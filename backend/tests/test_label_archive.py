@@ -0,0 +1,134 @@
+"""
+Tests for the content-addressed label archive (services/label_archive.py)
+"""
+import hashlib
+import os
+from unittest.mock import patch
+
+import pytest
+
+from services.label_archive import LabelArchive
+
+PDF = b'%PDF-1.4 label body %%EOF'
+
+
+class FakeStream:
+    status_code = 200
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def aiter_bytes(self, chunk_size):
+        for i in range(0, len(PDF), 8):
+            yield PDF[i:i + 8]
+
+
+class FakeClient:
+    def __init__(self):
+        self.requests = 0
+
+    def stream(self, method, url, **kwargs):
+        self.requests += 1
+        return FakeStream()
+
+
+@pytest.fixture
+def client():
+    fake = FakeClient()
+    with patch('services.label_archive.get_http_client', return_value=fake):
+        yield fake
+
+
+@pytest.mark.asyncio
+async def test_store_is_content_addressed_and_deduplicated(tmp_path, memory_db, client):
+    archive = LabelArchive(root=tmp_path)
+    archive.init_storage(memory_db)
+    await memory_db.shipping_labels.insert_one({'order_id': 'ORD-1', 'label_url': 'https://x/1.pdf'})
+    await memory_db.shipping_labels.insert_one({'order_id': 'ORD-2', 'label_url': 'https://x/2.pdf'})
+
+    first = await archive.store(await memory_db.shipping_labels.find_one({'order_id': 'ORD-1'}))
+    second = await archive.store(await memory_db.shipping_labels.find_one({'order_id': 'ORD-2'}))
+
+    sha256 = hashlib.sha256(PDF).hexdigest()
+    path = tmp_path / sha256[:2] / sha256[2:4] / f"{sha256}.pdf"
+    assert first['sha256'] == second['sha256'] == sha256
+    assert path.read_bytes() == PDF
+    assert archive.get_stats()['deduplicated'] == 1
+
+    # Already archived: served locally, no download
+    label = await memory_db.shipping_labels.find_one({'order_id': 'ORD-1'})
+    assert await archive.store(label) == first
+    assert client.requests == 2
+    with archive.open_pdf(label) as f:
+        assert f.read() == PDF
+
+
+@pytest.mark.asyncio
+async def test_eviction_removes_old_files_and_archive_entries(tmp_path, memory_db, client):
+    archive = LabelArchive(root=tmp_path, retention_days=30)
+    archive.init_storage(memory_db)
+    await memory_db.shipping_labels.insert_one({'order_id': 'ORD-1', 'label_url': 'https://x/1.pdf'})
+    label = await memory_db.shipping_labels.find_one({'order_id': 'ORD-1'})
+    await archive.store(label)
+
+    assert await archive.evict() == 0
+    old = os.path.getmtime(archive.locate(label)) - 31 * 86400
+    os.utime(archive.locate(label), (old, old))
+
+    assert await archive.evict() == 1
+    assert archive.locate(label) is None
+    assert 'archive' not in await memory_db.shipping_labels.find_one({'order_id': 'ORD-1'})
+
+
+@pytest.mark.asyncio
+async def test_backfill_archives_labels_without_copy(tmp_path, memory_db, client):
+    archive = LabelArchive(root=tmp_path)
+    archive.init_storage(memory_db)
+    await memory_db.shipping_labels.insert_one({'order_id': 'ORD-1', 'label_url': 'https://x/1.pdf'})
+    await memory_db.shipping_labels.insert_one({'order_id': 'ORD-2', 'label_url': ''})
+
+    assert await archive.backfill() == 1
+    assert await archive.backfill() == 0
+    assert (await memory_db.shipping_labels.find_one({'order_id': 'ORD-1'}))['archive']['size'] == len(PDF)
+
+
+@pytest.mark.asyncio
+async def test_backfill_backs_off_from_dead_urls(tmp_path, memory_db, client):
+    archive = LabelArchive(root=tmp_path, backfill_attempts=2)
+    archive.init_storage(memory_db)
+    await memory_db.shipping_labels.insert_one(
+        {'order_id': 'ORD-OLD', 'label_url': 'https://x/expired.pdf', 'created_at': '2024-01-01T00:00:00'})
+    FakeStream.status_code = 404
+    try:
+        assert await archive.backfill() == 0
+    finally:
+        FakeStream.status_code = 200
+    label = await memory_db.shipping_labels.find_one({'order_id': 'ORD-OLD'})
+    assert label['archive_attempts'] == 1 and label['archive_failed_at']
+
+    # Not retried before its backoff ends; newer labels get the batch
+    await memory_db.shipping_labels.insert_one(
+        {'order_id': 'ORD-NEW', 'label_url': 'https://x/new.pdf', 'created_at': '2025-01-01T00:00:00'})
+    assert await archive.backfill(limit=1) == 1
+    assert client.requests == 2
+
+    # Out of attempts: never selected again
+    await memory_db.shipping_labels.update_one(
+        {'order_id': 'ORD-OLD'}, {'$set': {'archive_attempts': 2, 'archive_retry_at': '2000-01-01T00:00:00'}})
+    assert await archive.backfill() == 0
+    assert client.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_zstd_compressed_copy_round_trips(tmp_path, client):
+    pytest.importorskip('zstandard')
+    archive = LabelArchive(root=tmp_path, compress=True)
+    label = {'order_id': 'ORD-1', 'label_url': 'https://x/1.pdf'}
+
+    entry = await archive.store(label)
+    assert entry['compressed']
+    assert archive.locate(label).suffix == '.zst'
+    assert b''.join(archive.iter_pdf(archive.locate(label))) == PDF
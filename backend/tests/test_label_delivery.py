@@ -0,0 +1,105 @@
+"""
+Tests for label PDF delivery with file_id reuse (services/label_delivery.py)
+"""
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from services.label_delivery import LabelDelivery
+
+
+class FakeBot:
+    def __init__(self, reject_urls=False):
+        self.reject_urls = reject_urls
+        self.sent = []
+
+    async def send_document(self, chat_id, document, caption=None):
+        if isinstance(document, str) and document.startswith('http') and self.reject_urls:
+            return None
+        body = document.input_file_content if hasattr(document, 'input_file_content') else document
+        self.sent.append((chat_id, body))
+        return SimpleNamespace(document=SimpleNamespace(file_id='FILE-1', file_size=48000))
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.status_code = 200
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def aiter_bytes(self, chunk_size):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class FakeClient:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.requests = 0
+
+    def stream(self, method, url, timeout=None):
+        self.requests += 1
+        return FakeStream(self.chunks)
+
+
+async def passthrough(coro, **kwargs):
+    return await coro
+
+
+def label_doc():
+    return {'order_id': 'ORD-1', 'label_url': 'https://labels.example/ORD-1.pdf', 'tracking_number': '1Z999'}
+
+
+@pytest.mark.asyncio
+async def test_url_send_records_file_id_for_reprints(memory_db):
+    await memory_db.shipping_labels.insert_one(label_doc())
+    delivery = LabelDelivery()
+    delivery.init_storage(memory_db)
+    bot = FakeBot()
+
+    label = await memory_db.shipping_labels.find_one({'order_id': 'ORD-1'})
+    assert await delivery.send(bot, 1, label, 'label', passthrough) == (True, None)
+    assert bot.sent[0] == (1, 'https://labels.example/ORD-1.pdf')
+
+    # Reprint / admin copy: served by file_id from the stored document
+    stored = await memory_db.shipping_labels.find_one({'order_id': 'ORD-1'})
+    assert stored['telegram_file_id'] == 'FILE-1'
+    assert await delivery.send(bot, 2, stored, 'copy', passthrough, allow_upload=False) == (True, None)
+    assert bot.sent[1] == (2, 'FILE-1')
+
+    stats = delivery.get_stats()
+    assert stats['sends'] == {'file_id': 1, 'url': 1, 'upload': 0}
+    assert stats['bytes_saved'] == 96000
+    assert stats['bytes_uploaded'] == 0
+
+
+@pytest.mark.asyncio
+async def test_rejected_url_falls_back_to_streamed_upload():
+    delivery = LabelDelivery(spool_max=4)
+    bot = FakeBot(reject_urls=True)
+    client = FakeClient([b'%PDF', b'-1.4', b'...'])
+    label = label_doc()
+
+    with patch('services.label_delivery.get_http_client', return_value=client):
+        assert await delivery.send(bot, 1, label, 'label', passthrough) == (True, None)
+
+    assert bot.sent == [(1, b'%PDF-1.4...')]
+    assert label['telegram_file_id'] == 'FILE-1'
+    assert delivery.get_stats()['bytes_uploaded'] == 11
+    assert delivery.get_stats()['url_rejected'] == 1
+
+
+@pytest.mark.asyncio
+async def test_copy_without_file_id_is_skipped():
+    delivery = LabelDelivery()
+    bot = FakeBot()
+
+    success, error = await delivery.send(bot, 1, label_doc(), 'copy', passthrough, allow_upload=False)
+    assert not success
+    assert bot.sent == []
@@ -0,0 +1,166 @@
+"""
+Tests for the durable label pipeline (services/label_jobs.py)
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.label_jobs import LabelJobFailed, LabelJobQueue, LabelJobRetry, STAGES
+
+
+class FakeStages:
+    def __init__(self):
+        self.calls = []
+        self.failures = []
+        self.behaviour = {}
+
+    def stages(self):
+        def make(name):
+            async def stage(job):
+                self.calls.append((job.order_id, name))
+                action = self.behaviour.pop(name, None)
+                if action:
+                    raise action
+                await job.save(**{f'{name}_done': True})
+            return name, stage
+        return [make(name) for name in STAGES]
+
+    async def on_failure(self, job, error):
+        self.failures.append((job.order_id, str(error), error.needs_review))
+
+
+@pytest.fixture
+def fake():
+    return FakeStages()
+
+
+@pytest.fixture
+def queue(memory_db, fake):
+    return LabelJobQueue(memory_db, stages=fake.stages(), on_failure=fake.on_failure, poll_interval=0.01)
+
+
+@pytest.mark.asyncio
+async def test_inline_run_then_workers_finish_each_stage_once(memory_db, queue, fake):
+    await memory_db.orders.insert_one({'order_id': 'ORD-1'})
+
+    assert await queue.run('ORD-1', 42, until='download')
+    assert fake.calls == [('ORD-1', 'purchase'), ('ORD-1', 'persist')]
+    assert not await queue.submit('ORD-1', 42)  # idempotent per order
+
+    await queue.start()
+    for _ in range(100):
+        if (await memory_db.label_jobs.find_one({'_id': 'ORD-1'}))['stage'] == 'done':
+            break
+        await asyncio.sleep(0.01)
+    await queue.stop()
+
+    assert [name for _, name in fake.calls] == list(STAGES)
+    # Finished job is a no-op for a repeated request
+    assert await queue.run('ORD-1', 42)
+    assert len(fake.calls) == len(STAGES)
+    assert queue.get_stats()['completed'] == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_claim_resumes_at_last_finished_stage(memory_db, fake):
+    await memory_db.orders.insert_one({'order_id': 'ORD-2'})
+    crashed = LabelJobQueue(memory_db, stages=fake.stages(), on_failure=fake.on_failure)
+    fake.behaviour['download'] = asyncio.CancelledError()  # process dies mid-download
+
+    await crashed.submit('ORD-2', 42)
+    with pytest.raises(asyncio.CancelledError):
+        await crashed._process(await crashed._claim({}))
+    assert await crashed._claim({}) is None  # lease still held
+
+    await memory_db.label_jobs.update_one(
+        {'_id': 'ORD-2'}, {'$set': {'claimed_until': datetime.now(timezone.utc) - timedelta(seconds=1)}}
+    )
+    restarted = LabelJobQueue(memory_db, stages=fake.stages(), on_failure=fake.on_failure)
+    assert await restarted._process(await restarted._claim({})) == 'done'
+
+    assert [name for _, name in fake.calls] == ['purchase', 'persist', 'download'] + list(STAGES[2:])
+    assert restarted.get_stats()['resumed'] == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_postpones_and_failure_notifies_once(memory_db, queue, fake):
+    await memory_db.orders.insert_one({'order_id': 'ORD-3'})
+    fake.behaviour['purchase'] = LabelJobRetry(60, 'circuit open')
+
+    assert not await queue.run('ORD-3', 42)
+    job = await memory_db.label_jobs.find_one({'_id': 'ORD-3'})
+    assert job['stage'] == 'purchase'
+    assert await queue._claim({}) is None  # hidden until the retry delay passes
+
+    await memory_db.label_jobs.update_one({'_id': 'ORD-3'}, {'$set': {'claimed_until': datetime.now(timezone.utc)}})
+    fake.behaviour['purchase'] = LabelJobFailed('outcome unknown', needs_review=True)
+    assert await queue._process(await queue._claim({})) == 'failed'
+    assert fake.failures == [('ORD-3', 'outcome unknown', True)]
+
+    # A user / API retry does not clear the review guard
+    assert not await queue.run('ORD-3', 42)
+    assert (await memory_db.label_jobs.find_one({'_id': 'ORD-3'}))['needs_review'] is True
+    assert [name for _, name in fake.calls].count('purchase') == 2
+
+    # Admin retry after checking ShipStation restarts it
+    assert await queue.run('ORD-3', 42, reviewed=True)
+    assert queue.get_stats()['retried'] == 1
+
+
+@pytest.mark.asyncio
+async def test_settlement_after_charged_inline_run(memory_db, queue, fake):
+    """A charged caller refunds only when nothing was bought"""
+    await memory_db.orders.insert_many([{'order_id': 'ORD-6'}, {'order_id': 'ORD-7'}, {'order_id': 'ORD-8'}])
+
+    async def buy(job):
+        await job.save(label={'tracking_number': '1Z'})
+
+    queue._stages = [('purchase', buy)] + fake.stages()[1:]
+
+    # Persist errors after the purchase: postponed, the workers deliver the label
+    fake.behaviour['persist'] = RuntimeError('db timeout')
+    assert not await queue.run('ORD-6', 42)
+    assert await queue.settlement('ORD-6') == 'pending'
+    await memory_db.label_jobs.update_one({'_id': 'ORD-6'}, {'$set': {'claimed_until': datetime.now(timezone.utc)}})
+    assert await queue._process(await queue._claim({})) == 'done'
+
+    # Out of attempts with the label bought: review, not refund
+    queue.max_attempts = 1
+    fake.behaviour['persist'] = RuntimeError('db timeout')
+    assert not await queue.run('ORD-7', 42)
+    assert await queue.settlement('ORD-7') == 'review'
+
+    # Failed before buying
+    queue._stages = fake.stages()
+    fake.behaviour['purchase'] = LabelJobFailed('circuit open', notify=False)
+    assert not await queue.run('ORD-8', 42)
+    assert await queue.settlement('ORD-8') == 'refund'
+    assert [order_id for order_id, _, _ in fake.failures] == ['ORD-7']  # notify=False stays silent
+
+
+@pytest.mark.asyncio
+async def test_lease_renewed_while_job_runs(memory_db, fake):
+    await memory_db.orders.insert_one({'order_id': 'ORD-5'})
+    queue = LabelJobQueue(memory_db, stages=fake.stages(), on_failure=fake.on_failure, claim_timeout=0.06)
+    released = asyncio.Event()
+
+    async def slow_purchase(job):
+        await asyncio.sleep(0.15)  # longer than the lease
+        await job.save(purchase_done=True)
+        released.set()
+
+    queue._stages = [('purchase', slow_purchase)] + fake.stages()[1:]
+    await queue.submit('ORD-5', 42)
+    first = asyncio.create_task(queue._process(await queue._claim({})))
+    await asyncio.sleep(0.1)
+    assert await queue._claim({}) is None  # heartbeat kept the lease
+    assert await first == 'done'
+    assert released.is_set()
+
+
+@pytest.mark.asyncio
+async def test_missing_order_fails_job(memory_db, queue, fake):
+    assert not await queue.run('ORD-404', 42)
+    assert fake.calls == []
+    assert fake.failures[0][0] == 'ORD-404'
@@ -0,0 +1,95 @@
+"""
+Tests for write-behind conversation persistence (utils/mongodb_persistence.py)
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from utils.mongodb_persistence import WriteBehindMongoDBPersistence
+
+
+@pytest.mark.asyncio
+async def test_updates_are_buffered_until_flush(memory_db):
+    persistence = WriteBehindMongoDBPersistence(memory_db, flush_interval=60)
+
+    await persistence.update_conversation('order_conversation', (1, 1), 5)
+    await persistence.update_user_data(1, {'from_zip': '10001', 'rates': [{'amount': 12.5}]})
+
+    # Nothing written yet
+    assert memory_db.bot_conversations.docs == []
+    assert memory_db.bot_user_data.docs == []
+    assert persistence.get_stats()['pending_user_data'] == 1
+
+    await persistence.flush()
+
+    assert await memory_db.bot_conversations.count_documents({}) == 1
+    doc = await memory_db.bot_user_data.find_one({'_id': 1})
+    assert doc['data']['from_zip'] == '10001'
+    assert persistence.get_stats()['flushes'] == 1
+
+
+@pytest.mark.asyncio
+async def test_restart_restores_conversations_and_lazy_user_data(memory_db):
+    first = WriteBehindMongoDBPersistence(memory_db, flush_interval=60)
+    await first.update_conversation('order_conversation', (7, 7), 3)
+    await first.update_user_data(7, {'to_zip': '90001'})
+    await first.flush()
+
+    second = WriteBehindMongoDBPersistence(memory_db, flush_interval=60)
+    assert await second.get_conversations('order_conversation') == {(7, 7): 3}
+    assert await second.get_user_data() == {}
+
+    user_data = {}
+    await second.refresh_user_data(7, user_data)
+    assert user_data == {'to_zip': '90001'}
+    assert second.get_stats()['rehydrated_users'] == 1
+
+    # Only the first update of a user goes to MongoDB
+    memory_db.bot_user_data.find_one = AsyncMock()
+    await second.refresh_user_data(7, user_data)
+    memory_db.bot_user_data.find_one.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_ended_conversation_is_deleted(memory_db):
+    persistence = WriteBehindMongoDBPersistence(memory_db, flush_interval=60)
+    await persistence.update_conversation('order_conversation', (2, 2), 4)
+    await persistence.flush()
+    await persistence.update_conversation('order_conversation', (2, 2), None)
+    await persistence.flush()
+
+    assert await memory_db.bot_conversations.count_documents({}) == 0
+
+
+@pytest.mark.asyncio
+async def test_threshold_triggers_early_flush(memory_db):
+    persistence = WriteBehindMongoDBPersistence(memory_db, flush_interval=60, flush_threshold=3)
+    for user_id in range(3):
+        await persistence.update_user_data(user_id, {'n': user_id})
+
+    for _ in range(50):
+        if await memory_db.bot_user_data.count_documents({}) == 3:
+            break
+        await asyncio.sleep(0.01)
+
+    assert await memory_db.bot_user_data.count_documents({}) == 3
+    await persistence.flush()
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_pending_writes(memory_db):
+    persistence = WriteBehindMongoDBPersistence(memory_db, flush_interval=60)
+    await persistence.update_user_data(1, {'a': 1})
+
+    memory_db.bot_user_data.bulk_write = AsyncMock(side_effect=Exception('mongo down'))
+    with pytest.raises(Exception):
+        await persistence._flush_dirty()
+
+    assert persistence.get_stats()['pending_user_data'] == 1
+    assert persistence.get_stats()['flush_errors'] == 1
+
+
+def test_unstorable_values_dropped():
+    from utils.mongodb_persistence import _bson_safe
+
+    data = {1: {'ids': (1, 2)}, 'obj': object(), 'tags': {'a'}}
+    assert _bson_safe(data) == {'1': {'ids': [1, 2]}, 'tags': ['a']}
@@ -116,6 +116,7 @@ async def test_process_payment_insufficient_balance(order_service, mock_reposito
     }
     
     mock_repositories['order'].find_by_id.return_value = order
+    mock_repositories['user'].update_balance.return_value = False
     mock_repositories['user'].get_balance.return_value = 50.0
     
     # Act
@@ -0,0 +1,86 @@
+"""
+Tests for the outbound Telegram scheduler (middleware/rate_limiter.py)
+"""
+import asyncio
+import time
+import pytest
+from telegram.error import RetryAfter
+from middleware.rate_limiter import (
+    LANE_BROADCAST,
+    LANE_INTERACTIVE,
+    OutboundTelegramScheduler,
+    TokenBucket,
+    outbound_lane,
+)
+
+
+def test_token_bucket_refill_and_reserve():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert 0 < bucket.time_until() <= 0.1
+
+    wait = bucket.reserve()
+    assert wait > 0
+    assert bucket.time_until() > wait
+
+
+async def send(scheduler, sent, chat_id, rate_limit_args=None):
+    async def callback():
+        sent.append(chat_id)
+        return True
+
+    return await scheduler.process_request(callback, (), {}, 'sendMessage', {'chat_id': chat_id}, rate_limit_args)
+
+
+@pytest.mark.asyncio
+async def test_interactive_jumps_ahead_of_broadcast():
+    scheduler = OutboundTelegramScheduler(global_rate=20, lane_rates={LANE_BROADCAST: 20})
+    await scheduler.initialize()
+    sent = []
+
+    with outbound_lane(LANE_BROADCAST):
+        broadcast = [asyncio.create_task(send(scheduler, sent, 1000 + i)) for i in range(60)]
+    await asyncio.sleep(0.1)
+    interactive_start = time.perf_counter()
+    await send(scheduler, sent, 1)
+    interactive_ms = (time.perf_counter() - interactive_start) * 1000
+
+    # The reply did not wait for the ~40 queued broadcast messages
+    assert interactive_ms < 200
+    assert sent.index(1) < 30
+    await asyncio.gather(*broadcast)
+
+    stats = scheduler.get_stats()
+    assert stats['lanes'][LANE_BROADCAST]['sent'] == 60
+    assert stats['lanes'][LANE_INTERACTIVE]['sent'] == 1
+    await scheduler.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_args_select_lane():
+    scheduler = OutboundTelegramScheduler()
+    await scheduler.initialize()
+    await send(scheduler, [], 5, rate_limit_args={'lane': LANE_BROADCAST})
+    assert scheduler.get_stats()['lanes'][LANE_BROADCAST]['sent'] == 1
+    await scheduler.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_and_retries():
+    scheduler = OutboundTelegramScheduler()
+    await scheduler.initialize()
+    calls = []
+
+    async def callback():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise RetryAfter(0.2)
+        return True
+
+    assert await scheduler.process_request(callback, (), {}, 'sendMessage', {'chat_id': 7}, None)
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.18
+    assert scheduler.get_stats()['retry_after'] == 1
+    await scheduler.shutdown()
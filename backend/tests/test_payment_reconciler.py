@@ -0,0 +1,90 @@
+"""
+Tests for the pending-payment reconciler (services/payment_reconciler.py)
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.payment_reconciler import PaymentReconciler
+from services.payment_webhooks import PaymentWebhooks
+
+
+def created(minutes_ago):
+    return (datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)).isoformat()
+
+
+class FakeProviders:
+    def __init__(self, states):
+        self.states = states
+        self.calls = []
+
+    def checker(self, provider):
+        async def check(track_ids):
+            self.calls.append((provider, list(track_ids)))
+            return {t: self.states[t] for t in track_ids if t in self.states}
+        return check
+
+
+@pytest.fixture
+def webhooks(memory_db):
+    return PaymentWebhooks(memory_db)
+
+
+@pytest.mark.asyncio
+async def test_found_states_go_through_claim(memory_db, webhooks):
+    payments = [
+        ('T-paid', 'oxapay', 10), ('T-wait', 'oxapay', 10), ('T-exp', 'oxapay', 10),
+        ('C-1', 'cryptobot', 5), ('C-2', 'cryptobot', 5), ('T-new', 'oxapay', 0),
+    ]
+    for track_id, provider, minutes in payments:
+        await memory_db.payments.insert_one({
+            'track_id': track_id, 'provider': provider, 'status': 'pending',
+            'created_at': created(minutes), 'amount': 10.0, 'type': 'topup'
+        })
+    providers = FakeProviders({
+        'T-paid': {'status': 'Paid', 'amount': 10.0},
+        'T-wait': {'status': 'Waiting', 'amount': 0},
+        'T-exp': {'status': 'Expired', 'amount': 0},
+        'C-2': {'status': 'paid', 'amount': 10.0},
+    })
+    reconciler = PaymentReconciler(
+        memory_db, claim=webhooks.claim,
+        checkers={name: providers.checker(name) for name in ('oxapay', 'cryptobot')}
+    )
+
+    assert await reconciler.run_pass() == 5  # T-new is younger than min_interval
+
+    status = {p['track_id']: p['status'] async for p in memory_db.payments.find({})}
+    assert status == {'T-paid': 'paid', 'T-wait': 'pending', 'T-exp': 'expired',
+                      'C-1': 'pending', 'C-2': 'paid', 'T-new': 'pending'}
+    # Oxapay one call per payment, CryptoBot batched
+    assert ('cryptobot', ['C-1', 'C-2']) in providers.calls
+    assert len(providers.calls) == 4
+    assert webhooks.get_stats()['queued'] == 2
+    assert reconciler.get_stats()['recovered'] == 2
+
+    # Late duplicate webhook after the reconciler claimed it
+    assert await webhooks.claim('T-paid', 'Paid', 10.0) == 'duplicate'
+
+    # Nothing is due again until its next check time
+    providers.calls.clear()
+    assert await reconciler.run_pass() == 0
+    assert providers.calls == []
+
+
+@pytest.mark.asyncio
+async def test_interval_backs_off_with_age_and_old_payments_expire(memory_db, webhooks):
+    reconciler = PaymentReconciler(memory_db, claim=webhooks.claim, checkers={},
+                                   min_interval=30, max_interval=1800, backoff_factor=0.1)
+    assert reconciler.next_interval(60) == 30
+    assert reconciler.next_interval(3600) == 360
+    assert reconciler.next_interval(86400) == 1800
+
+    await memory_db.payments.insert_one({'track_id': 'T-1', 'status': 'pending', 'created_at': created(60)})
+    await memory_db.payments.insert_one({'track_id': 'T-2', 'status': 'pending', 'created_at': created(60 * 25)})
+    assert await reconciler.run_pass() == 1
+
+    t1 = await memory_db.payments.find_one({'track_id': 'T-1'})
+    wait = (t1['reconcile_next_at'] - datetime.now(timezone.utc)).total_seconds()
+    assert 350 < wait <= 360 and t1['reconcile_checks'] == 1
+    assert (await memory_db.payments.find_one({'track_id': 'T-2'}))['status'] == 'expired'
@@ -1,16 +1,12 @@
 """
 Unit tests for Payment Service
-Tests all 8 functions in services/payment_service.py
+Tests the module-level functions in services/payment_service.py
 """
 import pytest
-from unittest.mock import AsyncMock
 from services.payment_service import (
     get_user_balance,
-    add_balance,
-    deduct_balance,
     validate_topup_amount,
     validate_payment_amount,
-    process_balance_payment,
     create_payment_invoice
 )
 
@@ -44,91 +40,6 @@ async def test_get_user_balance_not_exists():
     assert balance == 0.0
 
 
-@pytest.mark.asyncio
-async def test_add_balance_success(mock_db, mock_user, mock_find_user_func):
-    """Test successful balance addition"""
-    mock_db.users.update_one = AsyncMock()
-    
-    success, new_balance, error = await add_balance(
-        telegram_id=mock_user['telegram_id'],
-        amount=25.00,
-        db=mock_db,
-        find_user_func=mock_find_user_func
-    )
-    
-    assert success is True
-    assert new_balance == 75.00  # 50 + 25
-    assert error is None
-    mock_db.users.update_one.assert_called_once()
-
-
-@pytest.mark.asyncio
-async def test_add_balance_user_not_found(mock_db):
-    """Test adding balance to non-existent user"""
-    async def find_none(telegram_id):
-        return None
-    
-    success, new_balance, error = await add_balance(
-        telegram_id=999999,
-        amount=25.00,
-        db=mock_db,
-        find_user_func=find_none
-    )
-    
-    assert success is False
-    assert new_balance == 0.0
-    assert error == "User not found"
-
-
-@pytest.mark.asyncio
-async def test_deduct_balance_success(mock_db, mock_user, mock_find_user_func):
-    """Test successful balance deduction"""
-    mock_db.users.update_one = AsyncMock()
-    
-    success, new_balance, error = await deduct_balance(
-        telegram_id=mock_user['telegram_id'],
-        amount=20.00,
-        db=mock_db,
-        find_user_func=mock_find_user_func
-    )
-    
-    assert success is True
-    assert new_balance == 30.00  # 50 - 20
-    assert error is None
-
-
-@pytest.mark.asyncio
-async def test_deduct_balance_insufficient(mock_db, mock_user, mock_find_user_func):
-    """Test deducting more than available balance"""
-    success, new_balance, error = await deduct_balance(
-        telegram_id=mock_user['telegram_id'],
-        amount=100.00,  # More than 50.00 balance
-        db=mock_db,
-        find_user_func=mock_find_user_func
-    )
-    
-    assert success is False
-    assert new_balance == mock_user['balance']  # Unchanged
-    assert error == "Insufficient balance"
-
-
-@pytest.mark.asyncio
-async def test_deduct_balance_user_not_found(mock_db):
-    """Test deducting from non-existent user"""
-    async def find_none(telegram_id):
-        return None
-    
-    success, new_balance, error = await deduct_balance(
-        telegram_id=999999,
-        amount=10.00,
-        db=mock_db,
-        find_user_func=find_none
-    )
-    
-    assert success is False
-    assert error == "User not found"
-
-
 # ============================================================
 # VALIDATION TESTS
 # ============================================================
@@ -218,73 +129,6 @@ def test_validate_payment_amount_invalid():
     assert is_valid is False
 
 
-# ============================================================
-# PAYMENT PROCESSING TESTS
-# ============================================================
-
-@pytest.mark.asyncio
-async def test_process_balance_payment_success(mock_db, mock_user, mock_find_user_func):
-    """Test successful payment processing"""
-    mock_db.users.update_one = AsyncMock()
-    
-    async def mock_update_order(order_id, data):
-        pass
-    
-    success, new_balance, error = await process_balance_payment(
-        telegram_id=mock_user['telegram_id'],
-        amount=20.00,
-        order_id='order_123',
-        db=mock_db,
-        find_user_func=mock_find_user_func,
-        update_order_func=mock_update_order
-    )
-    
-    assert success is True
-    assert new_balance == 30.00  # 50 - 20
-    assert error is None
-
-
-@pytest.mark.asyncio
-async def test_process_balance_payment_insufficient_balance(mock_db, mock_user, mock_find_user_func):
-    """Test payment with insufficient balance"""
-    async def mock_update_order(order_id, data):
-        pass
-    
-    success, new_balance, error = await process_balance_payment(
-        telegram_id=mock_user['telegram_id'],
-        amount=100.00,
-        order_id='order_123',
-        db=mock_db,
-        find_user_func=mock_find_user_func,
-        update_order_func=mock_update_order
-    )
-    
-    assert success is False
-    assert error is not None
-
-
-@pytest.mark.asyncio
-async def test_process_balance_payment_user_not_found(mock_db):
-    """Test payment for non-existent user"""
-    async def find_none(telegram_id):
-        return None
-    
-    async def mock_update_order(order_id, data):
-        pass
-    
-    success, new_balance, error = await process_balance_payment(
-        telegram_id=999999,
-        amount=20.00,
-        order_id='order_123',
-        db=mock_db,
-        find_user_func=find_none,
-        update_order_func=mock_update_order
-    )
-    
-    assert success is False
-    assert error == "User not found"
-
-
 # ============================================================
 # INVOICE CREATION TESTS
 # ============================================================
@@ -369,32 +213,6 @@ async def test_create_payment_invoice_api_error():
 # INTEGRATION TESTS
 # ============================================================
 
-@pytest.mark.asyncio
-async def test_full_payment_flow(mock_db, mock_user, mock_find_user_func):
-    """Test complete payment flow from validation to processing"""
-    mock_db.users.update_one = AsyncMock()
-    
-    # 1. Validate amount
-    is_valid, error = validate_payment_amount(30.00, mock_user['balance'])
-    assert is_valid
-    
-    # 2. Process payment
-    async def mock_update_order(order_id, data):
-        assert data['payment_status'] == 'paid'
-    
-    success, new_balance, error = await process_balance_payment(
-        telegram_id=mock_user['telegram_id'],
-        amount=30.00,
-        order_id='order_123',
-        db=mock_db,
-        find_user_func=mock_find_user_func,
-        update_order_func=mock_update_order
-    )
-    
-    assert success is True
-    assert new_balance == 20.00
-
-
 @pytest.mark.asyncio
 async def test_full_topup_flow():
     """Test complete topup flow from validation to invoice"""
@@ -0,0 +1,132 @@
+"""
+Tests for atomic, idempotent Oxapay webhook processing (services/payment_webhooks.py)
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from handlers.webhook_handlers import complete_oxapay_payment
+from repositories import get_user_repo, init_repositories
+from repositories.payment_repository import PaymentRepository
+from services.payment_webhooks import CLAIMED, DUPLICATE, RECORDED, UNKNOWN, PaymentWebhooks
+
+
+async def add_topup(memory_db, track_id=123456, amount=10.0):
+    init_repositories(memory_db)
+    await memory_db.users.insert_one({'telegram_id': 42, 'balance': 0.0})
+    await PaymentRepository(memory_db).insert_payment({
+        'invoice_id': track_id, 'telegram_id': 42, 'amount': amount, 'status': 'pending', 'type': 'topup'
+    })
+
+
+async def credit(memory_db):
+    async def follow_up(payment):
+        await complete_oxapay_payment(payment, memory_db, None, None, None, None, None)
+    return follow_up
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_claim_and_credit_once(memory_db):
+    await add_topup(memory_db)
+    assert (await memory_db.payments.find_one({}))['track_id'] == '123456'  # normalized at write
+    webhooks = PaymentWebhooks(memory_db, follow_up=await credit(memory_db))
+
+    # Oxapay retries: same callback, id as int and as string, status in any case
+    outcomes = await asyncio.gather(*(
+        webhooks.claim(123456 if i % 2 else '123456', 'Paid' if i % 3 else 'PAID', 10.0) for i in range(20)
+    ))
+    assert outcomes.count(CLAIMED) == 1
+    assert outcomes.count(DUPLICATE) == 19
+
+    await webhooks.drain()
+    await webhooks.drain()
+    payment = await memory_db.payments.find_one({'track_id': '123456'})
+    assert payment['followup'] == 'done'
+    assert payment['processed_events'] == ['oxapay:123456:paid']
+    assert len(payment['status_history']) == 1
+    assert (await memory_db.users.find_one({'telegram_id': 42}))['balance'] == 10.0
+
+    # Follow-up retried after a crash does not credit again
+    await complete_oxapay_payment(payment, memory_db, None, None, None, None, None)
+    assert (await memory_db.users.find_one({'telegram_id': 42}))['balance'] == 10.0
+
+
+@pytest.mark.asyncio
+async def test_ack_does_not_wait_for_follow_up(memory_db):
+    await add_topup(memory_db)
+    started = asyncio.Event()
+
+    async def slow_follow_up(payment):
+        started.set()
+        await asyncio.sleep(10)  # slow Telegram
+
+    webhooks = PaymentWebhooks(memory_db, follow_up=slow_follow_up, workers=1)
+    await webhooks.start()
+    assert await webhooks.claim('123456', 'Confirming') == RECORDED
+    assert await asyncio.wait_for(webhooks.claim('123456', 'Paid', 10.0), timeout=0.5) == CLAIMED
+    await asyncio.wait_for(started.wait(), timeout=1)
+    await webhooks.stop()
+
+    assert await webhooks.claim('999', 'Paid') == UNKNOWN
+    payment = await memory_db.payments.find_one({'track_id': '123456'})
+    assert payment['status'] == 'paid'
+    assert payment['followup'] == 'pending'  # left for the next start
+    assert payment['processed_events'] == ['oxapay:123456:confirming', 'oxapay:123456:paid']
+
+
+@pytest.mark.asyncio
+async def test_interrupted_follow_up_resumed_after_lease(memory_db):
+    await add_topup(memory_db)
+    calls = []
+
+    async def flaky(payment):
+        calls.append(payment['followup_attempts'])
+        if len(calls) == 1:
+            raise ConnectionError("Telegram timeout")
+
+    webhooks = PaymentWebhooks(memory_db, follow_up=flaky, max_attempts=3)
+    await webhooks.claim('123456', 'Paid', 10.0)
+    await webhooks.drain()
+    assert await webhooks.sweep() == 0  # lease still held
+
+    await memory_db.payments.update_one(
+        {'track_id': '123456'},
+        {'$set': {'followup_claimed_until': datetime.now(timezone.utc) - timedelta(seconds=1)}}
+    )
+    assert await webhooks.sweep() == 1
+    await webhooks.drain()
+
+    assert calls == [1, 2]
+    assert (await memory_db.payments.find_one({'track_id': '123456'}))['followup'] == 'done'
+    assert webhooks.get_stats()['errors'] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_credit_is_retried_and_applied_once(memory_db):
+    await add_topup(memory_db)
+    webhooks = PaymentWebhooks(memory_db, follow_up=await credit(memory_db), max_attempts=3)
+    await webhooks.claim('123456', 'Paid', 10.0)
+
+    # Balance write fails: nothing is marked credited, the follow-up retries
+    find_one_and_update = memory_db.users.find_one_and_update
+
+    async def down(*args, **kwargs):
+        raise ConnectionError('connection reset')
+    memory_db.users.find_one_and_update = down
+    await webhooks.drain()
+    memory_db.users.find_one_and_update = find_one_and_update
+    payment = await memory_db.payments.find_one({'track_id': '123456'})
+    assert payment['followup'] == 'pending' and 'credited_at' not in payment
+
+    await memory_db.payments.update_one({'track_id': '123456'}, {'$unset': {'followup_claimed_until': ''}})
+    await webhooks.sweep()
+    await webhooks.drain()
+    payment = await memory_db.payments.find_one({'track_id': '123456'})
+    assert payment['followup'] == 'done' and payment['credited_amount'] == 10.0
+
+    # Same credit again (follow-up re-run after a crash before 'done')
+    await complete_oxapay_payment(payment, memory_db, None, None, None, None, None)
+    assert (await memory_db.users.find_one({'telegram_id': 42}))['balance'] == 10.0
+    assert await memory_db.balance_ledger.count_documents({'reason': 'topup'}) == 1
+    assert get_user_repo().ledger.get_stats()['applied'] == 1  # the repository's ledger, seen by monitoring
@@ -0,0 +1,72 @@
+"""
+Tests for per-carrier rate fan-out (services/rate_engine.py)
+"""
+import asyncio
+import pytest
+from unittest.mock import patch
+from services.rate_engine import RateFanOut, get_rate_engine_stats
+
+ORDER = {
+    'from_name': 'A', 'from_street': '1 Main St', 'from_city': 'New York', 'from_state': 'NY', 'from_zip': '10001',
+    'to_name': 'B', 'to_street': '2 Main St', 'to_city': 'Beverly Hills', 'to_state': 'CA', 'to_zip': '90210',
+    'parcel_weight': 2.0,
+}
+
+
+def rate(carrier, service, amount, rate_id):
+    return {
+        'carrier_friendly_name': carrier, 'carrier_code': carrier.lower(),
+        'service_type': service, 'service_code': service.lower().replace(' ', '_'),
+        'shipping_amount': {'amount': amount}, 'rate_id': rate_id,
+    }
+
+
+def make_fetch(delays, results):
+    async def fetch(rate_request, headers, api_url, timeout=30):
+        carrier_id = rate_request['rate_options']['carrier_ids'][0]
+        await asyncio.sleep(delays[carrier_id])
+        return results[carrier_id]
+    return fetch
+
+
+@pytest.mark.asyncio
+async def test_first_batch_before_slow_carrier_and_straggler_dropped():
+    delays = {'se-ups': 0.01, 'se-fedex': 0.05, 'se-slow': 1.0}
+    results = {
+        'se-ups': (True, [rate('UPS', 'UPS Ground', 9.0, 'r-ups')], None),
+        'se-fedex': (True, [rate('FedEx', 'FedEx Ground', 8.0, 'r-fedex')], None),
+        'se-slow': (True, [rate('USPS', 'Priority Mail', 7.0, 'r-usps')], None),
+    }
+    with patch('services.shipping_service.fetch_rates_from_shipstation', make_fetch(delays, results)):
+        fan_out = RateFanOut(ORDER, {'UPS': 'se-ups', 'FedEx': 'se-fedex', 'Slow': 'se-slow'}, {},
+                             carrier_deadline=0.2)
+        fan_out.start()
+
+        first = await fan_out.first_batch()
+        assert [r['rate_id'] for r in first] == ['r-ups']
+        assert not fan_out.done()
+
+        final = await fan_out.wait_all()
+
+    assert [r['rate_id'] for r in final] == ['r-fedex', 'r-ups']
+    assert fan_out.dropped == ['Slow']
+    assert final[0]['amount'] == 18.0  # markup applied
+    assert get_rate_engine_stats()['Slow']['dropped'] >= 1
+
+
+@pytest.mark.asyncio
+async def test_all_carriers_failing_reports_errors():
+    delays = {'se-ups': 0.0, 'se-fedex': 0.5}
+    results = {
+        'se-ups': (False, None, 'ShipStation API error: 400 - invalid carrier_id'),
+        'se-fedex': (True, [], None),
+    }
+    with patch('services.shipping_service.fetch_rates_from_shipstation', make_fetch(delays, results)):
+        fan_out = RateFanOut(ORDER, {'UPS': 'se-ups', 'FedEx': 'se-fedex'}, {}, carrier_deadline=0.05)
+        fan_out.start()
+        assert await fan_out.first_batch() == []
+
+    assert fan_out.done()
+    assert not fan_out.timed_out
+    assert 'invalid carrier_id' in fan_out.error_message()
+    assert 'FedEx' in fan_out.error_message()
@@ -0,0 +1,75 @@
+"""
+Tests for speculative rate prefetch (services/rate_prefetch.py)
+"""
+import asyncio
+import pytest
+from services.rate_prefetch import RatePrefetcher
+from services.shipstation_cache import shipstation_cache
+
+
+def order(to_zip, weight=2.0):
+    return {
+        'from_zip': '10001', 'from_city': 'New York', 'from_state': 'NY',
+        'to_zip': to_zip, 'to_city': 'Beverly Hills', 'to_state': 'CA',
+        'parcel_weight': weight,
+    }
+
+
+def make_fetcher(calls, delay=0.0):
+    async def fetch(order_data):
+        calls.append(order_data['to_zip'])
+        await asyncio.sleep(delay)
+        await shipstation_cache.set(order_data['from_zip'], order_data['to_zip'],
+                                    order_data['parcel_weight'], [{'rate_id': 'se-1'}])
+        return True
+    return fetch
+
+
+@pytest.mark.asyncio
+async def test_prefetch_result_used_on_confirm():
+    calls = []
+    prefetcher = RatePrefetcher(fetcher=make_fetcher(calls))
+    data = order('90211')
+
+    assert prefetcher.schedule(1, data)
+    assert not prefetcher.schedule(1, data)  # same fields - nothing new
+    await asyncio.sleep(0.01)
+
+    assert prefetcher.consume(1, data) == 'hit'
+    assert await shipstation_cache.get('10001', '90211', 2.0) == [{'rate_id': 'se-1'}]
+    assert calls == ['90211']
+    assert prefetcher.get_stats()['hit_rate'] == '100.0%'
+
+
+@pytest.mark.asyncio
+async def test_edit_supersedes_in_flight_prefetch():
+    calls = []
+    prefetcher = RatePrefetcher(fetcher=make_fetcher(calls, delay=0.05))
+
+    prefetcher.schedule(2, order('90212'))
+    await asyncio.sleep(0.01)
+    prefetcher.schedule(2, order('90213'))  # user edited the ZIP
+    await asyncio.sleep(0.01)
+
+    assert prefetcher.consume(2, order('90213')) == 'joined'
+    await asyncio.sleep(0.06)
+    stats = prefetcher.get_stats()
+    assert stats['superseded'] == 1
+    assert stats['wasted'] == 1
+    assert await shipstation_cache.get('10001', '90212', 2.0) is None
+
+
+@pytest.mark.asyncio
+async def test_incomplete_data_and_cached_rates_skip_api_call():
+    calls = []
+    prefetcher = RatePrefetcher(fetcher=make_fetcher(calls))
+
+    assert not prefetcher.schedule(3, {'from_zip': '10001', 'to_zip': '90214'})
+
+    await shipstation_cache.set('10001', '90215', 2.0, [{'rate_id': 'se-2'}])
+    prefetcher.schedule(3, order('90215'))
+    await asyncio.sleep(0.01)
+
+    assert calls == []
+    assert prefetcher.consume(3, order('90215')) == 'hit'
+    assert prefetcher.get_stats()['skipped_cached'] == 1
@@ -59,27 +59,30 @@ class TestUserRepository:
     @pytest.mark.asyncio
     async def test_update_balance_add(self, user_repo):
         """Тест добавления к балансу"""
-        user_repo.collection.update_one = AsyncMock(return_value=MagicMock(modified_count=1))
+        user_repo.collection.find_one_and_update = AsyncMock(return_value={"balance": 50.0, "ledger_seq": 1})
+        user_repo.ledger.entries.insert_one = AsyncMock()
         
         result = await user_repo.update_balance(12345, 50.0, operation="add")
         
         assert result
         
-        # Проверить что вызван update_one с правильными параметрами
-        call_args = user_repo.collection.update_one.call_args
-        assert call_args[0][0] == {"telegram_id": 12345}
+        # Проверить условие и $inc одной операцией
+        call_args = user_repo.collection.find_one_and_update.call_args
+        assert call_args[0][0] == {"telegram_id": 12345, "ledger_seq": {"$exists": True}}
         assert call_args[0][1]['$inc']['balance'] == 50.0
     
     @pytest.mark.asyncio
     async def test_update_balance_subtract(self, user_repo):
         """Тест вычитания из баланса"""
-        user_repo.collection.update_one = AsyncMock(return_value=MagicMock(modified_count=1))
+        user_repo.collection.find_one_and_update = AsyncMock(return_value={"balance": 20.0, "ledger_seq": 2})
+        user_repo.ledger.entries.insert_one = AsyncMock()
         
         result = await user_repo.update_balance(12345, 30.0, operation="subtract")
         
         assert result
         
-        call_args = user_repo.collection.update_one.call_args
+        call_args = user_repo.collection.find_one_and_update.call_args
+        assert call_args[0][0]['balance'] == {"$gte": 30.0}
         assert call_args[0][1]['$inc']['balance'] == -30.0
     
     @pytest.mark.asyncio
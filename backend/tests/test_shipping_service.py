@@ -331,10 +331,10 @@ async def test_fetch_rates_from_shipstation_success():
         }
     })
     
-    with patch('httpx.AsyncClient') as mock_client:
+    with patch('services.shipping_service.get_http_client') as mock_client:
         mock_client_instance = AsyncMock()
         mock_client_instance.post = AsyncMock(return_value=mock_response)
-        mock_client.return_value.__aenter__.return_value = mock_client_instance
+        mock_client.return_value = mock_client_instance
         
         success, rates, error = await fetch_rates_from_shipstation(
             rate_request={},
@@ -358,10 +358,10 @@ async def test_fetch_rates_from_shipstation_api_error():
     mock_response.status_code = 400
     mock_response.text = 'Bad Request'
     
-    with patch('httpx.AsyncClient') as mock_client:
+    with patch('services.shipping_service.get_http_client') as mock_client:
         mock_client_instance = AsyncMock()
         mock_client_instance.post = AsyncMock(return_value=mock_response)
-        mock_client.return_value.__aenter__.return_value = mock_client_instance
+        mock_client.return_value = mock_client_instance
         
         success, rates, error = await fetch_rates_from_shipstation(
             rate_request={},
@@ -382,10 +382,10 @@ async def test_fetch_rates_from_shipstation_timeout():
     from unittest.mock import AsyncMock
     import httpx
     
-    with patch('httpx.AsyncClient') as mock_client:
+    with patch('services.shipping_service.get_http_client') as mock_client:
         mock_client_instance = AsyncMock()
         mock_client_instance.post = AsyncMock(side_effect=httpx.TimeoutException("timeout"))
-        mock_client.return_value.__aenter__.return_value = mock_client_instance
+        mock_client.return_value = mock_client_instance
         
         success, rates, error = await fetch_rates_from_shipstation(
             rate_request={},
@@ -410,10 +410,10 @@ async def test_fetch_rates_from_shipstation_no_rates():
         }
     })
     
-    with patch('httpx.AsyncClient') as mock_client:
+    with patch('services.shipping_service.get_http_client') as mock_client:
         mock_client_instance = AsyncMock()
         mock_client_instance.post = AsyncMock(return_value=mock_response)
-        mock_client.return_value.__aenter__.return_value = mock_client_instance
+        mock_client.return_value = mock_client_instance
         
         success, rates, error = await fetch_rates_from_shipstation(
             rate_request={},
@@ -465,10 +465,10 @@ async def test_full_rate_fetching_pipeline(sample_order_data, sample_carrier_ids
         }
     })
     
-    with patch('httpx.AsyncClient') as mock_client:
+    with patch('services.shipping_service.get_http_client') as mock_client:
         mock_client_instance = AsyncMock()
         mock_client_instance.post = AsyncMock(return_value=mock_response)
-        mock_client.return_value.__aenter__.return_value = mock_client_instance
+        mock_client.return_value = mock_client_instance
         
         success, rates, error = await fetch_rates_from_shipstation(
             request, {}, 'https://test', 30
@@ -0,0 +1,77 @@
+"""
+Tests for the two-tier rate cache (services/shipstation_cache.py)
+"""
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+from services.shipstation_cache import ShipStationCache
+
+RATES = [{'carrier': 'USPS', 'amount': 12.5, 'rate_id': 'se-1'}]
+
+
+@pytest.mark.asyncio
+async def test_l2_shared_between_processes(memory_db):
+    worker_a = ShipStationCache()
+    worker_b = ShipStationCache()
+    await worker_a.init_storage(memory_db)
+    await worker_b.init_storage(memory_db)
+
+    await worker_a.set('10001', '90210', 2.0, RATES)
+    assert await worker_b.get('10001', '90210', 2.0) == RATES
+    assert await worker_b.get('10001', '90210', 2.0) == RATES
+
+    stats = worker_b.get_stats()
+    assert stats['l2_hits'] == 1
+    assert stats['l1_hits'] == 1
+    assert stats['by_route']['100→902']['hits'] == 2
+    assert stats['by_weight']['1-5lb']['hits'] == 2
+
+    assert await worker_b.delete('10001', '90210', 2.0)
+    assert await worker_a.get('10001', '90210', 2.0) == RATES  # still in worker A's L1
+    assert await ShipStationCache().get('10001', '90210', 2.0) is None
+
+
+@pytest.mark.asyncio
+async def test_l1_is_bounded_lru():
+    cache = ShipStationCache(max_entries=2)
+    await cache.set('10001', '90210', 1.0, RATES)
+    await cache.set('10001', '90210', 2.0, RATES)
+    await cache.get('10001', '90210', 1.0)
+    await cache.set('10001', '90210', 3.0, RATES)
+
+    assert await cache.get('10001', '90210', 2.0) is None
+    assert await cache.get('10001', '90210', 1.0) == RATES
+    assert cache.get_stats()['evictions'] == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_served_while_revalidating():
+    cache = ShipStationCache(cache_duration_minutes=60, stale_minutes=120)
+    await cache.set('10001', '90210', 2.0, RATES)
+    entry = next(iter(cache._cache.values()))
+    entry['timestamp'] = datetime.now(timezone.utc) - timedelta(minutes=90)
+
+    fresh = [{'carrier': 'UPS', 'amount': 20.0, 'rate_id': 'se-2'}]
+    calls = []
+
+    async def refresh():
+        calls.append(1)
+        await cache.set('10001', '90210', 2.0, fresh)
+        return True
+
+    assert await cache.get('10001', '90210', 2.0, refresh=refresh) == RATES
+    # A second stale read does not start another refresh
+    assert await cache.get('10001', '90210', 2.0, refresh=refresh) == RATES
+    await asyncio.sleep(0)
+    await asyncio.gather(*cache._refreshing.values())
+
+    assert calls == [1]
+    assert await cache.get('10001', '90210', 2.0) == fresh
+    stats = cache.get_stats()
+    assert stats['stale_hits'] == 2
+    assert stats['refreshes'] == 1
+
+    # Past the stale window the entry is a miss
+    entry = next(iter(cache._cache.values()))
+    entry['timestamp'] = datetime.now(timezone.utc) - timedelta(minutes=181)
+    assert await cache.get('10001', '90210', 2.0, refresh=refresh) is None
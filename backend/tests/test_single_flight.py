@@ -0,0 +1,73 @@
+"""
+Tests for single-flight request coalescing (utils/single_flight.py)
+"""
+import asyncio
+import pytest
+from utils.single_flight import SingleFlight, single_flight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    group = SingleFlight('test')
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return ['rate']
+
+    results = await asyncio.gather(*(group.do('10001-90210', fetch) for _ in range(5)))
+    assert results == [['rate']] * 5
+    assert len(calls) == 1
+
+    # Finished calls are not cached
+    await group.do('10001-90210', fetch)
+    assert len(calls) == 2
+
+    stats = group.get_stats()
+    assert stats['executions'] == 2
+    assert stats['coalesced'] == 4
+    assert stats['max_waiters'] == 5
+    assert stats['in_flight'] == 0
+
+
+@pytest.mark.asyncio
+async def test_error_shared_and_leader_cancel_does_not_cancel_followers():
+    group = SingleFlight('test')
+
+    async def failing():
+        await asyncio.sleep(0.02)
+        raise ValueError('upstream 500')
+
+    results = await asyncio.gather(group.do('k', failing), group.do('k', failing), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert group.get_stats()['errors'] == 1
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return 'ok'
+
+    leader = asyncio.create_task(group.do('k2', slow))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(group.do('k2', slow))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await follower == 'ok'
+
+
+@pytest.mark.asyncio
+async def test_decorator_keys_by_arguments():
+    calls = []
+
+    @single_flight('test_validate')
+    async def validate(street, zip_code):
+        calls.append((street, zip_code))
+        await asyncio.sleep(0.02)
+        return True
+
+    await asyncio.gather(
+        validate('1 Main St', '10001'),
+        validate('1 Main St', '10001'),
+        validate('2 Main St', '10001'),
+    )
+    assert sorted(calls) == [('1 Main St', '10001'), ('2 Main St', '10001')]
@@ -0,0 +1,68 @@
+"""
+Tests for the pre-generated thank-you message pool (services/thank_you_pool.py)
+"""
+import asyncio
+
+import pytest
+
+from services.thank_you_pool import ThankYouPool
+
+
+class StubLLM:
+    """Local stand-in for the LLM: numbered messages, optional delay/failures"""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    async def generate(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("LLM unavailable")
+        return f"Спасибо за заказ №{self.calls}!"
+
+
+async def settle(pool):
+    while pool._refill_task and not pool._refill_task.done():
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_take_never_waits_for_the_llm():
+    llm = StubLLM(delay=0.05)
+    pool = ThankYouPool(generator=llm.generate, size=4, low_watermark=2)
+
+    # Cold pool: fallback right away, refill in the background
+    assert pool.take() in pool.fallbacks
+    await settle(pool)
+    assert pool.get_stats()['depth'] == 4
+
+    assert pool.take('Анна').startswith("Анна, спасибо за заказ №")
+    assert pool.take().startswith("Спасибо за заказ №")
+    assert pool.take().startswith("Спасибо за заказ №")  # depth 1 < watermark: refill scheduled
+    await settle(pool)
+
+    stats = pool.get_stats()
+    assert stats['depth'] == 4
+    assert stats['served'] == 3
+    assert stats['fallback_rate'] == '25.0%'
+    assert stats['refills'] == 2
+    assert stats['generation_p50_ms'] >= 50
+
+
+@pytest.mark.asyncio
+async def test_failed_generation_backs_off_and_serves_fallbacks():
+    llm = StubLLM(fail=True)
+    pool = ThankYouPool(generator=llm.generate, size=3, low_watermark=1, error_backoff=60)
+
+    await pool.start()
+    await settle(pool)
+    assert llm.calls == 3
+
+    assert pool.take() in pool.fallbacks
+    await settle(pool)
+    assert llm.calls == 3  # still backing off
+    assert pool.get_stats()['failures'] == 3
+    await pool.stop()
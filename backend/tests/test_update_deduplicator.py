@@ -0,0 +1,49 @@
+"""
+Tests for Telegram update_id deduplication (utils/update_deduplicator.py)
+"""
+import pytest
+from utils.update_deduplicator import UpdateDeduplicator
+
+
+@pytest.mark.asyncio
+async def test_duplicate_update_rejected():
+    dedup = UpdateDeduplicator(window_size=100)
+
+    assert await dedup.is_duplicate(1) is False
+    assert await dedup.is_duplicate(2) is False
+    assert await dedup.is_duplicate(1) is True
+
+    stats = dedup.get_stats()
+    assert stats['checked'] == 3
+    assert stats['duplicates'] == 1
+    assert stats['tracked'] == 2
+
+
+@pytest.mark.asyncio
+async def test_missing_update_id_never_duplicate():
+    dedup = UpdateDeduplicator(window_size=10)
+    assert await dedup.is_duplicate(None) is False
+    assert await dedup.is_duplicate(None) is False
+
+
+def test_window_evicts_oldest():
+    """Memory stays bounded: the oldest ids fall out of the window"""
+    dedup = UpdateDeduplicator(window_size=3)
+    for update_id in range(5):
+        assert dedup.check_local(update_id) is False
+
+    assert dedup.get_stats()['tracked'] == 3
+    assert dedup.check_local(4) is True
+    assert dedup.check_local(0) is False
+
+
+@pytest.mark.asyncio
+async def test_shared_store_catches_other_worker_duplicates(memory_db):
+    worker_a = UpdateDeduplicator(window_size=10)
+    worker_b = UpdateDeduplicator(window_size=10)
+    await worker_a.enable_shared_store(memory_db)
+    await worker_b.enable_shared_store(memory_db)
+
+    assert await worker_a.is_duplicate(77) is False
+    assert await worker_b.is_duplicate(77) is True
+    assert worker_b.get_stats()['shared_duplicates'] == 1
@@ -0,0 +1,150 @@
+"""
+Tests for the Telegram update inbox (services/update_inbox.py)
+"""
+import asyncio
+import pytest
+from services.update_inbox import TelegramUpdateInbox, extract_user_id
+
+
+def make_update(update_id: int, user_id: int, text: str = 'hi'):
+    return {
+        'update_id': update_id,
+        'message': {'message_id': update_id, 'from': {'id': user_id}, 'chat': {'id': user_id}, 'text': text}
+    }
+
+
+def test_extract_user_id():
+    assert extract_user_id(make_update(1, 42)) == 42
+    assert extract_user_id({'update_id': 2, 'callback_query': {'from': {'id': 7}}}) == 7
+    assert extract_user_id({'update_id': 3}) == 0
+
+
+@pytest.mark.asyncio
+async def test_per_user_order_preserved():
+    """Updates of one user are processed in arrival order"""
+    processed = []
+
+    async def process(update):
+        await asyncio.sleep(0.001 * (update['update_id'] % 3))
+        processed.append((update['message']['from']['id'], update['update_id']))
+
+    inbox = TelegramUpdateInbox(None, process, num_workers=4, max_queue_size=100)
+    await inbox.start()
+    for i in range(30):
+        assert await inbox.submit(make_update(i, user_id=i % 3))
+    await inbox.stop()
+
+    for user_id in range(3):
+        ids = [uid for user, uid in processed if user == user_id]
+        assert ids == sorted(ids)
+    assert inbox.get_stats()['processed'] == 30
+
+
+@pytest.mark.asyncio
+async def test_overflow_spills_to_mongo_and_restores(memory_db):
+    """Full queues spill to the overflow store and are drained in order"""
+    processed = []
+    gate = asyncio.Event()
+
+    async def process(update):
+        await gate.wait()
+        processed.append(update['update_id'])
+
+    inbox = TelegramUpdateInbox(memory_db, process, num_workers=1, max_queue_size=2)
+    await inbox.start()
+    for i in range(6):
+        assert await inbox.submit(make_update(i, user_id=1))
+
+    stats = inbox.get_stats()
+    assert stats['overflowed'] > 0
+    assert await memory_db.telegram_update_inbox.count_documents({}) == stats['overflow_pending']
+
+    gate.set()
+    for _ in range(100):
+        if len(processed) == 6:
+            break
+        await asyncio.sleep(0.02)
+    await inbox.stop()
+
+    assert processed == list(range(6))
+    assert await memory_db.telegram_update_inbox.count_documents({}) == 0
+
+
+@pytest.mark.asyncio
+async def test_queued_updates_survive_restart(memory_db):
+    """Updates still queued on shutdown are saved and processed after restart"""
+    processed = []
+
+    async def blocked(update):
+        await asyncio.sleep(10)
+
+    inbox = TelegramUpdateInbox(memory_db, blocked, num_workers=1, max_queue_size=10)
+    await inbox.start()
+    for i in range(3):
+        await inbox.submit(make_update(i, user_id=5))
+    await asyncio.sleep(0.01)
+    await inbox.stop(timeout=0.05)
+
+    # The in-flight update is saved together with the queued ones
+    assert await memory_db.telegram_update_inbox.count_documents({}) == 3
+
+    async def process(update):
+        processed.append(update['update_id'])
+
+    restarted = TelegramUpdateInbox(memory_db, process, num_workers=1, max_queue_size=10)
+    await restarted.start()
+    for _ in range(100):
+        if len(processed) == 3:
+            break
+        await asyncio.sleep(0.02)
+    await restarted.stop()
+
+    assert processed == [0, 1, 2]
+
+
+class YieldingCollection:
+    """Overflow collection whose reads yield, so concurrent drains interleave"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def find(self, *args, **kwargs):
+        cursor = self.collection.find(*args, **kwargs)
+        to_list = cursor.to_list
+
+        async def yielding_to_list(length=None):
+            docs = await to_list(length)
+            await asyncio.sleep(0.01)
+            return docs
+
+        cursor.to_list = yielding_to_list
+        return cursor
+
+
+@pytest.mark.asyncio
+async def test_shared_overflow_drained_once(memory_db):
+    """Two processes draining one overflow store never restore the same update"""
+    for i in range(20):
+        await memory_db.telegram_update_inbox.insert_one(
+            {'user_id': i % 4, 'update': make_update(i, user_id=i % 4), 'received_at': float(i)}
+        )
+
+    first = TelegramUpdateInbox(memory_db, None, num_workers=4, max_queue_size=100)
+    second = TelegramUpdateInbox(memory_db, None, num_workers=4, max_queue_size=100)
+    for inbox in (first, second):
+        inbox._queues = [asyncio.Queue(maxsize=inbox.shard_capacity) for _ in range(inbox.num_workers)]
+        inbox._overflow_count = 20
+        inbox.overflow = YieldingCollection(memory_db.telegram_update_inbox)
+
+    restored = await asyncio.gather(first._drain_overflow_once(), second._drain_overflow_once())
+
+    ids = [
+        item['update']['update_id']
+        for inbox in (first, second) for queue in inbox._queues for item in queue._queue
+    ]
+    assert sum(restored) == 20
+    assert sorted(ids) == list(range(20))
+    assert await memory_db.telegram_update_inbox.count_documents({}) == 0
@@ -0,0 +1,111 @@
+"""
+Tests for user_data / conversation eviction (utils/user_data_eviction.py)
+"""
+import pytest
+from telegram import Update, User
+from telegram.ext import Application, CommandHandler, ConversationHandler, MessageHandler, filters
+from utils.mongodb_persistence import WriteBehindMongoDBPersistence
+from utils.user_data_eviction import UserDataEvictor, estimate_size
+
+ASK_ZIP, ASK_WEIGHT = range(2)
+
+
+def make_update(bot, update_id: int, user_id: int, text: str) -> Update:
+    entities = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}] if text.startswith('/') else []
+    return Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'U'},
+            'chat': {'id': user_id, 'type': 'private'},
+            'text': text,
+            'entities': entities,
+        }
+    }, bot)
+
+
+async def build_app(memory_db, seen):
+    async def start(update, context):
+        context.user_data['step'] = 'zip'
+        return ASK_ZIP
+
+    async def got_zip(update, context):
+        context.user_data['from_zip'] = update.message.text
+        return ASK_WEIGHT
+
+    async def got_weight(update, context):
+        seen.append((context.user_data.get('from_zip'), update.message.text))
+        return ConversationHandler.END
+
+    persistence = WriteBehindMongoDBPersistence(memory_db, flush_interval=60)
+    application = Application.builder().token('123:abc').persistence(persistence).build()
+    application.add_handler(ConversationHandler(
+        entry_points=[CommandHandler('start', start)],
+        states={
+            ASK_ZIP: [MessageHandler(filters.TEXT & ~filters.COMMAND, got_zip)],
+            ASK_WEIGHT: [MessageHandler(filters.TEXT & ~filters.COMMAND, got_weight)],
+        },
+        fallbacks=[],
+        name='order_conversation',
+        persistent=True,
+    ))
+    evictor = UserDataEvictor(application, persistence, idle_seconds=0, check_interval=3600)
+    evictor.install()
+
+    # Offline bot: skip getMe
+    application.bot._bot_user = User(id=123, first_name='Bot', is_bot=True, username='test_bot')
+    application.bot._bot_initialized = True
+    application.bot._requests_initialized = True
+    await application.initialize()
+    return application, persistence, evictor
+
+
+def test_estimate_size_grows_with_content():
+    small = estimate_size({'a': 1})
+    large = estimate_size({'a': 1, 'rates': [{'carrier': 'UPS', 'amount': 12.5}] * 20})
+    assert large > small
+
+
+@pytest.mark.asyncio
+async def test_idle_user_is_evicted_and_restored(memory_db):
+    seen = []
+    application, persistence, evictor = await build_app(memory_db, seen)
+    bot = application.bot
+
+    await application.process_update(make_update(bot, 1, 10, '/start'))
+    await application.process_update(make_update(bot, 2, 10, '10001'))
+    assert 10 in application.user_data
+
+    assert await evictor.evict_once() == 1
+    assert 10 not in application.user_data
+    assert application.handlers[0][0]._conversations.data == {}
+    # State was written to MongoDB, not deleted
+    assert await memory_db.bot_conversations.count_documents({}) == 1
+    assert (await memory_db.bot_user_data.find_one({'_id': 10}))['data']['from_zip'] == '10001'
+
+    # Next update continues the conversation with restored user_data
+    await application.process_update(make_update(bot, 3, 10, '2.5'))
+    assert seen == [('10001', '2.5')]
+    stats = evictor.get_stats()
+    assert stats['restored_users'] == 1
+    assert stats['restored_conversations'] == 1
+
+    await application.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_lru_cap_keeps_most_recent_users(memory_db):
+    application, persistence, evictor = await build_app(memory_db, [])
+    evictor.idle_seconds = 3600
+    evictor.max_resident_users = 2
+    bot = application.bot
+
+    for update_id, user_id in enumerate([1, 2, 3, 1], start=1):
+        await application.process_update(make_update(bot, update_id, user_id, '/start'))
+
+    assert await evictor.evict_once() == 1
+    assert set(application.user_data) == {3, 1}
+    assert evictor.get_stats()['resident_users'] == 2
+
+    await application.shutdown()
@@ -0,0 +1,66 @@
+"""
+Tests for the offline ZIP index (utils/zip_index.py)
+"""
+import utils.zip_index
+from utils.ui_utils import OrderStepMessages, TemplateEditMessages, city_prompt
+from utils.zip_index import ZipIndex, write_index
+
+RECORDS = [
+    ('94102', 'San Francisco', 'CA'),
+    ('10001', 'New York', 'NY'),
+    ('90210', 'Beverly Hills', 'CA'),
+    ('00501', 'Holtsville', 'NY'),
+    ('10001', 'Duplicate', 'NY'),
+    ('bad', 'Nowhere', 'XX'),
+]
+
+
+def test_lookup_from_mapped_file(tmp_path):
+    path = tmp_path / 'zip_index.bin'
+    assert write_index(path, RECORDS) == 4
+
+    index = ZipIndex(path)
+    assert not index.get_stats()['loaded']  # nothing read until the first lookup
+
+    assert index.lookup('94102') == ('San Francisco', 'CA')
+    assert index.lookup('10001-1234') == ('New York', 'NY')
+    assert index.lookup('00501') == ('Holtsville', 'NY')
+    assert index.lookup('94103') is None
+    assert index.lookup('9410') is None
+    assert index.get_stats()['zip_codes'] == 4
+
+
+def test_state_consistency_uses_index_then_zip3(tmp_path):
+    path = tmp_path / 'zip_index.bin'
+    write_index(path, RECORDS)
+    index = ZipIndex(path)
+
+    assert index.is_consistent('90210', 'ca')
+    assert not index.is_consistent('90210', 'NY')
+    # Not in the file: ZIP3 prefix decides
+    assert index.is_consistent('73301', 'TX')
+    assert not index.is_consistent('73301', 'OK')
+    # Malformed ZIPs are left to format validation
+    assert index.is_consistent('abc', 'CA')
+    assert index.get_stats()['mismatches'] == 2
+
+
+def test_missing_file_falls_back_to_zip3(tmp_path):
+    index = ZipIndex(tmp_path / 'missing.bin')
+
+    assert index.lookup('94102') is None
+    assert index.states_for_zip('94102') == ('CA',)
+    assert not index.is_consistent('94102', 'NY')
+    assert index.is_consistent('96950', 'MP')
+
+
+def test_zip_hint_only_with_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.zip_index, 'zip_index', ZipIndex(tmp_path / 'missing.bin'))
+    assert not utils.zip_index.zip_index.available
+    assert city_prompt(OrderStepMessages, 'FROM') == OrderStepMessages.FROM_CITY
+    assert 'ZIP' not in city_prompt(TemplateEditMessages, 'TO')
+
+    path = tmp_path / 'zip_index.bin'
+    write_index(path, RECORDS)
+    monkeypatch.setattr(utils.zip_index, 'zip_index', ZipIndex(path))
+    assert city_prompt(OrderStepMessages, 'TO') == OrderStepMessages.TO_CITY_OR_ZIP
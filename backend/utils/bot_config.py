@@ -251,7 +251,8 @@ def is_test_environment() -> bool:
    from utils.bot_config import get_bot_token
    
    token = get_bot_token()
-   bot = Bot(token=token)
+   application = Application.builder().token(token).build()
+   bot = application.bot  # все запросы идут через rate limiter приложения
    ```
 
 3. Проверить режим работы:
@@ -0,0 +1,383 @@
+"""
+MongoDB Index Manifest
+One declarative list of the indexes every collection needs
+
+Startup, scripts/optimize_database.py and SessionManager used to create
+indexes each from their own list, which drifted apart (two TTLs on
+user_sessions, orders indexed on both `id` and `order_id` under different
+names, refund_requests only indexed by a manual script). Services do not
+create indexes of their own; a new collection or query shape gets its
+entry here.
+
+apply_index_manifest() reads list_indexes for all collections concurrently,
+matches the manifest against them by key pattern (names are cosmetic, an
+index created under an old name counts) and only builds what is missing -
+one createIndexes call per collection, collections in parallel. A restart
+with nothing to change costs one list_indexes round trip per collection.
+- changed TTLs are updated in place with collMod
+- other option conflicts (e.g. a non-unique index where the manifest wants a
+  unique one) are reported, never dropped automatically
+- indexes not in the manifest are reported as unmanaged
+
+verify_query_plans() runs explain() for the repositories' hot queries and
+flags the ones whose winning plan is a COLLSCAN.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import IndexModel
+
+from config.performance_config import BotPerformanceConfig
+
+logger = logging.getLogger(__name__)
+
+# Index options compared against the live index
+INDEX_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression')
+
+INDEX_MANIFEST: Dict[str, List[Dict[str, Any]]] = {
+    'users': [
+        {'name': 'idx_telegram_id_unique', 'keys': [('telegram_id', 1)], 'unique': True},
+        {'name': 'idx_users_created_at', 'keys': [('created_at', -1)]},
+        {'name': 'idx_users_ledger_dirty', 'keys': [('ledger_dirty', 1)], 'sparse': True},
+    ],
+    'orders': [
+        {'name': 'idx_orders_id', 'keys': [('id', 1)]},
+        {'name': 'idx_orders_order_id', 'keys': [('order_id', 1)], 'unique': True},
+        {'name': 'idx_user_orders', 'keys': [('telegram_id', 1), ('created_at', -1)]},
+        {'name': 'idx_orders_created_at', 'keys': [('created_at', -1)]},
+        {'name': 'idx_payment_date', 'keys': [('payment_status', 1), ('created_at', -1)]},
+        {'name': 'idx_shipping_status', 'keys': [('shipping_status', 1)]},
+    ],
+    'shipping_labels': [
+        {'name': 'idx_labels_order_id', 'keys': [('order_id', 1), ('created_at', -1)]},
+        {'name': 'idx_labels_label_id', 'keys': [('label_id', 1)]},
+        {'name': 'idx_labels_status_date', 'keys': [('status', 1), ('created_at', -1)]},
+    ],
+    'payments': [
+        {'name': 'idx_payments_track_id', 'keys': [('track_id', 1)]},
+        {'name': 'idx_invoice_id', 'keys': [('invoice_id', 1)]},
+        {'name': 'idx_payments_order_id', 'keys': [('order_id', 1)]},
+        {'name': 'idx_user_payments', 'keys': [('telegram_id', 1), ('created_at', -1)]},
+        {'name': 'idx_payments_status_created', 'keys': [('status', 1), ('created_at', 1)]},
+        {'name': 'idx_payments_followup', 'keys': [('followup', 1)], 'sparse': True},
+    ],
+    'templates': [
+        {'name': 'idx_user_templates', 'keys': [('telegram_id', 1), ('created_at', -1)]},
+        {'name': 'idx_templates_id', 'keys': [('id', 1)]},
+        {'name': 'idx_template_name', 'keys': [('name', 1)]},
+    ],
+    'user_sessions': [
+        {'name': 'idx_user_id_unique', 'keys': [('user_id', 1)], 'unique': True},
+        # SessionManager writes `timestamp`; sessions expire 15 minutes after the last step
+        {'name': 'idx_sessions_timestamp_ttl', 'keys': [('timestamp', 1)], 'expireAfterSeconds': 900},
+    ],
+    'completed_labels': [
+        {'name': 'idx_completed_labels_user', 'keys': [('user_id', 1)]},
+        {'name': 'idx_completed_labels_created_at', 'keys': [('created_at', 1)]},
+    ],
+    'security_logs': [
+        {'name': 'idx_security_logs_timestamp', 'keys': [('timestamp', -1)]},
+    ],
+    'refund_requests': [
+        {'name': 'idx_request_id', 'keys': [('request_id', 1)], 'unique': True},
+        {'name': 'idx_user_refunds', 'keys': [('telegram_id', 1), ('created_at', -1)]},
+        {'name': 'idx_status_date', 'keys': [('status', 1), ('created_at', -1)]},
+        {'name': 'idx_label_id', 'keys': [('label_id', 1)], 'sparse': True},
+    ],
+    'pending_orders': [
+        {'name': 'idx_pending_user_unique', 'keys': [('telegram_id', 1)], 'unique': True},
+        {'name': 'idx_pending_ttl', 'keys': [('created_at', 1)], 'expireAfterSeconds': 3600},
+    ],
+    'settings': [
+        {'name': 'idx_settings_key', 'keys': [('key', 1)], 'unique': True},
+    ],
+    'bot_conversations': [
+        {'name': 'idx_conversations_name', 'keys': [('name', 1), ('updated_at', -1)]},
+    ],
+    'broadcast_jobs': [
+        {'name': 'idx_broadcast_jobs_status', 'keys': [('status', 1), ('created_at', -1)]},
+    ],
+    'broadcast_deliveries': [
+        {'name': 'idx_broadcast_deliveries_job', 'keys': [('job_id', 1), ('telegram_id', 1)]},
+    ],
+    'balance_ledger': [
+        {'name': 'idx_ledger_user_seq', 'keys': [('telegram_id', 1), ('seq', 1)], 'unique': True},
+    ],
+    'label_jobs': [
+        {'name': 'idx_label_jobs_claim', 'keys': [('stage', 1), ('claimed_until', 1)]},
+        {'name': 'idx_label_jobs_expires_ttl', 'keys': [('expires_at', 1)], 'expireAfterSeconds': 0},
+    ],
+    'rate_cache': [
+        {'name': 'idx_rate_cache_expires_ttl', 'keys': [('expires_at', 1)], 'expireAfterSeconds': 0},
+        {'name': 'idx_rate_cache_zone', 'keys': [('zone', 1)]},
+    ],
+    'address_cache': [
+        {'name': 'idx_address_cache_expires_ttl', 'keys': [('expires_at', 1)], 'expireAfterSeconds': 0},
+    ],
+    'processed_updates': [
+        {'name': 'idx_processed_updates_ttl', 'keys': [('created_at', 1)],
+         'expireAfterSeconds': BotPerformanceConfig.get_update_dedup_config()['ttl_seconds']},
+    ],
+    'telegram_update_inbox': [
+        {'name': 'idx_update_inbox_received', 'keys': [('received_at', 1), ('_id', 1)]},
+    ],
+}
+
+# Query shapes of the hot paths (values are placeholders, only the shape matters for the plan)
+HOT_QUERIES: List[Dict[str, Any]] = [
+    {'source': 'UserRepository.find_by_telegram_id', 'collection': 'users',
+     'filter': {'telegram_id': 0}},
+    {'source': 'OrderRepository.find_by_id', 'collection': 'orders',
+     'filter': {'id': ''}},
+    {'source': 'OrderRepository.find_by_order_id', 'collection': 'orders',
+     'filter': {'order_id': ''}},
+    {'source': 'order history', 'collection': 'orders',
+     'filter': {'telegram_id': 0}, 'sort': [('created_at', -1)]},
+    {'source': 'admin orders by payment status', 'collection': 'orders',
+     'filter': {'payment_status': 'paid', 'created_at': {'$gte': ''}}},
+    {'source': 'OrderRepository.get_recent_orders', 'collection': 'orders',
+     'filter': {'created_at': {'$gte': ''}}, 'sort': [('created_at', -1)]},
+    {'source': 'label by order', 'collection': 'shipping_labels',
+     'filter': {'order_id': ''}, 'sort': [('created_at', -1)]},
+    {'source': 'label by id', 'collection': 'shipping_labels',
+     'filter': {'label_id': ''}},
+    {'source': 'admin label stats', 'collection': 'shipping_labels',
+     'filter': {'status': 'created', 'created_at': {'$gte': ''}}},
+    {'source': 'PaymentRepository.find_by_track_id', 'collection': 'payments',
+     'filter': {'track_id': ''}},
+    {'source': 'PaymentRepository.find_by_invoice_id', 'collection': 'payments',
+     'filter': {'invoice_id': ''}},
+    {'source': 'PaymentRepository.find_by_order_id', 'collection': 'payments',
+     'filter': {'order_id': ''}},
+    {'source': 'PaymentReconciler', 'collection': 'payments',
+     'filter': {'status': 'pending', 'created_at': {'$gte': '', '$lte': ''}}, 'sort': [('created_at', 1)]},
+    {'source': 'PaymentWebhooks follow-ups', 'collection': 'payments',
+     'filter': {'followup': 'pending'}},
+    {'source': 'user templates', 'collection': 'templates',
+     'filter': {'telegram_id': 0}, 'sort': [('created_at', -1)]},
+    {'source': 'TemplateRepository.find_by_id', 'collection': 'templates',
+     'filter': {'id': ''}},
+    {'source': 'SessionManager', 'collection': 'user_sessions',
+     'filter': {'user_id': 0}},
+    {'source': 'refund by id', 'collection': 'refund_requests',
+     'filter': {'request_id': ''}},
+    {'source': 'user refunds', 'collection': 'refund_requests',
+     'filter': {'telegram_id': 0}, 'sort': [('created_at', -1)]},
+    {'source': 'admin refunds by status', 'collection': 'refund_requests',
+     'filter': {'status': 'pending'}, 'sort': [('created_at', -1)]},
+    {'source': 'refund by label', 'collection': 'refund_requests',
+     'filter': {'label_id': ''}},
+    {'source': 'LabelJobQueue._claim', 'collection': 'label_jobs',
+     'filter': {'stage': {'$in': ['purchase']}, 'claimed_until': {'$lte': ''}}},
+    {'source': 'BalanceLedger.rebuild', 'collection': 'balance_ledger',
+     'filter': {'telegram_id': 0, 'seq': {'$gt': 0}}, 'sort': [('seq', 1)]},
+    {'source': 'rate cache fallback by zone', 'collection': 'rate_cache',
+     'filter': {'zone': ''}},
+    {'source': 'UpdateInbox overflow drain', 'collection': 'telegram_update_inbox',
+     'filter': {}, 'sort': [('received_at', 1), ('_id', 1)]},
+]
+
+
+def _key_pattern(keys) -> tuple:
+    if isinstance(keys, str):
+        return ((keys, 1),)
+    items = keys.items() if hasattr(keys, 'items') else keys
+    # list_indexes may return 1.0 for 1
+    return tuple((field, int(direction) if isinstance(direction, float) else direction)
+                 for field, direction in items)
+
+
+def _option_conflict(spec: Dict[str, Any], index: Dict[str, Any]) -> Optional[str]:
+    """Why the live index cannot serve the spec (None if it can)"""
+    if spec.get('unique') and not index.get('unique'):
+        return 'not unique'
+    if index.get('sparse') and not spec.get('sparse'):
+        return 'sparse'
+    if spec.get('partialFilterExpression') != index.get('partialFilterExpression'):
+        return 'partial filter differs'
+    if spec.get('expireAfterSeconds') != index.get('expireAfterSeconds'):
+        return 'ttl'
+    return None
+
+
+def diff_indexes(specs: List[Dict[str, Any]], existing: List[Dict[str, Any]]) -> Dict[str, List]:
+    """
+    Compare a collection's manifest with its list_indexes output
+
+    Returns:
+        {'missing': [spec], 'ttl': [(spec, index)], 'conflicts': [(spec, index, reason)],
+         'unmanaged': [index name]}
+    """
+    by_keys = {_key_pattern(index['key']): index for index in existing}
+    report = {'missing': [], 'ttl': [], 'conflicts': [], 'unmanaged': []}
+    managed = set()
+
+    for spec in specs:
+        index = by_keys.get(_key_pattern(spec['keys']))
+        if index is None:
+            report['missing'].append(spec)
+            continue
+        managed.add(index['name'])
+        reason = _option_conflict(spec, index)
+        if reason == 'ttl' and spec.get('expireAfterSeconds') is not None and index.get('expireAfterSeconds') is not None:
+            report['ttl'].append((spec, index))
+        elif reason:
+            report['conflicts'].append((spec, index, reason))
+
+    report['unmanaged'] = [index['name'] for index in existing
+                           if index['name'] not in managed and index['name'] != '_id_']
+    return report
+
+
+def _index_model(spec: Dict[str, Any]) -> IndexModel:
+    options = {option: spec[option] for option in INDEX_OPTIONS if option in spec}
+    return IndexModel(list(spec['keys']), name=spec['name'], **options)
+
+
+async def _apply_collection(db, name: str, specs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    collection = db[name]
+    existing = await collection.list_indexes().to_list(None)
+    diff = diff_indexes(specs, existing)
+    result = {'created': [], 'ttl_updated': [], 'conflicts': [], 'unmanaged': diff['unmanaged'], 'errors': []}
+
+    if diff['missing']:
+        try:
+            await collection.create_indexes([_index_model(spec) for spec in diff['missing']])
+            result['created'] = [spec['name'] for spec in diff['missing']]
+        except Exception as e:
+            # One bad index (e.g. duplicates under a unique key) fails the whole call: isolate it
+            logger.debug(f"createIndexes on {name} failed ({e}), building one by one")
+            for spec in diff['missing']:
+                try:
+                    await collection.create_indexes([_index_model(spec)])
+                    result['created'].append(spec['name'])
+                except Exception as e:
+                    result['errors'].append(f"{spec['name']}: {e}")
+
+    for spec, index in diff['ttl']:
+        try:
+            await db.command('collMod', name, index={
+                'keyPattern': dict(spec['keys']), 'expireAfterSeconds': spec['expireAfterSeconds']
+            })
+            result['ttl_updated'].append(index['name'])
+        except Exception as e:
+            result['errors'].append(f"{index['name']}: {e}")
+
+    result['conflicts'] = [f"{index['name']} ({reason}, manifest: {spec['name']})"
+                           for spec, index, reason in diff['conflicts']]
+    return result
+
+
+_last_report: Optional[Dict[str, Any]] = None
+
+
+async def apply_index_manifest(
+    db,
+    manifest: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    collections: Optional[Iterable[str]] = None
+) -> Dict[str, Any]:
+    """
+    Build the manifest's missing indexes (all collections concurrently)
+
+    Args:
+        db: MongoDB database
+        manifest: Collection -> index specs (default: INDEX_MANIFEST)
+        collections: Only these collections of the manifest
+
+    Returns:
+        {'collections': {name: {'created', 'ttl_updated', 'conflicts', 'unmanaged', 'errors'}},
+         'created': n, 'errors': n, 'elapsed_ms': ms}
+    """
+    global _last_report
+    manifest = manifest if manifest is not None else INDEX_MANIFEST
+    names = [name for name in manifest if collections is None or name in collections]
+
+    started = time.monotonic()
+    results = await asyncio.gather(
+        *(_apply_collection(db, name, manifest[name]) for name in names),
+        return_exceptions=True
+    )
+
+    report = {'collections': {}, 'created': 0, 'errors': 0}
+    for name, result in zip(names, results):
+        if isinstance(result, BaseException):
+            result = {'created': [], 'ttl_updated': [], 'conflicts': [], 'unmanaged': [], 'errors': [str(result)]}
+        report['collections'][name] = result
+        report['created'] += len(result['created'])
+        report['errors'] += len(result['errors'])
+        for conflict in result['conflicts']:
+            logger.warning(f"⚠️ Index conflict on {name}: {conflict}")
+        for error in result['errors']:
+            logger.error(f"❌ Index error on {name}: {error}")
+    report['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+
+    if collections is None:
+        _last_report = report
+    if report['created']:
+        logger.info(f"✅ MongoDB indexes: {report['created']} created in {report['elapsed_ms']} ms")
+    else:
+        logger.info(f"✅ MongoDB indexes up to date ({len(names)} collections, {report['elapsed_ms']} ms)")
+    return report
+
+
+def get_last_report() -> Optional[Dict[str, Any]]:
+    """Report of the last full apply_index_manifest run (None before startup)"""
+    return _last_report
+
+
+# ==================== QUERY PLANS ====================
+
+def plan_stages(explain: Dict[str, Any]) -> List[str]:
+    """Stage names of the winning plan (outermost first)"""
+    planner = explain.get('queryPlanner', explain)
+    stages = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if 'stage' in node:
+                stages.append(node['stage'])
+            for key, value in node.items():
+                if key != 'rejectedPlans':
+                    walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(planner.get('winningPlan', {}))
+    return stages
+
+
+async def verify_query_plans(db, queries: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    explain() every hot query and flag collection scans
+
+    Returns:
+        {'plans': [{'source', 'collection', 'stages', 'collscan', 'in_memory_sort'}],
+         'collscans': [source]}
+    """
+    queries = queries if queries is not None else HOT_QUERIES
+
+    async def explain(query):
+        cursor = db[query['collection']].find(query['filter'])
+        if query.get('sort'):
+            cursor = cursor.sort(query['sort'])
+        try:
+            stages = plan_stages(await cursor.limit(1).explain())
+        except Exception as e:
+            return {'source': query['source'], 'collection': query['collection'], 'error': str(e)}
+        return {
+            'source': query['source'],
+            'collection': query['collection'],
+            'stages': stages,
+            'collscan': 'COLLSCAN' in stages,
+            'in_memory_sort': 'SORT' in stages,
+        }
+
+    plans = await asyncio.gather(*(explain(query) for query in queries))
+    collscans = [plan['source'] for plan in plans if plan.get('collscan')]
+    for plan in plans:
+        if plan.get('collscan'):
+            logger.warning(f"⚠️ COLLSCAN: {plan['source']} on {plan['collection']}")
+    return {'plans': plans, 'collscans': collscans}
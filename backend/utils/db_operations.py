@@ -87,7 +87,7 @@ async def insert_payment(payment_dict: dict):
     """Профилируемая вставка платежа"""
     from repositories import get_repositories
     repos = get_repositories()
-    return await repos.payments.collection.insert_one(payment_dict)
+    return await repos.payments.insert_payment(payment_dict)
 
 
 @profile_db_query("insert_pending_order")
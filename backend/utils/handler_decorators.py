@@ -76,10 +76,11 @@ def safe_handler(fallback_state=ConversationHandler.END, error_message="❌ Пр
                 # Send error notification to admin
                 try:
                     import os
-                    from telegram import Bot
+                    from middleware.rate_limiter import LANE_ADMIN, outbound_lane
                     admin_id = os.getenv('ADMIN_TELEGRAM_ID')
                     if admin_id:
-                        bot = Bot(os.getenv('TELEGRAM_BOT_TOKEN'))
+                        # context.bot goes through the application's outbound scheduler
+                        bot = context.bot
                         error_text = f"""🚨 *Ошибка в боте*
 ━━━━━━━━━━━━━━━━━━━━
 
@@ -92,11 +93,12 @@ def safe_handler(fallback_state=ConversationHandler.END, error_message="❌ Пр
 
 🕐 *Time:* {datetime.now(timezone.utc).strftime('%d.%m.%Y %H:%M UTC')}"""
                         
-                        await bot.send_message(
-                            chat_id=admin_id,
-                            text=error_text,
-                            parse_mode='Markdown'
-                        )
+                        with outbound_lane(LANE_ADMIN):
+                            await bot.send_message(
+                                chat_id=admin_id,
+                                text=error_text,
+                                parse_mode='Markdown'
+                            )
                 except Exception as admin_error:
                     logger.error(f"Failed to send error notification to admin: {admin_error}")
                 
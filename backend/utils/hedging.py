@@ -0,0 +1,198 @@
+"""
+Hedged requests with adaptive latency budgets
+
+Each external endpoint keeps a rolling window of call latencies. For
+idempotent calls (rates, carriers, address validation), when the primary call
+is still running after the endpoint's p95, one duplicate request is sent and
+the first successful response wins; the other request is cancelled.
+
+Hedges are limited by an extra-load budget: every call earns `max_extra_load`
+hedge tokens (0.1 = at most ~10% additional requests). Non-idempotent calls
+(label purchases) are only measured, never duplicated.
+
+Usage:
+    from utils.hedging import get_hedger
+
+    response = await get_hedger('shipstation_carriers').call(
+        lambda: client.get(url, headers=headers),
+        is_success=lambda r: r.status_code == 200
+    )
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config.performance_config import BotPerformanceConfig
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyWindow:
+    """Rolling window of latencies (seconds)"""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * p / 100))
+        return ordered[index]
+
+
+class Hedger:
+    """Latency tracking and request hedging for one endpoint"""
+
+    def __init__(
+        self,
+        name: str,
+        percentile: float = 95,
+        window: int = 200,
+        min_samples: int = 20,
+        min_delay: float = 0.05,
+        max_extra_load: float = 0.1,
+        max_tokens: float = 10.0
+    ):
+        """
+        Args:
+            name: Endpoint name (monitoring)
+            percentile: Latency percentile after which a hedge is sent
+            window: Latency samples kept
+            min_samples: No hedging until this many samples are collected
+            min_delay: Lower bound for the hedge delay (seconds)
+            max_extra_load: Hedge budget as a fraction of calls
+            max_tokens: Burst limit for hedges
+        """
+        self.name = name
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_extra_load = max_extra_load
+        self.max_tokens = max_tokens
+        self.latency = LatencyWindow(window)
+        self._tokens = 0.0
+
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.budget_exhausted = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """Current hedge delay, None while there is not enough data"""
+        if len(self.latency) < self.min_samples:
+            return None
+        return max(self.min_delay, self.latency.percentile(self.percentile))
+
+    def _timed(self, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        async def run():
+            start = time.perf_counter()
+            try:
+                return await fn()
+            finally:
+                # Cancelled losers count as at least this slow
+                self.latency.add(time.perf_counter() - start)
+        return asyncio.ensure_future(run())
+
+    @staticmethod
+    def _succeeded(task: asyncio.Task, is_success: Callable[[Any], bool]) -> bool:
+        return not task.cancelled() and task.exception() is None and is_success(task.result())
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        idempotent: bool = True,
+        is_success: Callable[[Any], bool] = lambda result: True
+    ) -> Any:
+        """
+        Run fn(), hedging it with a second fn() when it is slow
+
+        Args:
+            fn: Factory for the request coroutine (called once per attempt)
+            idempotent: False disables hedging (latency is still recorded)
+            is_success: Whether a result may win (failures wait for the other attempt)
+        """
+        self.calls += 1
+        self._tokens = min(self.max_tokens, self._tokens + self.max_extra_load)
+
+        primary = self._timed(fn)
+        delay = self.hedge_delay() if idempotent else None
+        if delay is None:
+            return await primary
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        if self._tokens < 1:
+            self.budget_exhausted += 1
+            return await primary
+        self._tokens -= 1
+        self.hedges += 1
+        hedge = self._timed(fn)
+        logger.info(f"🪝 {self.name}: primary slower than p{self.percentile:.0f} ({delay:.2f}s), hedging")
+
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if self._succeeded(task, is_success):
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+            # Both attempts failed - report the primary's outcome
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Latency percentiles and hedge counters"""
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            'calls': self.calls,
+            'samples': len(self.latency),
+            'p50_ms': ms(self.latency.percentile(50)),
+            'p95_ms': ms(self.latency.percentile(95)),
+            'p99_ms': ms(self.latency.percentile(99)),
+            'hedge_delay_ms': ms(self.hedge_delay()),
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'hedge_rate': f"{(self.hedges / self.calls * 100) if self.calls else 0:.1f}%",
+            'budget': f"{self.max_extra_load * 100:.0f}%",
+            'budget_exhausted': self.budget_exhausted,
+        }
+
+
+# Per-endpoint hedgers
+_hedgers: Dict[str, Hedger] = {}
+
+
+def get_hedger(name: str) -> Hedger:
+    """Get (or create) the hedger for an endpoint"""
+    hedger = _hedgers.get(name)
+    if hedger is None:
+        config = BotPerformanceConfig.get_hedging_config()
+        settings = {**config['defaults'], **config['endpoints'].get(name, {})}
+        hedger = _hedgers[name] = Hedger(name, **settings)
+    return hedger
+
+
+def get_hedging_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats for all endpoints"""
+    return {name: hedger.get_stats() for name, hedger in _hedgers.items()}
@@ -0,0 +1,174 @@
+"""
+HTTP Clients - shared keep-alive pools for external APIs
+
+One httpx.AsyncClient per provider (ShipStation, Oxapay, CryptoBot, label
+downloads), opened at startup and closed at shutdown. Requests reuse warm
+TCP/TLS connections instead of paying DNS + handshake on every call.
+
+Usage:
+    from utils.http_clients import get_http_client
+
+    client = get_http_client('shipstation')
+    response = await client.get(url, headers=headers, timeout=10.0)
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+from config.performance_config import BotPerformanceConfig
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401 - HTTP/2 support for httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+DEFAULT_PROVIDER = 'default'
+
+
+class HttpClientRegistry:
+    """Lifecycle-managed registry of per-provider httpx clients"""
+
+    def __init__(self, providers: Dict[str, Dict[str, Any]], defaults: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            providers: Per-provider settings (timeout, limits, http2, warmup_url)
+            defaults: Fallback settings (HTTP_CLIENT_CONFIG)
+        """
+        self.providers = providers
+        self.defaults = defaults or {}
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._requests: Dict[str, int] = {}
+        self._warmup: Dict[str, Any] = {}
+
+    def _settings(self, provider: str) -> Dict[str, Any]:
+        settings = dict(self.providers.get(provider, {}))
+        default_limits = self.defaults.get('limits')
+        settings.setdefault('timeout', self.defaults.get('timeout', 15.0))
+        settings.setdefault(
+            'max_connections',
+            default_limits.max_connections if default_limits else 100
+        )
+        settings.setdefault(
+            'max_keepalive_connections',
+            default_limits.max_keepalive_connections if default_limits else 20
+        )
+        settings.setdefault('http2', False)
+        return settings
+
+    def _create(self, provider: str) -> httpx.AsyncClient:
+        settings = self._settings(provider)
+        timeout = httpx.Timeout(settings['timeout'], connect=settings.get('connect_timeout', settings['timeout']))
+        limits = httpx.Limits(
+            max_connections=settings['max_connections'],
+            max_keepalive_connections=settings['max_keepalive_connections'],
+            keepalive_expiry=settings.get('keepalive_expiry', 60.0),
+        )
+
+        async def count_request(request: httpx.Request) -> None:
+            self._requests[provider] = self._requests.get(provider, 0) + 1
+
+        client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=limits,
+            http2=bool(settings['http2'] and HTTP2_AVAILABLE),
+            event_hooks={'request': [count_request]},
+        )
+        logger.debug(f"🔌 HTTP pool '{provider}' opened (max {settings['max_connections']} connections)")
+        return client
+
+    def get(self, provider: str = DEFAULT_PROVIDER) -> httpx.AsyncClient:
+        """Shared client for a provider (created on first use)"""
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = self._create(provider)
+            self._clients[provider] = client
+        return client
+
+    def start(self) -> None:
+        """Open pools for all configured providers"""
+        for provider in self.providers:
+            self.get(provider)
+        wanted = [p for p in self._clients if self._settings(p)['http2']]
+        if wanted and not HTTP2_AVAILABLE:
+            logger.warning(f"⚠️ HTTP/2 configured for {', '.join(wanted)} but h2 is not installed - using HTTP/1.1")
+        logger.info(
+            f"✅ HTTP pools opened: {', '.join(self._clients)} "
+            f"(HTTP/2: {', '.join(wanted) if wanted and HTTP2_AVAILABLE else 'none'})"
+        )
+
+    async def warm_up(self) -> None:
+        """Open one connection per provider so the first real request skips DNS/TLS"""
+        async def warm(provider: str, url: str):
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            try:
+                await self.get(provider).head(url, timeout=5.0)
+                self._warmup[provider] = round((loop.time() - start) * 1000, 1)
+            except Exception as e:
+                self._warmup[provider] = f"failed: {type(e).__name__}"
+
+        targets = [
+            (provider, settings['warmup_url'])
+            for provider, settings in self.providers.items()
+            if settings.get('warmup_url')
+        ]
+        await asyncio.gather(*(warm(provider, url) for provider, url in targets))
+        if targets:
+            logger.info(f"🔥 HTTP pools warmed up: {self._warmup}")
+
+    async def close(self) -> None:
+        """Close all pools (shutdown)"""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"HTTP pool close error: {e}")
+        logger.info("🔌 HTTP pools closed")
+
+    @staticmethod
+    def _pool_state(client: httpx.AsyncClient) -> Dict[str, int]:
+        """Connection counts from the underlying httpcore pool"""
+        try:
+            connections = list(client._transport._pool.connections)
+        except AttributeError:
+            return {'connections': 0, 'idle': 0, 'active': 0}
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {'connections': len(connections), 'idle': idle, 'active': len(connections) - idle}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool utilization per provider"""
+        stats = {}
+        for provider, client in self._clients.items():
+            settings = self._settings(provider)
+            state = self._pool_state(client)
+            stats[provider] = {
+                **state,
+                'max_connections': settings['max_connections'],
+                'utilization': f"{state['active'] / settings['max_connections'] * 100:.1f}%",
+                'requests': self._requests.get(provider, 0),
+                'http2': bool(settings['http2'] and HTTP2_AVAILABLE),
+                'warmup_ms': self._warmup.get(provider),
+            }
+        return stats
+
+
+# Global instance
+http_clients = HttpClientRegistry(
+    BotPerformanceConfig.get_http_providers_config(),
+    BotPerformanceConfig.get_http_client_config()
+)
+
+
+def get_http_client(provider: str = DEFAULT_PROVIDER) -> httpx.AsyncClient:
+    """
+    Get the shared pooled client for an external provider
+
+    Do not close the returned client - pools are closed on shutdown.
+    """
+    return http_clients.get(provider)
@@ -1,9 +1,16 @@
 """
 MongoDB Persistence for ConversationHandler
 Replaces PicklePersistence with MongoDB storage
+
+- MongoDBPersistence: conversation states only, immediate writes
+- WriteBehindMongoDBPersistence: conversation states + user_data,
+  buffered in memory and flushed in batches
 """
+import asyncio
 import logging
-from typing import Dict, Optional
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Optional, Set, Tuple
 from telegram.ext import BasePersistence, PersistenceInput
 from telegram.ext._utils.types import ConversationDict
 
@@ -109,3 +116,316 @@ class MongoDBPersistence(BasePersistence):
     async def refresh_chat_data(self, chat_id: int, chat_data: Dict) -> None: pass
     async def refresh_bot_data(self, bot_data: Dict) -> None: pass
     async def flush(self) -> None: pass
+
+
+# ============================================================
+# WRITE-BEHIND PERSISTENCE (conversations + user_data)
+# ============================================================
+
+_UNSTORABLE = object()
+
+
+def _bson_safe(value):
+    """
+    Convert user_data values to something BSON can store
+
+    - dict keys become strings
+    - tuples and sets become lists
+    - values BSON cannot encode are dropped
+    """
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            converted = _bson_safe(item)
+            if converted is not _UNSTORABLE:
+                result[str(key)] = converted
+        return result
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [item for item in (_bson_safe(v) for v in value) if item is not _UNSTORABLE]
+    if value is None or isinstance(value, (str, int, float, bool, bytes, datetime)):
+        return value
+    try:
+        from bson import ObjectId, Decimal128
+        if isinstance(value, (ObjectId, Decimal128)):
+            return value
+    except ImportError:
+        pass
+    return _UNSTORABLE
+
+
+class WriteBehindMongoDBPersistence(BasePersistence):
+    """
+    Production persistence for ConversationHandler states and user_data
+
+    - update_* calls only mark keys as dirty in memory (no I/O)
+    - a background task flushes dirty keys with one bulk_write per
+      collection every `flush_interval` seconds, or as soon as
+      `flush_threshold` keys are dirty
+    - user_data is rehydrated lazily: one find_one per user on the first
+      update after a restart, instead of loading every user at startup
+    - conversations are loaded at startup only for users active within
+      `active_window_hours`
+    """
+
+    def __init__(
+        self,
+        db,
+        flush_interval: float = 1.0,
+        flush_threshold: int = 200,
+        active_window_hours: int = 24,
+        update_interval: float = 1.0,
+        conversations_collection: str = 'bot_conversations',
+        user_data_collection: str = 'bot_user_data',
+    ):
+        """
+        Args:
+            db: MongoDB database
+            flush_interval: Seconds between background flushes
+            flush_threshold: Number of dirty keys that triggers an early flush
+            active_window_hours: Conversations older than this are not restored
+            update_interval: How often PTB hands changed data to the persistence
+            conversations_collection: Collection for conversation states
+            user_data_collection: Collection for user_data
+        """
+        super().__init__(
+            store_data=PersistenceInput(
+                user_data=True,
+                chat_data=False,
+                bot_data=False,
+                callback_data=False
+            ),
+            update_interval=update_interval
+        )
+        self.db = db
+        self.conversations = db[conversations_collection]
+        self.user_data = db[user_data_collection]
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.active_window = timedelta(hours=active_window_hours)
+
+        # Pending writes: value None means "delete"
+        self._dirty_conversations: Dict[Tuple[str, tuple], Optional[object]] = {}
+        self._dirty_user_data: Dict[int, Optional[Dict]] = {}
+
+        self._loaded_users: Set[int] = set()
+        self._flush_lock = asyncio.Lock()
+        self._flush_wakeup = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+
+        self.stats = {
+            'flushes': 0,
+            'writes': 0,
+            'flush_errors': 0,
+            'rehydrated_users': 0,
+            'last_flush_ms': 0.0,
+        }
+        logger.info("✅ WriteBehindMongoDBPersistence initialized (conversations + user_data)")
+
+    # ------------------------------------------------------------------
+    # Background flusher
+    # ------------------------------------------------------------------
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop(), name='persistence-flusher')
+
+    def _mark_dirty(self) -> None:
+        self._ensure_flusher()
+        if self.pending_writes >= self.flush_threshold:
+            self._flush_wakeup.set()
+
+    @property
+    def pending_writes(self) -> int:
+        return len(self._dirty_conversations) + len(self._dirty_user_data)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wakeup.clear()
+            try:
+                await self._flush_dirty()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Persistence flush failed: {e}")
+
+    @staticmethod
+    def conversation_doc_id(name: str, key: tuple) -> str:
+        """_id of the document that stores one conversation key"""
+        return f"{name}:{':'.join(str(part) for part in key)}"
+
+    async def flush_pending(self) -> int:
+        """Write pending keys now (used before user data leaves memory)"""
+        return await self._flush_dirty()
+
+    async def _flush_dirty(self) -> int:
+        """
+        Write all dirty keys with bulk_write
+
+        Returns:
+            int: Number of written keys
+        """
+        from pymongo import UpdateOne, DeleteOne
+
+        async with self._flush_lock:
+            if not self.pending_writes:
+                return 0
+
+            conversations, self._dirty_conversations = self._dirty_conversations, {}
+            user_data, self._dirty_user_data = self._dirty_user_data, {}
+            now = datetime.now(timezone.utc)
+            start = time.perf_counter()
+
+            conversation_ops = []
+            for (name, key), state in conversations.items():
+                doc_id = self.conversation_doc_id(name, key)
+                if state is None:
+                    conversation_ops.append(DeleteOne({'_id': doc_id}))
+                else:
+                    conversation_ops.append(UpdateOne(
+                        {'_id': doc_id},
+                        {'$set': {'name': name, 'key': list(key), 'state': state, 'updated_at': now}},
+                        upsert=True
+                    ))
+
+            user_data_ops = []
+            for user_id, data in user_data.items():
+                if data is None:
+                    user_data_ops.append(DeleteOne({'_id': user_id}))
+                else:
+                    user_data_ops.append(UpdateOne(
+                        {'_id': user_id},
+                        {'$set': {'data': _bson_safe(data), 'updated_at': now}},
+                        upsert=True
+                    ))
+
+            try:
+                if conversation_ops:
+                    await self.conversations.bulk_write(conversation_ops, ordered=False)
+                if user_data_ops:
+                    await self.user_data.bulk_write(user_data_ops, ordered=False)
+            except Exception:
+                # Put the batch back unless a newer value arrived meanwhile
+                for key, value in conversations.items():
+                    self._dirty_conversations.setdefault(key, value)
+                for key, value in user_data.items():
+                    self._dirty_user_data.setdefault(key, value)
+                self.stats['flush_errors'] += 1
+                raise
+
+            written = len(conversation_ops) + len(user_data_ops)
+            self.stats['flushes'] += 1
+            self.stats['writes'] += written
+            self.stats['last_flush_ms'] = round((time.perf_counter() - start) * 1000, 2)
+            logger.debug(f"💾 Persistence flush: {written} keys in {self.stats['last_flush_ms']}ms")
+            return written
+
+    # ------------------------------------------------------------------
+    # Conversations
+    # ------------------------------------------------------------------
+
+    async def get_conversations(self, name: str) -> ConversationDict:
+        """Restore conversation states of recently active users"""
+        cutoff = datetime.now(timezone.utc) - self.active_window
+        try:
+            docs = await self.conversations.find(
+                {'name': name, 'updated_at': {'$gte': cutoff}},
+                {'key': 1, 'state': 1}
+            ).to_list(None)
+        except Exception as e:
+            logger.error(f"❌ Failed to load conversations for '{name}': {e}")
+            return {}
+
+        conversations = {tuple(doc['key']): doc['state'] for doc in docs}
+        logger.info(f"✅ Restored {len(conversations)} active conversations for '{name}'")
+        return conversations
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        self._dirty_conversations[(name, tuple(key))] = new_state
+        self._mark_dirty()
+
+    # ------------------------------------------------------------------
+    # user_data
+    # ------------------------------------------------------------------
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        # Lazy: users are loaded one by one in refresh_user_data
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict) -> None:
+        """Load user_data from MongoDB on the first update of a user"""
+        if user_id in self._loaded_users:
+            return
+        self._loaded_users.add(user_id)
+
+        if user_data:
+            return
+
+        pending = self._dirty_user_data.get(user_id)
+        if pending is not None:
+            user_data.update(pending)
+            return
+        if user_id in self._dirty_user_data:
+            # Drop is pending - nothing to restore
+            return
+
+        try:
+            doc = await self.user_data.find_one({'_id': user_id}, {'data': 1})
+        except Exception as e:
+            logger.error(f"❌ Failed to rehydrate user_data for {user_id}: {e}")
+            self._loaded_users.discard(user_id)
+            return
+
+        if doc and doc.get('data'):
+            user_data.update(doc['data'])
+            self.stats['rehydrated_users'] += 1
+
+    async def update_user_data(self, user_id: int, data: Dict) -> None:
+        self._dirty_user_data[user_id] = data
+        self._mark_dirty()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._dirty_user_data[user_id] = None
+        self._mark_dirty()
+
+    def forget_user(self, user_id: int) -> None:
+        """Mark user as not loaded so the next update rehydrates it from MongoDB"""
+        self._loaded_users.discard(user_id)
+
+    # ------------------------------------------------------------------
+    # Unused data kinds
+    # ------------------------------------------------------------------
+
+    async def get_chat_data(self) -> Dict: return {}
+    async def get_bot_data(self) -> Dict: return {}
+    async def get_callback_data(self) -> Optional[tuple]: return None
+    async def update_chat_data(self, chat_id: int, data: Dict) -> None: pass
+    async def update_bot_data(self, data: Dict) -> None: pass
+    async def update_callback_data(self, data: tuple) -> None: pass
+    async def drop_chat_data(self, chat_id: int) -> None: pass
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict) -> None: pass
+    async def refresh_bot_data(self, bot_data: Dict) -> None: pass
+
+    async def flush(self) -> None:
+        """Called by PTB on shutdown - write everything that is still pending"""
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self._flush_dirty()
+        logger.info("💾 Persistence flushed on shutdown")
+
+    def get_stats(self) -> Dict:
+        """Write-behind buffer metrics"""
+        return {
+            **self.stats,
+            'pending_conversations': len(self._dirty_conversations),
+            'pending_user_data': len(self._dirty_user_data),
+            'loaded_users': len(self._loaded_users),
+        }
@@ -206,6 +206,14 @@ class ErrorHandler:
 # CIRCUIT BREAKER (ADVANCED)
 # ============================================================
 
+class CircuitOpenError(Exception):
+    """Call rejected because the circuit is open"""
+    
+    def __init__(self, name):
+        super().__init__(f"{name} circuit open")
+        self.name = name
+
+
 class CircuitBreaker:
     """
     Circuit breaker pattern for external services
@@ -215,7 +223,7 @@ class CircuitBreaker:
     States:
     - CLOSED: Normal operation
     - OPEN: Rejecting calls (fast-fail)
-    - HALF_OPEN: Testing if service recovered
+    - HALF_OPEN: Testing if service recovered (one probe call at a time)
     """
     
     def __init__(self, failure_threshold=5, timeout=60, name="service"):
@@ -226,9 +234,46 @@ class CircuitBreaker:
         self.failure_count = 0
         self.last_failure_time = None
         self.state = "CLOSED"  # CLOSED, OPEN, HALF_OPEN
+        self._probe_started = None
+        
+        # Metrics
+        self.transitions = {}
+        self.last_transition_time = None
+        self.rejected = 0
+        self.successes = 0
+        self.failures = 0
+    
+    def _transition(self, state):
+        """Switch state and record the transition"""
+        import time
+        
+        if state == self.state:
+            return
+        key = f"{self.state}->{state}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        self.last_transition_time = time.time()
+        self.state = state
+        self._probe_started = None
+        
+        if state == "OPEN":
+            from utils.monitoring import metrics_collector
+            metrics_collector.increment('circuit_breaker_opens')
+    
+    def retry_after(self):
+        """Seconds until the next probe is allowed (0 if calls are allowed now)"""
+        import time
+        
+        if self.state != "OPEN":
+            return 0.0
+        return max(0.0, self.timeout - (time.time() - self.last_failure_time))
     
     def is_available(self):
-        """Check if circuit allows calls"""
+        """
+        Check if circuit allows calls
+        
+        In HALF_OPEN only one probe call is let through; every allowed call
+        must be followed by record_success() or record_failure().
+        """
         import time
         
         if self.state == "CLOSED":
@@ -238,22 +283,30 @@ class CircuitBreaker:
             # Check if timeout expired
             if time.time() - self.last_failure_time > self.timeout:
                 logger.info(f"🟡 Circuit HALF_OPEN for {self.name} (testing)")
-                self.state = "HALF_OPEN"
+                self._transition("HALF_OPEN")
+                self._probe_started = time.time()
                 return True
             
-            logger.warning(f"🔴 Circuit OPEN for {self.name} (fast-fail)")
+            self.rejected += 1
+            logger.debug(f"🔴 Circuit OPEN for {self.name} (fast-fail)")
             return False
         
         if self.state == "HALF_OPEN":
-            return True
+            # A probe that never reported back does not block the circuit forever
+            if self._probe_started is None or time.time() - self._probe_started > self.timeout:
+                self._probe_started = time.time()
+                return True
+            self.rejected += 1
+            return False
         
         return False
     
     def record_success(self):
         """Record successful call"""
+        self.successes += 1
         if self.state == "HALF_OPEN":
             logger.info(f"✅ Circuit CLOSED for {self.name} (recovered)")
-            self.state = "CLOSED"
+            self._transition("CLOSED")
         
         self.failure_count = 0
     
@@ -261,12 +314,62 @@ class CircuitBreaker:
         """Record failed call"""
         import time
         
+        self.failures += 1
         self.failure_count += 1
         self.last_failure_time = time.time()
         
-        if self.failure_count >= self.failure_threshold:
+        if self.state == "HALF_OPEN":
+            logger.error(f"🔴 Circuit OPEN for {self.name} (probe failed)")
+            self._transition("OPEN")
+        elif self.state == "CLOSED" and self.failure_count >= self.failure_threshold:
             logger.error(f"🔴 Circuit OPEN for {self.name} (too many failures: {self.failure_count})")
-            self.state = "OPEN"
+            self._transition("OPEN")
+    
+    async def call(self, fn, is_failure=lambda result: False):
+        """
+        Run fn() through the breaker
+        
+        Args:
+            fn: Factory for the call coroutine
+            is_failure: Whether a returned result counts as a service failure
+                        (exceptions always do, cancellation never does)
+        
+        Raises:
+            CircuitOpenError: Circuit is open, fn() was not called
+        """
+        import asyncio
+        
+        if not self.is_available():
+            raise CircuitOpenError(self.name)
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # Caller gave up - no verdict about the service, free the probe slot
+            self._probe_started = None
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        if is_failure(result):
+            self.record_failure()
+        else:
+            self.record_success()
+        return result
+    
+    def get_stats(self):
+        """State and transition metrics"""
+        return {
+            'state': self.state,
+            'failure_count': self.failure_count,
+            'failure_threshold': self.failure_threshold,
+            'timeout': self.timeout,
+            'retry_after': round(self.retry_after(), 1),
+            'successes': self.successes,
+            'failures': self.failures,
+            'rejected': self.rejected,
+            'transitions': dict(self.transitions),
+            'last_transition_time': self.last_transition_time,
+        }
 
 
 # ============================================================
@@ -289,8 +392,8 @@ from utils.retry_utils import retry_on_api_error
 
 @retry_on_api_error(max_attempts=3)
 async def fetch_rates_from_shipstation(data):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=data)
+    client = get_http_client('shipstation')
+    response = await client.post(url, json=data)
     return response.json()
 
 
@@ -327,4 +430,10 @@ try:
 except Exception as e:
     SHIPSTATION_CIRCUIT.record_failure()
     raise
+
+# Or, equivalently (raises CircuitOpenError while open):
+result = await SHIPSTATION_CIRCUIT.call(
+    lambda: client.get(url),
+    is_failure=lambda r: r.status_code >= 500
+)
 """
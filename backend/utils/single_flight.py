@@ -0,0 +1,117 @@
+"""
+Single-flight request coalescing
+
+Concurrent calls with the same key share one in-flight coroutine and get
+its result or its exception. Nothing is cached - once the call finishes the
+next call with that key starts a new one.
+
+Usage:
+    from utils.single_flight import single_flight
+
+    @single_flight('shipstation_balance')
+    async def check_balance():
+        ...
+
+    # or explicitly
+    group = get_single_flight('shipstation_rates')
+    result = await group.do(cache_key, lambda: fetch(...))
+"""
+import asyncio
+import logging
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls within one process"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_waiters = 0
+        self._waiters: Dict[Hashable, int] = {}
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        waiters = self._waiters.pop(key, 0)
+        self.max_waiters = max(self.max_waiters, waiters)
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() once for all concurrent callers with the same key
+
+        The call runs in its own task, so a cancelled caller does not cancel
+        it for the others.
+        """
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            self._waiters[key] = 1
+            task.add_done_callback(lambda t, k=key: self._done(k, t))
+        else:
+            self.coalesced += 1
+            self._waiters[key] = self._waiters.get(key, 0) + 1
+            logger.debug(f"🔗 {self.name}: joined in-flight call ({self._waiters[key]} waiting)")
+        return await asyncio.shield(task)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Coalescing counters"""
+        return {
+            'calls': self.calls,
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'coalesced_rate': f"{(self.coalesced / self.calls * 100) if self.calls else 0:.1f}%",
+            'errors': self.errors,
+            'in_flight': len(self._in_flight),
+            'max_waiters': self.max_waiters,
+        }
+
+
+# Named groups (shared by all callers in the process)
+_groups: Dict[str, SingleFlight] = {}
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Get (or create) the named single-flight group"""
+    group = _groups.get(name)
+    if group is None:
+        group = _groups[name] = SingleFlight(name)
+    return group
+
+
+def single_flight(name: str, key: Optional[Callable[..., Hashable]] = None):
+    """
+    Decorator: coalesce concurrent calls of an async function
+
+    Args:
+        name: Group name (shown in monitoring)
+        key: Builds the coalescing key from the call arguments
+             (default: all positional and keyword arguments)
+    """
+    group = get_single_flight(name)
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            call_key = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            return await group.do(call_key, lambda: func(*args, **kwargs))
+        return wrapper
+
+    return decorator
+
+
+def get_single_flight_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats for all groups"""
+    return {name: group.get_stats() for name, group in _groups.items()}
@@ -55,75 +55,84 @@ def generate_random_phone():
     return f"+1{area_code}{exchange}{number}"
 
 
-async def generate_thank_you_message():
+# Used when the AI message is unavailable
+THANK_YOU_FALLBACKS = [
+    "Спасибо за использование нашего сервиса! Желаем вам приятной доставки.",
+    "Благодарим вас за доверие! Надеемся, что наш сервис оправдал ваши ожидания.",
+    "Спасибо, что выбрали нас! Мы ценим ваше время и доверие.",
+    "Благодарим за заказ! Желаем, чтобы ваша посылка прибыла быстро и в целости.",
+    "Спасибо за сотрудничество! Будем рады видеть вас снова."
+]
+
+
+async def request_thank_you_message():
     """
-    Generate a unique thank you message using AI
+    Generate a unique thank you message using AI (one LLM round trip)
     Генерирует уникальное сообщение благодарности с помощью AI
     
+    Used by the background pool (services/thank_you_pool.py).
+    
     Returns:
         str: Thank you message in Russian
+    
+    Raises:
+        Exception: LLM unavailable or empty response
     """
-    try:
-        import os
-        from emergentintegrations.llm.chat import LlmChat, UserMessage
-        
-        emergent_key = os.environ.get('EMERGENT_LLM_KEY')
-        print(f"🔑 EMERGENT_LLM_KEY loaded: {bool(emergent_key)}, len={len(emergent_key) if emergent_key else 0}")
-        logger.info(f"🔑 EMERGENT_LLM_KEY loaded: {bool(emergent_key)}")
-        
-        if not emergent_key:
-            raise ValueError("EMERGENT_LLM_KEY not found in environment")
-        
-        # Generate unique session ID
-        session_id = f"thanks_{int(datetime.now(timezone.utc).timestamp() * 1000)}"
-        
-        # Initialize chat with model
-        chat = LlmChat(
-            api_key=emergent_key,
-            session_id=session_id,
-            system_message="""Ты креативный помощник, создающий уникальные и теплые благодарности клиентам службы доставки на русском языке. 
+    import os
+    from emergentintegrations.llm.chat import LlmChat, UserMessage
+    
+    emergent_key = os.environ.get('EMERGENT_LLM_KEY')
+    
+    if not emergent_key:
+        raise ValueError("EMERGENT_LLM_KEY not found in environment")
+    
+    # Generate unique session ID
+    session_id = f"thanks_{int(datetime.now(timezone.utc).timestamp() * 1000)}"
+    
+    # Initialize chat with model
+    chat = LlmChat(
+        api_key=emergent_key,
+        session_id=session_id,
+        system_message="""Ты креативный помощник, создающий уникальные и теплые благодарности клиентам службы доставки на русском языке. 
 Твоя задача - генерировать РАЗНООБРАЗНЫЕ сообщения, не повторяя стиль и формулировки. 
 Используй разные подходы: иногда официальный тон, иногда более дружеский, варьируй структуру предложений."""
-        )
-        chat = chat.with_model("openai", "gpt-4o")
-        
-        # Add randomness to prompts
-        import random
-        prompts = [
-            "Создай краткое благодарственное сообщение клиенту за использование службы доставки (2-3 предложения). Используй тёплый, дружелюбный тон.",
-            "Напиши короткое сообщение с благодарностью клиенту сервиса доставки. Сделай его искренним и приятным (2-3 предложения).",
-            "Сформулируй благодарность клиенту за выбор нашей службы доставки. Пусть сообщение будет тёплым, но лаконичным (2-3 предложения).",
-            "Создай уникальное сообщение благодарности для клиента доставки. Тон - дружелюбный и позитивный (2-3 предложения).",
-            "Напиши короткую благодарность клиенту за пользование сервисом доставки. Сделай текст живым и искренним (2-3 предложения)."
-        ]
-        
-        selected_prompt = random.choice(prompts) + " Без эмодзи, только текст."
-        user_message = UserMessage(text=selected_prompt)
-        
-        # Get response
-        print("🤖 Sending request to AI...")
-        response = await chat.send_message(user_message)
-        print(f"🤖 AI Response received: {response[:50] if response else 'EMPTY'}...")
-        
-        if response and len(response.strip()) > 10:
-            logger.info(f"✅ Generated AI thank you message: {response[:50]}...")
-            print("✅ Using AI-generated message")
-            return response.strip()
-        else:
-            raise ValueError("Empty or invalid response from AI")
-            
+    )
+    chat = chat.with_model("openai", "gpt-4o")
+    
+    # Add randomness to prompts
+    prompts = [
+        "Создай краткое благодарственное сообщение клиенту за использование службы доставки (2-3 предложения). Используй тёплый, дружелюбный тон.",
+        "Напиши короткое сообщение с благодарностью клиенту сервиса доставки. Сделай его искренним и приятным (2-3 предложения).",
+        "Сформулируй благодарность клиенту за выбор нашей службы доставки. Пусть сообщение будет тёплым, но лаконичным (2-3 предложения).",
+        "Создай уникальное сообщение благодарности для клиента доставки. Тон - дружелюбный и позитивный (2-3 предложения).",
+        "Напиши короткую благодарность клиенту за пользование сервисом доставки. Сделай текст живым и искренним (2-3 предложения)."
+    ]
+    
+    selected_prompt = random.choice(prompts) + " Без эмодзи, только текст."
+    user_message = UserMessage(text=selected_prompt)
+    
+    # Get response
+    response = await chat.send_message(user_message)
+    
+    if response and len(response.strip()) > 10:
+        logger.info(f"✅ Generated AI thank you message: {response[:50]}...")
+        return response.strip()
+    else:
+        raise ValueError("Empty or invalid response from AI")
+
+
+async def generate_thank_you_message():
+    """
+    Thank you message: AI-generated, or a fallback on any error
+    
+    Returns:
+        str: Thank you message in Russian
+    """
+    try:
+        return await request_thank_you_message()
     except Exception as e:
-        print(f"❌ AI Error: {e}")
         logger.error(f"Error generating thank you message: {e}")
-        # Use varied fallback messages
-        fallback_messages = [
-            "Спасибо за использование нашего сервиса! Желаем вам приятной доставки.",
-            "Благодарим вас за доверие! Надеемся, что наш сервис оправдал ваши ожидания.",
-            "Спасибо, что выбрали нас! Мы ценим ваше время и доверие.",
-            "Благодарим за заказ! Желаем, чтобы ваша посылка прибыла быстро и в целости.",
-            "Спасибо за сотрудничество! Будем рады видеть вас снова."
-        ]
-        return random.choice(fallback_messages)
+        return random.choice(THANK_YOU_FALLBACKS)
 
 
 def sanitize_string(text: str, max_length: int = 200) -> str:
@@ -598,7 +598,7 @@ class OrderStepMessages:
                 get_skip_and_cancel_keyboard(CallbackData.SKIP_FROM_ADDRESS2),
                 OrderStepMessages.FROM_ADDRESS2
             ),
-            'FROM_CITY': (None, OrderStepMessages.FROM_CITY),
+            'FROM_CITY': (None, city_prompt(OrderStepMessages, 'FROM')),
             'FROM_STATE': (None, OrderStepMessages.FROM_STATE),
             'FROM_ZIP': (None, OrderStepMessages.FROM_ZIP),
             'FROM_PHONE': (
@@ -611,7 +611,7 @@ class OrderStepMessages:
                 get_skip_and_cancel_keyboard(CallbackData.SKIP_TO_ADDRESS2),
                 OrderStepMessages.TO_ADDRESS2
             ),
-            'TO_CITY': (None, OrderStepMessages.TO_CITY),
+            'TO_CITY': (None, city_prompt(OrderStepMessages, 'TO')),
             'TO_STATE': (None, OrderStepMessages.TO_STATE),
             'TO_ZIP': (None, OrderStepMessages.TO_ZIP),
             'TO_PHONE': (
@@ -640,6 +640,7 @@ class OrderStepMessages:
     FROM_ADDRESS = step_message.__func__(2, 18, "🏠 Адрес отправителя\nНапример: 215 Clayton St.")
     FROM_ADDRESS2 = step_message.__func__(3, 18, "🏢 Адрес 2 (опционально)\nНапример: Apt 4B или Suite 200\nИли нажмите \"Пропустить\" ")
     FROM_CITY = step_message.__func__(4, 18, "🏙 Город отправителя\nНапример: San Francisco")
+    FROM_CITY_OR_ZIP = step_message.__func__(4, 18, "🏙 Город отправителя (или сразу ZIP код)\nНапример: San Francisco или 94102")
     FROM_STATE = step_message.__func__(5, 18, "📍 Штат отправителя (2 буквы)\nНапример: CA, NY, TX, FL")
     FROM_ZIP = step_message.__func__(6, 18, "📮 ZIP код отправителя\nНапример: 94102")
     FROM_PHONE = step_message.__func__(7, 18, "📞 Телефон отправителя (опционально)\nНапример: +11234567890 или 1234567890\nИли нажмите \"Пропустить\" ")
@@ -649,6 +650,7 @@ class OrderStepMessages:
     TO_ADDRESS = step_message.__func__(9, 18, "🏠 Адрес получателя\nНапример: 123 Main St.")
     TO_ADDRESS2 = step_message.__func__(10, 18, "🏢 Адрес 2 получателя (опционально)\nНапример: Apt 4B\nИли нажмите \"Пропустить\" ")
     TO_CITY = step_message.__func__(11, 18, "🏙 Город получателя\nНапример: Los Angeles")
+    TO_CITY_OR_ZIP = step_message.__func__(11, 18, "🏙 Город получателя (или сразу ZIP код)\nНапример: Los Angeles или 90001")
     TO_STATE = step_message.__func__(12, 18, "📍 Штат получателя (2 буквы)\nНапример: CA, NY, TX")
     TO_ZIP = step_message.__func__(13, 18, "📮 ZIP код получателя\nНапример: 90001")
     TO_PHONE = step_message.__func__(14, 18, "📞 Телефон получателя (опционально)\nНапример: +11234567890\nИли нажмите \"Пропустить\" ")
@@ -668,6 +670,7 @@ class TemplateEditMessages:
     FROM_ADDRESS = "Шаг 2/7: 🏠 Адрес отправителя\nНапример: 215 Clayton St."
     FROM_ADDRESS2 = "Шаг 3/7: 🏢 Адрес 2 (опционально)\nНапример: Apt 4B или Suite 200\nИли нажмите \"Пропустить\" "
     FROM_CITY = "Шаг 4/7: 🏙 Город отправителя\nНапример: San Francisco"
+    FROM_CITY_OR_ZIP = "Шаг 4/7: 🏙 Город отправителя (или сразу ZIP код)\nНапример: San Francisco или 94102"
     FROM_STATE = "Шаг 5/7: 📍 Штат отправителя (2 буквы)\nНапример: CA, NY, TX, FL"
     FROM_ZIP = "Шаг 6/7: 📮 ZIP код отправителя\nНапример: 94102"
     FROM_PHONE = "Шаг 7/7: 📞 Телефон отправителя (опционально)\nНапример: +11234567890 или 1234567890\nИли нажмите \"Пропустить\" "
@@ -677,6 +680,7 @@ class TemplateEditMessages:
     TO_ADDRESS = "Шаг 2/7: 🏠 Адрес получателя\nНапример: 123 Main St."
     TO_ADDRESS2 = "Шаг 3/7: 🏢 Адрес 2 получателя (опционально)\nНапример: Apt 4B\nИли нажмите \"Пропустить\" "
     TO_CITY = "Шаг 4/7: 🏙 Город получателя\nНапример: Los Angeles"
+    TO_CITY_OR_ZIP = "Шаг 4/7: 🏙 Город получателя (или сразу ZIP код)\nНапример: Los Angeles или 90001"
     TO_STATE = "Шаг 5/7: 📍 Штат получателя (2 буквы)\nНапример: CA, NY, TX"
     TO_ZIP = "Шаг 6/7: 📮 ZIP код получателя\nНапример: 90001"
     TO_PHONE = "Шаг 7/7: 📞 Телефон получателя (опционально)\nНапример: +11234567890\nИли нажмите \"Пропустить\" "
@@ -689,6 +693,21 @@ class TemplateEditMessages:
 # HELPER FUNCTIONS
 # ============================================================
 
+def city_prompt(messages, side: str) -> str:
+    """
+    City step prompt for FROM/TO address
+
+    Offers entering a ZIP code instead of the city only when the offline
+    ZIP index (data/zip_index.bin) is available to fill in city and state.
+
+    Args:
+        messages: OrderStepMessages or TemplateEditMessages
+        side: 'FROM' or 'TO'
+    """
+    from utils.zip_index import zip_index
+    return getattr(messages, f"{side}_CITY_OR_ZIP" if zip_index.available else f"{side}_CITY")
+
+
 def build_custom_keyboard(buttons: List[List[dict]]) -> InlineKeyboardMarkup:
     """
     Build custom keyboard from button configuration
@@ -976,11 +995,32 @@ class ShippingRatesUI:
         dots = "." * (seconds % 3 + 1)
         return f"⏳ Получаю доступные курьерские службы и тарифы{dots} ({seconds} сек)"
     
+    @staticmethod
+    def loading_message() -> str:
+        """Message shown until the first carriers answer (replaced by the rates)"""
+        return "⏳ Получаю доступные курьерские службы и тарифы..."
+    
     @staticmethod
     def cache_hit_message() -> str:
         """Message when using cached rates"""
         return "✅ Тарифы загружены из кэша"
     
+    @staticmethod
+    def fallback_notice(kind: str, age_minutes: int) -> str:
+        """Header for last known rates shown while ShipStation is unavailable"""
+        if kind == 'estimated':
+            return ("⚠️ <b>Сервис доставки временно недоступен.</b>\n"
+                    "Показаны <b>примерные</b> тарифы по похожим посылкам на этом направлении.\n\n")
+        return ("⚠️ <b>Сервис доставки временно недоступен.</b>\n"
+                f"Показаны сохранённые тарифы ({age_minutes} мин назад), цена может измениться.\n\n")
+    
+    @staticmethod
+    def service_unavailable() -> str:
+        """Message when ShipStation is unavailable and no rates are known for the route"""
+        return """⏳ Сервис доставки временно недоступен.
+
+Пожалуйста, попробуйте через несколько минут."""
+    
     @staticmethod
     def missing_fields_error(fields: list) -> str:
         """Error message for missing required fields"""
@@ -1092,7 +1132,10 @@ ShipStation не смог проверить один или оба адреса
                 return f"{n} дней"
         
         # Build message
-        message = f"📦 Найдено {len(filtered_rates)} тарифов от {unique_carriers} курьеров:\n\n"
+        message = ""
+        if rates and rates[0].get('fallback'):
+            message += ShippingRatesUI.fallback_notice(rates[0]['fallback'], rates[0].get('fallback_age_minutes', 0))
+        message += f"📦 Найдено {len(filtered_rates)} тарифов от {unique_carriers} курьеров:\n\n"
         
         # Display rates grouped by carrier (sorted by priority: USPS, FedEx, UPS)
         # Sort carriers by their priority, not alphabetically
@@ -1339,7 +1382,7 @@ class DataConfirmationUI:
         return "✅📋 *ПРОВЕРКА ДАННЫХ ЗАКАЗА*\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
     
     @staticmethod
-    def format_address_section(title: str, data: dict, prefix: str) -> str:
+    def format_address_section(title: str, data: dict, prefix: str, check: dict = None) -> str:
         """
         Format address section for confirmation
         
@@ -1347,6 +1390,7 @@ class DataConfirmationUI:
             title: Section title (e.g., "Отправитель", "Получатель")
             data: Context user_data dict
             prefix: Field prefix ('from' or 'to')
+            check: Background verification result (None while pending)
         
         Returns:
             Formatted address section string
@@ -1375,10 +1419,28 @@ class DataConfirmationUI:
         section += f"🏙️  {city}, {state} {zip_code}\n"
         if phone:
             section += f"📱  {phone}\n"
+        section += DataConfirmationUI.format_address_check(check)
         section += "\n"
         
         return section
     
+    @staticmethod
+    def format_address_check(check: dict = None) -> str:
+        """Warning / suggested corrections from address verification"""
+        if not check or check.get('status') == 'valid':
+            return ""
+        if check.get('status') == 'invalid':
+            reason = str(check.get('message') or 'адрес не найден')
+            for char in '_*`[':
+                reason = reason.replace(char, ' ')
+            return f"⚠️  _Адрес не подтверждён: {reason.strip()}_\n"
+        
+        labels = {'street1': 'улица', 'city': 'город', 'state': 'штат', 'zip': 'ZIP'}
+        corrections = ", ".join(
+            f"{labels.get(field, field)}: {value}" for field, value in check.get('corrections', {}).items()
+        )
+        return f"💡  _Предлагаемое исправление: {corrections}_\n"
+    
     @staticmethod
     def format_parcel_section(data: dict) -> str:
         """
@@ -0,0 +1,142 @@
+"""
+Update Deduplicator - drops Telegram updates that were already received
+Telegram re-sends an update when the webhook is slow to answer; handling
+the copy again runs the handler twice (double prompts, double writes).
+
+Recent update_ids are kept in a fixed-size ring buffer plus a set, so a
+check is O(1) and memory is bounded by the window size. For setups with
+several workers an optional MongoDB collection with a TTL index is used
+as a shared index.
+"""
+import sys
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+from config.performance_config import BotPerformanceConfig
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateDeduplicator:
+    """Sliding-window index of recently seen update_ids"""
+
+    def __init__(self, window_size: int = 10000):
+        """
+        Args:
+            window_size: How many recent update_ids to remember locally
+        """
+        self.window_size = window_size
+        self._ring = [None] * window_size
+        self._position = 0
+        self._seen = set()
+
+        # Optional shared store (MongoDB collection with TTL index)
+        self._shared = None
+
+        self.checked = 0
+        self.duplicates = 0
+        self.shared_duplicates = 0
+
+    def _remember(self, update_id: int) -> None:
+        """Add update_id to the window, evicting the oldest one"""
+        oldest = self._ring[self._position]
+        if oldest is not None:
+            self._seen.discard(oldest)
+        self._ring[self._position] = update_id
+        self._seen.add(update_id)
+        self._position = (self._position + 1) % self.window_size
+
+    def check_local(self, update_id: int) -> bool:
+        """
+        Check an update_id against the local window and remember it
+
+        Returns:
+            True if the update was already seen, False if it is new
+        """
+        self.checked += 1
+        if update_id in self._seen:
+            self.duplicates += 1
+            return True
+        self._remember(update_id)
+        return False
+
+    async def is_duplicate(self, update_id: Optional[int]) -> bool:
+        """
+        Check whether an update was already received
+
+        Args:
+            update_id: Telegram update_id (updates without one are never duplicates)
+
+        Returns:
+            True if the update must be dropped
+        """
+        if update_id is None:
+            return False
+
+        if self.check_local(update_id):
+            logger.warning(f"🚫 Duplicate update {update_id} dropped (local window)")
+            return True
+
+        if self._shared is not None:
+            from pymongo.errors import DuplicateKeyError
+            try:
+                await self._shared.insert_one({
+                    '_id': update_id,
+                    'created_at': datetime.now(timezone.utc)
+                })
+            except DuplicateKeyError:
+                self.duplicates += 1
+                self.shared_duplicates += 1
+                logger.warning(f"🚫 Duplicate update {update_id} dropped (shared index)")
+                return True
+            except Exception as e:
+                # Shared index is best effort - never block updates on it
+                logger.error(f"Shared update index unavailable: {e}")
+
+        return False
+
+    async def enable_shared_store(self, db, collection: str = 'processed_updates') -> None:
+        """
+        Use a MongoDB collection as a shared index across workers
+
+        The TTL index (UPDATE_DEDUP_CONFIG ttl_seconds) is in utils/db_indexes.py.
+
+        Args:
+            db: MongoDB database
+            collection: Collection name
+        """
+        self._shared = db[collection]
+        logger.info(f"✅ Shared update_id index enabled ({collection})")
+
+    def get_stats(self) -> dict:
+        """Hit rate and memory usage of the index"""
+        hit_rate = (self.duplicates / self.checked * 100) if self.checked else 0
+        memory_bytes = sys.getsizeof(self._ring) + sys.getsizeof(self._seen)
+
+        return {
+            'checked': self.checked,
+            'duplicates': self.duplicates,
+            'shared_duplicates': self.shared_duplicates,
+            'hit_rate': f"{hit_rate:.2f}%",
+            'window_size': self.window_size,
+            'tracked': len(self._seen),
+            'memory_bytes': memory_bytes,
+            'shared_store': self._shared is not None,
+        }
+
+
+# Global instance
+update_deduplicator = UpdateDeduplicator(
+    window_size=BotPerformanceConfig.get_update_dedup_config()['window_size']
+)
+
+
+async def is_duplicate_update(update_id: Optional[int]) -> bool:
+    """
+    Check if an incoming Telegram update was already received
+
+    Usage:
+        if await is_duplicate_update(update_data.get('update_id')):
+            return {"ok": True}
+    """
+    return await update_deduplicator.is_duplicate(update_id)
@@ -0,0 +1,293 @@
+"""
+User Data Eviction
+Keeps in-memory user_data and conversation states bounded
+
+PTB keeps context.user_data (rates lists, db_user copies, address fields)
+and ConversationHandler states for every user who ever wrote to the bot.
+UserDataEvictor removes idle users from memory after their data has been
+flushed to MongoDB by WriteBehindMongoDBPersistence; on the user's next
+update the persistence reloads user_data and the evictor restores the
+conversation state before any handler sees the update.
+"""
+import asyncio
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import ConversationHandler, TypeHandler
+
+logger = logging.getLogger(__name__)
+
+# Handler group that runs before all other handlers
+RESTORE_HANDLER_GROUP = -100
+
+
+def estimate_size(value, _depth: int = 0) -> int:
+    """Approximate memory footprint of a user_data value in bytes"""
+    size = sys.getsizeof(value)
+    if _depth > 6:
+        return size
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += estimate_size(key, _depth + 1) + estimate_size(item, _depth + 1)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += estimate_size(item, _depth + 1)
+    return size
+
+
+class UserDataEvictor:
+    """
+    LRU / idle-time eviction of user_data and conversation keys
+
+    Usage:
+        evictor = UserDataEvictor(application, persistence, idle_seconds=1800)
+        evictor.install()     # before application.initialize()
+        evictor.start()       # after application.start()
+    """
+
+    def __init__(
+        self,
+        application,
+        persistence,
+        max_resident_users: int = 5000,
+        max_resident_mb: float = 256,
+        idle_seconds: int = 1800,
+        check_interval: int = 60,
+    ):
+        """
+        Args:
+            application: PTB Application
+            persistence: WriteBehindMongoDBPersistence instance
+            max_resident_users: Users kept in memory before LRU eviction
+            max_resident_mb: Approximate user_data memory cap
+            idle_seconds: Users idle longer than this are always evicted
+            check_interval: Seconds between eviction passes
+        """
+        self.application = application
+        self.persistence = persistence
+        self.max_resident_users = max_resident_users
+        self.max_resident_bytes = int(max_resident_mb * 1024 * 1024)
+        self.idle_seconds = idle_seconds
+        self.check_interval = check_interval
+
+        # user_id -> last access (monotonic), ordered from least to most recent
+        self._last_access: "OrderedDict[int, float]" = OrderedDict()
+        self._sizes: Dict[int, int] = {}
+        self._dirty_sizes = set()
+        # user_id -> evicted conversation keys per handler
+        self._evicted: Dict[int, List[Tuple[ConversationHandler, tuple]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            'evicted_users': 0,
+            'restored_users': 0,
+            'restored_conversations': 0,
+            'eviction_runs': 0,
+            'last_run_ms': 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def install(self) -> None:
+        """Register the restore handler (runs before every other handler)"""
+        self.application.add_handler(TypeHandler(Update, self._on_update), group=RESTORE_HANDLER_GROUP)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name='user-data-evictor')
+            logger.info(
+                f"✅ User data eviction started: max {self.max_resident_users} users, "
+                f"{self.max_resident_bytes // (1024 * 1024)}MB, idle {self.idle_seconds}s"
+            )
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.evict_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ User data eviction failed: {e}", exc_info=True)
+
+    # ------------------------------------------------------------------
+    # Access tracking and restore
+    # ------------------------------------------------------------------
+
+    def touch(self, user_id: int) -> None:
+        self._last_access[user_id] = time.monotonic()
+        self._last_access.move_to_end(user_id)
+        self._dirty_sizes.add(user_id)
+
+    async def _on_update(self, update: Update, context) -> None:
+        """Restore evicted conversation state; user_data is reloaded by the persistence"""
+        user = update.effective_user
+        if not user:
+            return
+        self.touch(user.id)
+
+        evicted = self._evicted.pop(user.id, None)
+        if not evicted:
+            return
+
+        self.stats['restored_users'] += 1
+        for handler, key in evicted:
+            try:
+                doc = await self.persistence.conversations.find_one(
+                    {'_id': self.persistence.conversation_doc_id(handler.name, key)},
+                    {'state': 1}
+                )
+            except Exception as e:
+                logger.error(f"❌ Failed to restore conversation {handler.name} for {user.id}: {e}")
+                continue
+            if doc and doc.get('state') is not None:
+                # PTB internal dict - update without marking the key as written
+                handler._conversations.update_no_track({key: doc['state']})
+                self.stats['restored_conversations'] += 1
+
+    # ------------------------------------------------------------------
+    # Eviction
+    # ------------------------------------------------------------------
+
+    def _persistent_conversation_handlers(self) -> List[ConversationHandler]:
+        return [
+            handler
+            for handlers in self.application.handlers.values()
+            for handler in handlers
+            if isinstance(handler, ConversationHandler) and handler.persistent
+        ]
+
+    def _resident_user_ids(self) -> List[int]:
+        return list(self.application.user_data.keys())
+
+    def _refresh_sizes(self) -> None:
+        user_data = self.application.user_data
+        for user_id in self._dirty_sizes:
+            if user_id in user_data:
+                self._sizes[user_id] = estimate_size(user_data[user_id])
+        self._dirty_sizes.clear()
+        for user_id in self._resident_user_ids():
+            if user_id not in self._sizes:
+                self._sizes[user_id] = estimate_size(user_data[user_id])
+
+    def _select_victims(self) -> List[int]:
+        """Idle users first, then least recently used ones until under the caps"""
+        now = time.monotonic()
+        resident = set(self._resident_user_ids())
+
+        # Users loaded before tracking started count as accessed now
+        for user_id in resident:
+            if user_id not in self._last_access:
+                self._last_access[user_id] = now
+                self._last_access.move_to_end(user_id, last=False)
+
+        victims = []
+        remaining_users = len(resident)
+        remaining_bytes = sum(self._sizes.get(user_id, 0) for user_id in resident)
+
+        for user_id, last_access in self._last_access.items():
+            if user_id not in resident:
+                continue
+            idle = now - last_access >= self.idle_seconds
+            over_cap = remaining_users > self.max_resident_users or remaining_bytes > self.max_resident_bytes
+            if not idle and not over_cap:
+                break
+            victims.append(user_id)
+            remaining_users -= 1
+            remaining_bytes -= self._sizes.get(user_id, 0)
+
+        return victims
+
+    async def evict_once(self) -> int:
+        """
+        Run one eviction pass
+
+        Returns:
+            int: Number of evicted users
+        """
+        start = time.perf_counter()
+        self._refresh_sizes()
+        victims = self._select_victims()
+        if not victims:
+            self.stats['eviction_runs'] += 1
+            return 0
+
+        # Hand pending changes to the persistence and write them to MongoDB
+        # before anything leaves memory
+        snapshot = {user_id: self._last_access.get(user_id) for user_id in victims}
+        await self.application.update_persistence()
+        await self.persistence.flush_pending()
+
+        handlers = self._persistent_conversation_handlers()
+        user_data = self.application._user_data  # PTB internal dict behind the read-only proxy
+        evicted = 0
+
+        for user_id in victims:
+            # Skip users who sent an update while we were flushing
+            if self._last_access.get(user_id) != snapshot[user_id]:
+                continue
+
+            conversation_keys = []
+            for handler in handlers:
+                for key in [k for k in handler._conversations.data if user_id in k]:
+                    # Remove without tracking so the state is not deleted in MongoDB
+                    handler._conversations.data.pop(key, None)
+                    conversation_keys.append((handler, key))
+
+            user_data.pop(user_id, None)
+            self.persistence.forget_user(user_id)
+            self._last_access.pop(user_id, None)
+            self._sizes.pop(user_id, None)
+            if conversation_keys:
+                self._evicted[user_id] = conversation_keys
+            evicted += 1
+
+        self.stats['evicted_users'] += evicted
+        self.stats['eviction_runs'] += 1
+        self.stats['last_run_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        if evicted:
+            logger.info(f"🧹 Evicted {evicted} idle users from memory ({self.stats['last_run_ms']}ms)")
+        return evicted
+
+    def get_stats(self) -> Dict:
+        """Resident users and approximate bytes"""
+        resident = self._resident_user_ids()
+        return {
+            **self.stats,
+            'resident_users': len(resident),
+            'resident_bytes': sum(self._sizes.get(user_id, 0) for user_id in resident),
+            'evicted_pending_restore': len(self._evicted),
+            'max_resident_users': self.max_resident_users,
+            'max_resident_bytes': self.max_resident_bytes,
+        }
+
+
+# Global instance (initialized in server.py startup)
+_user_data_evictor: Optional[UserDataEvictor] = None
+
+
+def init_user_data_evictor(application, persistence, **kwargs) -> UserDataEvictor:
+    """Create the global user data evictor"""
+    global _user_data_evictor
+    _user_data_evictor = UserDataEvictor(application, persistence, **kwargs)
+    return _user_data_evictor
+
+
+def get_user_data_evictor() -> Optional[UserDataEvictor]:
+    """Get the global user data evictor (None if not initialized)"""
+    return _user_data_evictor
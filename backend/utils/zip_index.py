@@ -0,0 +1,247 @@
+"""
+Offline ZIP Index
+ZIP → (city, state) lookups without network calls
+
+Two layers:
+- ZIP5 index: data/zip_index.bin, built by scripts/build_zip_index.py from a
+  public postal code dataset (GeoNames US). Sorted arrays, memory-mapped on
+  the first lookup, binary search - no parsing at startup.
+- ZIP3 prefixes: USPS sectional center ranges bundled below. Always
+  available, used to reject ZIP/state combinations that cannot exist even
+  when the ZIP5 file is missing.
+
+File layout (little-endian):
+    header   MAGIC, version u16, reserved u16, count u32, cities u32
+    zips     count x u32 (sorted)
+    city_ids count x u32
+    states   count x 2 bytes (ASCII state code)
+    offsets  (cities + 1) x u32 into the city blob
+    blob     UTF-8 city names
+"""
+import bisect
+import logging
+import mmap
+import os
+import re
+import struct
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ZIPX'
+VERSION = 1
+HEADER = struct.Struct('<4sHHII')
+
+DEFAULT_PATH = Path(__file__).resolve().parent.parent / 'data' / 'zip_index.bin'
+
+ZIP_PATTERN = re.compile(r'^(\d{5})(?:-\d{4})?$')
+
+# USPS ZIP3 prefix ranges (inclusive) -> state
+ZIP3_RANGES = (
+    (5, 5, 'NY'), (6, 7, 'PR'), (8, 8, 'VI'), (9, 9, 'PR'),
+    (10, 27, 'MA'), (28, 29, 'RI'), (30, 38, 'NH'), (39, 49, 'ME'),
+    (50, 54, 'VT'), (55, 55, 'MA'), (56, 59, 'VT'), (60, 69, 'CT'),
+    (70, 89, 'NJ'), (90, 98, 'AE'), (100, 149, 'NY'), (150, 196, 'PA'),
+    (197, 199, 'DE'), (200, 200, 'DC'), (201, 201, 'VA'), (202, 205, 'DC'),
+    (206, 219, 'MD'), (220, 246, 'VA'), (247, 268, 'WV'), (270, 289, 'NC'),
+    (290, 299, 'SC'), (300, 319, 'GA'), (320, 339, 'FL'), (340, 340, 'AA'),
+    (341, 349, 'FL'), (350, 369, 'AL'), (370, 385, 'TN'), (386, 397, 'MS'),
+    (398, 399, 'GA'), (400, 427, 'KY'), (430, 459, 'OH'), (460, 479, 'IN'),
+    (480, 499, 'MI'), (500, 528, 'IA'), (530, 549, 'WI'), (550, 567, 'MN'),
+    (569, 569, 'DC'), (570, 577, 'SD'), (580, 588, 'ND'), (590, 599, 'MT'),
+    (600, 629, 'IL'), (630, 658, 'MO'), (660, 679, 'KS'), (680, 693, 'NE'),
+    (700, 714, 'LA'), (716, 729, 'AR'), (730, 732, 'OK'), (733, 733, 'TX'),
+    (734, 749, 'OK'), (750, 799, 'TX'), (800, 816, 'CO'), (820, 831, 'WY'),
+    (832, 838, 'ID'), (840, 847, 'UT'), (850, 865, 'AZ'), (870, 884, 'NM'),
+    (885, 885, 'TX'), (889, 898, 'NV'), (900, 961, 'CA'), (962, 966, 'AP'),
+    (967, 968, 'HI'), (969, 969, 'GU'), (970, 979, 'OR'), (980, 994, 'WA'),
+    (995, 999, 'AK'),
+)
+
+# Territories sharing a prefix
+ZIP3_SHARED = {969: ('GU', 'MP', 'PW', 'FM', 'MH'), 967: ('HI', 'AS')}
+
+
+def _build_zip3_table() -> Tuple[Optional[Tuple[str, ...]], ...]:
+    table = [None] * 1000
+    for first, last, state in ZIP3_RANGES:
+        for prefix in range(first, last + 1):
+            table[prefix] = ZIP3_SHARED.get(prefix, (state,))
+    return tuple(table)
+
+
+ZIP3_STATES = _build_zip3_table()
+
+
+def normalize_zip(zip_code: str) -> Optional[str]:
+    """5-digit ZIP from '12345' / '12345-6789', None if malformed"""
+    match = ZIP_PATTERN.match((zip_code or '').strip())
+    return match.group(1) if match else None
+
+
+def write_index(path, records: Iterable[Tuple[str, str, str]]) -> int:
+    """
+    Write a ZIP index file
+
+    Args:
+        path: Output file
+        records: (zip5, city, state) tuples; the first record for a ZIP wins
+
+    Returns:
+        int: Number of ZIP codes written
+    """
+    by_zip: Dict[int, Tuple[str, str]] = {}
+    for zip_code, city, state in records:
+        zip5 = normalize_zip(zip_code)
+        if zip5 is None or len(state) != 2:
+            continue
+        by_zip.setdefault(int(zip5), (city.strip(), state.upper()))
+
+    zips = sorted(by_zip)
+    city_ids: Dict[str, int] = {}
+    for zip_number in zips:
+        city_ids.setdefault(by_zip[zip_number][0], len(city_ids))
+
+    blob = bytearray()
+    offsets = [0]
+    for city in city_ids:
+        blob += city.encode('utf-8')
+        offsets.append(len(blob))
+
+    tmp_path = Path(f"{path}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(zips), len(city_ids)))
+        f.write(struct.pack(f'<{len(zips)}I', *zips))
+        f.write(struct.pack(f'<{len(zips)}I', *(city_ids[by_zip[z][0]] for z in zips)))
+        f.write(b''.join(by_zip[z][1].encode('ascii') for z in zips))
+        f.write(struct.pack(f'<{len(offsets)}I', *offsets))
+        f.write(bytes(blob))
+    os.replace(tmp_path, path)
+    return len(zips)
+
+
+class ZipIndex:
+    """Memory-mapped ZIP5 index with ZIP3 fallback"""
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path: Index file (default: ZIP_INDEX_PATH env or data/zip_index.bin)
+        """
+        self.path = Path(path or os.environ.get('ZIP_INDEX_PATH') or DEFAULT_PATH)
+        self._loaded = False
+        self._mmap = None
+        self._zips = None
+        self._city_ids = None
+        self._states = None
+        self._offsets = None
+        self._blob_start = 0
+        self.count = 0
+
+        self.load_ms: Optional[float] = None
+        self.lookups = 0
+        self.hits = 0
+        self.mismatches = 0
+
+    def _load(self) -> None:
+        """Map the file on first use (missing file = ZIP3 table only)"""
+        self._loaded = True
+        if not self.path.exists():
+            logger.info(f"ZIP index not found at {self.path}, using ZIP3 prefixes only")
+            return
+        start = time.perf_counter()
+        try:
+            with open(self.path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, _, count, cities = HEADER.unpack_from(mapped, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"unsupported ZIP index format {magic!r} v{version}")
+
+            view = memoryview(mapped)
+            pos = HEADER.size
+            self._zips = view[pos:pos + 4 * count].cast('I')
+            pos += 4 * count
+            self._city_ids = view[pos:pos + 4 * count].cast('I')
+            pos += 4 * count
+            self._states = view[pos:pos + 2 * count]
+            pos += 2 * count
+            self._offsets = view[pos:pos + 4 * (cities + 1)].cast('I')
+            self._blob_start = pos + 4 * (cities + 1)
+            self._mmap = mapped
+            self.count = count
+        except Exception as e:
+            logger.error(f"ZIP index {self.path} unusable: {e}")
+            return
+        self.load_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"📮 ZIP index mapped: {self.count} ZIP codes in {self.load_ms:.2f}ms")
+
+    @property
+    def available(self) -> bool:
+        """True if the ZIP5 file is present and mapped (ZIP → city lookups work)"""
+        if not self._loaded:
+            self._load()
+        return self.count > 0
+
+    def lookup(self, zip_code: str) -> Optional[Tuple[str, str]]:
+        """
+        City and state for a ZIP code
+
+        Returns:
+            (city, state) or None if the ZIP is unknown / index missing
+        """
+        if not self._loaded:
+            self._load()
+        self.lookups += 1
+        zip5 = normalize_zip(zip_code)
+        if zip5 is None or not self.count:
+            return None
+
+        key = int(zip5)
+        i = bisect.bisect_left(self._zips, key)
+        if i == self.count or self._zips[i] != key:
+            return None
+
+        city_id = self._city_ids[i]
+        start = self._blob_start + self._offsets[city_id]
+        end = self._blob_start + self._offsets[city_id + 1]
+        self.hits += 1
+        return self._mmap[start:end].decode('utf-8'), bytes(self._states[2 * i:2 * i + 2]).decode('ascii')
+
+    def states_for_zip(self, zip_code: str) -> Optional[Tuple[str, ...]]:
+        """Possible states for a ZIP (exact from the index, else by ZIP3 prefix)"""
+        found = self.lookup(zip_code)
+        if found:
+            return (found[1],)
+        zip5 = normalize_zip(zip_code)
+        return ZIP3_STATES[int(zip5[:3])] if zip5 else None
+
+    def is_consistent(self, zip_code: str, state: str) -> bool:
+        """
+        False only if the ZIP cannot belong to the state
+
+        Malformed ZIPs and unassigned prefixes are left to other validation.
+        """
+        states = self.states_for_zip(zip_code)
+        if not states or (state or '').strip().upper() in states:
+            return True
+        self.mismatches += 1
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Index size, load time and lookup counters"""
+        return {
+            'path': str(self.path),
+            'loaded': self._loaded,
+            'zip_codes': self.count,
+            'load_ms': round(self.load_ms, 2) if self.load_ms is not None else None,
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'hit_rate': f"{(self.hits / self.lookups * 100) if self.lookups else 0:.1f}%",
+            'mismatches': self.mismatches,
+        }
+
+
+# Global index (file is mapped lazily on the first lookup)
+zip_index = ZipIndex()
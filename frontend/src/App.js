@@ -684,14 +684,8 @@ const Dashboard = () => {
       });
 
       if (response.data.success) {
-        const skipped = response.data.skipped_count || 0;
-        const failed = response.data.failed_count || 0;
-        
-        let message = `✅ Рассылка отправлена: ${response.data.success_count} пользователям`;
-        if (skipped > 0) message += `. Пропущено: ${skipped} (заблокированные)`;
-        if (failed > 0) message += `. Ошибок: ${failed}`;
-        
-        toast.success(message);
+        // Broadcast runs in background; progress: GET /broadcast/{job_id}
+        toast.success(`✅ Рассылка запущена: ${response.data.total_users} получателей`);
         setBroadcastMessage(''); // Clear the form
         setBroadcastImageUrl(''); // Clear image URL
         setBroadcastFileId(''); // Clear file_id